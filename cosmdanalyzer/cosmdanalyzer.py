@@ -1,8 +1,12 @@
 #!usr/bin/env python3/
 """cosmdanalyzer起動スクリプト"""
 import os
-from src import main
+import sys
 
 
 if __name__ == '__main__':
+    if ({'--startup_report', '--startup-report'} & set(sys.argv[1:])):
+        from src import importreport
+        importreport.install()
+    from src import main
     main.main(os.path.dirname(__file__))
@@ -0,0 +1,12 @@
+#!usr/bin/env python3/
+"""cosmdanalyzer分散計算の起動スクリプト"""
+import os
+import sys
+
+
+if __name__ == '__main__':
+    if ({'--startup_report', '--startup-report'} & set(sys.argv[1:])):
+        from src import importreport
+        importreport.install()
+    from src.main import workqueue
+    workqueue.queue_main(os.path.dirname(__file__))
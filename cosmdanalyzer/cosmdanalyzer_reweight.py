@@ -0,0 +1,8 @@
+#!usr/bin/env python3/
+"""cosmdanalyzer再重み付けの起動スクリプト"""
+import os
+
+
+if __name__ == '__main__':
+    from src.main import reweight
+    reweight.reweight_main(os.path.dirname(__file__))
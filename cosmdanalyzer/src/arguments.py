@@ -13,6 +13,97 @@ def create_parser():
     #                     type=pathlib.Path)
     # parser.add_argument('src_open_dx', help='存在確率',
     #                     nargs='+', type=pathlib.Path)
+    add_calc_arguments(parser)
+    return parser
+
+
+def create_batch_parser():
+    """複数の対象をまとめて計算する場合のコマンドラインオプション設定"""
+    parser = argparse.ArgumentParser(description='cosmdanalyzer batch')
+    parser.add_argument('out_dir',
+                        help='出力ディレクトリ, 対象毎のサブディレクトリに出力する',
+                        type=pathlib.Path)
+    parser.add_argument('targets',
+                        help='対象毎の入力ディレクトリ, globパターンも指定できる',
+                        nargs='*')
+    parser.add_argument('--manifest',
+                        help='対象毎の入力ディレクトリを1行ずつ記載したファイル'
+                             '(空行と#で始まる行は無視する)',
+                        type=pathlib.Path)
+    parser.add_argument('-j', '--jobs',
+                        help='同時に計算する対象の数(デフォルト: 1)',
+                        type=int, default=1)
+    parser.add_argument('--memory_budget',
+                        help='同時に計算する対象の推定使用メモリの上限(MB), '
+                             '推定値は原子数, フレーム数とボクセル数から求める'
+                             '(デフォルト: 制限なし)',
+                        type=float)
+    add_calc_arguments(parser)
+    return parser
+
+
+def create_queue_parser():
+    """共有ファイルシステム上のキューで分散計算する場合のコマンドラインオプション設定"""
+    parser = argparse.ArgumentParser(description='cosmdanalyzer work queue')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    coordinator = subparsers.add_parser(
+        'coordinator',
+        help='ホットスポットとパッチを求め, フレームの区間毎のタスクを作成する')
+    coordinator.add_argument('out_dir',
+                             help='出力ディレクトリ, キューと計算途中の状態を置く',
+                             type=pathlib.Path)
+    coordinator.add_argument('src_dir', help='入力ディレクトリ',
+                             type=pathlib.Path)
+    coordinator.add_argument('--chunk_size',
+                             help='1タスクで計算するフレーム数(デフォルト: 100)',
+                             type=int, default=100)
+    add_calc_arguments(coordinator)
+    worker = subparsers.add_parser(
+        'worker', help='タスクを取得してフレーム毎のスコアを計算する')
+    worker.add_argument('out_dir', help='coordinatorの出力ディレクトリ',
+                        type=pathlib.Path)
+    worker.add_argument('--max_tasks',
+                        help='計算するタスク数の上限(デフォルト: 制限なし)',
+                        type=int)
+    reduce = subparsers.add_parser(
+        'reduce', help='タスクの計算結果を結合して結果を出力する')
+    reduce.add_argument('out_dir', help='coordinatorの出力ディレクトリ',
+                        type=pathlib.Path)
+    requeue = subparsers.add_parser(
+        'requeue', help='workerの更新が途絶えた取得済みのタスクを未取得に戻す')
+    requeue.add_argument('out_dir', help='coordinatorの出力ディレクトリ',
+                         type=pathlib.Path)
+    requeue.add_argument('--older_than',
+                         help='workerの最後の更新から指定秒数以上経過した'
+                              'タスクのみ戻す, workerの更新間隔の60秒より'
+                              '大きくする(デフォルト: 600)',
+                         type=float, default=600.0)
+    return parser
+
+
+def create_reweight_parser():
+    """保存したスコアから重みを変えて結果を出力し直す場合のコマンドラインオプション設定"""
+    parser = argparse.ArgumentParser(description='cosmdanalyzer reweight')
+    parser.add_argument('out_dir',
+                        help='scores.binを含む計算済みの出力ディレクトリ, '
+                             'all_info.txtとプローブ毎の*_info.txtを上書きする',
+                        type=pathlib.Path)
+    parser.add_argument('-s', '--setting',
+                        help='[score.weight]を使う設定ファイルのパス'
+                             '(デフォルト: 前回の出力に使った重み)',
+                        type=pathlib.Path)
+    parser.add_argument('--weight',
+                        help='NAME=VALUEの形式でスコアの重みを指定する, '
+                             '設定ファイルより優先する. 複数回指定できる',
+                        action='append', default=[])
+    parser.add_argument('-v', '--verbose',
+                        help='標準出力に詳細な処理情報を表示する',
+                        action='store_true')
+    return parser
+
+
+def add_calc_arguments(parser: argparse.ArgumentParser) -> None:
+    """計算に関するオプションを追加する"""
     parser.add_argument('-s', '--setting', help='設定ファイルのパス',
                         type=pathlib.Path)
     # parser.add_argument('--fpocket_info',
@@ -23,7 +114,79 @@ def create_parser():
     parser.add_argument('--output_detail',
                         help='スコアの傾向を表す詳細情報を出力する',
                         action='store_true')
+    parser.add_argument('--detail_method',
+                        help='スコアの詳細情報の計算方法'
+                             '(sketch: 逐次的な統計量と四分位数の近似, '
+                             'exact: 全フレームのスコアを保持して厳密に計算, '
+                             'デフォルト: exact)',
+                        choices=('sketch', 'exact'), default='exact')
+    parser.add_argument('--detail_compression',
+                        help='--detail_method sketchの四分位数の精度, '
+                             '大きいほど精度が高く使用メモリが多い'
+                             '(デフォルト: 200)',
+                        type=float, default=200.0)
+    parser.add_argument('--output_gfe_grid',
+                        help='プローブ毎にすべてのボクセルのGFEを'
+                             '指定形式(dx: OpenDX, bin: バイナリ)で出力する',
+                        choices=('dx', 'bin'))
+    parser.add_argument('--output_frame_scores',
+                        help='フレーム毎, パッチ毎のスコアを'
+                             'プローブ毎に.npy形式で出力する',
+                        action='store_true')
+    parser.add_argument('--output_threads',
+                        help='プローブ毎の出力ファイルを次のプローブの計算中に'
+                             '書き込むスレッド数, 0の場合は計算と順番に書き込む'
+                             '(デフォルト: 1)',
+                        type=int, default=1)
+    parser.add_argument('--frame_start',
+                        help='計算に使う最初のフレーム番号(0始まり), '
+                             '設定ファイルの[frames]より優先する',
+                        type=int)
+    parser.add_argument('--frame_stop',
+                        help='このフレーム番号より前のフレームを計算に使う',
+                        type=int)
+    parser.add_argument('--frame_stride',
+                        help='計算に使うフレームの間隔',
+                        type=int)
+    parser.add_argument('--frame_subsample',
+                        help='start, stop, strideで選んだフレームから'
+                             '無作為に選んで計算に使うフレーム数',
+                        type=int)
+    parser.add_argument('--frame_seed',
+                        help='--frame_subsampleの乱数シード',
+                        type=int)
+    parser.add_argument('--convergence_tolerance',
+                        help='重み付きスコアの平均の標準誤差がこの値以下に'
+                             'なった時点でフレームの計算を打ち切る, '
+                             '設定ファイルの[score.convergence]より優先する',
+                        type=float)
+    parser.add_argument('--checkpoint_interval',
+                        help='計算途中の状態を出力ディレクトリに保存する, '
+                             'フレーム毎のスコアは指定フレーム数毎に保存する',
+                        type=int)
+    parser.add_argument('--resume',
+                        help='出力ディレクトリに保存した計算途中の状態から'
+                             '再開する',
+                        action='store_true')
+    parser.add_argument('--stream_chunk_size',
+                        help='トラジェクトリを指定フレーム数ずつ2回読み込み, '
+                             '使用メモリをトラジェクトリの長さによらない'
+                             '大きさにする',
+                        type=int)
+    parser.add_argument('--spill_dir',
+                        help='--stream_chunk_size, --exposure_mmapで'
+                             'フレーム毎の情報を書き出す'
+                             '一時ファイルのディレクトリ'
+                             '(デフォルト: システムの一時ディレクトリ)',
+                        type=pathlib.Path)
+    parser.add_argument('--exposure_mmap',
+                        help='フレーム毎の溶媒露出原子を--spill_dirの'
+                             '一時ファイルにメモリマップして保持する',
+                        action='store_true')
+    parser.add_argument('--startup_report', '--startup-report',
+                        help='終了時にモジュール毎の読み込み時間を'
+                             '標準エラー出力に表示する',
+                        action='store_true')
     parser.add_argument('-v', '--verbose',
                         help='標準出力に詳細な処理情報を表示する',
                         action='store_true')
-    return parser
@@ -1,5 +1,5 @@
 """PyMol互換処理"""
-from collections.abc import Iterable, Iterator
+from collections.abc import Iterable, Iterator, Mapping, Sequence
 import math
 import os
 from rdkit import Chem
@@ -39,17 +39,17 @@ def write_pymol_src(
     # write pdb
     pdb_str = Chem.rdmolfiles.MolToPDBBlock(
             mol, mol.GetNumConformers() - 1, flavor=34)
-    pdb_str_list = pdb_str.split('\n')
+    atom_lines, serial_to_lines = _index_atom_lines(pdb_str.split('\n'))
     with open(out_pdb_path, 'w') as pdb_out, \
          open(out_info_path, 'w') as info_out:
-        for line in pdb_str_list:
-            if line.startswith('ATOM  ') or line.startswith('HETATM'):
-                pdb_out.write(line)
-                pdb_out.write('\n')
+        for line in atom_lines:
+            pdb_out.write(line)
+            pdb_out.write('\n')
         for i, patch_info in enumerate(all_patch_info, 1):
             part_pdb_path = os.path.join(spots_dir, 'spot{}.pdb'.format(i))
             with open(part_pdb_path, 'w') as part_pdb_out:
-                _write_part_pdb(part_pdb_out, pdb_str_list, patch_info[1])
+                _write_part_pdb(part_pdb_out, atom_lines, serial_to_lines,
+                                patch_info[1])
             for point_line in _create_point_pdb_lines(i, patch_info[0]):
                 pdb_out.write(point_line)
                 pdb_out.write('\n')
@@ -122,34 +122,47 @@ def _write_pymol_script(out: IO[str], pdb_filename: str):
     out.write(pymol_script.format(pdb_filename))
 
 
-def _write_part_pdb(out: IO[str], pdb: Iterable[str], atom_idxs: Iterable[int]
-                    ) -> None:
-    """与えられたPDB文字列の一部を原子インデックスで指定して出力する.
+def _index_atom_lines(pdb: Iterable[str]
+                      ) -> tuple[list[str], dict[int, list[int]]]:
+    """PDB文字列から原子行を取り出し, 原子番号から行の位置の対応表を作成する.
 
     Args:
-        out: 出力先ストリーム
         pdb: 1行毎のPDB文字列
-        atom_idxs: 原子インデックスの集合
+    Returns:
+        ATOM, HETATM行の配列と
+        原子番号(PDBの原子のシリアル番号)から配列上の位置の対応表
     """
-    idx_set = set(atom_idxs)
-    for line in _part_pdb(pdb, idx_set):
-        out.write(line)
-        out.write('\n')
-
-
-def _part_pdb(pdb: Iterable[str], atom_idxs: set[int]) -> Iterator[str]:
-    """与えられたPDB文字列の一部を原子インデックスで切り抜く.
+    atom_lines: list[str] = []
+    serial_to_lines: dict[int, list[int]] = dict()
+    for line in pdb:
+        if line.startswith('ATOM  ') or line.startswith('HETATM'):
+            serial = int(line[6:11])
+            if serial in serial_to_lines:
+                serial_to_lines[serial].append(len(atom_lines))
+            else:
+                serial_to_lines[serial] = [len(atom_lines), ]
+            atom_lines.append(line)
+    return atom_lines, serial_to_lines
+
+
+def _write_part_pdb(out: IO[str],
+                    atom_lines: Sequence[str],
+                    serial_to_lines: Mapping[int, Iterable[int]],
+                    atom_idxs: Iterable[int]
+                    ) -> None:
+    """原子行の一部を原子インデックスで指定して元の順に出力する.
 
     Args:
-        pdb: 1行毎のPDB文字列
+        out: 出力先ストリーム
+        atom_lines: ATOM, HETATM行の配列
+        serial_to_lines: 原子番号から配列上の位置の対応表
         atom_idxs: 原子インデックスの集合
-    Returns:
-        原子インデックスに対応する原子行のみのPDB
     """
-    for line in pdb:
-        if ((line.startswith('ATOM  ') or line.startswith('HETATM'))
-                and (int(line[6:11]) in atom_idxs)):
-            yield line
+    line_idxs = sorted(
+        i for idx in set(atom_idxs) for i in serial_to_lines.get(idx, tuple()))
+    for i in line_idxs:
+        out.write(atom_lines[i])
+        out.write('\n')
 
 
 def _create_point_pdb_lines(residue_idx: int, positions: Iterable[Vector3f]
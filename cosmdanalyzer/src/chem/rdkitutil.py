@@ -72,6 +72,16 @@ class Mol:
         """
         return self._mol.GetAtomWithIdx(atom_idx).GetMonomerInfo().GetName()
 
+    def atom_to_hybridization(self, atom_idx: int) -> str:
+        """原子IDに対応する混成軌道の名前を返す.
+
+        Atoms:
+            atom_idx: 原子ID
+        Returns:
+            'SP2', 'SP3'などの混成軌道の名前
+        """
+        return str(self._mol.GetAtomWithIdx(atom_idx).GetHybridization())
+
     def atom_to_vdw_radius(self, atom_idx: int) -> float:
         """原子IDに対応するファンデルワールス半径を返す.
 
@@ -31,8 +31,7 @@ def single_linkage_3d(
     Returns:
         所属インデックスの配列で表されるクラスタの配列
     """
-    neg_idxs = list(index.half_sphere_grid_index_iterator(
-        distance_3d_threshold))
+    neg_idxs = index.half_sphere_grid_stencil(distance_3d_threshold)
     cluster_table = clusterdata.ClusterTable[tuple[int, int, int]]()
     cluster_num = 0
     distance_list = []
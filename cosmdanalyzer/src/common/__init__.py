@@ -1,3 +1,5 @@
 from .iterator import *
 from .function import *
 from .other import *
+from .stats import *
+from .bitmatrix import *
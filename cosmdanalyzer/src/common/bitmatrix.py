@@ -0,0 +1,207 @@
+"""1要素1ビットで保持する2次元の真偽値の表"""
+from collections.abc import Iterable, Iterator, Sequence
+import mmap
+import os
+import tempfile
+import numpy as np
+
+
+def pack_bits(cols: Iterable[int], n_cols: int) -> bytes:
+    """列番号の集合を1列1ビットのバイト列に変換する.
+
+    Args:
+        cols: 真とする列番号の集合
+        n_cols: 列数
+    Returns:
+        列番号の小さい順に下位ビットから詰めたバイト列
+    """
+    data = bytearray((n_cols + 7) // 8)
+    for col in cols:
+        data[col >> 3] |= 1 << (col & 7)
+    return bytes(data)
+
+
+def create_bit_mask(cols: Iterable[int]) -> int:
+    """列番号の集合をBitRow.countに渡すビットマスクに変換する.
+
+    Args:
+        cols: 列番号の集合
+    Returns:
+        列番号のビットを立てた整数
+    """
+    mask = 0
+    for col in cols:
+        mask |= 1 << col
+    return mask
+
+
+class BitRow:
+    """1行分のビット列.
+    真の列番号の集合として, 所属判定と列番号の小さい順の列挙ができる.
+    所属判定を繰り返す場合はcontains_manyでまとめて判定したほうが速い.
+    """
+    __slots__ = ('_data', '_n_cols')
+
+    def __init__(self, data: bytes, n_cols: int):
+        """
+
+        Args:
+            data: pack_bitsと同じ形式のバイト列
+            n_cols: 列数
+        """
+        self._data = data
+        self._n_cols = n_cols
+
+    @property
+    def n_cols(self) -> int:
+        """列数"""
+        return self._n_cols
+
+    def __contains__(self, col: int) -> bool:
+        return ((0 <= col < self._n_cols)
+                and ((self._data[col >> 3] >> (col & 7)) & 1) == 1)
+
+    def __iter__(self) -> Iterator[int]:
+        for i, byte in enumerate(self._data):
+            while byte:
+                low = byte & -byte
+                yield (i << 3) + low.bit_length() - 1
+                byte ^= low
+
+    def __len__(self) -> int:
+        return self.to_int().bit_count()
+
+    def to_bytes(self) -> bytes:
+        """pack_bitsと同じ形式のバイト列を返す."""
+        return bytes(self._data)
+
+    def to_int(self) -> int:
+        """列番号のビットを立てた整数を返す."""
+        return int.from_bytes(self._data, 'little')
+
+    def contains_many(self, cols: Iterable[int] | np.ndarray) -> np.ndarray:
+        """複数の列番号の所属判定をまとめて行う.
+
+        Args:
+            cols: 列番号の配列
+        Returns:
+            列番号毎に真の場合はTrueのbool配列
+        """
+        bits = np.unpackbits(np.frombuffer(self._data, dtype=np.uint8),
+                             count=self._n_cols, bitorder='little')
+        if not isinstance(cols, np.ndarray):
+            cols = np.fromiter(cols, dtype=np.int64)
+        valid = (cols >= 0) & (cols < self._n_cols)
+        ret = np.zeros(len(cols), dtype=bool)
+        ret[valid] = bits[cols[valid]]
+        return ret
+
+    def count(self, mask: int) -> int:
+        """ビットマスクの列のうち真の列数を返す.
+
+        Args:
+            mask: create_bit_maskで作成したビットマスク
+        Returns:
+            真の列数
+        """
+        return (self.to_int() & mask).bit_count()
+
+
+class BitMatrix:
+    """行毎にビットを詰めて保持する2次元の真偽値の表.
+    一時ファイルにメモリマップして保持することもできる.
+    pickleで保存した場合はメモリ上の表として復元する.
+    """
+
+    def __init__(self, n_rows: int, n_cols: int, mapped: bool = False,
+                 tmp_dir: str | os.PathLike | None = None):
+        """すべて偽の表を作成する.
+
+        Args:
+            n_rows: 行数
+            n_cols: 列数
+            mapped: Trueの場合は一時ファイルにメモリマップして保持する
+            tmp_dir: mappedの場合の一時ファイルのディレクトリ,
+                     Noneの場合はシステムの既定のディレクトリ
+        """
+        self._n_rows = n_rows
+        self._n_cols = n_cols
+        self._row_bytes = (n_cols + 7) // 8
+        size = n_rows * self._row_bytes
+        self._file = None
+        if mapped and size > 0:
+            self._file = tempfile.TemporaryFile(dir=tmp_dir)
+            self._file.truncate(size)
+            self._data = mmap.mmap(self._file.fileno(), size)
+        else:
+            self._data = bytearray(size)
+
+    @property
+    def n_cols(self) -> int:
+        """列数"""
+        return self._n_cols
+
+    def __len__(self) -> int:
+        return self._n_rows
+
+    def __getitem__(self, key: int | slice) -> 'BitRow | BitMatrix':
+        """行番号を指定した場合はその行を, スライスを指定した場合は
+        選択した行からなるメモリ上の表を返す.
+        """
+        if isinstance(key, slice):
+            rows = range(*key.indices(self._n_rows))
+            ret = BitMatrix(len(rows), self._n_cols)
+            b = self._row_bytes
+            if rows.step == 1:
+                ret._data[:] = self._data[rows.start * b:rows.stop * b]
+            else:
+                for i, row_idx in enumerate(rows):
+                    ret._data[i * b:(i + 1) * b] = \
+                        self._data[row_idx * b:(row_idx + 1) * b]
+            return ret
+        if key < 0:
+            key += self._n_rows
+        if not (0 <= key < self._n_rows):
+            raise IndexError('row index out of range')
+        b = self._row_bytes
+        return BitRow(bytes(self._data[key * b:(key + 1) * b]), self._n_cols)
+
+    def __iter__(self) -> Iterator[BitRow]:
+        for i in range(self._n_rows):
+            yield self[i]
+
+    def set_row(self, row_idx: int, cols: Iterable[int]) -> None:
+        """1行分の真の列を設定する.
+
+        Args:
+            row_idx: 行番号
+            cols: 真とする列番号の集合, 含まない列は偽とする
+        """
+        b = self._row_bytes
+        self._data[row_idx * b:(row_idx + 1) * b] = pack_bits(
+            cols, self._n_cols)
+
+    def count_groups(self, groups: Sequence[Iterable[int]]) -> list[int]:
+        """列の集合毎にすべての行の真の要素数を数える.
+
+        Args:
+            groups: 列番号の集合の列
+        Returns:
+            groupsと同じ順番の真の要素数
+        """
+        masks = [create_bit_mask(g) for g in groups]
+        counts = [0, ] * len(masks)
+        for row in self:
+            bits = row.to_int()
+            for i, mask in enumerate(masks):
+                counts[i] += (bits & mask).bit_count()
+        return counts
+
+    def __getstate__(self):
+        return (self._n_rows, self._n_cols, bytes(self._data))
+
+    def __setstate__(self, state):
+        self._n_rows, self._n_cols, data = state
+        self._row_bytes = (self._n_cols + 7) // 8
+        self._file = None
+        self._data = bytearray(data)
@@ -1,5 +1,9 @@
 """その他"""
+from collections.abc import Iterator
+import contextlib
 import os
+import tempfile
+from typing import BinaryIO
 
 
 def path_to_str(path: str | bytes | os.PathLike) -> str:
@@ -15,3 +19,30 @@ def path_to_str(path: str | bytes | os.PathLike) -> str:
     elif isinstance(path, bytes):
         return path.decode('utf-8')
     return path
+
+
+@contextlib.contextmanager
+def atomic_open(path: str | os.PathLike) -> Iterator[BinaryIO]:
+    """書き込み途中のファイルを残さないように,
+    同じディレクトリの一時ファイルに書き込んでから置き換える.
+    書き込み中に例外が発生した場合は一時ファイルを削除し, 元のファイルを残す.
+
+    Args:
+        path: 書き込むファイルのパス
+    Returns:
+        一時ファイルにバイナリで書き込むファイルオブジェクト
+    """
+    path = os.fspath(path)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or None,
+                                    prefix=os.path.basename(path),
+                                    suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,275 @@
+"""逐次的に値を追加できる統計量"""
+import math
+
+
+class RunningStats:
+    """値を1つずつ追加して件数, 平均, 分散, 最小値, 最大値を計算する.
+    平均と分散はWelfordの方法で計算し, 他のオブジェクトと結合できる.
+    """
+
+    def __init__(self):
+        self._count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._min = math.inf
+        self._max = -math.inf
+
+    def add(self, value: float) -> None:
+        """値を追加する.
+
+        Args:
+            value: 追加する値
+        """
+        self._count += 1
+        delta = value - self._mean
+        self._mean += delta / self._count
+        self._m2 += delta * (value - self._mean)
+        if value < self._min:
+            self._min = value
+        if value > self._max:
+            self._max = value
+
+    def merge(self, other: 'RunningStats') -> None:
+        """他のオブジェクトに追加された値をすべて追加する.
+
+        Args:
+            other: 結合するオブジェクト
+        """
+        if other._count == 0:
+            return
+        if self._count == 0:
+            self._count = other._count
+            self._mean = other._mean
+            self._m2 = other._m2
+            self._min = other._min
+            self._max = other._max
+            return
+        count = self._count + other._count
+        delta = other._mean - self._mean
+        self._mean += delta * other._count / count
+        self._m2 += other._m2 + delta**2 * self._count * other._count / count
+        self._count = count
+        self._min = min(self._min, other._min)
+        self._max = max(self._max, other._max)
+
+    @property
+    def count(self) -> int:
+        """追加した値の数"""
+        return self._count
+
+    @property
+    def mean(self) -> float:
+        """平均, 値がない場合はNaN"""
+        return self._mean if self._count > 0 else math.nan
+
+    @property
+    def variance(self) -> float:
+        """標本分散(不偏分散), 値が2つ未満の場合はNaN"""
+        return self._m2 / (self._count - 1) if self._count > 1 else math.nan
+
+    @property
+    def min(self) -> float:
+        """最小値, 値がない場合はinf"""
+        return self._min
+
+    @property
+    def max(self) -> float:
+        """最大値, 値がない場合は-inf"""
+        return self._max
+
+
+class QuantileSketch:
+    """t-digestによる分位数の近似計算.
+    値を(平均, 重み)で表される重心の集合に要約して保持し,
+    保持する重心の数はcompressionに比例する量に制限される.
+    追加した値の数がbuffer_size以下の間は要約せず,
+    分位数はソート済み配列の線形補間と同じ値になる.
+    """
+
+    def __init__(self, compression: float = 100.0,
+                 buffer_size: int | None = None):
+        """
+
+        Args:
+            compression: 大きいほど精度が高く使用メモリが多い
+            buffer_size: 要約せずに保持する重心の最大数,
+                         Noneの場合はcompressionの10倍
+        """
+        self._compression = compression
+        self._buffer_size = (buffer_size if buffer_size is not None
+                             else max(int(10 * compression), 1))
+        self._centroids: list[tuple[float, float]] = []
+        self._total = 0.0
+        self._min = math.inf
+        self._max = -math.inf
+
+    def add(self, value: float, weight: float = 1.0) -> None:
+        """値を追加する.
+
+        Args:
+            value: 追加する値
+            weight: 値の重み
+        """
+        self._centroids.append((value, weight))
+        self._total += weight
+        if value < self._min:
+            self._min = value
+        if value > self._max:
+            self._max = value
+        if len(self._centroids) > self._buffer_size:
+            self._compress()
+
+    def merge(self, other: 'QuantileSketch') -> None:
+        """他のオブジェクトに追加された値をすべて追加する.
+
+        Args:
+            other: 結合するオブジェクト
+        """
+        self._centroids.extend(other._centroids)
+        self._total += other._total
+        self._min = min(self._min, other._min)
+        self._max = max(self._max, other._max)
+        if len(self._centroids) > self._buffer_size:
+            self._compress()
+
+    def quantile(self, q: float) -> float:
+        """分位数を返す.
+        重心毎にその重心に含まれる値の中央の順位に重心の平均があるとみなし,
+        順位(値の数 - 1) * qの値を隣接する重心の線形補間で求める.
+
+        Args:
+            q: [0, 1]
+        Returns:
+            分位数, 値がない場合はNaN
+        """
+        if len(self._centroids) == 0:
+            return math.nan
+        self._centroids.sort()
+        pos = (self._total - 1) * q
+        prev_pos = None
+        prev_mean = self._min
+        cum = 0.0
+        for mean, weight in self._centroids:
+            center = cum + (weight - 1) * 0.5
+            if pos <= center:
+                if prev_pos is None:
+                    # 最初の重心より前は最小値との線形補間
+                    if center <= 0.0:
+                        return mean
+                    return self._min + (mean - self._min) * pos / center
+                rate = (pos - prev_pos) / (center - prev_pos)
+                return prev_mean * (1 - rate) + mean * rate
+            prev_pos = center
+            prev_mean = mean
+            cum += weight
+        # 最後の重心より後は最大値との線形補間
+        last = self._total - 1
+        if last <= prev_pos:
+            return prev_mean
+        rate = (pos - prev_pos) / (last - prev_pos)
+        return prev_mean * (1 - rate) + self._max * rate
+
+    def _compress(self) -> None:
+        """隣接する重心をスケール関数k1の制限内で結合する."""
+        centroids = sorted(self._centroids)
+        merged: list[tuple[float, float]] = []
+        cur_mean, cur_weight = centroids[0]
+        weight_so_far = 0.0
+        q_limit = self._q_limit(0.0)
+        for mean, weight in centroids[1:]:
+            if (weight_so_far + cur_weight + weight) / self._total <= q_limit:
+                cur_weight += weight
+                cur_mean += (mean - cur_mean) * weight / cur_weight
+            else:
+                merged.append((cur_mean, cur_weight))
+                weight_so_far += cur_weight
+                q_limit = self._q_limit(weight_so_far / self._total)
+                cur_mean, cur_weight = mean, weight
+        merged.append((cur_mean, cur_weight))
+        self._centroids = merged
+
+    def _q_limit(self, q: float) -> float:
+        """分位点qから始まる重心が含むことのできる分位点の上限を返す."""
+        scale = self._compression / (2 * math.pi)
+        k = scale * math.asin(2 * q - 1) + 1.0
+        if k >= scale * math.pi * 0.5:
+            return 1.0
+        return (math.sin(k / scale) + 1) * 0.5
+
+
+class BlockMeanStats:
+    """値をキーのblock_size毎の区間でブロックに分け,
+    ブロック平均のばらつきから平均の標準誤差を計算する.
+    値の相関がブロック長より短ければ標準誤差を過小評価しない.
+    追加した順番によらずキーの連続する値を同じブロックにするため,
+    無作為な順番で追加した時系列の値も時系列順のブロックで評価する.
+    ブロック毎の和は区間のキーがすべて揃うまで保持し,
+    揃ったブロックの平均は逐次的な統計量にまとめる.
+    """
+
+    def __init__(self, block_size: int):
+        """
+
+        Args:
+            block_size: 1ブロックのキーの数
+        """
+        if block_size < 1:
+            raise ValueError('block_size must be positive')
+        self._block_size = block_size
+        # ブロック番号 -> [値の和, 値の数, キーの数]
+        self._blocks: dict[int, list] = {}
+        self._block_means = RunningStats()
+        self._n_keys = 0
+        self._count = 0
+        self._sum = 0.0
+
+    def add(self, value: float | None, key: int | None = None) -> None:
+        """値を追加する.
+
+        Args:
+            value: 追加する値, Noneの場合はキーだけを追加する
+            key: 値を並べる順番(時系列のフレーム番号など),
+                 Noneの場合は追加した順番
+        """
+        if key is None:
+            key = self._n_keys
+        self._n_keys += 1
+        block_idx = key // self._block_size
+        block = self._blocks.get(block_idx)
+        if block is None:
+            block = self._blocks[block_idx] = [0.0, 0, 0]
+        if value is not None:
+            block[0] += value
+            block[1] += 1
+            self._count += 1
+            self._sum += value
+        block[2] += 1
+        if block[2] == self._block_size:
+            # ブロックのキーが揃ったら平均だけを残す
+            del self._blocks[block_idx]
+            if block[1] > 0:
+                self._block_means.add(block[0] / block[1])
+
+    @property
+    def count(self) -> int:
+        """追加した値の数"""
+        return self._count
+
+    @property
+    def n_blocks(self) -> int:
+        """値が揃ったブロックの数"""
+        return self._block_means.count
+
+    @property
+    def mean(self) -> float:
+        """すべての値の平均, 値がない場合はNaN"""
+        return self._sum / self._count if self._count > 0 else math.nan
+
+    @property
+    def standard_error(self) -> float:
+        """キーが揃ったブロックの平均から求めた平均の標準誤差,
+        ブロックが2つ未満の場合はNaN"""
+        n_blocks = self.n_blocks
+        if n_blocks < 2:
+            return math.nan
+        return math.sqrt(self._block_means.variance / n_blocks)
@@ -1,5 +1,4 @@
 """fpocketの出力パーサー"""
-import array
 from collections.abc import Iterator, Sequence
 from typing import Any, IO
 from ..solidcalc.typehint import Vector3f
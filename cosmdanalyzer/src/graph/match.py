@@ -1,11 +1,10 @@
 """グラフ構造のマッチング"""
-from collections.abc import Callable, Iterable
-import itertools
+from collections.abc import Callable, Hashable, Iterable
 from typing import TypeVar
 
 
-_N0 = TypeVar("_N0")
-_N1 = TypeVar("_N1")
+_N0 = TypeVar("_N0", bound=Hashable)
+_N1 = TypeVar("_N1", bound=Hashable)
 
 
 def match_all(node0: _N0,
@@ -16,6 +15,9 @@ def match_all(node0: _N0,
               ) -> dict[_N0, _N1] | None:
     """2つのグラフが一致するか判定する.
     一致する場合はグラフ0からグラフ1のノード対応表を返す.
+    グラフ0の起点ノードから到達できるノードを幅優先順に並べ,
+    対応済みの隣接ノードとの結合の整合性と未対応の隣接ノード数で
+    枝刈りしながら1ノードずつ対応を延長する(VF2法と同様の探索).
 
     Args:
         nodes0: グラフ0起点ノード
@@ -27,70 +29,105 @@ def match_all(node0: _N0,
         2つのグラフが一致する場合はグラフ0からグラフ1のノード対応表
         一致しない場合はNone
     """
+    order, parents, adj0 = _bfs_order(node0, edge0)
+    adj1: dict[_N1, tuple[_N1, ...]] = dict()
+
+    def neighbors1(n1: _N1) -> tuple[_N1, ...]:
+        if n1 not in adj1:
+            adj1[n1] = tuple(edge1(n1))
+        return adj1[n1]
+
     for node1 in nodes1:
-        if is_same_node(node0, node1):
-            same_node = {node0: node1}
-            ret = _match_inner(node0, edge0, node1, edge1, is_same_node,
-                               same_node, {node1, })
-            if ret is not None:
-                return same_node
+        if not is_same_node(node0, node1):
+            continue
+        core0 = {node0: node1}
+        core1 = {node1: node0}
+        if _match_inner(1, order, parents, adj0, neighbors1, is_same_node,
+                        core0, core1):
+            return core0
     return None
 
 
-def _match_inner(node0: _N0,
-                 edge0: Callable[[_N0], Iterable[_N0]],
-                 node1: _N1,
-                 edge1: Callable[[_N1], Iterable[_N1]],
+def _bfs_order(node0: _N0, edge0: Callable[[_N0], Iterable[_N0]]
+               ) -> tuple[list[_N0], list[_N0 | None],
+                          dict[_N0, tuple[_N0, ...]]]:
+    """起点ノードから到達できるノードを幅優先順に列挙する.
+
+    Args:
+        node0: 起点ノード
+        edge0: ノードから隣接ノードを返す関数
+    Returns:
+        幅優先順のノード列, 各ノードを最初に発見した親ノード(起点はNone),
+        ノードから隣接ノードの対応表
+    """
+    order = [node0, ]
+    parents: list[_N0 | None] = [None, ]
+    adj0: dict[_N0, tuple[_N0, ...]] = dict()
+    visited = {node0, }
+    i = 0
+    while i < len(order):
+        n0 = order[i]
+        adj0[n0] = tuple(edge0(n0))
+        for m0 in adj0[n0]:
+            if m0 not in visited:
+                visited.add(m0)
+                order.append(m0)
+                parents.append(n0)
+        i += 1
+    return order, parents, adj0
+
+
+def _match_inner(depth: int,
+                 order: list[_N0],
+                 parents: list[_N0 | None],
+                 adj0: dict[_N0, tuple[_N0, ...]],
+                 neighbors1: Callable[[_N1], tuple[_N1, ...]],
                  is_same_node: Callable[[_N0, _N1], bool],
-                 same_node: dict[_N0, _N1],
-                 searched1: set[_N1]) -> tuple[set[_N0], set[_N1]] | None:
+                 core0: dict[_N0, _N1],
+                 core1: dict[_N1, _N0]) -> bool:
     """一部のノード対応がわかっている2つのグラフが一致するか判定する.
-    一致する場合はグラフ0からグラフ1のノード対応表を返す.
+    一致する場合は対応表に全ノードの対応が追加される.
 
     Args:
-        nodes0: グラフ0の起点ノード
-        edge0: グラフ0のノードから隣接ノードを返す関数
-        nodes1: node0に対応するグラフ1のノード
-        edge1: グラフ1のノードから隣接ノードを返す関数
+        depth: 次に対応を決めるorder上の位置
+        order: グラフ0のノードの探索順
+        parents: orderの各ノードの対応済みの隣接ノード
+        adj0: グラフ0のノードから隣接ノードの対応表
+        neighbors1: グラフ1のノードから隣接ノードを返す関数
         is_same_node: ノードが一致する場合はTrueを返す関数
-        same_node: グラフ0からグラフ1の同一ノードの対応表
-        searched1: グラフ1の探索しないノード
+        core0: グラフ0からグラフ1の対応表
+        core1: グラフ1からグラフ0の対応表
     Returns:
-        2つのグラフが一致する場合は
-        探索した(グラフ0のノード集合, グラフ1のノード集合)
-        一致しない場合はNone
+        一致する場合はTrue
     """
-    neg0 = tuple(edge0(node0))
-    neg1_p = tuple(edge1(node1))
-    for neg1 in itertools.permutations(neg1_p):
-        child_same0: set[_N0] = set()
-        child_same1: set[_N1] = set()
-        for n0, n1 in zip(neg0, neg1):
-            if n0 in same_node:
-                if n1 == same_node[n0]:
-                    continue
-                else:
-                    break
-            if n1 in searched1:
-                break
-            if is_same_node(n0, n1):
-                child_same0.add(n0)
-                child_same1.add(n1)
-                same_node[n0] = n1
-                searched1.add(n1)
-                ret = _match_inner(n0, edge0, n1, edge1,
-                                   is_same_node, same_node, searched1)
-                if ret is None:
-                    break
-                child_same0.update(ret[0])
-                child_same1.update(ret[1])
-            else:
-                break
-        else:
-            return (child_same0, child_same1)
-        for n0 in child_same0:
-            same_node.pop(n0)
-        for n1 in child_same1:
-            searched1.remove(n1)
-    else:
-        return None
+    if depth == len(order):
+        return True
+    n0 = order[depth]
+    mapped0 = tuple(m0 for m0 in adj0[n0] if m0 in core0)
+    n_free0 = len(adj0[n0]) - len(mapped0)
+    for n1 in neighbors1(core0[parents[depth]]):
+        if n1 in core1:
+            continue
+        if not is_same_node(n0, n1):
+            continue
+        adj_n1 = neighbors1(n1)
+        # 対応済みの隣接ノード同士が結合しているか
+        if any(core0[m0] not in adj_n1 for m0 in mapped0):
+            continue
+        n_mapped1 = 0
+        for m1 in adj_n1:
+            if m1 in core1:
+                n_mapped1 += 1
+        if n_mapped1 != len(mapped0):
+            continue
+        # 未対応の隣接ノードが足りない場合は延長できない
+        if len(adj_n1) - n_mapped1 < n_free0:
+            continue
+        core0[n0] = n1
+        core1[n1] = n0
+        if _match_inner(depth + 1, order, parents, adj0, neighbors1,
+                        is_same_node, core0, core1):
+            return True
+        core0.pop(n0)
+        core1.pop(n1)
+    return False
@@ -0,0 +1,99 @@
+"""モジュール毎の読み込み時間の計測"""
+import atexit
+import importlib.abc
+import sys
+import time
+from typing import IO
+
+
+class _TimedLoader(importlib.abc.Loader):
+    """元のローダーのモジュール実行時間を計測する."""
+
+    def __init__(self, loader: importlib.abc.Loader, recorder: 'ImportTimer'):
+        self._loader = loader
+        self._recorder = recorder
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module) -> None:
+        self._recorder.exec_module(self._loader, module)
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+
+class ImportTimer(importlib.abc.MetaPathFinder):
+    """sys.meta_pathに登録してモジュール毎の読み込み時間を記録する.
+    時間は他のモジュールの読み込みを含む累積時間と含まない時間を記録する.
+    """
+
+    def __init__(self):
+        # (モジュール名, 累積時間, 自身の時間, 深さ)を読み込み完了順に保持する
+        self._records: list[tuple[str, float, float, int]] = []
+        self._child_time: list[float] = []
+        self._finding: set[str] = set()
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname in self._finding:
+            return None
+        self._finding.add(fullname)
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, 'find_spec'):
+                    continue
+                spec = finder.find_spec(fullname, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self._finding.discard(fullname)
+        if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+            spec.loader = _TimedLoader(spec.loader, self)
+        return spec
+
+    def exec_module(self, loader: importlib.abc.Loader, module) -> None:
+        """モジュールを実行して時間を記録する."""
+        depth = len(self._child_time)
+        self._child_time.append(0.0)
+        start = time.perf_counter()
+        try:
+            loader.exec_module(module)
+        finally:
+            elapsed = time.perf_counter() - start
+            child = self._child_time.pop()
+            if len(self._child_time) > 0:
+                self._child_time[-1] += elapsed
+            self._records.append(
+                (module.__name__, elapsed, elapsed - child, depth))
+
+    def write_report(self, out: IO[str]) -> None:
+        """モジュール毎の読み込み時間を累積時間の降順で出力する.
+
+        Args:
+            out: 出力先
+        """
+        total = sum(r[1] for r in self._records if r[3] == 0)
+        out.write('import time report: {} modules, {:.1f} ms\n'.format(
+            len(self._records), total * 1e3))
+        out.write('{:>10} | {:>10} | module\n'.format(
+            'self [ms]', 'cumul [ms]'))
+        for name, cumulative, self_time, depth in sorted(
+                self._records, key=(lambda r: r[1]), reverse=True):
+            out.write('{:10.2f} | {:10.2f} | {}{}\n'.format(
+                self_time * 1e3, cumulative * 1e3, '  ' * depth, name))
+
+
+def install(out: IO[str] = sys.stderr) -> ImportTimer:
+    """モジュールの読み込み時間の計測を開始し, 終了時に結果を出力する.
+
+    Args:
+        out: 出力先
+    Returns:
+        計測オブジェクト
+    """
+    timer = ImportTimer()
+    sys.meta_path.insert(0, timer)
+    atexit.register(timer.write_report, out)
+    return timer
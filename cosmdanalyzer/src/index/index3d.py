@@ -128,6 +128,82 @@ def half_sphere_grid_index_iterator(r: float
             yield (i0, i1, i2)
 
 
+# 半径毎の球内部のグリッドのインデックス(プロセス内で共有する)
+_SPHERE_STENCILS: dict[float, tuple[tuple[int, int, int], ...]] = dict()
+_HALF_SPHERE_STENCILS: dict[float, tuple[tuple[int, int, int], ...]] = dict()
+
+
+def sphere_grid_stencil(r: float) -> tuple[tuple[int, int, int], ...]:
+    """sphere_grid_index_iteratorの列挙結果を返す.
+    半径毎に初回のみ計算し, 以降はプロセス内で共有する.
+
+    Args:
+        r: 球の半径
+    Returns:
+        (i0, i1, i2)の順に並んだインデックス
+    """
+    stencil = _SPHERE_STENCILS.get(r)
+    if stencil is None:
+        stencil = tuple(sphere_grid_index_iterator(r))
+        _SPHERE_STENCILS[r] = stencil
+    return stencil
+
+
+def half_sphere_grid_stencil(r: float) -> tuple[tuple[int, int, int], ...]:
+    """half_sphere_grid_index_iteratorの列挙結果を返す.
+    半径毎に初回のみ計算し, 以降はプロセス内で共有する.
+
+    Args:
+        r: 球の半径
+    Returns:
+        (i0, i1, i2)の順に並んだインデックス
+    """
+    stencil = _HALF_SPHERE_STENCILS.get(r)
+    if stencil is None:
+        stencil = tuple(half_sphere_grid_index_iterator(r))
+        _HALF_SPHERE_STENCILS[r] = stencil
+    return stencil
+
+
+def clip_stencil(
+        stencil: Iterable[tuple[int, int, int]],
+        box: tuple[tuple[int, int, int], tuple[int, int, int]],
+        ) -> list[tuple[int, int, int]]:
+    """インデックス集合のうち指定ボックス内部のものを順番を保って返す.
+    sphere_grid_stencil(r)に対してはsphere_and_box_grid_index_iterator(r, box)
+    と同じ結果になる.
+
+    Args:
+        stencil: インデックス集合
+        box: (開始点,大きさ)で表されるボックス, 境界を含む
+    Returns:
+        ボックス内部のインデックス
+    """
+    (s0, s1, s2), (w0, w1, w2) = box
+    e0, e1, e2 = s0 + w0, s1 + w1, s2 + w2
+    return [i for i in stencil
+            if s0 <= i[0] <= e0 and s1 <= i[1] <= e1 and s2 <= i[2] <= e2]
+
+
+def get_stencil_tables() -> tuple[dict, dict]:
+    """計算済みのインデックス集合を他のプロセスに渡せる形式で返す.
+
+    Returns:
+        (sphere_grid_stencilの辞書, half_sphere_grid_stencilの辞書)
+    """
+    return (dict(_SPHERE_STENCILS), dict(_HALF_SPHERE_STENCILS))
+
+
+def set_stencil_tables(tables: tuple[dict, dict]) -> None:
+    """get_stencil_tablesで取得したインデックス集合を計算済みとして登録する.
+
+    Args:
+        tables: get_stencil_tablesの戻り値
+    """
+    _SPHERE_STENCILS.update(tables[0])
+    _HALF_SPHERE_STENCILS.update(tables[1])
+
+
 def offset_sphere_grid_index_iterator(
         pos: tuple[float, float, float], r: float
         ) -> Iterator[tuple[int, int, int]]:
@@ -184,6 +260,7 @@ def expand_idxs_float(
     if not isinstance(idxs, Set):
         idxs = set(idxs)
     new_idx_set = set()
+    stencil = sphere_grid_stencil(margin)
     if box is None:
         box = _MAX_BOX
     neg_diff_idxs = (((1, 0, 0), 0, box[1][0] + box[0][0]),
@@ -201,7 +278,7 @@ def expand_idxs_float(
                       box[0][1] - idx[1],
                       box[0][2] - idx[2]),
                      box[1])
-                for add_idx in sphere_and_box_grid_index_iterator(margin, b):
+                for add_idx in clip_stencil(stencil, b):
                     add_idx = add(idx, add_idx)
                     if not (add_idx in idxs):
                         new_idx_set.add(add_idx)
@@ -0,0 +1,450 @@
+"""複数の対象をプロセスプールでまとめて計算する"""
+import argparse
+from collections.abc import (Callable, Container, Iterable, Iterator,
+                             Sequence)
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+import contextlib
+import copy
+import glob
+import os
+import pathlib
+import sys
+import time
+import traceback
+from typing import NamedTuple
+from .. import arguments
+from .main import run as run_single
+
+
+# 推定使用メモリの係数(byte), 同梱のサンプルのタンパク質の原子数,
+# フレーム数とDXファイルのボクセル数を変えて計測した最大使用メモリから決めた
+# ワーカープロセスが読み込むライブラリとデータ
+BASE_MEMORY = 70.0 * 1024**2
+# 1フレームの原子数の2乗あたり, フレーム毎に作り直す原子同士の衝突判定の表
+MEMORY_PER_ATOM_PAIR = 17.0
+# 原子数とフレーム数の積あたり, フレーム毎に保持する溶媒露出原子など
+MEMORY_PER_ATOM_FRAME = 48.0
+# DXファイルのボクセル1つあたり
+MEMORY_PER_VOXEL = 24.0
+
+
+class BatchJob(NamedTuple):
+    """1つの対象の計算
+
+    Attributes:
+        name: 対象名, 出力サブディレクトリ名とする
+        src_dir: 入力ディレクトリ
+        out_dir: 出力ディレクトリ
+        memory: 推定使用メモリ(byte)
+    """
+    name: str
+    src_dir: pathlib.Path
+    out_dir: pathlib.Path
+    memory: float
+
+
+class BatchResult(NamedTuple):
+    """1つの対象の計算結果
+
+    Attributes:
+        name: 対象名
+        succeeded: 計算が成功した場合はTrue
+        elapsed: 計算時間(秒)
+        log_path: ログファイルのパス
+        message: 失敗した場合は例外の内容
+    """
+    name: str
+    succeeded: bool
+    elapsed: float
+    log_path: pathlib.Path
+    message: str
+
+
+def batch_main(root_dir: str | bytes | os.PathLike) -> None:
+    """複数対象の計算のエントリーポイント
+
+    Args:
+        root_dir: このプロジェクトのルートディレクトリのパス
+    """
+    args = arguments.create_batch_parser().parse_args()
+    targets = list(expand_targets(args.targets))
+    if args.manifest is not None:
+        targets.extend(load_manifest(args.manifest))
+    if len(targets) == 0:
+        print('No target directory', file=sys.stderr)
+        sys.exit(2)
+    jobs = create_jobs(targets, args.out_dir)
+    budget = (args.memory_budget * 1024**2
+              if args.memory_budget is not None else None)
+    results = run_batch(jobs, args, root_dir, args.jobs, budget)
+    write_summary(pathlib.Path(args.out_dir) / 'batch_summary.tsv', results)
+    n_failed = sum(1 for r in results if not r.succeeded)
+    print('{} targets, {} failed'.format(len(results), n_failed))
+    if n_failed > 0:
+        sys.exit(1)
+
+
+def expand_targets(patterns: Iterable[str]) -> Iterator[pathlib.Path]:
+    """globパターンを展開して対象のディレクトリを列挙する.
+
+    Args:
+        patterns: ディレクトリのパスまたはglobパターン
+    Returns:
+        ディレクトリのパス, パターン毎に名前順
+    """
+    for pattern in patterns:
+        matched = sorted(glob.glob(pattern))
+        if len(matched) == 0:
+            matched = [pattern, ]
+        for path in matched:
+            yield pathlib.Path(path)
+
+
+def load_manifest(manifest_path: str | bytes | os.PathLike
+                  ) -> Iterator[pathlib.Path]:
+    """マニフェストファイルから対象のディレクトリを読み込む.
+    相対パスはマニフェストファイルのディレクトリを基準とする.
+    空行と#で始まる行は無視し, globパターンも指定できる.
+
+    Args:
+        manifest_path: マニフェストファイルのパス
+    Returns:
+        ディレクトリのパス
+    """
+    base_dir = pathlib.Path(manifest_path).parent
+    with open(manifest_path) as f:
+        for line in f:
+            line = line.strip()
+            if len(line) == 0 or line.startswith('#'):
+                continue
+            yield from expand_targets((str(base_dir / line), ))
+
+
+def create_jobs(targets: Sequence[pathlib.Path],
+                out_root: str | bytes | os.PathLike) -> list[BatchJob]:
+    """対象のディレクトリから計算を作成する.
+    対象名は対象のディレクトリの共通の親ディレクトリからの相対パスを
+    '_'で結合したものとする.
+
+    Args:
+        targets: 対象のディレクトリ
+        out_root: 出力ディレクトリ
+    Returns:
+        対象毎の計算
+    """
+    resolved = [t.resolve() for t in targets]
+    if len(set(resolved)) != len(resolved):
+        raise ValueError('duplicate target directories')
+    if len(resolved) == 1:
+        names = [resolved[0].name, ]
+    else:
+        common_dir = pathlib.Path(os.path.commonpath(resolved))
+        names = ['_'.join(t.relative_to(common_dir).parts) for t in resolved]
+    return [BatchJob(name, target, pathlib.Path(out_root) / name,
+                     estimate_memory(target))
+            for name, target in zip(names, targets)]
+
+
+def estimate_memory(src_dir: pathlib.Path) -> float:
+    """入力ディレクトリの原子数, フレーム数とボクセル数から
+    計算の最大使用メモリを推定する.
+    衝突判定の表は1つのトラジェクトリの1フレーム分のみ同時に存在するため,
+    原子数の2乗の項は最も原子数の多いトラジェクトリのみ数える.
+
+    Args:
+        src_dir: 入力ディレクトリ
+    Returns:
+        推定使用メモリ(byte)
+    """
+    max_atoms = 0
+    atom_frames = 0
+    n_voxels = 0
+    for path in src_dir.rglob('*'):
+        if not path.is_file():
+            continue
+        if path.suffix == '.pdb':
+            n_atoms, n_frames = count_pdb_atoms_frames(path)
+            max_atoms = max(max_atoms, n_atoms)
+            atom_frames += n_atoms * n_frames
+        elif path.suffix == '.dx':
+            n_voxels += count_dx_voxels(path)
+    return (BASE_MEMORY + max_atoms**2 * MEMORY_PER_ATOM_PAIR
+            + atom_frames * MEMORY_PER_ATOM_FRAME
+            + n_voxels * MEMORY_PER_VOXEL)
+
+
+def count_pdb_atoms_frames(path: pathlib.Path) -> tuple[int, int]:
+    """PDBファイルの先頭フレームのみ読み込み, 原子数とフレーム数を数える.
+    フレーム数はファイルサイズを先頭フレームのバイト数で割って推定する.
+
+    Args:
+        path: トラジェクトリのPDBファイルのパス
+    Returns:
+        (1フレームの原子数, 推定フレーム数), 原子がない場合は(0, 0)
+    """
+    n_atoms = 0
+    n_bytes = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            n_bytes += len(line)
+            if line.startswith((b'ATOM', b'HETATM')):
+                n_atoms += 1
+            elif line.startswith(b'END') and n_atoms > 0:
+                # ENDMDLまたはEND
+                break
+    if n_atoms == 0:
+        return (0, 0)
+    return (n_atoms, max(round(path.stat().st_size / n_bytes), 1))
+
+
+def count_dx_voxels(path: pathlib.Path) -> int:
+    """OpenDX形式のファイルのヘッダからボクセル数を読み込む.
+
+    Args:
+        path: OpenDX形式のファイルのパス
+    Returns:
+        ボクセル数, ヘッダにない場合は0
+    """
+    with open(path) as f:
+        for line in f:
+            if line.startswith('object 1'):
+                nx, ny, nz = (int(w) for w in line.split()[-3:])
+                return nx * ny * nz
+            if line.startswith('object'):
+                break
+    return 0
+
+
+def run_batch(jobs: Sequence[BatchJob],
+              args: argparse.Namespace,
+              root_dir: str | bytes | os.PathLike,
+              n_workers: int,
+              memory_budget: float | None = None,
+              run_func: (Callable[[BatchJob, argparse.Namespace,
+                                   str | bytes | os.PathLike], BatchResult]
+                         | None) = None,
+              ) -> list[BatchResult]:
+    """計算をプロセスプールで実行する.
+    推定使用メモリの合計がmemory_budgetを超えない範囲で同時に実行する.
+    ただし実行中の計算がない場合はmemory_budgetを超えていても実行する.
+    ワーカープロセスが異常終了してプロセスプールが使えなくなった場合は
+    プールを作り直して残りの計算を続ける.
+    異常終了時に実行中だった対象はどれが原因か分からないため
+    1つずつ単独で計算し直し, 単独でも異常終了した対象を失敗とする.
+
+    Args:
+        jobs: 対象毎の計算
+        args: 計算に使うコマンドライン引数
+        root_dir: このプロジェクトのルートディレクトリのパス
+        n_workers: 同時に計算する対象の最大数
+        memory_budget: 同時に計算する対象の推定使用メモリの上限(byte),
+                       Noneの場合は制限しない
+        run_func: ワーカープロセスで1つの対象を計算する関数,
+                  Noneの場合はrun_job
+    Returns:
+        jobsと同じ順番の計算結果
+    """
+    if run_func is None:
+        run_func = run_job
+    results: dict[str, BatchResult] = dict()
+    waiting = list(jobs)
+    isolated: set[str] = set()
+    geometry_tables = create_geometry_tables(args, root_dir)
+    while len(waiting) > 0:
+        with concurrent.futures.ProcessPoolExecutor(
+                max(n_workers, 1), initializer=init_worker,
+                initargs=(root_dir, geometry_tables)) as executor:
+            crashed = _run_until_broken(
+                executor, waiting, isolated, results, args, root_dir,
+                n_workers, memory_budget, run_func)
+        for job in crashed:
+            if (len(crashed) == 1) or (job.name in isolated):
+                _add_result(results, BatchResult(
+                    job.name, False, 0.0, job.out_dir / 'cosmdanalyzer.log',
+                    'worker process terminated abruptly'))
+            else:
+                isolated.add(job.name)
+        waiting[:0] = [job for job in crashed if job.name not in results]
+    return [results[job.name] for job in jobs]
+
+
+def _run_until_broken(
+        executor: concurrent.futures.ProcessPoolExecutor,
+        waiting: list[BatchJob],
+        isolated: Container[str],
+        results: dict[str, BatchResult],
+        args: argparse.Namespace,
+        root_dir: str | bytes | os.PathLike,
+        n_workers: int,
+        memory_budget: float | None,
+        run_func: Callable[[BatchJob, argparse.Namespace,
+                            str | bytes | os.PathLike], BatchResult],
+) -> list[BatchJob]:
+    """waitingの先頭から計算を実行し, 終了した計算をresultsに加える.
+    isolatedに含まれる対象は他の計算と同時に実行しない.
+
+    Returns:
+        プロセスプールが異常終了した場合はその時に実行中だった計算,
+        すべての計算が終了した場合は空
+    """
+    running: dict[concurrent.futures.Future, BatchJob] = dict()
+    used_memory = 0.0
+    crashed: list[BatchJob] = []
+    while len(waiting) > 0 or len(running) > 0:
+        while (len(waiting) > 0) and (len(running) < max(n_workers, 1)):
+            job = waiting[0]
+            if (len(running) > 0) and (
+                    (job.name in isolated)
+                    or any(j.name in isolated for j in running.values())
+                    or ((memory_budget is not None)
+                        and (used_memory + job.memory > memory_budget))):
+                break
+            try:
+                future = executor.submit(run_func, job, args, root_dir)
+            except BrokenProcessPool:
+                break
+            waiting.pop(0)
+            running[future] = job
+            used_memory += job.memory
+        if len(running) == 0:
+            break
+        done, _ = concurrent.futures.wait(
+            running.keys(), return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            job = running.pop(future)
+            used_memory -= job.memory
+            _add_future_result(results, crashed, future, job)
+        if len(crashed) > 0:
+            # 異常終了したプールの残りの計算はすべてBrokenProcessPoolになる
+            for future in concurrent.futures.wait(running.keys()).done:
+                _add_future_result(results, crashed, future,
+                                   running.pop(future))
+            break
+    return crashed
+
+
+def _add_future_result(results: dict[str, BatchResult],
+                       crashed: list[BatchJob],
+                       future: concurrent.futures.Future,
+                       job: BatchJob) -> None:
+    """終了した計算の結果をresultsに加える.
+    プロセスプールの異常終了で失敗した場合はcrashedに加える.
+    """
+    try:
+        result = future.result()
+    except BrokenProcessPool:
+        crashed.append(job)
+        return
+    except Exception as e:
+        result = BatchResult(job.name, False, 0.0,
+                             job.out_dir / 'cosmdanalyzer.log', repr(e))
+    _add_result(results, result)
+
+
+def _add_result(results: dict[str, BatchResult],
+                result: BatchResult) -> None:
+    """計算結果を記録して表示する."""
+    results[result.name] = result
+    print('{} {} ({:.1f} s)'.format(
+        result.name, 'done' if result.succeeded else 'FAILED',
+        result.elapsed))
+
+
+def create_geometry_tables(args: argparse.Namespace,
+                           root_dir: str | bytes | os.PathLike) -> tuple:
+    """ワーカープロセスに渡す計算済みの幾何情報を作成する.
+    設定ファイルを読み込める場合はその分割数の球面の点を計算する.
+
+    Args:
+        args: 計算に使うコマンドライン引数
+        root_dir: このプロジェクトのルートディレクトリのパス
+    Returns:
+        (球面の点の辞書, 球内部のグリッドのインデックスの辞書)
+    """
+    from .. import index
+    from .. import solidcalc
+    from .main import load_setting
+    setting_path = args.setting
+    if setting_path is None:
+        setting_path = os.path.join(root_dir, 'data/setting.toml')
+    # 設定ファイルの誤りは各対象の計算で報告する
+    try:
+        resolution = load_setting(setting_path)['score']['resolution']
+    except (OSError, KeyError, ValueError):
+        resolution = None
+    if resolution is not None:
+        solidcalc.normalized_sphere_point_table(resolution)
+    return (solidcalc.get_sphere_point_tables(), index.get_stencil_tables())
+
+
+def init_worker(root_dir: str | bytes | os.PathLike,
+                geometry_tables: tuple | None = None) -> None:
+    """ワーカープロセスの初期化.
+    対象によらない入力ファイルをプロセス毎に1度だけ読み込む.
+
+    Args:
+        root_dir: このプロジェクトのルートディレクトリのパス
+        geometry_tables: create_geometry_tablesで作成した幾何情報,
+                         指定した場合はプロセス内で計算済みとして登録する
+    """
+    from .. import index
+    from .. import solidcalc
+    from . import calccharge
+    from . import calcmain
+    calccharge.load_residue_templates(
+        os.path.join(root_dir, 'data/aminoacids.rtp'))
+    calcmain.load_hydrophobicity_table(
+        os.path.join(root_dir, 'data/hydrophobicity.csv'))
+    if geometry_tables is not None:
+        solidcalc.set_sphere_point_tables(geometry_tables[0])
+        index.set_stencil_tables(geometry_tables[1])
+
+
+def run_job(job: BatchJob, args: argparse.Namespace,
+            root_dir: str | bytes | os.PathLike) -> BatchResult:
+    """1つの対象を計算する.
+    標準出力と標準エラー出力は対象の出力ディレクトリのログファイルに書き込み,
+    例外は計算結果として返す.
+
+    Args:
+        job: 対象の計算
+        args: 計算に使うコマンドライン引数
+        root_dir: このプロジェクトのルートディレクトリのパス
+    Returns:
+        計算結果
+    """
+    os.makedirs(job.out_dir, exist_ok=True)
+    log_path = job.out_dir / 'cosmdanalyzer.log'
+    job_args = copy.copy(args)
+    job_args.out_dir = job.out_dir
+    job_args.src_dir = job.src_dir
+    start = time.perf_counter()
+    with open(log_path, 'w') as log, \
+            contextlib.redirect_stdout(log), \
+            contextlib.redirect_stderr(log):
+        try:
+            run_single(job_args, root_dir)
+        except (Exception, SystemExit) as e:
+            traceback.print_exc(file=log)
+            return BatchResult(job.name, False,
+                               time.perf_counter() - start, log_path, repr(e))
+    return BatchResult(job.name, True, time.perf_counter() - start,
+                       log_path, '')
+
+
+def write_summary(out_file: str | bytes | os.PathLike,
+                  results: Iterable[BatchResult]) -> None:
+    """計算結果の一覧をタブ区切りで出力する.
+
+    Args:
+        out_file: 出力ファイルのパス
+        results: 計算結果
+    """
+    os.makedirs(pathlib.Path(out_file).parent, exist_ok=True)
+    with open(out_file, 'w') as out:
+        out.write('name\tstatus\telapsed\tlog\tmessage\n')
+        for r in results:
+            out.write('{}\t{}\t{:.1f}\t{}\t{}\n'.format(
+                r.name, 'done' if r.succeeded else 'failed', r.elapsed,
+                r.log_path, r.message.replace('\t', ' ').replace('\n', ' ')))
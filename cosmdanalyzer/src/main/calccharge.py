@@ -1,6 +1,7 @@
 """タンパク質原子の電荷対応表を作成する."""
-from collections.abc import Callable, Iterable, Iterator, Sequence
+from collections.abc import Callable, Hashable, Iterable, Sequence
 from os import PathLike
+from typing import NamedTuple
 from .. import chem
 from .. import common
 from .. import graph
@@ -30,6 +31,41 @@ def calc_atoms_charge_from_lenard_jones_file(
     return id_to_charge
 
 
+class ResidueTemplate(NamedTuple):
+    """電荷ファイルの1残基分の基準残基
+
+    Attributes:
+        atoms: 原子インデックス順の(原子番号, 電荷)
+        neighbors: 原子インデックス順の隣接原子インデックス集合
+    """
+    atoms: tuple[tuple[int, float], ...]
+    neighbors: tuple[tuple[int, ...], ...]
+
+
+def _load_residue_templates(charge_file_path: str | bytes | PathLike
+                            ) -> dict[str, ResidueTemplate]:
+    """Glomacs電荷ファイルから残基名と基準残基の対応表を作成する.
+
+    Args:
+        charge_file_path: Glomacs電荷ファイルのパス
+    Returns:
+        3文字の残基名から基準残基の対応表
+    """
+    templates: dict[str, ResidueTemplate] = dict()
+    for symbol, ch, link in chem.load_glomacs_charge_from_file(
+            charge_file_path, True):
+        templates[symbol] = ResidueTemplate(
+            tuple(ch),
+            tuple(tuple(link.get(i, tuple())) for i in range(len(ch))))
+    return templates
+
+
+# 電荷ファイルのパスから残基名と基準残基の対応表を返す, ファイル毎に1度だけ読み込む
+load_residue_templates = common.BufferdFunction[
+    str | bytes | PathLike, dict[str, ResidueTemplate]](
+        _load_residue_templates)
+
+
 def calc_atoms_charge_from_rtp_file(
         res_ids: Iterable[int],
         res_to_atom_ids: Callable[[int], Iterable[int]],
@@ -37,6 +73,7 @@ def calc_atoms_charge_from_rtp_file(
         atom_to_neighbors: Callable[[int], Iterable[int]],
         atom_to_residue_symbol: Callable[[int], str],
         charge_file_path: str | bytes | PathLike,
+        atom_to_name: Callable[[int], str] | None = None,
         ) -> dict[int, float]:
     """
 
@@ -47,17 +84,19 @@ def calc_atoms_charge_from_rtp_file(
         atom_to_neighbors: 原子IDから隣接原子ID集合を返す関数
         atom_to_residue_symbol: 原子IDから残基の3文字シンボルを返す関数
         charge_file_path: Glomacs電荷ファイルのパス
+        atom_to_name: 原子IDから原子名を返す関数,
+                      指定した場合は原子名と結合が同じ残基の照合結果を再利用する
     Returns:
         原子IDから電荷の対応表
     """
-    res_charge = dict()
-    for symbol, ch, link in chem.load_glomacs_charge_from_file(
-            charge_file_path, True):
-        res_charge[symbol] = (ch, common.dict_to_function(link))
+    templates = load_residue_templates(charge_file_path)
+    empty = (tuple(), (lambda _: tuple()))
     return calc_atoms_charge(
             res_ids, res_to_atom_ids, atom_to_atomic_number,
             atom_to_neighbors, atom_to_residue_symbol,
-            (lambda s: res_charge.get(s, (tuple(), lambda _: iter(tuple())))),
+            (lambda s: (templates[s].atoms, templates[s].neighbors.__getitem__)
+             if s in templates else empty),
+            atom_to_name,
             )
 
 
@@ -69,7 +108,8 @@ def calc_atoms_charge(
         atom_to_residue_symbol: Callable[[int], str],
         res_atoms_charge: Callable[[str],
                                    tuple[Sequence[tuple[int, float]],
-                                         Callable[[int], Iterable[int]]]]
+                                         Callable[[int], Iterable[int]]]],
+        atom_to_name: Callable[[int], str] | None = None,
         ) -> dict[int, float]:
     """
 
@@ -82,29 +122,78 @@ def calc_atoms_charge(
         res_atoms_charge: 3文字の残基名から(原子番号,電荷)の原子集合と
                           原子インデックスから隣接原子のインデックスを
                           返す関数を返す
+        atom_to_name: 原子IDから原子名を返す関数,
+                      指定した場合は残基名, 原子名, 原子番号, 結合が
+                      同じ残基の照合結果を再利用する
     """
     atom_to_charge: dict[int, float] = dict()
+    # 残基のトポロジーから原子名順の電荷(一致しない場合はNone)の対応表
+    topology_charge: dict[Hashable, tuple[float, ...] | None] = dict()
     for res_id in res_ids:
         res_atoms = tuple(res_to_atom_ids(res_id))
         symbol = atom_to_residue_symbol(res_atoms[0])
+        key = None
+        if atom_to_name is not None:
+            key, res_atoms_sorted = _residue_topology_key(
+                symbol, res_atoms, atom_to_name,
+                atom_to_atomic_number, atom_to_neighbors)
+            if key in topology_charge:
+                charges = topology_charge[key]
+                if charges is not None:
+                    atom_to_charge.update(zip(res_atoms_sorted, charges))
+                continue
         ret = _calc_residue_atoms_charge(
                 res_atoms,
                 atom_to_atomic_number,
                 atom_to_neighbors,
                 *res_atoms_charge(symbol))
         if ret is not None:
-            for atom_id, charge in ret:
-                atom_to_charge[atom_id] = charge
+            atom_to_charge.update(ret)
+        if key is not None:
+            topology_charge[key] = (
+                None if ret is None
+                else tuple(ret[a] for a in res_atoms_sorted))
     return atom_to_charge
 
 
+def _residue_topology_key(
+        symbol: str,
+        res_atom_ids: Sequence[int],
+        atom_to_name: Callable[[int], str],
+        atom_to_atomic_number: Callable[[int], int],
+        atom_to_neighbors: Callable[[int], Iterable[int]],
+        ) -> tuple[Hashable | None, tuple[int, ...]]:
+    """残基名, 原子名, 原子番号と残基内の結合から残基のトポロジーを表すキーを作成する.
+    キーが等しい残基は原子名で原子を対応付けると同じグラフになる.
+
+    Args:
+        symbol: 3文字の残基名
+        res_atom_ids: 1つの残基の原子ID集合
+        atom_to_name: 原子IDから原子名を返す関数
+        atom_to_atomic_number: 原子IDから原子番号を返す
+        atom_to_neighbors: 原子IDから隣接原子ID集合を返す関数
+    Returns:
+        キーと原子名順の原子ID集合,
+        残基内に同じ原子名がある場合はキーはNone
+    """
+    names = {a: atom_to_name(a) for a in res_atom_ids}
+    sorted_atoms = tuple(sorted(res_atom_ids, key=names.__getitem__))
+    if len(set(names.values())) != len(names):
+        return None, sorted_atoms
+    key = (symbol, ) + tuple(
+        (names[a], atom_to_atomic_number(a),
+         tuple(sorted(names[n] for n in atom_to_neighbors(a) if n in names)))
+        for a in sorted_atoms)
+    return key, sorted_atoms
+
+
 def _calc_residue_atoms_charge(
         res_atom_ids: Sequence[int],
         atom_to_atomic_number: Callable[[int], int],
         atom_to_neighbors: Callable[[int], Iterable[int]],
         template_atom_charge: Sequence[tuple[int, float]],
         template_atom_to_neighbors: Callable[[int], Iterable[int]]
-        ) -> Iterator[tuple[int, float]] | None:
+        ) -> dict[int, float] | None:
     """
 
     Args:
@@ -115,7 +204,7 @@ def _calc_residue_atoms_charge(
         template_atom_to_bonds: 基準残基の原子IDから
                                 隣接原子ID集合を返す関数
     Returns:
-        基準残基に一致する場合は(原子ID, 電荷)の集合
+        基準残基に一致する場合は原子IDから電荷の対応表
         一致しない場合はNone
     """
     res_atom_first = res_atom_ids[0]
@@ -131,8 +220,7 @@ def _calc_residue_atoms_charge(
                         range(len(template_atom_charge)),
                         template_atom_to_neighbors,
                         (lambda r, t: atom_to_cmp(r) == template_to_cmp(t)))
-    if m is not None:
-        for atom_id in res_atom_ids:
-            yield (atom_id, template_atom_charge[m[atom_id]][1])
-    else:
+    if m is None:
         return None
+    return {atom_id: template_atom_charge[m[atom_id]][1]
+            for atom_id in res_atom_ids}
@@ -1,12 +1,15 @@
 """計算部分のメインルーチン"""
+import array
 from collections.abc import (
-    Callable, Collection, Iterable, Iterator, MutableSequence, Sequence
+    Callable, Collection, Iterable, Iterator, Mapping, MutableSequence,
+    Sequence
 )
+import contextlib
 import math
 import os
 import pathlib
-from typing import NamedTuple
-from gridData import Grid
+from typing import NamedTuple, TYPE_CHECKING
+import numpy as np
 from .. import chem
 from .. import common
 # from .. import visualization
@@ -17,29 +20,79 @@ from ..solidcalc import vector3f
 from ..solidcalc.typehint import Sphere, Vector3f
 from .. import fpocket
 from . import calccharge
+from . import checkpoint
 from . import fpocketscore
 from . import output
+from . import pmap
 from . import spot
 from . import scoretype
 from . import input
+from . import streaming
+from . import sweep
 from ..scorecalc import gfe, rmsf
 
+if TYPE_CHECKING:
+    import gridData
+
 
 class MyGrid(NamedTuple):
     to_value: Callable[[tuple[int, int, int]], float]
     to_pos: Callable[[tuple[int, int, int]], Vector3f]
     shape: tuple[int, int, int]
     size: float
+    flat_values: Sequence[float]
 
 
 class SingleSystem(NamedTuple):
+    """トラジェクトリを一度に読み込む場合の1プローブの初期処理結果
+
+    Attributes:
+        exposed_atoms: フレーム毎の溶媒露出原子, 行がフレームで列が原子ID
+        surface_res_order: 溶媒露出原子を含む残基の,
+                           露出原子の計算結果の走査順で最初に現れた順番
+    """
     mol: chem.Mol
     n_probe_heavy_atoms: int
-    exposed_atom_set: tuple[set[int]]
+    exposed_atoms: common.BitMatrix
+    surface_res_order: tuple[int, ...]
     grid: MyGrid
     basename: str
     fpocket_pdb: str | bytes | os.PathLike
     fpocket_info: str | bytes | os.PathLike
+    frames: tuple[int, ...]
+
+
+class StreamedSystem(NamedTuple):
+    """トラジェクトリを一定フレーム数ずつ読み込む場合の1プローブの初期処理結果
+
+    Attributes:
+        mol: 最後に読み込んだフレーム集合, 最後のコンフォーマーが最終フレーム
+        hotspot_voxels: ホットスポットの検出に使うボクセル
+        exposed_spill: フレーム毎の溶媒露出原子, common.pack_bitsの形式
+        surface_spill: フレーム毎の溶媒露出原子を含む残基と構成原子の座標
+        volume_calc: タンパク質体積を計算したフレームを追加済みのオブジェクト
+        pdbs: トラジェクトリのPDBファイル集合
+        frame_filter: フレームの選択, Noneの場合はすべてのフレーム
+    """
+    mol: chem.Mol
+    n_probe_heavy_atoms: int
+    hotspot_voxels: list[tuple[int, int, int]]
+    grid: MyGrid
+    basename: str
+    fpocket_pdb: str | bytes | os.PathLike
+    fpocket_info: str | bytes | os.PathLike
+    frames: tuple[int, ...]
+    exposed_spill: streaming.FrameSpill
+    surface_spill: streaming.FrameSpill
+    volume_calc: gfe.ProteinVolumeCalc
+    pdbs: Iterable[str | bytes | os.PathLike]
+    frame_filter: Callable[[int], bool] | None
+
+
+# ホットスポットに使うボクセルの溶媒露出原子からの距離の上限
+HOTSPOT_EXPOSED_DISTANCE = 5.0
+# 重みを掛ける前のプローブ毎のスコアを保存するファイル名
+SCORE_RESULTS_FILE = 'scores.bin'
 
 
 def calc_main(src_system_infos: Iterable[input.SystemInfo],
@@ -58,7 +111,30 @@ def calc_main(src_system_infos: Iterable[input.SystemInfo],
               spot_marge_rate: float,
               resolution: int,
               output_detail: bool,
-              verbose: bool):
+              verbose: bool,
+              volume_input: (gfe.RayVolumeInput
+                             | gfe.VoxelVolumeInput | None) = None,
+              volume_all_frames: bool = False,
+              gfe_grid_format: str | None = None,
+              output_threads: int = 1,
+              output_frame_scores: bool = False,
+              detail_input: (scoretype.ExactDetail
+                             | scoretype.SketchDetail
+                             ) = scoretype.ExactDetail(),
+              frame_selection: input.FrameSelection | None = None,
+              convergence_input: scoretype.ConvergenceInput | None = None,
+              checkpoint_store: checkpoint.Checkpoint | None = None,
+              prepare_only: bool = False,
+              reduce_only: bool = False,
+              stream_input: streaming.StreamInput | None = None,
+              exposure_mmap_dir: str | os.PathLike | None = None,
+              exposed_grid_refine: int | None = None,
+              surface_input: (solidcalc.AdaptiveResolution
+                              | solidcalc.LcpoArea | None) = None,
+              output_scores: Collection[str] = tuple(),
+              sweep_points: Sequence[sweep.SweepPoint] | None = None,
+              pmap_input: pmap.PmapInput | None = None,
+              fpocket_overlap: str = 'point'):
     """計算部分のメインルーチン
 
     Args:
@@ -70,105 +146,329 @@ def calc_main(src_system_infos: Iterable[input.SystemInfo],
         resolution: 球面を多面体で近似するときの頂点数
         output_detail: スコアの詳細を出力する場合はTrue, しない場合はFalse
         verbose: 標準出力に詳細な処理情報を表示する場合はTrue, しない場合はFalse
+        volume_input: GFEの溶媒体積計算に使うタンパク質体積の計算方法,
+                      Noneの場合はresolutionを使った錐体近似
+        volume_all_frames: タンパク質体積を全フレームの平均で計算する場合は
+                           True, 最終フレームのみで計算する場合はFalse
+        gfe_grid_format: 'dx'または'bin'を指定した場合は
+                         プローブ毎にすべてのボクセルのGFEを出力する
+        output_threads: プローブ毎の出力を次のプローブの計算中に行う
+                        スレッド数, 0の場合は計算と順番に出力する
+        output_frame_scores: フレーム毎, パッチ毎のスコアを
+                             プローブ毎に.npy形式で出力する場合はTrue
+        detail_input: スコアの詳細の計算方法
+        frame_selection: 計算に使うフレームの選択,
+                         Noneの場合はすべてのフレームを使う.
+                         指定した場合は使ったフレーム番号を
+                         frames.txtに出力する
+        convergence_input: フレーム毎のスコアの平均が収束した時点で
+                           プローブ毎のフレームの計算を打ち切る設定,
+                           Noneの場合はすべてのフレームを計算する.
+                           指定した場合は計算したフレーム数と標準誤差を
+                           convergence.txtに出力する
+        checkpoint_store: 計算途中の状態の保存先, Noneの場合は保存しない.
+                          露出原子, ホットスポット, パッチ,
+                          スコアの途中経過を保存し, 保存済みの状態から再開する
+        prepare_only: Trueの場合は露出原子, ホットスポット, パッチ,
+                      フレーム毎に計算しないスコア, 使ったフレームを
+                      checkpoint_storeに保存した時点で終了する
+        reduce_only: Trueの場合はprepare_onlyで保存した状態と
+                     保存済みのフレーム毎のスコアから結果を出力する.
+                     トラジェクトリは各プローブの最後のフレームのみ読み込む
+        stream_input: 指定した場合はトラジェクトリをchunk_sizeフレームずつ
+                      2回読み込み, 使用メモリをトラジェクトリの長さによらない
+                      大きさにする. convergence_input, checkpoint_storeとは
+                      同時に指定できない
+        exposure_mmap_dir: 指定した場合はフレーム毎の露出原子を
+                           指定ディレクトリの一時ファイルに
+                           メモリマップして保持する
+        exposed_grid_refine: 指定した場合はホットスポットの検出に使う
+                             ボクセルを, 溶媒露出原子の座標をボクセル1つ
+                             あたり各軸この数に分割した格子に丸めて選別する.
+                             Noneの場合は丸めずに選別する
+        surface_input: 指定した場合は溶媒露出原子とフレーム毎の表面積を
+                       適応的な頂点数で計算する, またはフレーム毎の表面積を
+                       LCPO法で計算する.
+                       Noneの場合はresolutionの頂点数で計算する
+        output_scores: 重みが0でも計算して出力するスコアの名前,
+                       'all'を含む場合はすべてのスコアを計算する.
+                       計算しないスコアはn/aとして出力する
+        sweep_points: 指定した場合はoccupancy_threashold, clustering_input,
+                      spot_marge_rateの代わりに組み合わせ毎の
+                      ホットスポットとスコアを求め, sweep.txtと
+                      sweep/<組み合わせの番号>に出力する.
+                      stream_input, convergence_input, checkpoint_store,
+                      gfe_grid_format, output_frame_scoresとは
+                      同時に指定できない
+        pmap_input: 指定した場合はDXファイルを読み込まずに,
+                    トラジェクトリの読み込み中にプローブ重原子の
+                    数密度のグリッドを作成して使う.
+                    グリッドの配置は先頭のプローブから決めて
+                    すべてのプローブで共有する.
+                    stream_inputと同時に指定する場合は
+                    exposed_grid_refineも指定する必要がある
+        fpocket_overlap: fpocketの点とホットスポットの重なりの判定方法,
+                         'point'の場合は座標が一致する点のみを重なりとし,
+                         fpocket_thretholdは使わない.
+                         'voxel'の場合はホットスポットのボクセルに含まれる点を
+                         重なりとし, 割合がfpocket_threthold未満のfpocketを
+                         無視する
     """
-    src_systems = tuple(init_single_system(
-        info, solvent_radius, resolution)
-        for info in src_system_infos)
+    if prepare_only and (checkpoint_store is None):
+        raise ValueError('prepare_only requires checkpoint_store')
+    if reduce_only and ((checkpoint_store is None) or prepare_only):
+        raise ValueError('reduce_only requires checkpoint_store '
+                         'and cannot be used with prepare_only')
+    if (sweep_points is not None) and (
+            (stream_input is not None) or (convergence_input is not None)
+            or (checkpoint_store is not None)
+            or (gfe_grid_format is not None) or output_frame_scores):
+        raise ValueError(
+            'sweep does not support streaming, convergence, checkpoint '
+            'and per-probe grid or frame score outputs')
+    if (stream_input is not None) and ((convergence_input is not None)
+                                       or (checkpoint_store is not None)):
+        raise ValueError(
+            'streaming does not support convergence and checkpoint')
+    if ((pmap_input is not None) and (stream_input is not None)
+            and (exposed_grid_refine is None)):
+        raise ValueError(
+            'pmap with streaming requires clustering.exposed_grid_refine')
+    if volume_input is None:
+        volume_input = gfe.RayVolumeInput(resolution)
+    if surface_input is not None:
+        # 以降の溶媒露出原子と表面積の計算は指定した方法で行う
+        resolution = surface_input
+    active_scores = select_active_scores(score_weight, output_scores)
+    if gfe_grid_format is not None:
+        active_scores |= {'gfe'}
+    if verbose:
+        print('active scores: {}'.format(', '.join(
+            name for name in SCORE_NAMES if name in active_scores)))
+
+    def create_slot(name: str) -> checkpoint.CheckpointSlot | None:
+        if checkpoint_store is None:
+            return None
+        return checkpoint_store.slot(name)
+    src_system_infos = tuple(src_system_infos)
+    if pmap_input is not None:
+        pmap_geometry = pmap.create_pmap_geometry(src_system_infos[0],
+                                                  pmap_input)
+        if verbose:
+            print('pmap grid: origin {}, delta {}, shape {}'.format(
+                *pmap_geometry))
+
+    def create_pmap_grid() -> pmap.PmapGrid | None:
+        if pmap_input is None:
+            return None
+        return pmap.PmapGrid(pmap_geometry, pmap_input.sigma,
+                             pmap_input.normalize)
+    if reduce_only:
+        src_systems = tuple(
+            init_reduced_system(info, checkpoint_store, i)
+            for i, info in enumerate(src_system_infos))
+    elif stream_input is not None:
+        src_systems = tuple(init_streamed_system(
+            info, solvent_radius, resolution, occupancy_threashold,
+            stream_input, frame_selection, volume_input, volume_all_frames,
+            exposed_grid_refine, create_pmap_grid())
+            for info in src_system_infos)
+    else:
+        src_systems = tuple(init_single_system(
+            info, solvent_radius, resolution, frame_selection,
+            create_slot('system{}_exposed'.format(i)), exposure_mmap_dir,
+            create_pmap_grid())
+            for i, info in enumerate(src_system_infos))
+    if sweep_points is not None:
+        calc_sweep(src_systems, out_dir_path, sweep_points, hotspot_extend,
+                   exposed_grid_refine, fpocket_threthold, fpocket_overlap,
+                   hydrophobicity_path, charge_path, temperature,
+                   solvent_radius, score_weight, resolution, verbose,
+                   volume_input, volume_all_frames, detail_input,
+                   active_scores)
+        if frame_selection is not None:
+            write_frames_file(pathlib.Path(out_dir_path) / 'frames.txt',
+                              ((s.basename, s.frames) for s in src_systems))
+        return
     grid_idx_to_pos = src_systems[0].grid[1]
     grid_shape = src_systems[0].grid[2]
     grid_size = src_systems[0].grid[3]
-    hotspot_idx_list = tuple(spot.detect_multi_hotspots(
-        map(lambda v: to_detect_hotspot(
-            v.mol, v.n_probe_heavy_atoms, v.exposed_atom_set, v.grid,
-            v.basename, occupancy_threashold),
-            src_systems),
-        grid_idx_to_pos,
-        5.0,
-        clustering_input,
-        hotspot_extend,
-        ((0, 0, 0), (grid_shape[0] - 1, grid_shape[1] - 1, grid_shape[2] - 1)),
-        grid_size,
-        spot_marge_rate,
-    ))
+    grid_origin = grid_idx_to_pos((0, 0, 0))
+    hotspot_slot = create_slot('hotspots')
+    hotspot_idx_list = (hotspot_slot.load()
+                        if hotspot_slot is not None else None)
+    if (hotspot_idx_list is None) and reduce_only:
+        raise ValueError('hotspots are not saved in the checkpoint')
+    if hotspot_idx_list is None:
+        idxs_box = ((0, 0, 0),
+                    (grid_shape[0] - 1, grid_shape[1] - 1, grid_shape[2] - 1))
+        if stream_input is not None:
+            hotspot_idx_list = tuple(spot.cluster_multi_hotspots(
+                ((v.hotspot_voxels, v.grid.to_value, v.basename)
+                 for v in src_systems),
+                clustering_input,
+                hotspot_extend,
+                idxs_box,
+                grid_size,
+                spot_marge_rate,
+            ))
+        else:
+            hotspot_idx_list = tuple(spot.detect_multi_hotspots(
+                map(lambda v: to_detect_hotspot(
+                    v.mol, v.n_probe_heavy_atoms, v.exposed_atoms, v.grid,
+                    v.basename, occupancy_threashold, exposed_grid_refine),
+                    src_systems),
+                grid_idx_to_pos,
+                HOTSPOT_EXPOSED_DISTANCE,
+                clustering_input,
+                hotspot_extend,
+                idxs_box,
+                grid_size,
+                spot_marge_rate,
+            ))
+        if hotspot_slot is not None:
+            hotspot_slot.save(hotspot_idx_list)
     hotspot_id_list = tuple(id for _, id in hotspot_idx_list)
     hotspot_idx_list = tuple(idx for idx, _ in hotspot_idx_list)
     if verbose:
         print('n_hotspot = {}'.format(len(hotspot_idx_list)))
 
-    hotspot_list = tuple(
-        tuple(map(grid_idx_to_pos, hotspot_idxs))
-        for hotspot_idxs in hotspot_idx_list
-    )
+    hotspot_list, hotspot_voxel_ids, hotspot_labels = to_hotspot_arrays(
+        hotspot_idx_list, grid_idx_to_pos, grid_shape)
 
-    def weight_func(i: int):
-        return lambda s: (score_weight[i], s)
     mean_scores = [[0.0, ] * len(hotspot_list)
                    for _ in range((len(score_weight) + 1))]
     n_all_frames = 0
-    for src_system in src_systems:
+    system_results: list[output.SystemScoreResults] = []
+    convergence_results: list[tuple[str, int, int, float, bool]] = []
+    writer = output.BackgroundWriter(output_threads)
+    for system_idx, src_system in enumerate(src_systems):
+        n_frame = len(src_system.frames)
         if verbose:
             print('calc system {}, n_frame = {}'.format(
-                src_system.basename, src_system.mol.get_num_conformers()))
+                src_system.basename, n_frame))
         mol = src_system.mol
         protein_idxs = tuple(mol.get_atom_idxs())
         n_probe_heavy_atoms = src_system.n_probe_heavy_atoms
-        exposed_atom_set = src_system.exposed_atom_set
-        grid_idx_to_val = src_system.grid.to_value
+        grid_flat_values = src_system.grid.flat_values
+        if gfe_grid_format is not None:
+            gfe_grid_out = create_gfe_grid_writer(
+                pathlib.Path(out_dir_path) / src_system.basename,
+                src_system.basename, gfe_grid_format,
+                grid_shape, grid_origin, grid_size)
+        else:
+            gfe_grid_out = None
 
         res_atom_idxs = mol.divide_to_residue(protein_idxs)
-        res_to_atoms = (lambda r: iter(res_atom_idxs[r]))
-        patch_list = tuple(spot.detect_frame_union_patches(
-            hotspot_list, mol.atom_to_residue,
-            res_to_atoms,
-            ((lambda a: mol.atom_to_position(a, i))
-             for i in range(mol.get_num_conformers())),
-            exposed_atom_set,
-        ))
+        # 出力処理がバックグラウンドで実行されるため残基の対応表をここで束縛する
+        res_to_atoms = create_res_to_atoms(res_atom_idxs)
+        patch_slot = create_slot('system{}_patches'.format(system_idx))
+        patch_list = patch_slot.load() if patch_slot is not None else None
+        if isinstance(src_system, StreamedSystem):
+            patch_list = tuple(spot.detect_surface_union_patches(
+                hotspot_list, src_system.surface_spill))
+            src_system.surface_spill.close()
+        elif patch_list is None:
+            patch_list = tuple(spot.detect_frame_union_patches(
+                hotspot_list, mol.atom_to_residue,
+                res_to_atoms,
+                ((lambda a: mol.atom_to_position(a, i))
+                 for i in range(mol.get_num_conformers())),
+                src_system.exposed_atoms,
+                src_system.surface_res_order,
+            ))
+            if patch_slot is not None:
+                patch_slot.save(patch_list)
+        if prepare_only:
+            # reduceがトラジェクトリ全体を読み込まずに出力できるように,
+            # フレーム毎に計算しないスコアと使ったフレームも保存する
+            non_frame_slot = create_slot('system{}_scores'.format(system_idx))
+            if non_frame_slot.load() is None:
+                non_frame_slot.save(calc_non_frame_scores(
+                    mol, protein_idxs, res_to_atoms,
+                    hotspot_voxel_ids, hotspot_labels, hotspot_list,
+                    patch_list, grid_shape, grid_size, grid_flat_values,
+                    n_probe_heavy_atoms, solvent_radius, temperature,
+                    src_system.fpocket_info, src_system.fpocket_pdb,
+                    fpocket_threthold, fpocket_overlap,
+                    hydrophobicity_path, volume_input,
+                    volume_all_frames, grid_origin, gfe_grid_out, verbose,
+                    None, active_scores))
+            create_slot('system{}_frames'.format(system_idx)).save(
+                src_system.frames)
+            continue
+        if checkpoint_store is not None:
+            score_slots = (
+                create_slot('system{}_scores'.format(system_idx)),
+                create_slot('system{}_frame_scores'.format(system_idx)))
+        else:
+            score_slots = None
+        if convergence_input is not None:
+            convergence = scoretype.ConvergenceMonitor(
+                convergence_input,
+                tuple(score_weight[i] for i in FRAME_SCORE_WEIGHT_INDICES),
+                len(patch_list), n_frame)
+        else:
+            convergence = None
+        with contextlib.ExitStack() as stack:
+            if output_frame_scores:
+                frame_score_out = create_frame_score_writer(
+                    stack,
+                    pathlib.Path(out_dir_path) / src_system.basename,
+                    src_system.basename,
+                    n_frame, len(patch_list),
+                    convergence is not None,
+                    (score_slots is not None)
+                    and (score_slots[1].load() is not None))
+            else:
+                frame_score_out = None
+            if isinstance(src_system, StreamedSystem):
+                all_scores = calc_streamed_scores(
+                    src_system, protein_idxs, res_to_atoms,
+                    hotspot_voxel_ids, hotspot_labels,
+                    hotspot_list, patch_list,
+                    grid_shape, grid_size, grid_flat_values,
+                    solvent_radius, temperature,
+                    fpocket_threthold, fpocket_overlap,
+                    hydrophobicity_path, charge_path,
+                    output_detail, resolution, verbose,
+                    volume_input, grid_origin, gfe_grid_out,
+                    stream_input.chunk_size, frame_score_out, detail_input,
+                    active_scores)
+            else:
+                all_scores = calc_scores(
+                    mol, protein_idxs, res_to_atoms,
+                    hotspot_voxel_ids, hotspot_labels,
+                    hotspot_list, patch_list, src_system.exposed_atoms,
+                    grid_shape, grid_size, grid_flat_values,
+                    n_probe_heavy_atoms, solvent_radius, temperature,
+                    src_system.fpocket_info, src_system.fpocket_pdb,
+                    fpocket_threthold, fpocket_overlap,
+                    hydrophobicity_path, charge_path,
+                    output_detail, resolution, verbose,
+                    volume_input, volume_all_frames, grid_origin,
+                    gfe_grid_out, frame_score_out, detail_input,
+                    convergence, score_slots, active_scores)
         (score_gfe, score_fpocket, score_hydrophobicity,
          score_size, score_protrusion, score_convexity, score_compactness,
-         score_charge_density, score_rmsf) = calc_scores(
-            mol, protein_idxs, res_to_atoms, hotspot_idx_list,
-            hotspot_list, patch_list, exposed_atom_set,
-            grid_shape, grid_size, grid_idx_to_val, n_probe_heavy_atoms,
-            solvent_radius, temperature,
-            src_system.fpocket_info, src_system.fpocket_pdb,
-            fpocket_threthold,
-            hydrophobicity_path, charge_path,
-            output_detail, resolution, verbose)
-        sum_score = tuple(
-            weighted_sum(s)
-            for s in zip(
-                map(weight_func(0), score_gfe),
-                map(weight_func(1), score_size.get_result()),
-                map(weight_func(2), score_protrusion.get_result()),
-                map(weight_func(3), score_convexity.get_result()),
-                map(weight_func(4), score_compactness.get_result()),
-                map(weight_func(5), score_hydrophobicity),
-                map(weight_func(6), score_charge_density.get_result()),
-                map(weight_func(7), score_rmsf.get_result()),
-                map(weight_func(8), score_fpocket),
-            ))
-        n_frame = mol.get_num_conformers()
+         score_charge_density, score_rmsf) = all_scores
+        if convergence is not None:
+            convergence_results.append((
+                src_system.basename, convergence.n_used_frames,
+                n_frame, convergence.get_error(),
+                convergence.converged))
+            if verbose:
+                print('{} / {} frames, error = {:.3g}'.format(
+                    *convergence_results[-1][1:4]))
+        results = score_results(all_scores)
+        sum_score = add_system_mean_scores(
+            mean_scores, results, score_weight, n_frame)
         n_all_frames += n_frame
-        mul_frame = (lambda v: v * n_frame)
-        add_to_sequence(mean_scores[0], map(mul_frame, sum_score))
-        add_to_sequence(mean_scores[1], map(mul_frame, score_gfe))
-        add_to_sequence(mean_scores[2], map(
-            mul_frame, score_size.get_result()))
-        add_to_sequence(mean_scores[3], map(
-            mul_frame, score_protrusion.get_result()))
-        add_to_sequence(mean_scores[4], map(
-            mul_frame, score_convexity.get_result()))
-        add_to_sequence(mean_scores[5], map(
-            mul_frame, score_compactness.get_result()))
-        add_to_sequence(mean_scores[6], map(mul_frame, score_hydrophobicity))
-        add_to_sequence(mean_scores[7], map(
-            mul_frame, score_charge_density.get_result()))
-        add_to_sequence(mean_scores[8], map(
-            mul_frame, score_rmsf.get_result()))
-        add_to_sequence(mean_scores[9], map(mul_frame, score_fpocket))
+        system_results.append(output.SystemScoreResults(
+            src_system.basename, n_frame, results))
         # output
-        write_pymol_src_wrapper(
+        writer.submit(
+            write_pymol_src_wrapper,
             out_dir_path, src_system.basename, mol,
             hotspot_list, patch_list, res_to_atoms,
             sum_score, score_gfe, score_size, score_protrusion,
@@ -176,12 +476,159 @@ def calc_main(src_system_infos: Iterable[input.SystemInfo],
             score_charge_density, score_rmsf, score_fpocket,
             output_detail,
         )
+    writer.wait()
+    if prepare_only:
+        return
     for mean_score in mean_scores:
         mul_scaler_to_sequence(mean_score, 1.0 / n_all_frames)
     write_mean_score_info_file(
         pathlib.Path(out_dir_path) / 'all_info.txt', mean_scores)
     write_hotspot_probe_file(pathlib.Path(out_dir_path) / 'spot_probe.toml',
                              hotspot_id_list)
+    # reweightが読み込むscores.binは書き込み途中で残さない
+    with common.atomic_open(
+            pathlib.Path(out_dir_path) / SCORE_RESULTS_FILE) as f:
+        output.write_score_results(
+            f, score_weight, [name in active_scores for name in SCORE_NAMES],
+            system_results)
+    if frame_selection is not None:
+        write_frames_file(pathlib.Path(out_dir_path) / 'frames.txt',
+                          ((s.basename, s.frames) for s in src_systems))
+    if convergence_input is not None:
+        write_convergence_file(
+            pathlib.Path(out_dir_path) / 'convergence.txt',
+            convergence_results)
+
+
+def calc_sweep(src_systems: Sequence[SingleSystem],
+               out_dir_path: str | bytes | os.PathLike,
+               sweep_points: Sequence[sweep.SweepPoint],
+               hotspot_extend: float,
+               exposed_grid_refine: int | None,
+               fpocket_threthold: float,
+               fpocket_overlap: str,
+               hydrophobicity_path: str | bytes | os.PathLike,
+               charge_path: str | bytes | os.PathLike,
+               temperature: float,
+               solvent_radius: float,
+               score_weight: Sequence[float],
+               resolution: solidcalc.SurfaceResolution,
+               verbose: bool,
+               volume_input: gfe.RayVolumeInput | gfe.VoxelVolumeInput,
+               volume_all_frames: bool,
+               detail_input: (scoretype.ExactDetail
+                              | scoretype.SketchDetail),
+               active_scores: Collection[str]) -> None:
+    """クラスタリングパラメータの組み合わせ毎のホットスポットとスコアを求める.
+    露出原子とボクセルの選別は1回だけ行い, 複数の組み合わせで
+    同じボクセル集合になるホットスポットのスコアは1回だけ計算する.
+    ホットスポット毎のスコアは他のホットスポットによらないため,
+    組み合わせ毎の結果はcalc_mainで同じパラメータを指定した場合と同じになる.
+
+    Args:
+        src_systems: 初期処理済みのプローブ毎のトラジェクトリ
+        out_dir_path: 出力ディレクトリ, sweep.txtに組み合わせ毎の要約を,
+                      sweep/<組み合わせの番号>にall_info.txtと
+                      spot_probe.tomlを出力する
+        sweep_points: パラメータの組み合わせ
+        その他: calc_mainと同じ
+    """
+    grid_idx_to_pos = src_systems[0].grid.to_pos
+    grid_shape = src_systems[0].grid.shape
+    grid_size = src_systems[0].grid.size
+    grid_origin = grid_idx_to_pos((0, 0, 0))
+    idxs_box = ((0, 0, 0),
+                (grid_shape[0] - 1, grid_shape[1] - 1, grid_shape[2] - 1))
+    min_occupancy = min(p.occupancy for p in sweep_points)
+    multi_voxels = []
+    for v in src_systems:
+        voxels, to_v, threshold, atoms_pos, i = to_detect_hotspot(
+            v.mol, v.n_probe_heavy_atoms, v.exposed_atoms, v.grid,
+            v.basename, min_occupancy, exposed_grid_refine)
+        multi_voxels.append((
+            spot.select_exposed_voxels(voxels, to_v, threshold, atoms_pos,
+                                       grid_idx_to_pos,
+                                       HOTSPOT_EXPOSED_DISTANCE),
+            to_v, v.n_probe_heavy_atoms, i))
+    hotspot_sweep = sweep.HotspotSweep(multi_voxels, hotspot_extend,
+                                       idxs_box, grid_size)
+    point_hotspots = [hotspot_sweep.detect(p) for p in sweep_points]
+    hotspot_idx_list, point_idxs = sweep.unique_hotspots(
+        (idx for idx, _ in hotspots) for hotspots in point_hotspots)
+    if verbose:
+        print('n_hotspot = {} in {} parameter sets'.format(
+            len(hotspot_idx_list), len(sweep_points)))
+    hotspot_list, hotspot_voxel_ids, hotspot_labels = to_hotspot_arrays(
+        hotspot_idx_list, grid_idx_to_pos, grid_shape)
+    mean_scores = [[0.0, ] * len(hotspot_list)
+                   for _ in range((len(score_weight) + 1))]
+    n_all_frames = 0
+    for src_system in src_systems:
+        n_frame = len(src_system.frames)
+        if verbose:
+            print('calc system {}, n_frame = {}'.format(
+                src_system.basename, n_frame))
+        mol = src_system.mol
+        protein_idxs = tuple(mol.get_atom_idxs())
+        res_to_atoms = create_res_to_atoms(mol.divide_to_residue(protein_idxs))
+        patch_list = tuple(spot.detect_frame_union_patches(
+            hotspot_list, mol.atom_to_residue,
+            res_to_atoms,
+            ((lambda a: mol.atom_to_position(a, i))
+             for i in range(mol.get_num_conformers())),
+            src_system.exposed_atoms,
+            src_system.surface_res_order,
+        ))
+        all_scores = calc_scores(
+            mol, protein_idxs, res_to_atoms,
+            hotspot_voxel_ids, hotspot_labels,
+            hotspot_list, patch_list, src_system.exposed_atoms,
+            grid_shape, grid_size, src_system.grid.flat_values,
+            src_system.n_probe_heavy_atoms, solvent_radius, temperature,
+            src_system.fpocket_info, src_system.fpocket_pdb,
+            fpocket_threthold, fpocket_overlap,
+            hydrophobicity_path, charge_path,
+            False, resolution, verbose,
+            volume_input, volume_all_frames, grid_origin,
+            None, None, detail_input,
+            None, None, active_scores)
+        add_system_mean_scores(mean_scores, score_results(all_scores),
+                               score_weight, n_frame)
+        n_all_frames += n_frame
+    for mean_score in mean_scores:
+        mul_scaler_to_sequence(mean_score, 1.0 / n_all_frames)
+    for k, (hotspots, idxs) in enumerate(zip(point_hotspots, point_idxs)):
+        set_dir = pathlib.Path(out_dir_path) / 'sweep' / str(k)
+        os.makedirs(set_dir, exist_ok=True)
+        write_mean_score_info_file(
+            set_dir / 'all_info.txt',
+            ([mean_score[i] for i in idxs] for mean_score in mean_scores))
+        write_hotspot_probe_file(set_dir / 'spot_probe.toml',
+                                 (ids for _, ids in hotspots))
+    write_sweep_file(pathlib.Path(out_dir_path) / 'sweep.txt',
+                     sweep_points,
+                     ([mean_scores[0][i] for i in idxs]
+                      for idxs in point_idxs))
+
+
+def write_sweep_file(
+        out_file: str | bytes | os.PathLike,
+        sweep_points: Sequence[sweep.SweepPoint],
+        point_scores: Iterable[Sequence[float | None]]) -> None:
+    """パラメータの組み合わせ毎のホットスポット数と最大の重み付きスコアを出力する"""
+    param_names = sweep_points[0].clustering_input._fields
+    with open(out_file, 'w') as f:
+        f.write('\t'.join(('set', 'occupancy', *param_names,
+                           'spot_marge_rate', 'n_hotspots', 'max_score')))
+        f.write('\n')
+        for k, (point, scores) in enumerate(zip(sweep_points, point_scores)):
+            valid = [s for s in scores
+                     if (s is not None) and (not math.isnan(s))]
+            f.write('\t'.join(map(str, (
+                k, point.occupancy, *point.clustering_input,
+                point.spot_marge_rate, len(scores),
+                '{:.3f}'.format(max(valid)) if len(valid) > 0 else 'n/a'))))
+            f.write('\n')
 
 
 def write_hotspot_probe_file(
@@ -200,6 +647,28 @@ def write_hotspot_probe_file(
                 pass
 
 
+def write_frames_file(
+        out_file: str | bytes | os.PathLike,
+        system_frames: Iterable[tuple[str, Sequence[int]]]) -> None:
+    """プローブ毎に計算に使ったフレーム番号を出力する"""
+    with open(out_file, 'w') as f:
+        for basename, frames in system_frames:
+            f.write('{}\t{}\t{}\n'.format(
+                basename, len(frames), ','.join(map(str, frames))))
+
+
+def write_convergence_file(
+        out_file: str | bytes | os.PathLike,
+        results: Iterable[tuple[str, int, int, float, bool]]) -> None:
+    """プローブ毎に計算したフレーム数と重み付きスコアの標準誤差を出力する"""
+    with open(out_file, 'w') as f:
+        f.write('basename\tused_frames\tall_frames\terror\tconverged\n')
+        for basename, n_used, n_frames, error, converged in results:
+            f.write('{}\t{}\t{}\t{:.6g}\t{}\n'.format(
+                basename, n_used, n_frames, error,
+                'yes' if converged else 'no'))
+
+
 def write_mean_score_info_file(
         out_file: str | bytes | os.PathLike,
         mean_scores: Iterable[Iterable[float]]) -> None:
@@ -275,40 +744,108 @@ def write_pymol_src_wrapper(
             )
 
 
-def add_to_sequence(dst: MutableSequence[float], values: Iterable[float]
-                    ) -> None:
+def add_to_sequence(dst: MutableSequence[float | None],
+                    values: Iterable[float | None]) -> None:
+    """要素毎に加算する. いずれかがNoneの要素はNoneにする."""
     for i, v in enumerate(values):
-        dst[i] += v
+        if (v is None) or (dst[i] is None):
+            dst[i] = None
+        else:
+            dst[i] += v
+
+
+def score_results(all_scores: tuple
+                  ) -> tuple[tuple[float | None, ...], ...]:
+    """calc_scoresの結果をscore_weightの順のパッチ毎のスコアにする.
+
+    Args:
+        all_scores: calc_scoresの結果
+    Returns:
+        スコアの種類毎のパッチ毎のスコア
+    """
+    (score_gfe, score_fpocket, score_hydrophobicity,
+     score_size, score_protrusion, score_convexity, score_compactness,
+     score_charge_density, score_rmsf) = all_scores
+    return (
+        tuple(score_gfe),
+        tuple(score_size.get_result()),
+        tuple(score_protrusion.get_result()),
+        tuple(score_convexity.get_result()),
+        tuple(score_compactness.get_result()),
+        tuple(score_hydrophobicity),
+        tuple(score_charge_density.get_result()),
+        tuple(score_rmsf.get_result()),
+        tuple(score_fpocket),
+    )
+
+
+def add_system_mean_scores(
+        mean_scores: Sequence[MutableSequence[float | None]],
+        results: Sequence[Sequence[float | None]],
+        score_weight: Sequence[float],
+        n_frame: int,
+) -> tuple[float | None, ...]:
+    """1つのプローブのスコアをフレーム数倍してパッチ毎に加算する.
+
+    Args:
+        mean_scores: 重み付きの和, 各スコアの順のパッチ毎のスコアの和
+        results: score_resultsで変換したスコアの種類毎のパッチ毎のスコア
+        score_weight: 各スコアの重み
+        n_frame: プローブのフレーム数
+    Returns:
+        パッチ毎の重み付きの和
+    """
+    sum_score = tuple(weighted_sum(zip(score_weight, s))
+                      for s in zip(*results))
+    mul_frame = (lambda v: v * n_frame if v is not None else None)
+    for dst, values in zip(mean_scores, (sum_score, *results)):
+        add_to_sequence(dst, map(mul_frame, values))
+    return sum_score
 
 
-def mul_scaler_to_sequence(dst: MutableSequence[float], val: float
+def mul_scaler_to_sequence(dst: MutableSequence[float | None], val: float
                            ) -> None:
+    """Noneでない要素に定数を掛ける."""
     for i in range(len(dst)):
-        dst[i] *= val
+        if dst[i] is not None:
+            dst[i] *= val
 
 
 def calc_scores(
         mol: chem.Mol,
         protein_idxs: Collection[int],
         res_to_atoms: Callable[[int], Iterable[int]],
-        hotspot_idx_list: Iterable[Iterable[tuple[int, int, int]]],
-        hotspot_list: Iterable[Iterable[Vector3f]],
+        hotspot_voxel_ids: Sequence[int],
+        hotspot_labels: Sequence[int],
+        hotspot_list: Collection[Iterable[Vector3f]],
         patch_list: Collection[set[int]],
-        exposed_atom_set: Sequence[set[int]],
+        exposed_atoms: Sequence[Iterable[int]],
         grid_shape: tuple[int, int, int],
         grid_size: float,
-        grid_idx_to_val: Callable[[tuple[int, int, int]], float],
+        grid_flat_values: Sequence[float],
         n_probe_heavy_atoms: int,
         solvent_radius: float,
         temperature: float,
         fpocket_info: str | bytes | os.PathLike | None,
         fpocket_pdb: str | bytes | os.PathLike | None,
         fpocket_threthold: float,
+        fpocket_overlap: str,
         hydrophobicity_path: str | bytes | os.PathLike,
         charge_path: str | bytes | os.PathLike,
         output_detail: bool,
-        resolution: float,
+        resolution: solidcalc.SurfaceResolution,
         verbose: bool,
+        volume_input: gfe.RayVolumeInput | gfe.VoxelVolumeInput,
+        volume_all_frames: bool,
+        grid_origin: Vector3f,
+        gfe_grid_out: Callable[[Sequence[float]], None] | None,
+        frame_score_out: output.FrameScoreWriter | None = None,
+        detail_input: (scoretype.ExactDetail
+                       | scoretype.SketchDetail) = scoretype.ExactDetail(),
+        convergence: scoretype.ConvergenceMonitor | None = None,
+        checkpoint_slots: tuple[checkpoint.CheckpointSlot,
+                                checkpoint.CheckpointSlot] | None = None,
+        active_scores: Collection[str] | None = None,
 ) -> tuple[Sequence[float, ...], Sequence[float, ...], Sequence[float, ...],
            scoretype.ScoreSize,
            scoretype.ScoreProtrusion,
@@ -316,18 +853,120 @@ def calc_scores(
            scoretype.ScoreCompactness,
            scoretype.ScoreChargeDensity,
            rmsf.AllPatchRmsfCalc]:
-    return (*calc_non_frame_scores(
-        mol, protein_idxs, res_to_atoms,
-        hotspot_idx_list, hotspot_list, patch_list, grid_shape,
-        grid_size, grid_idx_to_val, n_probe_heavy_atoms,
-        solvent_radius, temperature, fpocket_info, fpocket_pdb,
-        fpocket_threthold,
-        hydrophobicity_path, resolution),
-        *calc_frame_scores(
+    """
+    Args:
+        checkpoint_slots: フレーム毎に計算しないスコアとフレーム毎のスコアの
+                          計算途中の状態の保存先, Noneの場合は保存しない
+        active_scores: 計算するスコアの名前の集合,
+                       Noneの場合はすべてのスコアを計算する
+    """
+    non_frame_slot, frame_slot = (checkpoint_slots
+                                  if checkpoint_slots is not None
+                                  else (None, None))
+    non_frame_scores = (non_frame_slot.load()
+                        if non_frame_slot is not None else None)
+    if non_frame_scores is None:
+        non_frame_scores = calc_non_frame_scores(
+            mol, protein_idxs, res_to_atoms,
+            hotspot_voxel_ids, hotspot_labels, hotspot_list, patch_list,
+            grid_shape, grid_size, grid_flat_values, n_probe_heavy_atoms,
+            solvent_radius, temperature, fpocket_info, fpocket_pdb,
+            fpocket_threthold, fpocket_overlap,
+            hydrophobicity_path, volume_input, volume_all_frames,
+            grid_origin, gfe_grid_out, verbose, None, active_scores)
+        if non_frame_slot is not None:
+            non_frame_slot.save(non_frame_scores)
+    return (*non_frame_scores,
+            *calc_frame_scores(
+                mol, protein_idxs, res_to_atoms,
+                patch_list, exposed_atoms, solvent_radius, output_detail,
+                resolution, charge_path, verbose, frame_score_out,
+                detail_input, convergence, frame_slot, active_scores)
+            )
+
+
+def calc_streamed_scores(
+        src_system: StreamedSystem,
+        protein_idxs: Collection[int],
+        res_to_atoms: Callable[[int], Iterable[int]],
+        hotspot_voxel_ids: Sequence[int],
+        hotspot_labels: Sequence[int],
+        hotspot_list: Collection[Iterable[Vector3f]],
+        patch_list: Collection[set[int]],
+        grid_shape: tuple[int, int, int],
+        grid_size: float,
+        grid_flat_values: Sequence[float],
+        solvent_radius: float,
+        temperature: float,
+        fpocket_threthold: float,
+        fpocket_overlap: str,
+        hydrophobicity_path: str | bytes | os.PathLike,
+        charge_path: str | bytes | os.PathLike,
+        output_detail: bool,
+        resolution: solidcalc.SurfaceResolution,
+        verbose: bool,
+        volume_input: gfe.RayVolumeInput | gfe.VoxelVolumeInput,
+        grid_origin: Vector3f,
+        gfe_grid_out: Callable[[Sequence[float]], None] | None,
+        chunk_size: int,
+        frame_score_out: output.FrameScoreWriter | None = None,
+        detail_input: (scoretype.ExactDetail
+                       | scoretype.SketchDetail) = scoretype.ExactDetail(),
+        active_scores: Collection[str] | None = None,
+) -> tuple[Sequence[float, ...], Sequence[float, ...], Sequence[float, ...],
+           scoretype.ScoreSize,
+           scoretype.ScoreProtrusion,
+           scoretype.ScoreConvexity,
+           scoretype.ScoreCompactness,
+           scoretype.ScoreChargeDensity,
+           rmsf.AllPatchRmsfCalc]:
+    """init_streamed_systemで初期処理したプローブのスコアを求める.
+    トラジェクトリをchunk_sizeフレームずつ読み直し,
+    溶媒露出原子は一時ファイルから読み込む.
+    結果はcalc_scoresと同じ順番で返す.
+    active_scoresを指定した場合は含まれるスコアのみ計算する.
+    """
+    mol = src_system.mol
+    non_frame_scores = calc_non_frame_scores(
         mol, protein_idxs, res_to_atoms,
-        patch_list, exposed_atom_set, solvent_radius, output_detail,
-        resolution, charge_path, verbose)
-    )
+        hotspot_voxel_ids, hotspot_labels, hotspot_list, patch_list,
+        grid_shape, grid_size, grid_flat_values,
+        src_system.n_probe_heavy_atoms, solvent_radius, temperature,
+        src_system.fpocket_info, src_system.fpocket_pdb,
+        fpocket_threthold, fpocket_overlap, hydrophobicity_path,
+        volume_input, False, grid_origin, gfe_grid_out,
+        verbose, src_system.volume_calc.get_result(verbose), active_scores)
+    all_scores = create_frame_score_calcs(
+        mol, res_to_atoms, patch_list, solvent_radius, output_detail,
+        resolution, charge_path, detail_input, active_scores)
+    exposed_itr = iter(src_system.exposed_spill)
+    n_done = 0
+    for pdb_str, _ in input.trajectory_pdb_files_chunks(
+            src_system.pdbs, chunk_size, src_system.frame_filter):
+        chunk_mol = chem.create_mol_from_pdb_str(pdb_str)
+        for frame_idx in range(chunk_mol.get_num_conformers()):
+            exposed_atoms = next(exposed_itr, None)
+            if exposed_atoms is None:
+                raise ValueError('trajectory of {} has changed'.format(
+                    src_system.basename))
+            if verbose:
+                print('.', end='')
+            add_frame_to_scores(all_scores, chunk_mol, frame_idx,
+                                protein_idxs,
+                                common.BitRow(exposed_atoms,
+                                              len(protein_idxs)),
+                                solvent_radius)
+            if frame_score_out is not None:
+                frame_score_out.add_frame(get_frame_scores(all_scores),
+                                          n_done)
+            n_done += 1
+    if n_done != len(src_system.frames):
+        raise ValueError('trajectory of {} has changed'.format(
+            src_system.basename))
+    src_system.exposed_spill.close()
+    if verbose:
+        print()
+    return (*non_frame_scores, *all_scores)
 
 
 def calc_frame_scores(
@@ -335,55 +974,238 @@ def calc_frame_scores(
         protein_idxs: Collection[int],
         res_to_atoms: Callable[[int], Iterable[int]],
         patch_list: Collection[set[int]],
-        exposed_atom_set: Sequence[set[int]],
+        exposed_atoms: Sequence[Iterable[int]],
         solvent_radius: float,
         output_detail: bool,
-        resolution: int,
+        resolution: solidcalc.SurfaceResolution,
         charge_path: str | bytes | os.PathLike,
         verbose: bool,
+        frame_score_out: output.FrameScoreWriter | None = None,
+        detail_input: (scoretype.ExactDetail
+                       | scoretype.SketchDetail) = scoretype.ExactDetail(),
+        convergence: scoretype.ConvergenceMonitor | None = None,
+        checkpoint_slot: checkpoint.CheckpointSlot | None = None,
+        active_scores: Collection[str] | None = None,
 ) -> tuple[scoretype.ScoreSize,
            scoretype.ScoreProtrusion,
            scoretype.ScoreConvexity,
            scoretype.ScoreCompactness,
            scoretype.ScoreChargeDensity,
            rmsf.AllPatchRmsfCalc]:
-    all_res_idxs: set[int] = set()
-    for p in patch_list:
-        all_res_idxs.update(p)
-    atom_to_charge = calccharge.calc_atoms_charge_from_rtp_file(
-        all_res_idxs,
-        res_to_atoms,
-        mol.atom_to_atomic_number,
-        mol.get_neighbor_atoms,
-        mol.atom_to_residue_symbol,
-        charge_path)
-    res_to_ca = common.BufferdFunction[int, int](
-        lambda res_id: residue_to_ca_index(
-            res_id, res_to_atoms, mol.atom_to_name))
-    score_size = scoretype.ScoreSize(
-        patch_list, res_to_atoms, mol.atom_to_vdw_radius, resolution,
-        calc_detail=output_detail)
-    score_protrusion = scoretype.ScoreProtrusion(
-        patch_list, res_to_atoms, calc_detail=output_detail)
-    score_convexity = scoretype.ScoreConvexity(
-        patch_list, res_to_atoms, res_to_ca,
-        mol.atom_to_residue, mol.atom_to_weight,
-        4.0,
-        calc_detail=output_detail)
-    score_compactness = scoretype.ScoreCompactness(
-        patch_list, res_to_atoms, calc_detail=output_detail)
-    score_charge_density = scoretype.ScoreChargeDensity(
-        patch_list, res_to_atoms,
-        mol.atom_to_vdw_radius, solvent_radius,
-        (lambda a: atom_to_charge[a]),
-        resolution=resolution,
-        calc_detail=output_detail)
-    score_rmsf = rmsf.AllPatchRmsfCalc(
-        res_to_atoms, patch_list, mol.atom_to_weight)
-    for frame_idx in range(mol.get_num_conformers()):
+    """フレーム毎に計算するスコアを求める.
+    convergenceを指定した場合はその順番でフレームを計算し,
+    スコアの平均が収束した時点で打ち切る.
+    checkpoint_slotを指定した場合はcheckpoint_slot.intervalフレーム毎と
+    終了時に途中経過を保存し, 保存済みの途中経過があればその続きから計算する.
+    active_scoresを指定した場合は含まれるスコアのみ計算する.
+    """
+    all_scores = create_frame_score_calcs(
+        mol, res_to_atoms, patch_list, solvent_radius, output_detail,
+        resolution, charge_path, detail_input, active_scores)
+    if convergence is not None:
+        frame_order = convergence.frame_order()
+    else:
+        frame_order = range(mol.get_num_conformers())
+    start = 0
+    finished = False
+    state = checkpoint_slot.load() if checkpoint_slot is not None else None
+    if state is not None:
+        start, finished, score_states, convergence_state = state
+        for score, score_state in zip(all_scores, score_states):
+            score.set_state(score_state)
+        if convergence is not None:
+            convergence.set_state(convergence_state)
+
+    def save_state(n_done: int, finished: bool) -> None:
+        if frame_score_out is not None:
+            frame_score_out.flush()
+        checkpoint_slot.save((
+            n_done, finished,
+            tuple(score.get_state() for score in all_scores),
+            convergence.get_state() if convergence is not None else None))
+
+    for n_done in range(start, start if finished else len(frame_order)):
+        if ((checkpoint_slot is not None) and (n_done > start)
+                and (n_done % checkpoint_slot.interval == 0)):
+            save_state(n_done, False)
+        frame_idx = frame_order[n_done]
         if verbose:
             print('.', end='')
-        atom_to_pos = (lambda a: mol.atom_to_position(a, frame_idx))
+        add_frame_to_scores(all_scores, mol, frame_idx, protein_idxs,
+                            exposed_atoms[frame_idx], solvent_radius)
+        if (frame_score_out is None) and (convergence is None):
+            continue
+        frame_scores = get_frame_scores(all_scores)
+        if frame_score_out is not None:
+            frame_score_out.add_frame(frame_scores, frame_idx)
+        if ((convergence is not None)
+                and convergence.add_frame(frame_scores, frame_idx)):
+            break
+    if (checkpoint_slot is not None) and (not finished):
+        save_state(len(frame_order), True)
+    if verbose:
+        print()
+    return all_scores
+
+
+def create_frame_score_calcs(
+        mol: chem.Mol,
+        res_to_atoms: Callable[[int], Iterable[int]],
+        patch_list: Collection[set[int]],
+        solvent_radius: float,
+        output_detail: bool,
+        resolution: solidcalc.SurfaceResolution,
+        charge_path: str | bytes | os.PathLike,
+        detail_input: (scoretype.ExactDetail
+                       | scoretype.SketchDetail) = scoretype.ExactDetail(),
+        active_scores: Collection[str] | None = None,
+) -> tuple[scoretype.ScoreSize | scoretype.SkippedScore,
+           scoretype.ScoreProtrusion | scoretype.SkippedScore,
+           scoretype.ScoreConvexity | scoretype.SkippedScore,
+           scoretype.ScoreCompactness | scoretype.SkippedScore,
+           scoretype.ScoreChargeDensity | scoretype.SkippedScore,
+           rmsf.AllPatchRmsfCalc | scoretype.SkippedScore]:
+    """フレーム毎に計算するスコアの計算オブジェクトを作成する.
+    molは原子と残基の情報のみ使い, 座標は使わない.
+    active_scoresに含まれないスコアはscoretype.SkippedScoreとし,
+    そのスコアのみが使うデータは作成しない.
+    """
+    if active_scores is None:
+        active_scores = SCORE_NAMES
+    required = required_score_data(active_scores)
+    calc_detail = detail_input if output_detail else False
+    # LCPO法の係数は溶媒接触面に合わせてあるため, ファンデルワールス球の
+    # 表面積を使うsizeは頂点で計算する
+    size_resolution = resolution
+    if isinstance(resolution, solidcalc.LcpoArea):
+        size_resolution = solidcalc.to_fixed_resolution(resolution)
+        if (resolution.atom_to_parameter is None
+                and 'as_collision' in required):
+            resolution = resolution._replace(
+                atom_to_parameter=create_atom_to_lcpo_parameter(mol))
+
+    def create_size():
+        return scoretype.ScoreSize(
+            patch_list, res_to_atoms, mol.atom_to_vdw_radius,
+            size_resolution, calc_detail=calc_detail)
+
+    def create_protrusion():
+        return scoretype.ScoreProtrusion(
+            patch_list, res_to_atoms, calc_detail=calc_detail)
+
+    def create_convexity():
+        res_to_ca = common.BufferdFunction[int, int](
+            lambda res_id: residue_to_ca_index(
+                res_id, res_to_atoms, mol.atom_to_name))
+        return scoretype.ScoreConvexity(
+            patch_list, res_to_atoms, res_to_ca,
+            mol.atom_to_residue, mol.atom_to_weight,
+            4.0,
+            calc_detail=calc_detail)
+
+    def create_compactness():
+        return scoretype.ScoreCompactness(
+            patch_list, res_to_atoms, calc_detail=calc_detail)
+
+    def create_charge_density():
+        all_res_idxs: set[int] = set()
+        for p in patch_list:
+            all_res_idxs.update(p)
+        atom_to_charge = calccharge.calc_atoms_charge_from_rtp_file(
+            all_res_idxs,
+            res_to_atoms,
+            mol.atom_to_atomic_number,
+            mol.get_neighbor_atoms,
+            mol.atom_to_residue_symbol,
+            charge_path,
+            mol.atom_to_name)
+        return scoretype.ScoreChargeDensity(
+            patch_list, res_to_atoms,
+            mol.atom_to_vdw_radius, solvent_radius,
+            (lambda a: atom_to_charge[a]),
+            resolution=resolution,
+            calc_detail=calc_detail)
+
+    def create_flexibility():
+        return rmsf.AllPatchRmsfCalc(
+            res_to_atoms, patch_list, mol.atom_to_weight)
+
+    return tuple(
+        create() if name in active_scores
+        else scoretype.SkippedScore(len(patch_list))
+        for name, create in zip(
+            FRAME_CALC_SCORE_NAMES,
+            (create_size, create_protrusion, create_convexity,
+             create_compactness, create_charge_density, create_flexibility)))
+
+
+def create_atom_to_lcpo_parameter(
+        mol: chem.Mol) -> Callable[[int], solidcalc.LcpoParameter | None]:
+    """原子IDからLCPO法の係数を返す関数を作成する.
+    係数は原子番号, 混成軌道, 水素以外の結合原子数から決める.
+    """
+    def _atom_to_parameter(atom_idx: int) -> solidcalc.LcpoParameter | None:
+        atomic_number = mol.atom_to_atomic_number(atom_idx)
+        heavy_neighbors = [a for a in mol.get_neighbor_atoms(atom_idx)
+                           if mol.atom_to_atomic_number(a) != 1]
+        return solidcalc.lcpo_parameter(
+            atomic_number, mol.atom_to_hybridization(atom_idx),
+            len(heavy_neighbors),
+            (atomic_number == 8) and (len(heavy_neighbors) == 1)
+            and is_carboxyl_carbon(mol, heavy_neighbors[0]))
+    return common.BufferdFunction[int, solidcalc.LcpoParameter | None](
+        _atom_to_parameter)
+
+
+def is_carboxyl_carbon(mol: chem.Mol, atom_idx: int) -> bool:
+    """カルボキシ基の炭素原子の場合はTrueを返す."""
+    if mol.atom_to_atomic_number(atom_idx) != 6:
+        return False
+    terminal_oxygens = [
+        a for a in mol.get_neighbor_atoms(atom_idx)
+        if mol.atom_to_atomic_number(a) == 8
+        and all(mol.atom_to_atomic_number(n) == 1
+                for n in mol.get_neighbor_atoms(a) if n != atom_idx)]
+    return len(terminal_oxygens) == 2
+
+
+def add_frame_to_scores(
+        all_scores: tuple[scoretype.ScoreSize,
+                          scoretype.ScoreProtrusion,
+                          scoretype.ScoreConvexity,
+                          scoretype.ScoreCompactness,
+                          scoretype.ScoreChargeDensity,
+                          rmsf.AllPatchRmsfCalc],
+        mol: chem.Mol,
+        frame_idx: int,
+        protein_idxs: Collection[int],
+        exposed_atoms: common.BitRow,
+        solvent_radius: float,
+) -> None:
+    """1フレーム分のスコアを計算する.
+    scoretype.SkippedScoreのスコアは計算せず, そのスコアのみが使う
+    衝突判定やVP木は作成しない.
+
+    Args:
+        all_scores: create_frame_score_calcsで作成した計算オブジェクト
+        mol: 座標を使う分子
+        frame_idx: molのコンフォーマー番号
+        protein_idxs: タンパク質の原子ID集合
+        exposed_atoms: フレームの溶媒露出原子, 列が原子ID
+        solvent_radius: 溶媒半径
+    """
+    (score_size, score_protrusion, score_convexity, score_compactness,
+     score_charge_density, score_rmsf) = all_scores
+    # 計算するスコアが使うデータのみ作成する
+    required = required_score_data(
+        name for name, score in zip(FRAME_CALC_SCORE_NAMES, all_scores)
+        if not isinstance(score, scoretype.SkippedScore))
+    atom_to_pos = (lambda a: mol.atom_to_position(a, frame_idx))
+    # 凸性, コンパクト性, 電荷密度の内側のループで原子毎に所属判定するため,
+    # すべての原子の所属判定をまとめて行い原子IDで引けるようにする
+    is_exposed_atom = exposed_atoms.contains_many(
+        np.arange(exposed_atoms.n_cols)).tolist().__getitem__
+    if 'vptree' in required:
         tree = vptree.VpTree[tuple[int, Vector3f]](
             map(lambda i: (i, atom_to_pos(i)), protein_idxs),
             lambda vl, vr: vector3f.norm(vector3f.sub(vl[1], vr[1])))
@@ -391,78 +1213,152 @@ def calc_frame_scores(
                                           tree.neighbors((0, s[0]), s[1])))
         atom_in_sphere = (lambda s: map(lambda v: v[1][0],
                                         tree.neighbors((0, s[0]), s[1])))
+    else:
+        d_atom_in_sphere = atom_in_sphere = None
+    if 'vdw_collision' in required:
         atom_to_sphere = (lambda i: (atom_to_pos(i),
                                      mol.atom_to_vdw_radius(i)))
         vdw_col_sphere = gen_col_sphere(protein_idxs, atom_to_sphere)
+    else:
+        vdw_col_sphere = None
+    if 'as_collision' in required:
         atom_to_as_sphere = (
             lambda i: (atom_to_pos(i),
                        mol.atom_to_vdw_radius(i) + solvent_radius))
         as_col_sphere = gen_col_sphere(protein_idxs, atom_to_as_sphere)
-        is_exposed_atom = (lambda a: a in exposed_atom_set[frame_idx])
-        score_rmsf.add_frame(atom_to_pos)
-        score_size.add_frame(atom_to_pos, vdw_col_sphere)
-        score_protrusion.add_frame(atom_to_pos, d_atom_in_sphere)
-        score_convexity.add_frame(atom_to_pos, atom_in_sphere,
-                                  is_exposed_atom)
-        score_compactness.add_frame(atom_to_pos, is_exposed_atom)
-        score_charge_density.add_frame(atom_to_pos, is_exposed_atom,
-                                       as_col_sphere)
-    if verbose:
-        print()
-    return (score_size, score_protrusion, score_convexity, score_compactness,
-            score_charge_density, score_rmsf)
+    else:
+        as_col_sphere = None
+    score_rmsf.add_frame(atom_to_pos)
+    score_size.add_frame(atom_to_pos, vdw_col_sphere)
+    score_protrusion.add_frame(atom_to_pos, d_atom_in_sphere)
+    score_convexity.add_frame(atom_to_pos, atom_in_sphere,
+                              is_exposed_atom)
+    score_compactness.add_frame(atom_to_pos, is_exposed_atom)
+    score_charge_density.add_frame(atom_to_pos, is_exposed_atom,
+                                   as_col_sphere)
+
+
+def get_frame_scores(
+        all_scores: tuple[scoretype.ScoreSize,
+                          scoretype.ScoreProtrusion,
+                          scoretype.ScoreConvexity,
+                          scoretype.ScoreCompactness,
+                          scoretype.ScoreChargeDensity,
+                          rmsf.AllPatchRmsfCalc],
+) -> tuple[tuple[float | None, ...], ...]:
+    """最後に追加したフレームのFRAME_SCORE_NAMES順のパッチ毎のスコアを返す."""
+    (score_size, score_protrusion, score_convexity, score_compactness,
+     score_charge_density, _) = all_scores
+    return (
+        tuple(score_size.get_frame_result()),
+        tuple(score_protrusion.get_frame_result()),
+        tuple(score_convexity.get_frame_result()),
+        tuple(score_compactness.get_frame_result()),
+        tuple(score_charge_density.get_frame_result()),
+    )
 
 
 def calc_non_frame_scores(
         mol: chem.Mol,
         protein_idxs: Collection[int],
         res_to_atoms: Callable[[int], Iterable[int]],
-        hotspot_idx_list: Iterable[Iterable[tuple[int, int, int]]],
-        hotspot_list: Iterable[Iterable[Vector3f]],
+        hotspot_voxel_ids: Sequence[int],
+        hotspot_labels: Sequence[int],
+        hotspot_list: Collection[Iterable[Vector3f]],
         patch_list: Iterator[set[int]],
         grid_shape: tuple[int, int, int],
         grid_size: float,
-        grid_idx_to_val: Callable[[tuple[int, int, int]], float],
+        grid_flat_values: Sequence[float],
         n_probe_heavy_atoms: int,
         solvent_radius: float,
         temperature: float,
         fpocket_info: str | bytes | os.PathLike | None,
         fpocket_pdb: str | bytes | os.PathLike | None,
         fpocket_threthold: float,
+        fpocket_overlap: str,
         hydrophobicity_path: str | bytes | os.PathLike,
-        resolution: int,
-) -> tuple[Sequence[float, ...], Sequence[float, ...], Sequence[float, ...]]:
+        volume_input: gfe.RayVolumeInput | gfe.VoxelVolumeInput,
+        volume_all_frames: bool,
+        grid_origin: Vector3f,
+        gfe_grid_out: Callable[[Sequence[float]], None] | None,
+        verbose: bool,
+        protein_volume: float | None = None,
+        active_scores: Collection[str] | None = None,
+) -> tuple[Sequence[float | None, ...], Sequence[float | None, ...],
+           Sequence[float | None, ...]]:
     """
 
     Args:
         fpocket_threthold: [0,1]hotspotに含まれるfpocketの座標点の割合が
                                                         指定値未満の場合は無視する.
+        volume_input: タンパク質体積の計算方法
+        volume_all_frames: タンパク質体積を全フレームの平均で計算する場合は
+                           True, 最終フレームのみで計算する場合はFalse
+        grid_origin: OpenDXのグリッドの原点
+        gfe_grid_out: 指定した場合は1次元インデックス順の
+                      すべてのボクセルのGFEを渡して呼び出す
+        protein_volume: 計算済みのタンパク質体積,
+                        Noneの場合はmolの座標から計算する
+        active_scores: 計算するスコアの名前の集合,
+                       Noneの場合はすべてのスコアを計算する.
+                       計算しないスコアはパッチ毎にNoneを返す
 
     """
-    score_gfe = tuple(gfe.calc_all_gfe(
-        protein_idxs,
-        (lambda i: (mol.atom_to_position(i, mol.get_num_conformers() - 1))),
-        mol.atom_to_vdw_radius,
-        common.deep2_map(grid_idx_to_val, hotspot_idx_list),
-        grid_shape[0] * grid_shape[1] * grid_shape[2] * grid_size**3,
-        n_probe_heavy_atoms,
-        temperature,
-        solvent_radius,
-        resolution,
-    ))
-    n_hotspot = len(score_gfe)
+    if active_scores is None:
+        active_scores = SCORE_NAMES
+    n_hotspot = len(hotspot_list)
+    skipped = (None, ) * n_hotspot
+    if 'gfe' not in active_scores:
+        score_gfe = skipped
+    else:
+        if protein_volume is None:
+            n_frames = mol.get_num_conformers()
+            protein_volume = gfe.calc_protein_volume(
+                protein_idxs,
+                mol.atom_to_position,
+                mol.atom_to_vdw_radius,
+                solvent_radius,
+                range(n_frames) if volume_all_frames else (n_frames - 1, ),
+                volume_input,
+                grid_size,
+                grid_origin,
+                verbose,
+            )
+        score_gfe, grid_gfe = gfe.calc_all_gfe(
+            hotspot_voxel_ids,
+            hotspot_labels,
+            n_hotspot,
+            grid_flat_values.__getitem__,
+            grid_shape[0] * grid_shape[1] * grid_shape[2] * grid_size**3,
+            protein_volume,
+            n_probe_heavy_atoms,
+            temperature,
+            grid_flat_values if gfe_grid_out is not None else None,
+        )
+        if gfe_grid_out is not None:
+            gfe_grid_out(grid_gfe)
     # fpocket
-    score_fpocket: list[float | None] = [0.0, ] * n_hotspot
-    if (fpocket_pdb is not None) and (fpocket_info is not None):
+    score_fpocket: Sequence[float | None] = [0.0, ] * n_hotspot
+    if 'fpocket' not in active_scores:
+        score_fpocket = skipped
+    elif (fpocket_pdb is not None) and (fpocket_info is not None):
         with open(fpocket_pdb, 'r') as pdb,\
                 open(fpocket_info, 'r') as info:
             src_fpocket = tuple(fpocket.parse_fpocket(pdb, info))
-        for i, hotspot in enumerate(hotspot_list):
-            score_fpocket[i] = fpocketscore.fpocket_score(
-                hotspot, grid_size, src_fpocket, fpocket_threthold)
+        if fpocket_overlap == 'voxel':
+            score_fpocket = fpocketscore.fpocket_voxel_scores(
+                hotspot_voxel_ids, hotspot_labels, n_hotspot,
+                fpocketscore.create_grid_voxel_id_func(
+                    grid_origin, grid_size, grid_shape),
+                src_fpocket, fpocket_threthold)
+        else:
+            score_fpocket = fpocketscore.fpocket_scores(
+                hotspot_list, grid_size, src_fpocket)
+    if 'hydrophobicity' not in active_scores:
+        return (score_gfe, score_fpocket, skipped)
     # hydrophobicity
     score_hydrophobicity: list[float] = []
-    hydrophobicity_table = chem.ResidueHydrophobicity(hydrophobicity_path)
+    hydrophobicity_table = load_hydrophobicity_table(hydrophobicity_path)
     for patch in patch_list:
         count = 0
         hydro_sum = 0.0
@@ -478,6 +1374,12 @@ def calc_non_frame_scores(
     return (score_gfe, score_fpocket, score_hydrophobicity)
 
 
+def create_res_to_atoms(res_atom_idxs: Mapping[int, Iterable[int]]
+                        ) -> Callable[[int], Iterator[int]]:
+    """残基のインデックスから構成原子のインデックスを返す関数を作成する."""
+    return (lambda r: iter(res_atom_idxs[r]))
+
+
 def res_to_atom_iterator(
         res_idxs: Iterable[int], res_to_atom: Callable[[int], Iterable[int]]
 ) -> Iterator[int]:
@@ -487,7 +1389,26 @@ def res_to_atom_iterator(
             yield atom_idx
 
 
-def get_grid_access(grid: Grid) -> MyGrid:
+# 疎水性テーブルのパスから疎水性テーブルを返す, ファイル毎に1度だけ読み込む
+load_hydrophobicity_table = common.BufferdFunction[
+    str | bytes | os.PathLike, chem.ResidueHydrophobicity](
+        chem.ResidueHydrophobicity)
+
+
+def load_grid(path: str | bytes | os.PathLike) -> 'gridData.Grid':
+    """OpenDX形式のファイルを読み込む.
+    gridDataは読み込みに時間がかかるため, 使用時に読み込む.
+
+    Args:
+        path: OpenDX形式のファイルのパス
+    Returns:
+        グリッドオブジェクト
+    """
+    import gridData
+    return gridData.Grid(common.path_to_str(path))
+
+
+def get_grid_access(grid: 'gridData.Grid') -> MyGrid:
     """OpenDX形式のグリッドオブジェクトから使用するアクセス情報を取得する.
 
     Args:
@@ -497,6 +1418,7 @@ def get_grid_access(grid: Grid) -> MyGrid:
          3次元インデックスから対応グリッドの座標を返す関数,
          グリッドの各軸の数,
          1グリッドの幅,
+         1次元インデックス順のグリッドの値,
         )
     """
     return MyGrid(
@@ -506,7 +1428,209 @@ def get_grid_access(grid: Grid) -> MyGrid:
                  grid.edges[1][idx[1]],
                  grid.edges[2][idx[2]])),
         shape=grid.grid.shape,
-        size=grid.edges[0][1] - grid.edges[0][0])
+        size=grid.edges[0][1] - grid.edges[0][0],
+        flat_values=grid.grid.ravel())
+
+
+def get_pmap_grid_access(pmap_grid: pmap.PmapGrid) -> MyGrid:
+    """トラジェクトリから作成したグリッドから使用するアクセス情報を取得する.
+    すべてのフレームを加算した後に呼び出す.
+
+    Args:
+        pmap_grid: プローブ重原子の座標を加算したグリッド
+    Returns:
+        get_grid_accessと同じアクセス情報
+    """
+    (o0, o1, o2), delta, shape = pmap_grid.geometry
+    _, n1, n2 = shape
+    values = pmap_grid.get_values()
+    # gridDataと同様にDXのoriginから半ボクセルずらした座標を返す
+    c0, c1, c2 = (o0 - delta / 2, o1 - delta / 2, o2 - delta / 2)
+    return MyGrid(
+        to_value=(lambda idx: values[(idx[0] * n1 + idx[1]) * n2 + idx[2]]),
+        to_pos=(lambda idx:
+                (c0 + idx[0] * delta,
+                 c1 + idx[1] * delta,
+                 c2 + idx[2] * delta)),
+        shape=shape,
+        size=delta,
+        flat_values=values)
+
+
+def create_gfe_grid_writer(
+        out_dir: str | bytes | os.PathLike,
+        basename: str,
+        grid_format: str,
+        shape: tuple[int, int, int],
+        origin: Vector3f,
+        delta: float,
+) -> Callable[[Sequence[float]], None]:
+    """すべてのボクセルのGFEをファイルに出力する関数を生成する.
+
+    Args:
+        out_dir: 出力ディレクトリ
+        basename: 出力ファイル名の接頭辞
+        grid_format: 'dx'はOpenDX形式, 'bin'はバイナリ形式
+        shape: グリッドの各軸の数
+        origin: グリッドの原点
+        delta: グリッド1つの幅
+    Returns:
+        1次元インデックス順のGFEを受け取り出力する関数
+    """
+    def _write(values: Sequence[float]) -> None:
+        os.makedirs(out_dir, exist_ok=True)
+        if grid_format == 'dx':
+            with open(os.path.join(out_dir, basename + '_gfe.dx'),
+                      'w') as out:
+                output.output_grid_dx(out, values, shape, origin, delta)
+        elif grid_format == 'bin':
+            with open(os.path.join(out_dir, basename + '_gfe.bin'),
+                      'wb') as out:
+                output.output_grid_binary(out, values, shape, origin, delta)
+        else:
+            raise ValueError(grid_format)
+    return _write
+
+
+class ScoreSpec(NamedTuple):
+    """スコアの種類と計算に必要なデータ
+
+    Attributes:
+        name: スコアの名前, [score.weight]の項目名と同じ
+        requires: 計算に必要なデータの名前の集合.
+                  'protein_volume': タンパク質体積,
+                  'fpocket': fpocketの出力,
+                  'hydrophobicity_table': 残基の疎水性の表,
+                  'vdw_collision': ファンデルワールス半径の球の衝突判定,
+                  'as_collision': 溶媒接触面の球の衝突判定,
+                  'vptree': 原子座標のVP木,
+                  'exposure': 溶媒露出原子,
+                  'charges': rtpファイルから求めた原子の電荷
+    """
+    name: str
+    requires: frozenset[str]
+
+
+# スコアの種類, score_weightと同じ順番
+SCORE_SPECS = (
+    ScoreSpec('gfe', frozenset({'protein_volume'})),
+    ScoreSpec('size', frozenset({'vdw_collision'})),
+    ScoreSpec('protrusion', frozenset({'vptree'})),
+    ScoreSpec('convexity', frozenset({'vptree', 'exposure'})),
+    ScoreSpec('compactness', frozenset({'exposure'})),
+    ScoreSpec('hydrophobicity', frozenset({'hydrophobicity_table'})),
+    ScoreSpec('charge_density',
+              frozenset({'as_collision', 'exposure', 'charges'})),
+    ScoreSpec('flexibility', frozenset()),
+    ScoreSpec('fpocket', frozenset({'fpocket'})),
+)
+SCORE_NAMES = tuple(spec.name for spec in SCORE_SPECS)
+
+
+def select_active_scores(score_weight: Sequence[float],
+                         output_scores: Iterable[str] = tuple()
+                         ) -> frozenset[str]:
+    """計算するスコアの名前の集合を返す.
+    重みが0でないスコアと出力を指定したスコアを計算する.
+
+    Args:
+        score_weight: SCORE_NAMES順のスコアの重み
+        output_scores: 重みが0でも計算するスコアの名前,
+                       'all'を含む場合はすべてのスコア
+    Returns:
+        計算するスコアの名前の集合
+    """
+    output_scores = frozenset(output_scores)
+    if 'all' in output_scores:
+        return frozenset(SCORE_NAMES)
+    unknown = output_scores.difference(SCORE_NAMES)
+    if len(unknown) > 0:
+        raise ValueError('unknown score names: {}'.format(
+            ', '.join(sorted(unknown))))
+    return frozenset(name for name, weight in zip(SCORE_NAMES, score_weight)
+                     if weight != 0.0) | output_scores
+
+
+def required_score_data(active_scores: Iterable[str]) -> frozenset[str]:
+    """スコアの計算に必要なデータの名前の集合を返す.
+
+    Args:
+        active_scores: 計算するスコアの名前の集合
+    Returns:
+        ScoreSpec.requiresの和集合
+    """
+    active_scores = frozenset(active_scores)
+    return frozenset().union(*(spec.requires for spec in SCORE_SPECS
+                               if spec.name in active_scores))
+
+
+# フレーム毎のスコア出力のスコアの種類の順番
+FRAME_SCORE_NAMES = ('size', 'protrusion', 'convexity', 'compactness',
+                     'charge_density')
+# FRAME_SCORE_NAMES順のスコアの重みのscore_weight上の位置
+FRAME_SCORE_WEIGHT_INDICES = (1, 2, 3, 4, 6)
+# create_frame_score_calcsで作成するスコアの種類の順番
+FRAME_CALC_SCORE_NAMES = (*FRAME_SCORE_NAMES, 'flexibility')
+
+
+def create_frame_score_writer(
+        stack: contextlib.ExitStack,
+        out_dir: str | bytes | os.PathLike,
+        basename: str,
+        n_frames: int,
+        n_patches: int,
+        prefill: bool = False,
+        resume: bool = False,
+) -> output.FrameScoreWriter:
+    """フレーム毎, パッチ毎のスコアを出力するファイルを開く.
+
+    Args:
+        stack: 開いたファイルを登録する
+        out_dir: 出力ディレクトリ
+        basename: 出力ファイル名の接頭辞
+        n_frames: フレーム数
+        n_patches: パッチ数
+        prefill: 全フレームをNaNで出力しておく場合はTrue
+        resume: 出力済みのファイルの続きから書き込む場合はTrue,
+                ファイルがない場合は新しく作成する
+    Returns:
+        FRAME_SCORE_NAMES順のスコアを1フレームずつ追記するオブジェクト
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, basename + '_frame_scores.npy')
+    resume = resume and os.path.exists(path)
+    out = stack.enter_context(open(path, 'r+b' if resume else 'wb'))
+    return output.FrameScoreWriter(
+        out, n_frames, len(FRAME_SCORE_NAMES), n_patches, prefill, resume)
+
+
+def to_hotspot_arrays(
+        hotspot_idx_list: Sequence[Sequence[tuple[int, int, int]]],
+        grid_idx_to_pos: Callable[[tuple[int, int, int]], Vector3f],
+        grid_shape: tuple[int, int, int],
+) -> tuple[tuple[tuple[Vector3f, ...], ...], array.array, array.array]:
+    """ホットスポットのボクセル集合をスコアの計算に使う形式に変換する.
+
+    Args:
+        hotspot_idx_list: ホットスポット毎のボクセルインデックス集合
+        grid_idx_to_pos: ボクセルのインデックスに対応する座標を返す関数
+        grid_shape: グリッドの各軸のボクセル数
+    Returns:
+        (ホットスポット毎のボクセル座標集合,
+         すべてのホットスポットの1次元のボクセルインデックス,
+         ボクセル毎のホットスポットの番号)
+    """
+    hotspot_list = tuple(
+        tuple(map(grid_idx_to_pos, hotspot_idxs))
+        for hotspot_idxs in hotspot_idx_list
+    )
+    hotspot_voxel_ids = array.array('q', (
+        index.convert_3d_index_to_1d(idx, grid_shape)
+        for hotspot_idxs in hotspot_idx_list for idx in hotspot_idxs))
+    hotspot_labels = array.array('q', (
+        i for i, hotspot_idxs in enumerate(hotspot_idx_list)
+        for _ in hotspot_idxs))
+    return hotspot_list, hotspot_voxel_ids, hotspot_labels
 
 
 def gen_col_sphere(sphere_ids: Iterable[int],
@@ -534,8 +1658,11 @@ def residue_to_ca_index(res_id: int,
             return atom
 
 
-def weighted_sum(w_v: Iterable[tuple[float, float]]) -> float:
-    return sum(map(lambda v: v[0] * v[1], w_v))
+def weighted_sum(w_v: Iterable[tuple[float, float | None]]) -> float:
+    """重みとスコアの組から重み付きの和を求める.
+    重みが0のスコアは計算しない場合があるため使わない.
+    """
+    return sum(map(lambda v: v[0] * v[1], filter(lambda v: v[0] != 0.0, w_v)))
 
 
 def calc_exposed_atoms_set_all_frame(
@@ -544,7 +1671,7 @@ def calc_exposed_atoms_set_all_frame(
         atom_to_vdw_radius: Callable[[int], float],
         solvent_radius: float,
         frame_indicies: Iterable[int],
-        resolution: int,
+        resolution: solidcalc.SurfaceResolution,
 ) -> Iterator[set[int]]:
     """すべてのフレームについて溶媒露出原子を求める.
 
@@ -553,7 +1680,8 @@ def calc_exposed_atoms_set_all_frame(
         atom_to_pos: 原子IDから原子座標を返す関数
         atom_to_vdw_radius: 原子IDからファンデルワールス半径を返す関数
         solvent_radius: 溶媒半径
-        resolution: 球面を多面体で近似するときの頂点数
+        resolution: 球面を多面体で近似するときの頂点数,
+                    適応的な頂点数またはLCPO法の設定
     Returns:
         フレーム毎の溶媒露出原子のID集合
     """
@@ -573,29 +1701,229 @@ def calc_exposed_atoms_set_all_frame(
 def init_single_system(
         info: input.SystemInfo,
         solvent_radius: float,
-        resolution: float,
+        resolution: solidcalc.SurfaceResolution,
+        frame_selection: input.FrameSelection | None = None,
+        checkpoint_slot: checkpoint.CheckpointSlot | None = None,
+        exposure_mmap_dir: str | os.PathLike | None = None,
+        pmap_grid: pmap.PmapGrid | None = None,
 ) -> SingleSystem:
-    """1プローブのトラジェクトリの初期処理を行う."""
-    pdb_str, n_probe_heavy_atoms = input.trajectory_pdb_files_filter(info.pdbs)
+    """1プローブのトラジェクトリの初期処理を行う.
+    選択されなかったフレームは読み込み時に除き, 以降の計算には使わない.
+    checkpoint_slotを指定した場合は露出原子を保存し,
+    保存済みの場合は読み込む.
+    exposure_mmap_dirを指定した場合は露出原子を指定ディレクトリの
+    一時ファイルにメモリマップして保持する.
+    pmap_gridを指定した場合はDXファイルの代わりに,
+    読み込んだフレームのプローブ重原子を加算したグリッドを使う.
+    """
+    frame_filter = create_system_frame_filter(info, frame_selection)
+    used_frames: list[int] = []
+    pdb_str, n_probe_heavy_atoms = input.trajectory_pdb_files_filter(
+        info.pdbs, frame_filter, used_frames,
+        pmap_grid.add_frame if pmap_grid is not None else None)
     mol = chem.create_mol_from_pdb_str(pdb_str)
     protein_idxs = tuple(mol.get_atom_idxs())
-    exposed_atom_set = tuple(
-        calc_exposed_atoms_set_all_frame(
-            protein_idxs, mol.atom_to_position, mol.atom_to_vdw_radius,
-            solvent_radius, range(mol.get_num_conformers()), resolution
-        )
-    )
+    state = checkpoint_slot.load() if checkpoint_slot is not None else None
+    if state is not None:
+        exposed_atoms, surface_res_order = state
+    else:
+        exposed_atoms = common.BitMatrix(
+            mol.get_num_conformers(), len(protein_idxs),
+            exposure_mmap_dir is not None, exposure_mmap_dir)
+        first_seen_res: dict[int, None] = dict()
+        for frame_idx, atoms in enumerate(calc_exposed_atoms_set_all_frame(
+                protein_idxs, mol.atom_to_position, mol.atom_to_vdw_radius,
+                solvent_radius, range(mol.get_num_conformers()), resolution)):
+            exposed_atoms.set_row(frame_idx, atoms)
+            # パッチの残基の並びを集合の走査順に揃えるため記録する
+            for a in atoms:
+                first_seen_res.setdefault(mol.atom_to_residue(a))
+        surface_res_order = tuple(first_seen_res)
+        if checkpoint_slot is not None:
+            checkpoint_slot.save((exposed_atoms, surface_res_order))
     return SingleSystem(
             mol=mol,
             n_probe_heavy_atoms=n_probe_heavy_atoms,
-            exposed_atom_set=exposed_atom_set,
-            grid=get_grid_access(Grid(common.path_to_str(info.dx))),
+            exposed_atoms=exposed_atoms,
+            surface_res_order=surface_res_order,
+            grid=(get_grid_access(load_grid(info.dx)) if pmap_grid is None
+                  else get_pmap_grid_access(pmap_grid)),
             basename=info.basename,
             fpocket_pdb=info.fpocket_pdb,
             fpocket_info=info.fpocket_info,
+            frames=tuple(used_frames),
             )
 
 
+def init_reduced_system(
+        info: input.SystemInfo,
+        checkpoint_store: checkpoint.Checkpoint,
+        system_idx: int,
+) -> SingleSystem:
+    """保存済みの状態から結果を出力する場合の1プローブの初期処理を行う.
+    露出原子, パッチ, スコアは保存済みの状態を使うため,
+    トラジェクトリは出力に使う最後のフレームのみ読み込む.
+    """
+    frames = checkpoint_store.load('system{}_frames'.format(system_idx))
+    if (frames is None) or (checkpoint_store.load(
+            'system{}_scores'.format(system_idx)) is None):
+        raise ValueError('{} is not prepared in the checkpoint'.format(
+            info.basename))
+    last_frame = frames[-1]
+    pdb_str, n_probe_heavy_atoms = input.trajectory_pdb_files_filter(
+        info.pdbs, (lambda i: i == last_frame))
+    mol = chem.create_mol_from_pdb_str(pdb_str)
+    return SingleSystem(
+            mol=mol,
+            n_probe_heavy_atoms=n_probe_heavy_atoms,
+            # 露出原子は保存済みのパッチとスコアの計算にのみ使う
+            exposed_atoms=common.BitMatrix(
+                0, len(tuple(mol.get_atom_idxs()))),
+            surface_res_order=tuple(),
+            grid=get_grid_access(load_grid(info.dx)),
+            basename=info.basename,
+            fpocket_pdb=info.fpocket_pdb,
+            fpocket_info=info.fpocket_info,
+            frames=tuple(frames),
+            )
+
+
+def init_streamed_system(
+        info: input.SystemInfo,
+        solvent_radius: float,
+        resolution: solidcalc.SurfaceResolution,
+        occupancy_threashold: float,
+        stream_input: streaming.StreamInput,
+        frame_selection: input.FrameSelection | None = None,
+        volume_input: (gfe.RayVolumeInput
+                       | gfe.VoxelVolumeInput | None) = None,
+        volume_all_frames: bool = False,
+        exposed_grid_refine: int | None = None,
+        pmap_grid: pmap.PmapGrid | None = None,
+) -> StreamedSystem:
+    """1プローブのトラジェクトリをstream_input.chunk_sizeフレームずつ読み込み,
+    フレーム毎の溶媒露出原子を求めて一時ファイルに書き出す.
+    ホットスポットの検出に使うボクセルの選別と
+    タンパク質体積の計算も同時に行う.
+    exposed_grid_refineを指定した場合はspot.ExposedHitMapで選別する.
+    pmap_gridを指定した場合はDXファイルの代わりに同じ読み込みで
+    プローブ重原子を加算したグリッドを使う.
+    グリッドの値は読み込み後に確定するためexposed_grid_refineが必要.
+    """
+    if volume_input is None:
+        volume_input = gfe.RayVolumeInput(
+            solidcalc.to_fixed_resolution(resolution))
+    frame_filter = create_system_frame_filter(info, frame_selection)
+    if pmap_grid is None:
+        grid = get_grid_access(load_grid(info.dx))
+        grid_origin = grid.to_pos((0, 0, 0))
+        grid_size = grid.size
+    else:
+        if exposed_grid_refine is None:
+            raise ValueError('pmap_grid requires exposed_grid_refine')
+        grid = None
+        grid_size = pmap_grid.geometry.delta
+        grid_origin = tuple(o - grid_size / 2
+                            for o in pmap_grid.geometry.origin)
+    used_frames: list[int] = []
+    exposed_spill = streaming.FrameSpill(stream_input.spill_dir)
+    surface_spill = streaming.FrameSpill(stream_input.spill_dir)
+    res_to_atoms = None
+    voxel_filter = None
+    hit_map = None
+    for pdb_str, n_probe_heavy_atoms in input.trajectory_pdb_files_chunks(
+            info.pdbs, stream_input.chunk_size, frame_filter, used_frames,
+            pmap_grid.add_frame if pmap_grid is not None else None):
+        mol = chem.create_mol_from_pdb_str(pdb_str)
+        if res_to_atoms is None:
+            protein_idxs = tuple(mol.get_atom_idxs())
+            res_to_atoms = create_res_to_atoms(
+                mol.divide_to_residue(protein_idxs))
+            if exposed_grid_refine is not None:
+                hit_map = spot.ExposedHitMap(
+                    grid_origin, grid_size, exposed_grid_refine)
+            else:
+                voxel_filter = streaming.HotspotVoxelFilter(
+                    select_occupied_voxels(
+                        grid, occupancy_threashold * n_probe_heavy_atoms),
+                    grid.to_value,
+                    occupancy_threashold * n_probe_heavy_atoms,
+                    grid.to_pos,
+                    HOTSPOT_EXPOSED_DISTANCE)
+            volume_calc = gfe.ProteinVolumeCalc(
+                protein_idxs, mol.atom_to_vdw_radius, solvent_radius,
+                volume_input, grid_size, grid_origin)
+        exposed_itr = calc_exposed_atoms_set_all_frame(
+            protein_idxs, mol.atom_to_position, mol.atom_to_vdw_radius,
+            solvent_radius, range(mol.get_num_conformers()), resolution)
+        for frame_idx, exposed_atoms in enumerate(exposed_itr):
+            def atom_to_pos(a: int, m=mol, f=frame_idx) -> Vector3f:
+                return m.atom_to_position(a, f)
+            if hit_map is not None:
+                hit_map.add_positions(map(atom_to_pos, exposed_atoms))
+            else:
+                voxel_filter.add_frame(map(atom_to_pos, exposed_atoms))
+            exposed_spill.write(common.pack_bits(exposed_atoms,
+                                                 len(protein_idxs)))
+            surface_spill.write(tuple(spot.frame_surface_residues(
+                exposed_atoms, mol.atom_to_residue, res_to_atoms,
+                atom_to_pos)))
+            if volume_all_frames:
+                volume_calc.add_frame(atom_to_pos, len(exposed_spill) - 1)
+    if not volume_all_frames:
+        last_frame = mol.get_num_conformers() - 1
+        volume_calc.add_frame(
+            (lambda a: mol.atom_to_position(a, last_frame)),
+            len(exposed_spill) - 1)
+    if pmap_grid is not None:
+        grid = get_pmap_grid_access(pmap_grid)
+    if hit_map is not None:
+        hotspot_voxels = spot.select_hit_map_voxels(
+            select_occupied_voxels(
+                grid, occupancy_threashold * n_probe_heavy_atoms),
+            grid.to_value,
+            occupancy_threashold * n_probe_heavy_atoms, hit_map,
+            HOTSPOT_EXPOSED_DISTANCE)
+    else:
+        hotspot_voxels = voxel_filter.get_result()
+    return StreamedSystem(
+        mol=mol,
+        n_probe_heavy_atoms=n_probe_heavy_atoms,
+        hotspot_voxels=hotspot_voxels,
+        grid=grid,
+        basename=info.basename,
+        fpocket_pdb=info.fpocket_pdb,
+        fpocket_info=info.fpocket_info,
+        frames=tuple(used_frames),
+        exposed_spill=exposed_spill,
+        surface_spill=surface_spill,
+        volume_calc=volume_calc,
+        pdbs=info.pdbs,
+        frame_filter=frame_filter,
+    )
+
+
+def create_system_frame_filter(
+        info: input.SystemInfo,
+        frame_selection: input.FrameSelection | None,
+) -> Callable[[int], bool] | None:
+    """1プローブのトラジェクトリのフレームの選択を判定する関数を作成する.
+
+    Args:
+        info: プローブの入力ファイル
+        frame_selection: フレームの選択, Noneの場合はすべてのフレームを使う
+    Returns:
+        フレーム番号を使う場合はTrueを返す関数,
+        すべてのフレームを使う場合はNone
+    """
+    if frame_selection is None:
+        return None
+    return input.create_frame_filter(
+        frame_selection,
+        (input.count_trajectory_frames(info.pdbs)
+         if frame_selection.subsample is not None else None))
+
+
 def to_detect_hotspot(
         mol: chem.Mol,
         n_probe_heavy_atoms: int,
@@ -603,19 +1931,45 @@ def to_detect_hotspot(
         grid: MyGrid,
         id: str,
         occupancy_threashold: float,
+        exposed_grid_refine: int | None = None,
 ) -> tuple[Iterable[tuple[int, int, int]],
            Callable[[tuple[int, int, int]], float],
            float,
-           Iterable[Vector3f],
+           Iterable[Vector3f] | spot.ExposedHitMap,
            int]:
-    return (index.dence_matrix_3d_indices(*grid.shape),
+    if exposed_grid_refine is not None:
+        atoms_pos = spot.ExposedHitMap(grid.to_pos((0, 0, 0)), grid.size,
+                                       exposed_grid_refine)
+        for i, exposed_atoms in enumerate(exposed_atom_all_frame):
+            atoms_pos.add_positions(
+                mol.atom_to_position(a, i) for a in exposed_atoms)
+    else:
+        atoms_pos = to_all_atoms_pos(mol, exposed_atom_all_frame)
+    return (select_occupied_voxels(
+                grid, occupancy_threashold * n_probe_heavy_atoms),
             grid.to_value,
             occupancy_threashold * n_probe_heavy_atoms,
-            to_all_atoms_pos(mol, exposed_atom_all_frame),
+            atoms_pos,
             id,
             )
 
 
+def select_occupied_voxels(grid: MyGrid, threshold: float
+                           ) -> list[tuple[int, int, int]]:
+    """値がしきい値以上のボクセルを1次元インデックス順の値から
+    配列演算でまとめて求める.
+
+    Args:
+        grid: グリッドのアクセス情報
+        threshold: ボクセルの値がこの値以上の場合に選ぶ
+    Returns:
+        index.dence_matrix_3d_indicesの順番のボクセルのインデックス
+    """
+    voxel_ids = np.flatnonzero(np.asarray(grid.flat_values) >= threshold)
+    return list(zip(*(i.tolist() for i in np.unravel_index(
+        voxel_ids, grid.shape))))
+
+
 def to_all_atoms_pos(mol: chem.Mol,
                      atom_all_frame: Iterable[Iterable[int]]
                      ) -> Iterator[Vector3f]:
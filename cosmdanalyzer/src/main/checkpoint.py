@@ -0,0 +1,149 @@
+"""計算途中の状態の保存と再開"""
+from collections.abc import Iterable
+import hashlib
+import os
+import pathlib
+import pickle
+from typing import Any
+from .. import common
+from . import input
+
+
+# 状態ファイルの形式が変わった場合に古い状態ファイルを使わないための番号
+CHECKPOINT_VERSION = 3
+
+
+class Checkpoint:
+    """計算途中の状態を出力ディレクトリのcheckpointディレクトリに保存する.
+    状態は名前毎に1ファイルとし, 一時ファイルに書き込んでから置き換えるため
+    書き込み中に中断しても直前に保存した状態が残る.
+    """
+
+    def __init__(self,
+                 out_dir: str | bytes | os.PathLike,
+                 run_key: str,
+                 interval: int,
+                 resume: bool):
+        """
+
+        Args:
+            out_dir: 出力ディレクトリ
+            run_key: 入力ファイルと設定を表す文字列,
+                     保存時と異なる場合は再開できない
+            interval: フレーム毎のスコアの状態を保存するフレーム間隔
+            resume: 保存済みの状態から再開する場合はTrue
+        """
+        if interval < 1:
+            raise ValueError('checkpoint interval must be positive')
+        self._dir = pathlib.Path(out_dir) / 'checkpoint'
+        self._run_key = run_key
+        self._interval = interval
+        self._resume = resume
+
+    @property
+    def interval(self) -> int:
+        """フレーム毎のスコアの状態を保存するフレーム間隔"""
+        return self._interval
+
+    def slot(self, name: str) -> 'CheckpointSlot':
+        """名前を指定して状態の保存先を返す.
+
+        Args:
+            name: 状態の名前
+        Returns:
+            状態の保存先
+        """
+        return CheckpointSlot(self, name)
+
+    def load(self, name: str) -> Any | None:
+        """保存した状態を読み込む.
+
+        Args:
+            name: 状態の名前
+        Returns:
+            保存した状態, 再開しない場合と保存していない場合はNone
+        """
+        if not self._resume:
+            return None
+        path = self._dir / (name + '.pkl')
+        if not path.exists():
+            return None
+        with open(path, 'rb') as f:
+            version, run_key, state = pickle.load(f)
+        if (version != CHECKPOINT_VERSION) or (run_key != self._run_key):
+            raise ValueError(
+                'checkpoint {} does not match the input files and settings'
+                .format(path))
+        return state
+
+    def save(self, name: str, state: Any) -> None:
+        """状態を保存する.
+
+        Args:
+            name: 状態の名前
+            state: pickleで保存できる状態
+        """
+        os.makedirs(self._dir, exist_ok=True)
+        with common.atomic_open(self._dir / (name + '.pkl')) as f:
+            pickle.dump((CHECKPOINT_VERSION, self._run_key, state), f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+
+
+class CheckpointSlot:
+    """名前を指定した状態の保存先"""
+
+    def __init__(self, checkpoint: Checkpoint, name: str):
+        """
+
+        Args:
+            checkpoint: 保存先
+            name: 状態の名前
+        """
+        self._checkpoint = checkpoint
+        self._name = name
+
+    @property
+    def interval(self) -> int:
+        """フレーム毎のスコアの状態を保存するフレーム間隔"""
+        return self._checkpoint.interval
+
+    def load(self) -> Any | None:
+        """保存した状態を読み込む.
+
+        Returns:
+            保存した状態, 再開しない場合と保存していない場合はNone
+        """
+        return self._checkpoint.load(self._name)
+
+    def save(self, state: Any) -> None:
+        """状態を保存する.
+
+        Args:
+            state: pickleで保存できる状態
+        """
+        self._checkpoint.save(self._name, state)
+
+
+def create_run_key(setting: dict,
+                   options: dict,
+                   system_infos: Iterable[input.SystemInfo]) -> str:
+    """設定, コマンドラインオプション, 入力ファイルから再開の可否を判定する
+    文字列を作成する. 入力ファイルはパス, サイズ, 更新時刻で区別する.
+
+    Args:
+        setting: 設定ファイルの内容
+        options: 計算結果に影響するコマンドラインオプション
+        system_infos: 入力ファイル
+    Returns:
+        SHA-256のハッシュ値
+    """
+    files = []
+    for info in system_infos:
+        for path in (*info.pdbs, info.dx, info.fpocket_pdb,
+                     info.fpocket_info):
+            if path is None:
+                continue
+            stat = os.stat(path)
+            files.append((os.fspath(path), stat.st_size, stat.st_mtime_ns))
+    key = repr((setting, sorted(options.items()), files))
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
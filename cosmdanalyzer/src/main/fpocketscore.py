@@ -1,8 +1,14 @@
-from collections.abc import Collection, Iterable
+from collections.abc import Callable, Collection, Iterable, Sequence
+import math
+from .. import index
 from .. import solidcalc
 from ..solidcalc.typehint import Vector3f
 
 
+# fpocketの点とホットスポットの重なりの判定方法
+FPOCKET_OVERLAP_METHODS = ('point', 'voxel')
+
+
 def fpocket_score(hotspot: Collection[Vector3f],
                   hotspot_size: float,
                   fpockets: Iterable[tuple[float, Iterable[Vector3f]]],
@@ -19,14 +25,140 @@ def fpocket_score(hotspot: Collection[Vector3f],
         hotspotに対して最も重なりの大きいfpocketのスコア
         rate_thresholdより重なりの大きいスコアがない場合は0.0
     """
-    max_rate = 0
-    max_score = 0.0
+    return fpocket_scores((hotspot, ), hotspot_size, fpockets)[0]
+
+
+def fpocket_scores(hotspot_list: Sequence[Collection[Vector3f]],
+                   hotspot_size: float,
+                   fpockets: Iterable[tuple[float, Iterable[Vector3f]]],
+                   ) -> list[float]:
+    """すべてのhotspotに対して最も重なりの大きいfpocketのスコアを求める.
+    重なりの判定はsolidcalc.calc_point_set_box_overwrapedと同じで,
+    許容幅がボックス幅にsqrt(float_info.min)を掛けたものなので
+    座標が一致する点のみが重なる.
+    そのため座標の一致でホットスポットの候補を絞り込み,
+    候補の点のみをホットスポット毎に1度だけ作成したVP木で判定する.
+
+    Args:
+        hotspot_list: ホットスポット毎の座標集合
+        hotspot_size: ホットスポットの座標1点の幅
+        fpockets: fpocketのスコアと座標集合
+    Returns:
+        ホットスポット毎の最も重なりの大きいfpocketのスコア
+        重なるfpocketがない場合は0.0
+    """
+    point_to_hotspots: dict[Vector3f, set[int]] = dict()
+    for i, hotspot in enumerate(hotspot_list):
+        for p in hotspot:
+            key = _point_key(p)
+            if key in point_to_hotspots:
+                point_to_hotspots[key].add(i)
+            else:
+                point_to_hotspots[key] = {i, }
+    overwrap_funcs: dict[int, Callable[[Vector3f], bool]] = dict()
+    max_rate = [0.0, ] * len(hotspot_list)
+    max_score = [0.0, ] * len(hotspot_list)
     for score, pos in fpockets:
-        rate = solidcalc.calc_point_set_box_overwraped(
-            pos,
-            hotspot,
-            hotspot_size)
-        if (max_rate < rate) and rate:
-            max_rate = rate
-            max_score = score
+        counts: dict[int, int] = dict()
+        n_points = 0
+        for p in pos:
+            n_points += 1
+            for i in point_to_hotspots.get(_point_key(p), tuple()):
+                if i not in overwrap_funcs:
+                    overwrap_funcs[i] = (
+                        solidcalc.create_point_set_box_overwrap_func(
+                            hotspot_list[i], hotspot_size))
+                if overwrap_funcs[i](p):
+                    counts[i] = counts.get(i, 0) + 1
+        for i, count in counts.items():
+            rate = count / n_points
+            if max_rate[i] < rate:
+                max_rate[i] = rate
+                max_score[i] = score
     return max_score
+
+
+def fpocket_voxel_scores(
+        hotspot_voxel_ids: Iterable[int],
+        hotspot_labels: Iterable[int],
+        n_hotspots: int,
+        pos_to_voxel_id: Callable[[Vector3f], int | None],
+        fpockets: Iterable[tuple[float | str, Iterable[Vector3f]]],
+        rate_threshold: float) -> list[float]:
+    """すべてのhotspotに対して最も重なりの大きいfpocketのスコアを求める.
+    fpocketの座標点をそれを含むボクセルに割り当て,
+    ホットスポットのボクセルに含まれる点の数から重なりの割合を求める.
+
+    Args:
+        hotspot_voxel_ids: すべてのホットスポットのボクセルID
+        hotspot_labels: hotspot_voxel_idsの各ボクセルのホットスポット番号
+        n_hotspots: ホットスポット数
+        pos_to_voxel_id: 座標を含むボクセルのIDを返す関数,
+                         グリッド外の場合はNoneを返す
+        fpockets: fpocketのスコアと座標集合
+        rate_threshold: [0,1]hotspotに含まれるfpocketの座標点の割合が
+                        rate未満の場合は無視する.
+    Returns:
+        ホットスポット毎の最も重なりの大きいfpocketのスコア
+        rate_thresholdより重なりの大きいスコアがない場合は0.0
+    """
+    voxel_to_hotspots: dict[int, set[int]] = dict()
+    for voxel_id, label in zip(hotspot_voxel_ids, hotspot_labels):
+        if voxel_id in voxel_to_hotspots:
+            voxel_to_hotspots[voxel_id].add(label)
+        else:
+            voxel_to_hotspots[voxel_id] = {label, }
+    max_rate = [0.0, ] * n_hotspots
+    max_score = [0.0, ] * n_hotspots
+    for score, pos in fpockets:
+        counts: dict[int, int] = dict()
+        n_points = 0
+        for p in pos:
+            n_points += 1
+            for i in voxel_to_hotspots.get(pos_to_voxel_id(p), tuple()):
+                counts[i] = counts.get(i, 0) + 1
+        for i, count in counts.items():
+            rate = count / n_points
+            if (max_rate[i] < rate) and (rate >= rate_threshold):
+                max_rate[i] = rate
+                # _info.txtのスコアは文字列で読み込まれる
+                max_score[i] = float(score)
+    return max_score
+
+
+def create_grid_voxel_id_func(grid_origin: Vector3f,
+                              grid_size: float,
+                              grid_shape: Sequence[int],
+                              ) -> Callable[[Vector3f], int | None]:
+    """座標からそれを含むボクセルの1次元インデックスを返す関数を作成する.
+
+    Args:
+        grid_origin: インデックス(0, 0, 0)のボクセルの下端の座標,
+                     calcmain.get_grid_accessのto_posと同じ座標
+        grid_size: ボクセルの幅
+        grid_shape: グリッドの各軸の数
+    Returns:
+        座標から1次元インデックスを返す関数, グリッド外の場合はNoneを返す
+    """
+    def _to_id(pos: Vector3f) -> int | None:
+        idx = _pos_to_voxel(pos, grid_origin, grid_size)
+        for i in range(3):
+            if (idx[i] < 0) or (idx[i] >= grid_shape[i]):
+                return None
+        return index.convert_3d_index_to_1d(idx, grid_shape)
+    return _to_id
+
+
+def _pos_to_voxel(pos: Vector3f, origin: Vector3f, size: float
+                  ) -> tuple[int, int, int]:
+    """座標を含むボクセルの3次元インデックスを返す.
+    ボクセルiは[origin + i * size, origin + (i + 1) * size)の範囲とする.
+    """
+    return (math.floor((pos[0] - origin[0]) / size),
+            math.floor((pos[1] - origin[1]) / size),
+            math.floor((pos[2] - origin[2]) / size))
+
+
+def _point_key(pos: Vector3f) -> Vector3f:
+    """座標が一致する点同士を同じキーにする."""
+    return (float(pos[0]), float(pos[1]), float(pos[2]))
@@ -1,69 +1,279 @@
 """入力関係"""
-from collections.abc import Iterable, Iterator
+from collections.abc import Callable, Iterable, Iterator
 import itertools
 import pathlib
+import random
 import re
 from operator import itemgetter
 from os import PathLike
 from typing import IO, NamedTuple
+from ..solidcalc.typehint import Vector3f
+
+
+class FrameSelection(NamedTuple):
+    """計算に使うフレームの選択.
+    フレーム番号はプローブ毎のトラジェクトリPDBを入力順に連結した
+    MODEL単位の0始まりの番号とする.
+
+    Attributes:
+        start: 最初のフレーム番号
+        stop: このフレーム番号より前のフレームを使う, Noneの場合は最後まで
+        stride: フレームの間隔
+        subsample: start, stop, strideで選んだフレームから無作為に選ぶ
+                   フレーム数, Noneの場合はすべて使う
+        seed: subsampleの乱数シード
+    """
+    start: int = 0
+    stop: int | None = None
+    stride: int = 1
+    subsample: int | None = None
+    seed: int = 0
+
+
+def create_frame_filter(selection: FrameSelection,
+                        n_frames: int | None = None
+                        ) -> Callable[[int], bool]:
+    """フレーム番号が選択されているか判定する関数を作成する.
+
+    Args:
+        selection: フレームの選択
+        n_frames: トラジェクトリの全フレーム数,
+                  selection.subsampleを指定する場合は必須
+    Returns:
+        フレーム番号を選択する場合はTrueを返す関数
+    """
+    if selection.start < 0 or selection.stride < 1:
+        raise ValueError('invalid frame selection {}'.format(selection))
+    if selection.subsample is None:
+        def _is_selected(frame_idx: int) -> bool:
+            return ((frame_idx >= selection.start)
+                    and (selection.stop is None or frame_idx < selection.stop)
+                    and ((frame_idx - selection.start) % selection.stride
+                         == 0))
+        return _is_selected
+    if n_frames is None:
+        raise ValueError('n_frames is required for subsample')
+    stop = (n_frames if selection.stop is None
+            else min(selection.stop, n_frames))
+    candidates = range(selection.start, stop, selection.stride)
+    if selection.subsample >= len(candidates):
+        selected = set(candidates)
+    else:
+        selected = set(random.Random(selection.seed).sample(
+            candidates, selection.subsample))
+    return selected.__contains__
+
+
+def count_trajectory_frames(src: Iterable[str | bytes | PathLike]) -> int:
+    """PDBファイル集合のフレーム数を数える.
+
+    Args:
+        src: PDB形式のファイル集合
+    Returns:
+        MODEL行の数, MODEL行がない場合は1
+    """
+    n_frames = 0
+    for f in _path_to_io_iterator(src):
+        for line in f:
+            if line.startswith('MODEL'):
+                n_frames += 1
+    return max(n_frames, 1)
 
 
 def trajectory_pdb_string_filter(
         pdb_lines: Iterable[str],
+        frame_filter: Callable[[int], bool] | None = None,
+        used_frames: list[int] | None = None,
+        probe_frame_out: Callable[[list[Vector3f]], None] | None = None,
 ) -> tuple[str, int]:
-    """PDBストリームからタンパク質のみのPDB文字列とプローブ重原子数を取得する
+    """PDBストリームからタンパク質のみのPDB文字列とプローブ重原子数を取得する.
+    frame_filterを指定した場合は選択されなかったフレームの行は保持しない.
+    先頭フレームはタンパク質とプローブの判定に使うため常に読み込む.
 
     Args:
         pdb_lines: PDB形式の文字列を行ごとに返すイテレータ
+        frame_filter: フレーム番号を使う場合はTrueを返す関数,
+                      Noneの場合はすべてのフレームを使う
+        used_frames: 使ったフレーム番号の出力先
+        probe_frame_out: 使ったフレーム毎にプローブ重原子の座標集合を
+                         渡して呼び出す関数
     Returns:
         (タンパク質のみのPDB, プローブ重原子数)
     """
+    return next(trajectory_pdb_string_chunks(
+        pdb_lines, None, frame_filter, used_frames, probe_frame_out))
+
+
+def trajectory_pdb_string_chunks(
+        pdb_lines: Iterable[str],
+        chunk_size: int | None = None,
+        frame_filter: Callable[[int], bool] | None = None,
+        used_frames: list[int] | None = None,
+        probe_frame_out: Callable[[list[Vector3f]], None] | None = None,
+) -> Iterator[tuple[str, int]]:
+    """PDBストリームからタンパク質のみのPDB文字列を
+    chunk_sizeフレームずつ取得する.
+    読み込み中のフレーム以外の行は保持しないため,
+    使用メモリはトラジェクトリの長さによらない.
+
+    Args:
+        pdb_lines: PDB形式の文字列を行ごとに返すイテレータ
+        chunk_size: 1つのPDB文字列に含めるフレーム数,
+                    Noneの場合はすべてのフレームを1つのPDB文字列とする
+        frame_filter: フレーム番号を使う場合はTrueを返す関数,
+                      Noneの場合はすべてのフレームを使う
+        used_frames: 使ったフレーム番号の出力先
+        probe_frame_out: 使ったフレーム毎にプローブ重原子の座標集合を
+                         渡して呼び出す関数
+    Returns:
+        (タンパク質のみのPDB, プローブ重原子数)を返すイテレータ
+    """
+    if (chunk_size is not None) and (chunk_size < 1):
+        raise ValueError('chunk_size must be positive')
+    pdb_lines = iter(pdb_lines)
     line_buf: list[str] = list()
     protain_max_id = _first_frame_protein_filter(pdb_lines, line_buf)
-    n_probe_atoms = _first_frame_probe_counter(pdb_lines)
-    line_buf.append('ENDMDL\n')
+    probe_pos: list[Vector3f] = list()
+    n_probe_atoms, probe_name = _first_frame_probe_counter(pdb_lines,
+                                                           probe_pos)
+    frame_idx = 0
+    is_used = _use_frame(frame_idx, frame_filter, used_frames)
+    if is_used:
+        line_buf.append('ENDMDL\n')
+        n_buf_frames = 1
+        if probe_frame_out is not None:
+            probe_frame_out(probe_pos)
+            probe_pos = list()
+    else:
+        line_buf.clear()
+        probe_pos = list()
+        n_buf_frames = 0
+    n_chunks = 0
     for line in pdb_lines:
+        if line.startswith('MODEL'):
+            frame_idx += 1
+            is_used = _use_frame(frame_idx, frame_filter, used_frames)
+            if is_used:
+                if n_buf_frames == chunk_size:
+                    line_buf.append('END')
+                    yield (''.join(line_buf), n_probe_atoms)
+                    n_chunks += 1
+                    line_buf.clear()
+                    n_buf_frames = 0
+                n_buf_frames += 1
+        if not is_used:
+            continue
         if line.startswith('ATOM  ') or line.startswith('HETATM'):
             if int(line[6:11]) < protain_max_id:
                 line_buf.append(line)
+            elif ((probe_frame_out is not None)
+                  and (line[17:20] == probe_name)
+                  and (line[76:78] != ' H')):
+                probe_pos.append(_pdb_line_position(line))
         if line.startswith('TER'):
             if int(line[6:11]) == protain_max_id:
                 line_buf.append(line)
         elif line.startswith('MODEL') or line.startswith('ENDMDL'):
             line_buf.append(line)
+            if line.startswith('ENDMDL') and (probe_frame_out is not None):
+                probe_frame_out(probe_pos)
+                probe_pos = list()
+    if len(line_buf) == 0:
+        if n_chunks == 0:
+            raise ValueError('no frame is selected')
+        return
     line_buf.append('END')
-    return (''.join(line_buf), n_probe_atoms)
+    yield (''.join(line_buf), n_probe_atoms)
 
 
 def trajectory_pdb_stream_filter(
-        pdb_src: IO[str]
+        pdb_src: IO[str],
+        frame_filter: Callable[[int], bool] | None = None,
+        used_frames: list[int] | None = None,
 ) -> tuple[str, int]:
     """PDBストリームからタンパク質のみのPDB文字列とプローブ重原子数を取得する
 
     Args:
         pdb_src: PDB形式の文字ストリーム
+        frame_filter: フレーム番号を使う場合はTrueを返す関数,
+                      Noneの場合はすべてのフレームを使う
+        used_frames: 使ったフレーム番号の出力先
     Returns:
         (タンパク質のみのPDB, プローブ重原子数)
     """
-    return trajectory_pdb_string_filter(_io_to_line_iterator(pdb_src))
+    return trajectory_pdb_string_filter(_io_to_line_iterator(pdb_src),
+                                        frame_filter, used_frames)
 
 
-def trajectory_pdb_files_filter(src: Iterable[str | bytes | PathLike]
+def trajectory_pdb_files_filter(src: Iterable[str | bytes | PathLike],
+                                frame_filter: Callable[[int], bool]
+                                | None = None,
+                                used_frames: list[int] | None = None,
+                                probe_frame_out: Callable[[list[Vector3f]],
+                                                          None] | None = None,
                                 ) -> tuple[str, int]:
     """PDBファイル集合からタンパク質のみのPDB文字列とプローブ重原子数を取得する
 
     Args:
         src: PDB形式のファイル集合, 同じ原子集合の座標のみ異なるデータをもつ.
+        frame_filter: フレーム番号を使う場合はTrueを返す関数,
+                      Noneの場合はすべてのフレームを使う
+        used_frames: 使ったフレーム番号の出力先
+        probe_frame_out: 使ったフレーム毎にプローブ重原子の座標集合を
+                         渡して呼び出す関数
     Returns:
         (タンパク質のみのPDB, プローブ重原子数)
     """
     return trajectory_pdb_string_filter(
         itertools.chain.from_iterable(
             map(_io_to_line_iterator, _path_to_io_iterator(src))
-        )
+        ),
+        frame_filter, used_frames, probe_frame_out,
+    )
+
+
+def trajectory_pdb_files_chunks(src: Iterable[str | bytes | PathLike],
+                                chunk_size: int | None = None,
+                                frame_filter: Callable[[int], bool]
+                                | None = None,
+                                used_frames: list[int] | None = None,
+                                probe_frame_out: Callable[[list[Vector3f]],
+                                                          None] | None = None,
+                                ) -> Iterator[tuple[str, int]]:
+    """PDBファイル集合からタンパク質のみのPDB文字列を
+    chunk_sizeフレームずつ取得する.
+
+    Args:
+        src: PDB形式のファイル集合, 同じ原子集合の座標のみ異なるデータをもつ.
+        chunk_size: 1つのPDB文字列に含めるフレーム数,
+                    Noneの場合はすべてのフレームを1つのPDB文字列とする
+        frame_filter: フレーム番号を使う場合はTrueを返す関数,
+                      Noneの場合はすべてのフレームを使う
+        used_frames: 使ったフレーム番号の出力先
+        probe_frame_out: 使ったフレーム毎にプローブ重原子の座標集合を
+                         渡して呼び出す関数
+    Returns:
+        (タンパク質のみのPDB, プローブ重原子数)を返すイテレータ
+    """
+    return trajectory_pdb_string_chunks(
+        itertools.chain.from_iterable(
+            map(_io_to_line_iterator, _path_to_io_iterator(src))
+        ),
+        chunk_size, frame_filter, used_frames, probe_frame_out,
     )
 
 
+def _use_frame(frame_idx: int,
+               frame_filter: Callable[[int], bool] | None,
+               used_frames: list[int] | None) -> bool:
+    """フレームを使うか判定し, 使う場合はused_framesに追加する."""
+    if (frame_filter is not None) and (not frame_filter(frame_idx)):
+        return False
+    if used_frames is not None:
+        used_frames.append(frame_idx)
+    return True
+
+
 def _first_frame_protein_filter(
         pdb_lines: Iterable[str], out_buf: list[str]) -> int:
     """トラジェクトリPDBの先頭フレームのタンパク質を読み込む
@@ -83,25 +293,54 @@ def _first_frame_protein_filter(
             return int(line[6:11])
 
 
-def _first_frame_probe_counter(pdb_lines: Iterable[str]) -> int:
+def _first_frame_probe_counter(pdb_lines: Iterable[str],
+                               out_pos: list[Vector3f] | None = None
+                               ) -> tuple[int, str]:
     """
     Args:
         pdb_lines: PDB形式の文字列を行ごとに返すイテレータ
+        out_pos: プローブ重原子の座標の出力先
     Returns:
-        プローブ重原子数
+        (プローブ重原子数, プローブの残基名)
     """
     n_probe_atoms = 0
     line = next(pdb_lines)
     probe_name = line[17:20]
     if line[76:78] != ' H':
         n_probe_atoms += 1
+        if out_pos is not None:
+            out_pos.append(_pdb_line_position(line))
     for line in pdb_lines:
         if line.startswith('ATOM  ') or line.startswith('HETATM'):
             if (line[17:20] == probe_name) and (line[76:78] != ' H'):
                 n_probe_atoms += 1
+                if out_pos is not None:
+                    out_pos.append(_pdb_line_position(line))
         elif line.startswith('ENDMDL'):
             break
-    return n_probe_atoms
+    return n_probe_atoms, probe_name
+
+
+def _pdb_line_position(line: str) -> Vector3f:
+    """PDBのATOM/HETATM行から座標を取得する"""
+    return (float(line[30:38]), float(line[38:46]), float(line[46:54]))
+
+
+def first_frame_protein_positions(src: Iterable[str | bytes | PathLike]
+                                  ) -> list[Vector3f]:
+    """PDBファイル集合の先頭フレームのタンパク質原子の座標を取得する.
+
+    Args:
+        src: PDB形式のファイル集合
+    Returns:
+        タンパク質原子の座標集合
+    """
+    pdb_lines = itertools.chain.from_iterable(
+        map(_io_to_line_iterator, _path_to_io_iterator(src)))
+    line_buf: list[str] = list()
+    _first_frame_protein_filter(pdb_lines, line_buf)
+    return [_pdb_line_position(line) for line in line_buf
+            if line.startswith('ATOM  ') or line.startswith('HETATM')]
 
 
 def _io_to_line_iterator(src: IO[str]) -> Iterator[str]:
@@ -124,12 +363,32 @@ class SystemInfo(NamedTuple):
     fpocket_info: str | bytes | PathLike
 
 
-def parse_src_dir(src_dir: str | bytes | PathLike
+def parse_src_dir(src_dir: str | bytes | PathLike,
+                  require_dx: bool = True,
                   ) -> Iterator[SystemInfo]:
-    """入力ディレクトリから使用するファイルのパスを抜き出す"""
+    """入力ディレクトリから使用するファイルのパスを抜き出す
+
+    Args:
+        src_dir: 入力ディレクトリ
+        require_dx: Falseの場合はPMAPのDXファイルがなくても,
+                    トラジェクトリPDBのあるディレクトリを入力とする
+    Returns:
+        入力毎のファイルのパス
+    """
     dx_pattern = re.compile(r'.*PMAP.*_nVH.dx')
-    for dx_path in _search_rec_file(pathlib.Path(src_dir), dx_pattern):
-        yield _parse_md_dir(dx_path.parent)
+    if require_dx:
+        for dx_path in _search_rec_file(pathlib.Path(src_dir), dx_pattern):
+            yield _parse_md_dir(dx_path.parent)
+        return
+    pdb_pattern = re.compile(r'.*_position_check2.pdb')
+    md_dirs: dict[pathlib.Path, None] = dict()
+    for pdb_path in _search_rec_file(pathlib.Path(src_dir), pdb_pattern):
+        md_dir = pdb_path.parent
+        if md_dir.name.startswith('system'):
+            md_dir = md_dir.parent
+        md_dirs[md_dir] = None
+    for md_dir in md_dirs:
+        yield _parse_md_dir(md_dir)
 
 
 def _search_rec_file(src_dir: pathlib.Path, pattern: re.Pattern,
@@ -1,11 +1,20 @@
 """メインルーチン"""
+import argparse
 import os
 import sys
+import tempfile
 import tomli
 from .. import arguments
-from . import calcmain
-from . import spot
-from . import input
+
+
+# 保存した計算途中の状態の既定の保存間隔(フレーム数)
+DEFAULT_CHECKPOINT_INTERVAL = 100
+# 計算結果に影響しないため再開の可否の判定に使わないコマンドライン引数
+NON_RESULT_OPTIONS = ('out_dir', 'verbose', 'output_threads', 'startup_report',
+                      'checkpoint_interval', 'resume',
+                      'targets', 'manifest', 'jobs', 'memory_budget',
+                      'command', 'chunk_size',
+                      'stream_chunk_size', 'spill_dir', 'exposure_mmap')
 
 
 def load_setting(setting_file_path: str | bytes | os.PathLike) -> dict:
@@ -20,23 +29,60 @@ def main(root_dir: str | bytes | os.PathLike) -> None:
     Args:
         root_dir: このプロジェクトのルートディレクトリのパス
     """
-    args = arguments.create_parser().parse_args()
-    system_infos = input.parse_src_dir(args.src_dir)
+    run(arguments.create_parser().parse_args(), root_dir)
+
+
+def run(args: argparse.Namespace, root_dir: str | bytes | os.PathLike
+        ) -> None:
+    """1つの対象を計算する.
+
+    Args:
+        args: arguments.create_parserで解析したコマンドライン引数
+        root_dir: このプロジェクトのルートディレクトリのパス
+    """
+    # 計算に使うモジュールは依存ライブラリの読み込みに時間がかかるため,
+    # 引数の解析後に読み込む
+    from . import calcmain
+    calcmain.calc_main(**create_calc_main_args(args, root_dir))
+
+
+def create_calc_main_args(args: argparse.Namespace,
+                          root_dir: str | bytes | os.PathLike) -> dict:
+    """コマンドライン引数と設定ファイルからcalcmain.calc_mainの引数を作成する.
+
+    Args:
+        args: arguments.create_parserで解析したコマンドライン引数
+        root_dir: このプロジェクトのルートディレクトリのパス
+    Returns:
+        calcmain.calc_mainの引数名から値の辞書
+    """
+    from . import checkpoint
+    from . import fpocketscore
+    from . import input
+    from . import pmap
+    from . import scoretype
+    from . import spot
+    from . import streaming
+    from . import sweep
+    from ..scorecalc import gfe
+    from .. import solidcalc
     setting_path = args.setting
     if setting_path is None:
         setting_path = os.path.join(root_dir, 'data/setting.toml')
     setting = load_setting(setting_path)
-    weight = setting['score']['weight']
-    weight_array = (weight['gfe'],
-                    weight['size'],
-                    weight['protrusion'],
-                    weight['convexity'],
-                    weight['compactness'],
-                    weight['hydrophobicity'],
-                    weight['charge_density'],
-                    weight['flexibility'],
-                    weight['fpocket'],
-                    )
+    pmap_setting = setting.get('pmap')
+    if pmap_setting is not None:
+        pmap_input = pmap.PmapInput(
+            pmap_setting.get('delta'),
+            pmap_setting.get('sigma', 0.0),
+            pmap_setting.get('margin', 10.0),
+            pmap_setting.get('normalize', 'none').lower(),
+        )
+    else:
+        pmap_input = None
+    system_infos = tuple(input.parse_src_dir(args.src_dir,
+                                             pmap_input is None))
+    weight_array = create_score_weight(setting['score']['weight'])
     algo = (setting['clustering']['algorithm']).lower()
     if algo == 'single_linkage':
         clustering_input = spot.SingleLinkageInput(
@@ -53,19 +99,170 @@ def main(root_dir: str | bytes | os.PathLike) -> None:
                 )
     else:
         print('Unknown clustering algorithm {}'.format(algo), file=sys.stderr)
-    calcmain.calc_main(system_infos,
-                       args.out_dir,
-                       setting['clustering']['occupancy'],
-                       clustering_input,
-                       setting['clustering']['extend'],
-                       setting['score']['fpocket_threshold'],
-                       os.path.join(root_dir, 'data/hydrophobicity.csv'),
-                       os.path.join(root_dir, 'data/aminoacids.rtp'),
-                       setting['score']['temperature'],
-                       setting['score']['solvent_radius'],
-                       weight_array,
-                       setting['clustering']['spot_marge_rate'],
-                       setting['score']['resolution'],
-                       args.output_detail,
-                       args.verbose,
-                       )
+    volume_setting = setting['score'].get('volume', dict())
+    volume_method = volume_setting.get('method', 'ray').lower()
+    if volume_method == 'ray':
+        volume_input = gfe.RayVolumeInput(setting['score']['resolution'])
+    elif volume_method == 'voxel':
+        volume_input = gfe.VoxelVolumeInput(
+                volume_setting.get('refine', 2),
+                (setting['score']['resolution']
+                 if volume_setting.get('check', False) else 0),
+                )
+    else:
+        raise ValueError('Unknown volume method {}, expected one of {}'
+                         .format(volume_method, ', '.join(gfe.VOLUME_METHODS)))
+    fpocket_overlap = setting['score'].get('fpocket_overlap', 'point').lower()
+    if fpocket_overlap not in fpocketscore.FPOCKET_OVERLAP_METHODS:
+        raise ValueError('Unknown fpocket overlap {}, expected one of {}'
+                         .format(fpocket_overlap,
+                                 ', '.join(
+                                     fpocketscore.FPOCKET_OVERLAP_METHODS)))
+    if args.detail_method == 'sketch':
+        detail_input = scoretype.SketchDetail(args.detail_compression)
+    else:
+        detail_input = scoretype.ExactDetail()
+    frame_selection = create_frame_selection(
+        setting.get('frames', dict()), args)
+    convergence_setting = setting['score'].get('convergence', dict())
+    tolerance = args.convergence_tolerance
+    if tolerance is None:
+        tolerance = convergence_setting.get('tolerance')
+    if tolerance is not None:
+        convergence_input = scoretype.ConvergenceInput(
+            tolerance,
+            convergence_setting.get('order', 'random').lower(),
+            convergence_setting.get('seed', 0),
+            convergence_setting.get('block_size', 5),
+            convergence_setting.get('min_blocks', 4),
+        )
+    else:
+        convergence_input = None
+    if (args.checkpoint_interval is not None) or args.resume:
+        checkpoint_store = checkpoint.Checkpoint(
+            args.out_dir,
+            checkpoint.create_run_key(
+                setting,
+                {k: v for k, v in vars(args).items()
+                 if k not in NON_RESULT_OPTIONS},
+                system_infos),
+            (args.checkpoint_interval if args.checkpoint_interval is not None
+             else DEFAULT_CHECKPOINT_INTERVAL),
+            args.resume)
+    else:
+        checkpoint_store = None
+    if args.stream_chunk_size is not None:
+        stream_input = streaming.StreamInput(args.stream_chunk_size,
+                                             args.spill_dir)
+    else:
+        stream_input = None
+    surface_setting = setting['score'].get('surface')
+    surface_input = None
+    if surface_setting is not None:
+        surface_method = surface_setting.get('method', 'adaptive').lower()
+        if surface_method == 'adaptive':
+            surface_input = solidcalc.AdaptiveResolution(
+                setting['score']['resolution'],
+                surface_setting.get('coarse', 64),
+                surface_setting.get('check', False),
+            )
+        elif surface_method == 'lcpo':
+            surface_input = solidcalc.LcpoArea(
+                setting['score']['resolution'],
+                check=surface_setting.get('check', False),
+            )
+        else:
+            raise ValueError('Unknown surface method {}, expected one of {}'
+                             .format(surface_method,
+                                     ', '.join(solidcalc.SURFACE_METHODS)))
+    if args.exposure_mmap:
+        exposure_mmap_dir = (args.spill_dir if args.spill_dir is not None
+                             else tempfile.gettempdir())
+    else:
+        exposure_mmap_dir = None
+    sweep_setting = setting.get('sweep')
+    if sweep_setting is not None:
+        sweep_points = sweep.create_sweep_points(
+            setting['clustering']['occupancy'], clustering_input,
+            setting['clustering']['spot_marge_rate'], sweep_setting)
+    else:
+        sweep_points = None
+    return dict(
+        src_system_infos=system_infos,
+        out_dir_path=args.out_dir,
+        occupancy_threashold=setting['clustering']['occupancy'],
+        clustering_input=clustering_input,
+        hotspot_extend=setting['clustering']['extend'],
+        fpocket_threthold=setting['score']['fpocket_threshold'],
+        hydrophobicity_path=os.path.join(root_dir, 'data/hydrophobicity.csv'),
+        charge_path=os.path.join(root_dir, 'data/aminoacids.rtp'),
+        temperature=setting['score']['temperature'],
+        solvent_radius=setting['score']['solvent_radius'],
+        score_weight=weight_array,
+        spot_marge_rate=setting['clustering']['spot_marge_rate'],
+        resolution=setting['score']['resolution'],
+        output_detail=args.output_detail,
+        verbose=args.verbose,
+        volume_input=volume_input,
+        volume_all_frames=volume_setting.get('all_frames', False),
+        gfe_grid_format=args.output_gfe_grid,
+        output_threads=args.output_threads,
+        output_frame_scores=args.output_frame_scores,
+        detail_input=detail_input,
+        frame_selection=frame_selection,
+        convergence_input=convergence_input,
+        checkpoint_store=checkpoint_store,
+        stream_input=stream_input,
+        exposure_mmap_dir=exposure_mmap_dir,
+        exposed_grid_refine=setting['clustering'].get('exposed_grid_refine'),
+        surface_input=surface_input,
+        output_scores=setting['score'].get('output_scores', tuple()),
+        sweep_points=sweep_points,
+        pmap_input=pmap_input,
+        fpocket_overlap=fpocket_overlap,
+    )
+
+
+def create_score_weight(weight: dict) -> tuple[float, ...]:
+    """設定ファイルの[score.weight]から各スコアの重みを作成する.
+
+    Args:
+        weight: 設定ファイルの[score.weight]
+    Returns:
+        calcmain.calc_mainのscore_weightの順の重み
+    """
+    return (weight['gfe'],
+            weight['size'],
+            weight['protrusion'],
+            weight['convexity'],
+            weight['compactness'],
+            weight['hydrophobicity'],
+            weight['charge_density'],
+            weight['flexibility'],
+            weight['fpocket'],
+            )
+
+
+def create_frame_selection(frames_setting: dict,
+                           args: argparse.Namespace
+                           ) -> 'input.FrameSelection | None':
+    """設定ファイルの[frames]とコマンドライン引数からフレームの選択を作成する.
+    コマンドライン引数の指定を設定ファイルより優先する.
+
+    Args:
+        frames_setting: 設定ファイルの[frames]
+        args: コマンドライン引数
+    Returns:
+        フレームの選択, どちらも指定がない場合はNone
+    """
+    from . import input
+    values = dict()
+    for key in input.FrameSelection._fields:
+        value = getattr(args, 'frame_' + key, None)
+        if value is None:
+            value = frames_setting.get(key)
+        if value is not None:
+            values[key] = value
+    if len(values) == 0:
+        return None
+    return input.FrameSelection(**values)
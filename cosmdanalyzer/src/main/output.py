@@ -1,8 +1,13 @@
 """出力"""
-from collections.abc import Iterable, Sequence
+import array
+from collections.abc import Callable, Iterable, Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
 import itertools
 import math
-from typing import IO
+import struct
+import sys
+from typing import IO, NamedTuple
+from ..solidcalc.typehint import Vector3f
 
 
 def output_detail_score_csv(out: IO[str],
@@ -41,3 +46,266 @@ def output_detail_score_csv(out: IO[str],
                 else:
                     out.write(',n/a')
             out.write('\n')
+
+
+def output_grid_dx(out: IO[str],
+                   values: Iterable[float],
+                   shape: tuple[int, int, int],
+                   origin: Vector3f,
+                   delta: float,
+                   ) -> None:
+    """グリッドの値をOpenDX形式でストリームに出力する
+
+    Args:
+        out: 出力先
+        values: 1次元インデックス順(2軸->1軸->0軸の順にインクリメント)の値
+        shape: グリッドの各軸の数
+        origin: グリッドの原点
+        delta: グリッド1つの幅
+    """
+    n_items = shape[0] * shape[1] * shape[2]
+    out.write('object 1 class gridpositions counts {} {} {}\n'.format(*shape))
+    out.write('origin {:.7g} {:.7g} {:.7g}\n'.format(*origin))
+    out.write('delta {:.7g} 0 0\n'.format(delta))
+    out.write('delta 0 {:.7g} 0\n'.format(delta))
+    out.write('delta 0 0 {:.7g}\n'.format(delta))
+    out.write('object 2 class gridconnections counts {} {} {}\n'.format(
+        *shape))
+    out.write('object 3 class array type double rank 0 items {} '
+              'data follows\n'.format(n_items))
+    itr = iter(values)
+    while True:
+        line = tuple(itertools.islice(itr, 3))
+        if len(line) == 0:
+            break
+        out.write(' '.join(map('{:.7g}'.format, line)))
+        out.write('\n')
+    out.write('attribute "dep" string "positions"\n')
+    out.write('object "density" class field\n')
+    out.write('component "positions" value 1\n')
+    out.write('component "connections" value 2\n')
+    out.write('component "data" value 3\n')
+
+
+GRID_BINARY_MAGIC = b'CMDAGRD1'
+
+
+def output_grid_binary(out: IO[bytes],
+                       values: Iterable[float],
+                       shape: tuple[int, int, int],
+                       origin: Vector3f,
+                       delta: float,
+                       ) -> None:
+    """グリッドの値をバイナリ形式でストリームに出力する.
+    形式はリトルエンディアンで以下の順
+    マジックナンバー(8byte), 各軸の数(int32 x 3), 原点(float64 x 3),
+    グリッド幅(float64), 1次元インデックス順の値(float32 x 要素数)
+
+    Args:
+        out: 出力先
+        values: 1次元インデックス順(2軸->1軸->0軸の順にインクリメント)の値
+        shape: グリッドの各軸の数
+        origin: グリッドの原点
+        delta: グリッド1つの幅
+    """
+    out.write(GRID_BINARY_MAGIC)
+    out.write(struct.pack('<3i4d', *shape, *origin, delta))
+    data = array.array('f', values)
+    if sys.byteorder != 'little':
+        data.byteswap()
+    out.write(data.tobytes())
+
+
+SCORE_RESULTS_MAGIC = b'CMDASCR1'
+
+
+class SystemScoreResults(NamedTuple):
+    """1プローブの重みを掛ける前のパッチ毎のスコア
+
+    Attributes:
+        basename: プローブの名前
+        n_frames: 計算に使ったフレーム数
+        scores: スコアの種類毎([score.weight]の順)のパッチ毎のスコア,
+                計算しなかったスコアはNone
+    """
+    basename: str
+    n_frames: int
+    scores: tuple[tuple[float | None, ...], ...]
+
+
+def write_score_results(out: IO[bytes],
+                        score_weight: Sequence[float],
+                        calculated: Sequence[bool],
+                        systems: Sequence[SystemScoreResults],
+                        ) -> None:
+    """プローブ毎の重みを掛ける前のスコアをバイナリ形式でストリームに出力する.
+    形式はリトルエンディアンで以下の順
+    マジックナンバー(8byte), スコアの種類数, パッチ数, プローブ数(int32 x 3),
+    重み(float64 x スコアの種類数), 計算の有無(uint8 x スコアの種類数),
+    プローブ毎に(名前のbyte数, フレーム数(int32 x 2), UTF-8の名前,
+    スコアの種類毎のパッチ毎のスコア(float64 x スコアの種類数 x パッチ数))
+    値がない場合はNaNを出力する.
+
+    Args:
+        out: 出力先
+        score_weight: 結果の出力に使った各スコアの重み
+        calculated: スコアの種類毎に計算した場合はTrue
+        systems: プローブ毎のスコア
+    """
+    n_patches = len(systems[0].scores[0]) if len(systems) > 0 else 0
+    out.write(SCORE_RESULTS_MAGIC)
+    out.write(struct.pack('<3i', len(score_weight), n_patches, len(systems)))
+    out.write(struct.pack('<{}d'.format(len(score_weight)), *score_weight))
+    out.write(bytes(map(int, calculated)))
+    for system in systems:
+        name = system.basename.encode('utf-8')
+        out.write(struct.pack('<2i', len(name), system.n_frames))
+        out.write(name)
+        data = array.array('d', (
+            v if v is not None else math.nan
+            for patch_scores in system.scores for v in patch_scores))
+        if sys.byteorder != 'little':
+            data.byteswap()
+        out.write(data.tobytes())
+
+
+def read_score_results(src: IO[bytes]
+                       ) -> tuple[tuple[float, ...], tuple[bool, ...],
+                                  list[SystemScoreResults]]:
+    """write_score_resultsで出力したスコアを読み込む.
+
+    Args:
+        src: 入力元
+    Returns:
+        (各スコアの重み, スコアの種類毎の計算の有無, プローブ毎のスコア)
+    """
+    if src.read(len(SCORE_RESULTS_MAGIC)) != SCORE_RESULTS_MAGIC:
+        raise ValueError('not a score results file')
+    n_scores, n_patches, n_systems = struct.unpack('<3i', src.read(12))
+    score_weight = struct.unpack('<{}d'.format(n_scores),
+                                 src.read(8 * n_scores))
+    calculated = tuple(b != 0 for b in src.read(n_scores))
+    systems = []
+    for _ in range(n_systems):
+        n_name, n_frames = struct.unpack('<2i', src.read(8))
+        basename = src.read(n_name).decode('utf-8')
+        data = array.array('d')
+        data.frombytes(src.read(8 * n_scores * n_patches))
+        if sys.byteorder != 'little':
+            data.byteswap()
+        scores = tuple(
+            (tuple(data[i * n_patches:(i + 1) * n_patches])
+             if calculated[i] else (None, ) * n_patches)
+            for i in range(n_scores))
+        systems.append(SystemScoreResults(basename, n_frames, scores))
+    return score_weight, calculated, systems
+
+
+class FrameScoreWriter:
+    """フレーム毎, スコアの種類毎, パッチ毎のスコアを
+    NumPyの.npy形式(float64, リトルエンディアン, 形状(フレーム数,
+    スコアの種類数, パッチ数))で1フレームずつ追記する.
+    値がない場合はNaNを出力する.
+    """
+
+    def __init__(self, out: IO[bytes], n_frames: int, n_scores: int,
+                 n_patches: int, prefill: bool = False,
+                 resume: bool = False):
+        """ヘッダを出力する.
+
+        Args:
+            out: 出力先
+            n_frames: フレーム数
+            n_scores: スコアの種類数
+            n_patches: パッチ数
+            prefill: Trueの場合はすべてのフレームをNaNで出力しておき,
+                     add_frameでフレーム番号を指定して上書きする.
+                     outはシーク可能である必要がある
+            resume: Trueの場合は出力済みのファイルの続きから書き込むため
+                    ヘッダを出力せず, add_frameでフレーム番号を指定する
+        """
+        self._out = out
+        self._n_values = n_scores * n_patches
+        header = ("{{'descr': '<f8', 'fortran_order': False, "
+                  "'shape': ({}, {}, {}), }}").format(
+                      n_frames, n_scores, n_patches)
+        # マジックナンバー, バージョン, ヘッダ長を含めて64byte境界に揃える
+        n_pad = 64 - (10 + len(header) + 1) % 64
+        header = header + ' ' * (n_pad % 64) + '\n'
+        self._data_offset = 10 + len(header)
+        if resume:
+            return
+        out.write(b'\x93NUMPY\x01\x00')
+        out.write(struct.pack('<H', len(header)))
+        out.write(header.encode('latin1'))
+        if prefill:
+            nan_frame = array.array('d', (math.nan, ) * self._n_values)
+            if sys.byteorder != 'little':
+                nan_frame.byteswap()
+            nan_bytes = nan_frame.tobytes()
+            for _ in range(n_frames):
+                out.write(nan_bytes)
+
+    def add_frame(self, scores: Iterable[Iterable[float | None]],
+                  frame_idx: int | None = None) -> None:
+        """1フレーム分のスコアを追記する.
+
+        Args:
+            scores: スコアの種類毎のパッチ毎のスコア
+            frame_idx: 書き込むフレーム番号, Noneの場合は追記する
+        """
+        data = array.array('d', (
+            v if v is not None else math.nan
+            for patch_scores in scores for v in patch_scores))
+        if len(data) != self._n_values:
+            raise ValueError('invalid number of scores: {}'.format(len(data)))
+        if sys.byteorder != 'little':
+            data.byteswap()
+        if frame_idx is not None:
+            self._out.seek(self._data_offset
+                           + frame_idx * self._n_values * data.itemsize)
+        self._out.write(data.tobytes())
+
+    def flush(self) -> None:
+        """書き込んだスコアを出力先に反映する."""
+        self._out.flush()
+
+
+class BackgroundWriter:
+    """出力処理をバックグラウンドのスレッドで実行する."""
+
+    def __init__(self, n_threads: int):
+        """
+
+        Args:
+            n_threads: 出力に使うスレッド数, 0の場合は呼び出し時に直接実行する
+        """
+        self._executor = (ThreadPoolExecutor(n_threads)
+                          if n_threads > 0 else None)
+        self._futures: list[Future] = []
+
+    def submit(self, func: Callable[..., None], *args, **kwargs) -> None:
+        """出力処理を登録する.
+
+        Args:
+            func: 出力処理, 呼び出し後に引数は変更しないこと
+            args: funcの引数
+            kwargs: funcのキーワード引数
+        """
+        if self._executor is None:
+            func(*args, **kwargs)
+        else:
+            self._futures.append(self._executor.submit(func, *args, **kwargs))
+
+    def wait(self) -> None:
+        """登録したすべての出力処理の終了を待つ.
+        出力処理で例外が発生した場合は再送出する.
+        """
+        if self._executor is None:
+            return
+        try:
+            for future in self._futures:
+                future.result()
+        finally:
+            self._futures.clear()
+            self._executor.shutdown()
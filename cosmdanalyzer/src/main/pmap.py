@@ -0,0 +1,213 @@
+"""トラジェクトリからのプローブ占有率グリッド(PMAP)の作成.
+トラジェクトリPDBの読み込み中にフレーム毎のプローブ重原子の座標を
+グリッドのヒストグラムに加算し, OpenDX形式のPMAPの代わりに使う.
+"""
+from collections.abc import Sequence
+import math
+import os
+from typing import NamedTuple
+import numpy as np
+from .. import index
+from ..solidcalc.typehint import Vector3f
+from . import input
+
+
+class PmapInput(NamedTuple):
+    """トラジェクトリからPMAPを作成する設定
+
+    Attributes:
+        delta: ボクセル1つの幅(Å), NoneはDXファイルの幅,
+               DXファイルがない場合は1.0
+        sigma: 0より大きい場合は各原子を含むボクセルを中心に,
+               この標準偏差(Å)のガウス関数で周囲のボクセルに分配する
+        margin: DXファイルがない場合に先頭フレームのタンパク質を囲む
+                直方体を各方向にこの距離(Å)広げた範囲をグリッドにする
+        normalize: 'none'の場合はDXファイルと同じ全フレームの原子数の和を使い,
+                   DXファイルと同じしきい値で同じボクセルを選ぶ.
+                   'density'の場合はボクセル毎の原子数を
+                   (フレーム数 * ボクセルの体積)で割る
+    """
+    delta: float | None = None
+    sigma: float = 0.0
+    margin: float = 10.0
+    normalize: str = 'none'
+
+
+class PmapGeometry(NamedTuple):
+    """グリッドの配置
+
+    Attributes:
+        origin: DXファイルのoriginと同じ座標,
+                インデックス(0, 0, 0)のボクセルは各軸originから
+                originにdeltaを加えた座標の直前までの原子を数える
+        delta: ボクセル1つの幅
+        shape: 各軸のボクセル数
+    """
+    origin: Vector3f
+    delta: float
+    shape: tuple[int, int, int]
+
+
+# ガウス関数で分配する範囲(標準偏差に対する比)
+GAUSSIAN_CUTOFF = 3.0
+# PmapInput.normalizeに指定できる値
+NORMALIZE_METHODS = ('none', 'density')
+
+
+def read_dx_geometry(path: str | bytes | os.PathLike) -> PmapGeometry:
+    """OpenDX形式のファイルのヘッダからグリッドの配置を読み込む.
+    各軸の幅は等しく軸に平行であるとする.
+
+    Args:
+        path: OpenDX形式のファイルのパス
+    Returns:
+        グリッドの配置
+    """
+    shape = None
+    origin = None
+    deltas: list[float] = []
+    with open(path) as f:
+        for line in f:
+            words = line.split()
+            if line.startswith('object 1'):
+                shape = tuple(int(w) for w in words[-3:])
+            elif line.startswith('origin'):
+                origin = tuple(float(w) for w in words[1:4])
+            elif line.startswith('delta'):
+                deltas.append(max(float(w) for w in words[1:4]))
+            elif line.startswith('object 3'):
+                break
+    if (shape is None) or (origin is None) or (len(deltas) != 3):
+        raise ValueError('invalid OpenDX header {}'.format(path))
+    return PmapGeometry(origin, deltas[0], shape)
+
+
+def create_pmap_geometry(info: input.SystemInfo,
+                         pmap_input: PmapInput) -> PmapGeometry:
+    """PMAPのグリッドの配置を決める.
+    DXファイルがある場合はその範囲をpmap_input.deltaの幅で覆い,
+    ない場合は先頭フレームのタンパク質を囲む直方体を
+    pmap_input.margin広げた範囲を覆う.
+
+    Args:
+        info: 入力ファイル
+        pmap_input: PMAPを作成する設定
+    Returns:
+        グリッドの配置
+    """
+    if info.dx is not None:
+        dx_geometry = read_dx_geometry(info.dx)
+        if (pmap_input.delta is None) or (pmap_input.delta
+                                          == dx_geometry.delta):
+            return dx_geometry
+        delta = pmap_input.delta
+        origin = dx_geometry.origin
+        extents = tuple(n * dx_geometry.delta for n in dx_geometry.shape)
+    else:
+        delta = pmap_input.delta if pmap_input.delta is not None else 1.0
+        positions = input.first_frame_protein_positions(info.pdbs)
+        if len(positions) == 0:
+            raise ValueError('no protein atom in {}'.format(info.basename))
+        origin = tuple(min(p[i] for p in positions) - pmap_input.margin
+                       for i in range(3))
+        extents = tuple(max(p[i] for p in positions) + pmap_input.margin
+                        - origin[i] for i in range(3))
+    return PmapGeometry(
+        origin, delta,
+        tuple(max(math.ceil(e / delta - 1e-9), 1) for e in extents))
+
+
+class PmapGrid:
+    """フレーム毎のプローブ重原子の座標をボクセル毎に数える.
+    ボクセルの割り当てはcpptrajで作成したDXファイルと同じで,
+    グリッドの範囲外の原子は数えない.
+    """
+
+    def __init__(self, geometry: PmapGeometry, sigma: float = 0.0,
+                 normalize: str = 'none'):
+        """
+
+        Args:
+            geometry: グリッドの配置
+            sigma: 0より大きい場合は各原子を含むボクセルを中心に,
+                   この標準偏差(Å)のガウス関数で周囲のボクセルに分配する
+            normalize: get_valuesの値, 'none'はget_countsと同じ
+                       DXファイルと同じ単位の原子数の和,
+                       'density'は原子数を(フレーム数 * ボクセルの体積)で
+                       割った1フレームあたりの数密度(Å^-3)
+        """
+        if normalize not in NORMALIZE_METHODS:
+            raise ValueError('Unknown pmap normalize {}, expected one of {}'
+                             .format(normalize, ', '.join(NORMALIZE_METHODS)))
+        self._geometry = geometry
+        self._normalize = normalize
+        self._origin = np.array(geometry.origin, dtype=np.float64)
+        self._shape = np.array(geometry.shape, dtype=np.int64)
+        self._counts = np.zeros(int(np.prod(self._shape)), dtype=np.float64)
+        self._n_frames = 0
+        if sigma > 0.0:
+            radius = GAUSSIAN_CUTOFF * sigma / geometry.delta
+            stencil = np.array(index.sphere_grid_stencil(radius),
+                               dtype=np.int64)
+            weights = np.exp(-(stencil**2).sum(axis=1)
+                             * geometry.delta**2 / (2 * sigma**2))
+            self._stencil = stencil
+            self._weights = weights / weights.sum()
+        else:
+            self._stencil = None
+            self._weights = None
+
+    @property
+    def geometry(self) -> PmapGeometry:
+        """グリッドの配置"""
+        return self._geometry
+
+    @property
+    def n_frames(self) -> int:
+        """加算したフレーム数"""
+        return self._n_frames
+
+    def add_frame(self, positions: Sequence[Vector3f]) -> None:
+        """1フレーム分のプローブ重原子の座標をまとめて加算する.
+
+        Args:
+            positions: プローブ重原子の座標集合
+        """
+        self._n_frames += 1
+        if len(positions) == 0:
+            return
+        voxels = np.floor(
+            (np.asarray(positions, dtype=np.float64) - self._origin)
+            / self._geometry.delta).astype(np.int64)
+        if self._stencil is None:
+            weights = None
+        else:
+            # (原子数, ステンシルの要素数, 3)に広げて分配する
+            voxels = (voxels[:, np.newaxis, :]
+                      + self._stencil[np.newaxis, :, :]).reshape(-1, 3)
+            weights = np.tile(self._weights, len(positions))
+        inside = np.all((voxels >= 0) & (voxels < self._shape), axis=1)
+        ids = np.ravel_multi_index(tuple(voxels[inside].T),
+                                   self._geometry.shape)
+        np.add.at(self._counts, ids,
+                  1.0 if weights is None else weights[inside])
+
+    def get_counts(self) -> np.ndarray:
+        """全フレームのボクセル毎のプローブ重原子数の和を返す.
+        cpptrajで作成したDXファイルの値と同じ単位になる.
+
+        Returns:
+            1次元インデックス順(2軸->1軸->0軸の順にインクリメント)の
+            原子数
+        """
+        return self._counts.copy()
+
+    def get_values(self) -> np.ndarray:
+        """ボクセル毎の値を__init__のnormalizeの単位で返す.
+
+        Returns:
+            1次元インデックス順(2軸->1軸->0軸の順にインクリメント)の値
+        """
+        if (self._normalize == 'none') or (self._n_frames == 0):
+            return self.get_counts()
+        return self._counts / (self._n_frames * self._geometry.delta**3)
@@ -0,0 +1,129 @@
+"""保存したスコアから重みを変えて結果を出力し直す.
+トラジェクトリを読み込まずにall_info.txtとプローブ毎の*_info.txtを作成する.
+"""
+import argparse
+from collections.abc import Iterable, Sequence
+import os
+import pathlib
+import sys
+from .. import arguments
+from .. import chem
+from .. import common
+from . import calcmain
+from . import output
+from .main import create_score_weight, load_setting
+
+
+def reweight_main(root_dir: str | bytes | os.PathLike) -> None:
+    """再重み付けのエントリーポイント
+
+    Args:
+        root_dir: このプロジェクトのルートディレクトリのパス
+    """
+    parser = arguments.create_reweight_parser()
+    args = parser.parse_args()
+    try:
+        score_weight = create_reweight_score_weight(args)
+        reweight(args.out_dir, score_weight, args.verbose)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+
+
+def create_reweight_score_weight(args: argparse.Namespace
+                                 ) -> list[float | None] | None:
+    """コマンドライン引数から各スコアの重みを作成する.
+
+    Args:
+        args: arguments.create_reweight_parserで解析したコマンドライン引数
+    Returns:
+        calcmain.SCORE_NAMES順の重み, 指定のないスコアはNone.
+        どの重みも指定しない場合はNone
+    """
+    if args.setting is not None:
+        score_weight = list(create_score_weight(
+            load_setting(args.setting)['score']['weight']))
+    elif len(args.weight) > 0:
+        score_weight = [None, ] * len(calcmain.SCORE_NAMES)
+    else:
+        return None
+    for item in args.weight:
+        name, sep, value = item.partition('=')
+        if (sep == '') or (name not in calcmain.SCORE_NAMES):
+            raise ValueError('invalid weight {}, expected NAME=VALUE with '
+                             'NAME in {}'.format(
+                                 item, ', '.join(calcmain.SCORE_NAMES)))
+        score_weight[calcmain.SCORE_NAMES.index(name)] = float(value)
+    return score_weight
+
+
+def reweight(out_dir: str | bytes | os.PathLike,
+             score_weight: Sequence[float | None] | None = None,
+             verbose: bool = False) -> None:
+    """出力ディレクトリのscores.binから指定した重みで
+    all_info.txtとプローブ毎の*_info.txtを出力し直す.
+    同じ重みの場合はcalcmain.calc_mainの出力と同じになる.
+    scores.binの重みも更新する.
+
+    Args:
+        out_dir: calcmain.calc_mainの出力ディレクトリ
+        score_weight: calcmain.SCORE_NAMES順の重み,
+                      Noneの要素と, Noneの場合はすべての重みに
+                      scores.binに保存した重みを使う
+        verbose: 標準出力に詳細な処理情報を表示する場合はTrue
+    """
+    out_dir = pathlib.Path(out_dir)
+    with open(out_dir / calcmain.SCORE_RESULTS_FILE, 'rb') as f:
+        stored_weight, calculated, systems = output.read_score_results(f)
+    if len(stored_weight) != len(calcmain.SCORE_NAMES):
+        raise ValueError('unexpected number of scores {}'.format(
+            len(stored_weight)))
+    if score_weight is None:
+        score_weight = stored_weight
+    score_weight = tuple(w if w is not None else s
+                         for w, s in zip(score_weight, stored_weight))
+    missing = [name for name, w, c
+               in zip(calcmain.SCORE_NAMES, score_weight, calculated)
+               if (w != 0.0) and (not c)]
+    if len(missing) > 0:
+        raise ValueError(
+            'scores {} were not calculated, add them to '
+            'score.output_scores and run again'.format(', '.join(missing)))
+    if verbose:
+        print('weights: {}'.format(', '.join(
+            '{} = {}'.format(name, w)
+            for name, w in zip(calcmain.SCORE_NAMES, score_weight))))
+    n_patches = len(systems[0].scores[0]) if len(systems) > 0 else 0
+    mean_scores = [[0.0, ] * n_patches
+                   for _ in range((len(score_weight) + 1))]
+    n_all_frames = 0
+    for system in systems:
+        sum_score = calcmain.add_system_mean_scores(
+            mean_scores, system.scores, score_weight, system.n_frames)
+        n_all_frames += system.n_frames
+        chem.write_score_info_file(
+            out_dir / system.basename / (system.basename + '_info.txt'),
+            to_patch_scores(sum_score, system.scores))
+    for mean_score in mean_scores:
+        calcmain.mul_scaler_to_sequence(mean_score, 1.0 / n_all_frames)
+    calcmain.write_mean_score_info_file(out_dir / 'all_info.txt',
+                                        mean_scores)
+    # 読み込んだscores.binを書き込み途中で失わないように一時ファイルから置き換える
+    with common.atomic_open(out_dir / calcmain.SCORE_RESULTS_FILE) as f:
+        output.write_score_results(f, score_weight, calculated, systems)
+
+
+def to_patch_scores(sum_score: Iterable[float | None],
+                    results: Sequence[Iterable[float | None]]
+                    ) -> Iterable[chem.PatchScores]:
+    """パッチ毎の(スコア名称, スコア)の集合にする.
+
+    Args:
+        sum_score: パッチ毎の重み付きの和
+        results: スコアの種類毎のパッチ毎のスコア
+    Returns:
+        パッチ毎の(スコア名称, スコア)の集合
+    """
+    names = ('score', *calcmain.SCORE_NAMES)
+    return (tuple(zip(names, scores))
+            for scores in zip(sum_score, *results))
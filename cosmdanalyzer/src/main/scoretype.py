@@ -2,36 +2,119 @@
 from collections.abc import Callable, Collection, Iterable, Iterator, Sequence
 import itertools
 import math
+import random
 import statistics
+import time
+from typing import NamedTuple
+from .. import common
 from .. import solidcalc
 from ..scorecalc import convexity, compactness, protrusion, calcchargedensity
 from ..solidcalc.typehint import Sphere, Vector3f
 from . import fpocketscore
 
 
-class ScoreSize:
+class ExactDetail(NamedTuple):
+    """すべてのスコアを保持して詳細情報を厳密に計算する"""
+    pass
+
+
+class SketchDetail(NamedTuple):
+    """詳細情報を逐次的な統計量で計算する.
+    平均と分散はWelfordの方法, 最小値と最大値は厳密に,
+    四分位数はt-digestで近似する.
+
+    Attributes:
+        compression: t-digestの精度, 大きいほど精度が高く使用メモリが多い
+    """
+    compression: float = 200.0
+
+
+class ConvergenceInput(NamedTuple):
+    """フレーム毎のスコアの平均が収束した時点でフレームの計算を打ち切る.
+
+    Attributes:
+        tolerance: 重み付きスコアの平均の標準誤差の許容値
+        order: フレームをblock_size個ずつのブロックで計算する順番,
+               'random': 無作為な順番, 'strided': 一定間隔で飛ばした順番
+        seed: order='random'の乱数シード
+        block_size: 標準誤差を求めるブロック平均のフレーム番号の数
+        min_blocks: 収束を判定する前に計算するフレーム数のブロック数
+    """
+    tolerance: float
+    order: str = 'random'
+    seed: int = 0
+    block_size: int = 5
+    min_blocks: int = 4
+
+
+class SurfaceScoreState(NamedTuple):
+    """表面積を使うスコアの計算途中の状態
+
+    Attributes:
+        scores: パッチ毎のスコア
+        surface_check: 次に計算するフレームで全頂点との誤差を表示する場合はTrue
+    """
+    scores: tuple['MeanScore', ...]
+    surface_check: bool
+
+
+class _PatchScores:
+    """パッチ毎のスコアをMeanScoreで保持するスコアの共通部分.
+    派生クラスは__init__でパッチ毎のMeanScoreを_scoresに設定する.
+    """
+    _scores: tuple['MeanScore', ...]
+
+    def get_frame_result(self) -> Iterator[float | None]:
+        """最後に追加したフレームのスポット毎のスコアを返す
+
+        Returns:
+            スポット毎の最後に追加したフレームのスコア
+        """
+        for score in self._scores:
+            yield score.get_last_score()
+
+    def get_state(self) -> tuple['MeanScore', ...]:
+        """計算途中の状態を保存するためにパッチ毎のスコアを返す
+
+        Returns:
+            パッチ毎のスコア
+        """
+        return self._scores
+
+    def set_state(self, state: Sequence['MeanScore']) -> None:
+        """get_stateで保存した状態に戻す
+
+        Args:
+            state: get_stateで保存したパッチ毎のスコア
+        """
+        self._scores = tuple(state)
+
+
+class ScoreSize(_PatchScores):
     """複数のパッチの表面積のスコアを保持する"""
 
     def __init__(self,
                  patch_list: Sequence[Iterable[int]],
                  res_to_atoms: Callable[[int], Iterable[int]],
                  atom_to_vdw_radius: Callable[[int], float],
-                 resolution: int,
-                 calc_detail: bool = False):
+                 resolution: solidcalc.SurfaceResolution,
+                 calc_detail: bool | ExactDetail | SketchDetail = False):
         """
 
         Args:
             patch_list: パッチ毎に構成残基IDの集合を保持する
             res_to_atoms: 残基IDから構成原子IDの集合を返す関数
             atom_to_vdw_radius: 原子IDから原子半径を返す関数
-            resolution: 原子表面を多面体で近似するときの頂点数
-            calc_detail: 詳細情報を計算する場合はTrue
+            resolution: 原子表面を多面体で近似するときの頂点数,
+                        適応的な頂点数またはLCPO法の設定
+            calc_detail: 詳細情報を計算する場合はTrueまたは計算方法
         """
         self._scores = tuple(MeanScore(calc_detail) for _ in patch_list)
         self._res_to_atoms = res_to_atoms
         self._atom_to_radius = atom_to_vdw_radius
         self._patch_list = patch_list
         self._resolution = resolution
+        self._surface_check = _needs_surface_check(resolution)
 
     def add_frame(self, atom_to_pos: Callable[[int], Vector3f],
                   vdw_col_sphere: Callable[[int], Iterable[int]]) -> None:
@@ -42,13 +125,21 @@ class ScoreSize:
             vdw_col_sphere: 原子IDからファンデルワールス半径で見た場合に
                             衝突している原子ID集合を返す関数
         """
-        for score, patch_res_ids in zip(self._scores, self._patch_list):
-            score.add_score(sum(map(
-                solidcalc.create_one_area_in_multi_spheres_func(
-                    (lambda a: (atom_to_pos(a), self._atom_to_radius(a))),
-                    vdw_col_sphere, self._resolution),
-                _res_to_atom_iterator(patch_res_ids, self._res_to_atoms),
-            )))
+        def calc_areas(resolution: solidcalc.SurfaceResolution):
+            area_func = solidcalc.create_one_area_in_multi_spheres_func(
+                (lambda a: (atom_to_pos(a), self._atom_to_radius(a))),
+                vdw_col_sphere, resolution)
+            return [sum(map(area_func, _res_to_atom_iterator(
+                        patch_res_ids, self._res_to_atoms)))
+                    for patch_res_ids in self._patch_list]
+        if self._surface_check:
+            self._surface_check = False
+            areas = _calc_with_surface_check(
+                'size', calc_areas, self._resolution)
+        else:
+            areas = calc_areas(self._resolution)
+        for score, area in zip(self._scores, areas):
+            score.add_score(area)
 
     def get_result(self) -> Iterator[float]:
         """スポット毎の平均スコアを返す
@@ -70,20 +161,38 @@ class ScoreSize:
         for score in self._scores:
             yield score.get_detail_result()
 
+    def get_state(self) -> 'SurfaceScoreState':
+        """計算途中の状態を保存するためにパッチ毎のスコアと
+        誤差の表示が残っているかを返す
+
+        Returns:
+            パッチ毎のスコアと誤差の表示の状態
+        """
+        return SurfaceScoreState(super().get_state(), self._surface_check)
+
+    def set_state(self, state: 'SurfaceScoreState') -> None:
+        """get_stateで保存した状態に戻す
+
+        Args:
+            state: get_stateで保存したパッチ毎のスコアと誤差の表示の状態
+        """
+        super().set_state(state.scores)
+        self._surface_check = state.surface_check
 
-class ScoreProtrusion:
+
+class ScoreProtrusion(_PatchScores):
     """複数のパッチのProtrusionのスコアを保持する"""
 
     def __init__(self,
                  patch_list: Sequence[Iterable[int]],
                  res_to_atoms: Callable[[int], Iterable[int]],
-                 calc_detail: bool = False):
+                 calc_detail: bool | ExactDetail | SketchDetail = False):
         """
 
         Args:
             patch_list: パッチ毎に構成残基IDの集合を保持する
             res_to_atoms: 残基IDから構成原子IDの集合を返す関数
-            calc_detail: 詳細情報を計算する場合はTrue
+            calc_detail: 詳細情報を計算する場合はTrueまたは計算方法
         """
         self._scores = tuple(MeanScore(calc_detail) for _ in patch_list)
         self._res_to_atoms = res_to_atoms
@@ -130,7 +239,7 @@ class ScoreProtrusion:
             yield score.get_detail_result()
 
 
-class ScoreConvexity:
+class ScoreConvexity(_PatchScores):
     """複数のパッチのConvexityのスコアを保持する"""
 
     def __init__(self,
@@ -140,7 +249,7 @@ class ScoreConvexity:
                  atom_to_res: Callable[[int], int],
                  atom_to_weight: Callable[[int], float],
                  neighbor_residue_distance: float,
-                 calc_detail: bool = False):
+                 calc_detail: bool | ExactDetail | SketchDetail = False):
         """
 
         Args:
@@ -151,7 +260,7 @@ class ScoreConvexity:
             atom_to_weight: 原子IDから原子量を返す関数
             neighbor_residue_distance: 残基を隣接していると見なす
                                        最近傍原子中心間の距離
-            calc_detail: 詳細情報を計算する場合はTrue
+            calc_detail: 詳細情報を計算する場合はTrueまたは計算方法
         """
         self._scores = tuple(MeanScore(calc_detail) for _ in patch_list)
         self._res_to_atoms = res_to_atoms
@@ -205,19 +314,19 @@ class ScoreConvexity:
             yield score.get_detail_result()
 
 
-class ScoreCompactness:
+class ScoreCompactness(_PatchScores):
     """複数のパッチのCompactnessのスコアを保持する"""
 
     def __init__(self,
                  patch_list: Sequence[Iterable[int]],
                  res_to_atoms: Callable[[int], Iterable[int]],
-                 calc_detail: bool = False):
+                 calc_detail: bool | ExactDetail | SketchDetail = False):
         """
 
         Args:
             patch_list: パッチ毎に構成残基IDの集合を保持する
             res_to_atoms: 残基IDから構成原子IDの集合を返す関数
-            calc_detail: 詳細情報を計算する場合はTrue
+            calc_detail: 詳細情報を計算する場合はTrueまたは計算方法
         """
         self._scores = tuple(MeanScore(calc_detail) for _ in patch_list)
         self._res_to_atoms = res_to_atoms
@@ -261,7 +370,7 @@ class ScoreCompactness:
             yield score.get_detail_result()
 
 
-class ScoreChargeDensity:
+class ScoreChargeDensity(_PatchScores):
     """複数のパッチのcharge densityのスコアを保持する"""
 
     def __init__(self,
@@ -270,8 +379,8 @@ class ScoreChargeDensity:
                  atom_to_vdw_radius: Callable[[int], float],
                  solvent_radius: float,
                  atom_to_charge: Callable[[int], float],
-                 resolution: int,
-                 calc_detail: bool = False):
+                 resolution: solidcalc.SurfaceResolution,
+                 calc_detail: bool | ExactDetail | SketchDetail = False):
         """
 
         Args:
@@ -280,8 +389,9 @@ class ScoreChargeDensity:
             atom_to_vdw_radius: 原子IDから原子半径を返す関数
             solvent_radius: 溶媒半径
             atom_to_charge: 原子IDから電荷を返す関数
-            resolution: 原子表面を多面体で近似するときの頂点数
-            calc_detail: 詳細情報を計算する場合はTrue
+            resolution: 原子表面を多面体で近似するときの頂点数,
+                        適応的な頂点数またはLCPO法の設定
+            calc_detail: 詳細情報を計算する場合はTrueまたは計算方法
         """
         self._scores = tuple(MeanScore(calc_detail) for _ in patch_list)
         self._res_to_atoms = res_to_atoms
@@ -290,6 +400,7 @@ class ScoreChargeDensity:
         self._solvent_radius = solvent_radius
         self._atom_to_charge = atom_to_charge
         self._resolution = resolution
+        self._surface_check = _needs_surface_check(resolution)
 
     def add_frame(self, atom_to_pos: Callable[[int], Vector3f],
                   is_exposed_atom: Callable[[int], bool],
@@ -303,18 +414,30 @@ class ScoreChargeDensity:
             as_col_sphere: 原子IDから溶媒接触面で見た場合に
                            衝突している原子ID集合を返す関数
         """
-        for score, patch_res_ids in zip(self._scores, self._patch_list):
-            patch_atom_ids = itertools.chain.from_iterable(
-                map(self._res_to_atoms, patch_res_ids))
-            score.add_score(calcchargedensity.calc_atoms_charge_density(
-                filter(is_exposed_atom, patch_atom_ids),
+        patch_atoms = [
+            tuple(filter(is_exposed_atom, itertools.chain.from_iterable(
+                map(self._res_to_atoms, patch_res_ids))))
+            for patch_res_ids in self._patch_list]
+
+        def calc_densities(resolution: solidcalc.SurfaceResolution):
+            # 表面積を返す関数はすべてのパッチで共有し,
+            # LCPO法の場合は全パッチの原子の表面積をまとめて計算する
+            area_func = solidcalc.create_one_area_in_multi_spheres_func(
                 (lambda a: (atom_to_pos(a),
-                            self._atom_to_radius(a)
-                            + self._solvent_radius)),
-                self._atom_to_charge,
-                as_col_sphere,
-                self._resolution,
-            ))
+                            self._atom_to_radius(a) + self._solvent_radius)),
+                as_col_sphere, resolution,
+                itertools.chain.from_iterable(patch_atoms))
+            return [calcchargedensity.calc_atoms_charge_density_by_area(
+                        iter(atoms), self._atom_to_charge, area_func)
+                    for atoms in patch_atoms]
+        if self._surface_check:
+            self._surface_check = False
+            densities = _calc_with_surface_check(
+                'charge_density', calc_densities, self._resolution)
+        else:
+            densities = calc_densities(self._resolution)
+        for score, density in zip(self._scores, densities):
+            score.add_score(density)
 
     def get_result(self) -> Iterator[float]:
         """スポット毎の平均スコアを返す
@@ -336,15 +459,33 @@ class ScoreChargeDensity:
         for score in self._scores:
             yield score.get_detail_result()
 
+    def get_state(self) -> 'SurfaceScoreState':
+        """計算途中の状態を保存するためにパッチ毎のスコアと
+        誤差の表示が残っているかを返す
+
+        Returns:
+            パッチ毎のスコアと誤差の表示の状態
+        """
+        return SurfaceScoreState(super().get_state(), self._surface_check)
+
+    def set_state(self, state: 'SurfaceScoreState') -> None:
+        """get_stateで保存した状態に戻す
+
+        Args:
+            state: get_stateで保存したパッチ毎のスコアと誤差の表示の状態
+        """
+        super().set_state(state.scores)
+        self._surface_check = state.surface_check
 
-class ScoreFpocket:
+
+class ScoreFpocket(_PatchScores):
     """複数のパッチのfpocketのスコアを保持する"""
 
     def __init__(self,
                  hotspot_list: Sequence[Collection[Vector3f]],
                  grid_size: float,
                  rate_threshold: float,
-                 calc_detail: bool = False):
+                 calc_detail: bool | ExactDetail | SketchDetail = False):
         """
 
         Args:
@@ -352,7 +493,7 @@ class ScoreFpocket:
             grid_size:
             rate_threshold: [0,1]hotspotに含まれるfpocketの座標点の割合が
                             rate未満の場合は無視する.
-            calc_detail: 詳細情報を計算する場合はTrue
+            calc_detail: 詳細情報を計算する場合はTrueまたは計算方法
         """
         self._hotspot_list = hotspot_list
         self._grid_size = grid_size
@@ -397,20 +538,70 @@ class ScoreFpocket:
             yield score.get_detail_result()
 
 
+class SkippedScore:
+    """計算しないスコアの代わりに使う.
+    他のスコアと同じ方法で結果を取得でき, すべてのパッチの値をNoneとする.
+    """
+
+    def __init__(self, n_patches: int):
+        """
+
+        Args:
+            n_patches: パッチ数
+        """
+        self._n_patches = n_patches
+
+    def add_frame(self, *args, **kwargs) -> None:
+        """何もしない"""
+        pass
+
+    def get_result(self) -> Iterator[None]:
+        """パッチ毎にNoneを返す"""
+        return itertools.repeat(None, self._n_patches)
+
+    def get_frame_result(self) -> Iterator[None]:
+        """パッチ毎にNoneを返す"""
+        return itertools.repeat(None, self._n_patches)
+
+    def get_detail_result(self) -> Iterator[None]:
+        """パッチ毎にNoneを返す"""
+        return itertools.repeat(None, self._n_patches)
+
+    def get_state(self) -> tuple:
+        """保存する状態はないため空のタプルを返す"""
+        return tuple()
+
+    def set_state(self, state: Sequence) -> None:
+        """何もしない"""
+        pass
+
+
 class MeanScore:
     """複数のスコアの平均からなるスコアを管理する.
     Noneを無視する.
     """
 
-    def __init__(self, calc_detail: bool):
+    def __init__(self, calc_detail: bool | ExactDetail | SketchDetail):
         """
 
         Args:
-            calc_detail: 詳細情報も計算する場合はTrue
-        """
-        self._detail_buf = self._detail_buf = list() if calc_detail else None
+            calc_detail: 詳細情報も計算する場合はTrueまたは計算方法,
+                         TrueはExactDetailと同じ
+        """
+        if calc_detail is True:
+            calc_detail = ExactDetail()
+        self._detail_buf = (list() if isinstance(calc_detail, ExactDetail)
+                            else None)
+        if isinstance(calc_detail, SketchDetail):
+            self._detail_stats = common.RunningStats()
+            self._detail_sketch = common.QuantileSketch(
+                calc_detail.compression)
+        else:
+            self._detail_stats = None
+            self._detail_sketch = None
         self._num_scores = 0
         self._sum_scores = 0.0
+        self._last_score = None
 
     def add_score(self, new_score: float):
         """スコアを追加する
@@ -421,8 +612,35 @@ class MeanScore:
         if new_score is not None:
             self._sum_scores += new_score
             self._num_scores += 1
+            if self._detail_stats is not None:
+                self._detail_stats.add(new_score)
+                self._detail_sketch.add(new_score)
         if self._detail_buf is not None:
             self._detail_buf.append(new_score)
+        self._last_score = new_score
+
+    def merge(self, other: 'MeanScore') -> None:
+        """他のオブジェクトに追加されたスコアをすべて追加する.
+        詳細情報の計算方法は同じである必要がある.
+
+        Args:
+            other: 結合するオブジェクト
+        """
+        self._sum_scores += other._sum_scores
+        self._num_scores += other._num_scores
+        if self._detail_buf is not None:
+            self._detail_buf.extend(other._detail_buf)
+        if self._detail_stats is not None:
+            self._detail_stats.merge(other._detail_stats)
+            self._detail_sketch.merge(other._detail_sketch)
+
+    def get_last_score(self) -> float | None:
+        """最後に追加したスコアを返す.
+
+        Returns:
+            最後に追加したスコア, 追加していない場合はNone
+        """
+        return self._last_score
 
     def get_result(self) -> float | None:
         """スコアの平均を返す.
@@ -445,6 +663,15 @@ class MeanScore:
         """
         if self._num_scores == 0:
             return None
+        if self._detail_stats is not None:
+            return (self._sum_scores / self._num_scores,
+                    self._detail_stats.variance,
+                    self._detail_stats.min,
+                    self._detail_sketch.quantile(0.25),
+                    self._detail_sketch.quantile(0.5),
+                    self._detail_sketch.quantile(0.75),
+                    self._detail_stats.max,
+                    )
         sorted_score = sorted(self._detail_buf)
         return (self._sum_scores / self._num_scores,
                 statistics.variance(sorted_score),
@@ -456,6 +683,132 @@ class MeanScore:
                 )
 
 
+class ConvergenceMonitor:
+    """フレーム毎, パッチ毎のスコアの平均の収束を判定する.
+    スコアの種類毎, パッチ毎にフレーム番号をblock_size毎に区切った
+    ブロック平均から平均の標準誤差を求め,
+    重みを掛けた標準誤差がすべて許容値以下になった場合に収束したとみなす.
+    値が1つもないパッチのスコアと重みが0のスコアは判定に使わない.
+    """
+
+    def __init__(self,
+                 convergence_input: ConvergenceInput,
+                 score_weights: Sequence[float],
+                 n_patches: int,
+                 n_frames: int):
+        """
+
+        Args:
+            convergence_input: 収束判定の設定
+            score_weights: フレーム毎に計算するスコアの種類毎の重み
+            n_patches: パッチ数
+            n_frames: 全フレーム数
+        """
+        self._input = convergence_input
+        self._weights = tuple(score_weights)
+        self._n_frames = n_frames
+        self._stats = tuple(
+            tuple(common.BlockMeanStats(convergence_input.block_size)
+                  for _ in range(n_patches))
+            for _ in self._weights)
+        self._n_used = 0
+        self._converged = False
+
+    def frame_order(self) -> list[int]:
+        """フレームを計算する順番を返す.
+        フレーム番号をblock_size個ずつに区切ったブロックの順番を決め,
+        ブロック内のフレームは続けて計算する.
+
+        Returns:
+            フレーム番号の配列
+        """
+        block_size = self._input.block_size
+        n_blocks = -(-self._n_frames // block_size)
+        if self._input.order == 'random':
+            block_order = list(range(n_blocks))
+            random.Random(self._input.seed).shuffle(block_order)
+        elif self._input.order == 'strided':
+            stride = max(int(math.sqrt(n_blocks)), 1)
+            block_order = [i for start in range(stride)
+                           for i in range(start, n_blocks, stride)]
+        else:
+            raise ValueError(
+                'unknown frame order {}'.format(self._input.order))
+        return [i for block_idx in block_order
+                for i in range(block_idx * block_size,
+                               min((block_idx + 1) * block_size,
+                                   self._n_frames))]
+
+    def add_frame(self, scores: Iterable[Iterable[float | None]],
+                  frame_idx: int) -> bool:
+        """1フレーム分のスコアを追加して収束を判定する.
+        判定はmin_blocksブロック分のフレームを追加した後,
+        ブロックの最後のフレームを追加する毎に行う.
+
+        Args:
+            scores: スコアの種類毎のパッチ毎のスコア, 値がない場合はNone
+            frame_idx: フレーム番号, ブロックはフレーム番号順に作る
+        Returns:
+            収束した場合はTrue
+        """
+        for patch_stats, patch_scores in zip(self._stats, scores):
+            for stats, score in zip(patch_stats, patch_scores):
+                # 値がないフレームもブロックが揃ったことの判定に数える
+                stats.add(score, frame_idx)
+        self._n_used += 1
+        block_size = self._input.block_size
+        if ((self._n_used >= self._input.min_blocks * block_size)
+                and ((frame_idx + 1) % block_size == 0
+                     or frame_idx + 1 == self._n_frames)):
+            self._converged = self.get_error() <= self._input.tolerance
+        return self._converged
+
+    def get_error(self) -> float:
+        """重みを掛けた平均の標準誤差の最大値を返す.
+
+        Returns:
+            標準誤差の最大値, 求められないスコアがある場合はinf
+        """
+        max_error = 0.0
+        for weight, patch_stats in zip(self._weights, self._stats):
+            if weight == 0.0:
+                continue
+            for stats in patch_stats:
+                if stats.count == 0:
+                    continue
+                error = abs(weight) * stats.standard_error
+                if math.isnan(error):
+                    return math.inf
+                max_error = max(max_error, error)
+        return max_error
+
+    def get_state(self) -> tuple:
+        """計算途中の状態を保存するために収束判定の状態を返す
+
+        Returns:
+            収束判定の状態
+        """
+        return (self._stats, self._n_used, self._converged)
+
+    def set_state(self, state: tuple) -> None:
+        """get_stateで保存した状態に戻す
+
+        Args:
+            state: get_stateで保存した収束判定の状態
+        """
+        self._stats, self._n_used, self._converged = state
+
+    @property
+    def n_used_frames(self) -> int:
+        """追加したフレーム数"""
+        return self._n_used
+
+    @property
+    def converged(self) -> bool:
+        """収束した場合はTrue"""
+        return self._converged
+
+
 def sorted_percentile(sorted_data: Sequence[float], per: float):
     """ソート済み配列のパーセンタイルを計算する.
 
@@ -475,6 +828,69 @@ def sorted_percentile(sorted_data: Sequence[float], per: float):
             + sorted_data[first + 1] * second_rate)
 
 
+def merge_score_states(state: 'SurfaceScoreState | Sequence[MeanScore]',
+                       other: 'SurfaceScoreState | Sequence[MeanScore]'
+                       ) -> 'SurfaceScoreState | Sequence[MeanScore]':
+    """フレームの区間毎に計算したスコアのget_stateの状態を結合する.
+    stateのパッチ毎のスコアにotherのスコアを追加する.
+    誤差の表示はどちらかの区間で表示済みであれば表示済みとする.
+
+    Args:
+        state: 前の区間の状態, 計算しないスコアは空のタプル
+        other: 後の区間の状態
+    Returns:
+        結合した状態
+    """
+    if isinstance(state, SurfaceScoreState):
+        return SurfaceScoreState(
+            merge_score_states(state.scores, other.scores),
+            state.surface_check and other.surface_check)
+    for score, other_score in zip(state, other):
+        score.merge(other_score)
+    return state
+
+
+def _needs_surface_check(resolution: solidcalc.SurfaceResolution) -> bool:
+    """適応的な頂点数またはLCPO法の誤差を表示する設定の場合はTrueを返す."""
+    return (isinstance(resolution, (solidcalc.AdaptiveResolution,
+                                    solidcalc.LcpoArea))
+            and resolution.check)
+
+
+def _calc_with_surface_check(
+        name: str,
+        calc: Callable[[solidcalc.SurfaceResolution], list[float]],
+        resolution: solidcalc.AdaptiveResolution | solidcalc.LcpoArea,
+) -> list[float]:
+    """パッチ毎のスコアを計算し, 全頂点で計算したスコアとの誤差の最大値と
+    それぞれの計算時間を表示する.
+
+    Args:
+        name: 表示するスコアの名前
+        calc: 表面積の計算方法からパッチ毎のスコアを返す関数
+        resolution: 適応的な頂点数またはLCPO法の設定
+    Returns:
+        resolutionで計算したパッチ毎のスコア
+    """
+    start = time.perf_counter()
+    values = calc(resolution)
+    elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    fixed_values = calc(solidcalc.to_fixed_resolution(resolution))
+    fixed_elapsed = time.perf_counter() - start
+    errors = [abs(v - f) for v, f in zip(values, fixed_values)]
+    relative_errors = [e / abs(f) for e, f in zip(errors, fixed_values)
+                       if f != 0.0]
+    method = ('lcpo' if isinstance(resolution, solidcalc.LcpoArea)
+              else 'adaptive')
+    print('{} surface check ({}): max absolute error = {:.3e}, '
+          'max relative error = {:.3e}, time = {:.3f} s '
+          '(all points: {:.3f} s)'.format(
+              method, name, max(errors, default=0.0),
+              max(relative_errors, default=0.0), elapsed, fixed_elapsed))
+    return values
+
+
 def _res_to_atom_iterator(
         res_ids: Iterable[int], res_to_atom: Callable[[int], Iterable[int]]
 ) -> Iterator[int]:
@@ -5,7 +5,7 @@ import math
 from typing import NamedTuple, TypeVar
 from .. import clustering
 from .. import index
-from ..neighbors import vptree
+from ..neighbors import gridindex, vptree
 from ..solidcalc import vector3f
 from ..solidcalc.typehint import Vector3f
 from . import multicluster
@@ -113,7 +113,7 @@ def detect_multi_hotspots(
         multi_voxels: Iterable[tuple[Iterable[tuple[int, int, int]],
                                      Callable[[tuple[int, int, int]], float],
                                      float,
-                                     Iterable[Vector3f],
+                                     'Iterable[Vector3f] | ExposedHitMap',
                                      _ID]],
         voxel_to_pos: Callable[[tuple[int, int, int]], Vector3f],
         pos_threshold: float,
@@ -130,7 +130,8 @@ def detect_multi_hotspots(
                       (ボクセルのインデックス集合,
                        ボクセルインデックスから値を返す関数,
                        指定しきい値以上のボクセルのみ使用する,
-                       全フレームの露出原子の座標集合, 識別子)
+                       全フレームの露出原子の座標集合または
+                       ExposedHitMap, 識別子)
         voxel_to_pos: ボクセルのインデックスに対応する座標を返す関数
         pos_threshold: 溶媒露出原子からの距離が指定値以下のボクセルのみ使う
         clustering_input: クラスタリングアルゴリズムへの入力パラメータ
@@ -145,22 +146,97 @@ def detect_multi_hotspots(
         (ホットスポット毎のボクセルインデックス集合, 元クラスタのID集合)
     """
     multi_voxels = (
-        (filter(create_voxel_filter(to_v, threshold, voxel_to_pos,
-                                    atoms_pos, pos_threshold),
-                voxels),
+        (select_exposed_voxels(voxels, to_v, threshold, atoms_pos,
+                               voxel_to_pos, pos_threshold),
          to_v, i)
         for voxels, to_v, threshold, atoms_pos, i in multi_voxels)
+    return cluster_multi_hotspots(multi_voxels, clustering_input, expand,
+                                  idxs_box, voxel_width, marge_rate)
+
+
+def cluster_multi_hotspots(
+        multi_voxels: Iterable[tuple[Iterable[tuple[int, int, int]],
+                                     Callable[[tuple[int, int, int]], float],
+                                     _ID]],
+        clustering_input: SingleLinkageInput | DbscanInput | MeanShiftInput,
+        expand: float,
+        idxs_box: tuple[tuple[int, int, int], tuple[int, int, int]],
+        voxel_width: float,
+        marge_rate: float,
+) -> Iterator[tuple[tuple[tuple[int, int, int]], set[_ID]]]:
+    """選別済みの複数のボクセル集合を統合したホットスポットを捜査する.
+
+    Args:
+        multi_voxels: ボクセル集合毎に
+                      (使用するボクセルのインデックス集合,
+                       ボクセルインデックスから値を返す関数, 識別子)
+        clustering_input: クラスタリングアルゴリズムへの入力パラメータ
+                          単位はインデックス座標
+        expand: ホットスポットを指定距離分拡大する
+        idxs_box: ホットスポット拡大時のインデックスの許容範囲
+                  (開始点, 大きさ)で表され境界を含む
+        voxel_width: ボクセル1つあたりの幅
+        marge_rate: [0.0, 1.0]で表されこの率以上重複している
+                    クラスタ同士を結合する
+    Returns:
+        (ホットスポット毎のボクセルインデックス集合, 元クラスタのID集合)
+    """
     clusters = multi_clustering_voxels(
         multi_voxels, input_to_index_unit(clustering_input, voxel_width),
         marge_rate)
+    return ((expand_hotspot(cl, expand, idxs_box, voxel_width), ids)
+            for cl, ids in clusters)
+
+
+def expand_hotspot(
+        cluster: Iterable[tuple[int, int, int]],
+        expand: float,
+        idxs_box: tuple[tuple[int, int, int], tuple[int, int, int]],
+        voxel_width: float,
+) -> list[tuple[int, int, int]]:
+    """クラスタを拡大してホットスポットのボクセル集合にする.
+
+    Args:
+        cluster: クラスタのボクセルインデックス集合
+        expand: ホットスポットを指定距離分拡大する
+        idxs_box: ホットスポット拡大時のインデックスの許容範囲
+                  (開始点, 大きさ)で表され境界を含む
+        voxel_width: ボクセル1つあたりの幅
+    Returns:
+        昇順に並べたホットスポットのボクセルインデックス集合
+    """
     if expand > 0.0:
-        clusters = (
-            (index.expand_idxs_float(
-                cl, to_index_unit(expand, voxel_width), idxs_box),
-             ids)
-            for cl, ids in clusters
-        )
-    return ((sorted(cl), ids) for cl, ids in clusters)
+        cluster = index.expand_idxs_float(
+            cluster, to_index_unit(expand, voxel_width), idxs_box)
+    return sorted(cluster)
+
+
+def select_exposed_voxels(
+        voxels: Iterable[tuple[int, int, int]],
+        voxel_to_value: Callable[[tuple[int, int, int]], float],
+        voxel_threshold: float,
+        atoms_pos: 'Iterable[Vector3f] | ExposedHitMap',
+        voxel_to_pos: Callable[[tuple[int, int, int]], Vector3f],
+        pos_threshold: float,
+) -> Iterable[tuple[int, int, int]]:
+    """ホットスポットの検出に使うボクセルを選別する.
+
+    Args:
+        voxels: ボクセルのインデックス集合
+        voxel_to_value: インデックスに対応する値を返す関数
+        voxel_threshold: インデックスの値が指定値以上の場合のみ使用する
+        atoms_pos: 全フレームの露出原子の座標集合またはExposedHitMap
+        voxel_to_pos: ボクセルのインデックスに対応する座標を返す関数
+        pos_threshold: 溶媒露出原子からの距離が指定値以下のボクセルのみ使う
+    Returns:
+        voxelsの順番の選別したボクセル
+    """
+    if isinstance(atoms_pos, ExposedHitMap):
+        return select_hit_map_voxels(voxels, voxel_to_value, voxel_threshold,
+                                     atoms_pos, pos_threshold)
+    return filter(create_voxel_filter(voxel_to_value, voxel_threshold,
+                                      voxel_to_pos, atoms_pos, pos_threshold),
+                  voxels)
 
 
 def create_voxel_filter(
@@ -189,6 +265,94 @@ def create_voxel_filter(
             )
 
 
+class ExposedHitMap:
+    """溶媒露出原子の座標をボクセルと格子点を揃えた細かい格子に丸め,
+    いずれかのフレームで原子が丸められたセルのみを保持する.
+    保持するセル数はフレーム数によらず, 結果はフレームの順番によらない.
+    """
+
+    def __init__(self, origin: Vector3f, voxel_width: float, refine: int):
+        """
+
+        Args:
+            origin: インデックス(0, 0, 0)のボクセルの座標
+            voxel_width: ボクセル1つあたりの幅
+            refine: ボクセル1つあたりの各軸のセルの分割数
+        """
+        self._origin = origin
+        self._refine = refine
+        self._cell_width = voxel_width / refine
+        self._cells: set[tuple[int, int, int]] = set()
+
+    @property
+    def cell_width(self) -> float:
+        """セル1つあたりの幅"""
+        return self._cell_width
+
+    def __len__(self) -> int:
+        return len(self._cells)
+
+    def add_positions(self, positions: Iterable[Vector3f]) -> None:
+        """1フレーム分の溶媒露出原子の座標を追加する.
+
+        Args:
+            positions: 溶媒露出原子の座標集合
+        """
+        o0, o1, o2 = self._origin
+        w = self._cell_width
+        self._cells.update(
+            (round((p[0] - o0) / w), round((p[1] - o1) / w),
+             round((p[2] - o2) / w))
+            for p in positions)
+
+    def dilate(self, voxels: Iterable[tuple[int, int, int]],
+               distance: float) -> set[tuple[int, int, int]]:
+        """保持するセルを指定距離分膨張した領域に中心が含まれる
+        ボクセルを求める. 距離の判定はセル単位の整数座標で行う.
+
+        Args:
+            voxels: 対象のボクセルのインデックス集合
+            distance: セルの中心からの距離が指定値未満のボクセルを返す
+        Returns:
+            条件を満たすボクセルのインデックス集合
+        """
+        k = self._refine
+        radius = distance / self._cell_width
+        voxel_index = gridindex.LabeledGridIndex[tuple[int, int, int]](
+            ((v, (float(v[0] * k), float(v[1] * k), float(v[2] * k)))
+             for v in voxels),
+            radius)
+        return voxel_index.labels_in_radius(
+            ((float(c[0]), float(c[1]), float(c[2]))
+             for c in self._cells),
+            radius)
+
+
+def select_hit_map_voxels(
+        voxels: Iterable[tuple[int, int, int]],
+        voxel_to_value: Callable[[tuple[int, int, int]], float],
+        voxel_threshold: float,
+        hit_map: ExposedHitMap,
+        pos_threshold: float,
+) -> list[tuple[int, int, int]]:
+    """ホットスポットの検出に使うボクセルをExposedHitMapで選別する.
+    create_voxel_filterの溶媒露出原子の座標をセルの中心に丸めた結果になる.
+
+    Args:
+        voxels: ボクセルのインデックス集合
+        voxel_to_value: インデックスに対応する値を返す関数
+        voxel_threshold: インデックスの値が指定値以上の場合のみ使用する
+        hit_map: 全フレームの溶媒露出原子を追加したExposedHitMap
+        pos_threshold: 溶媒露出原子のセルからの距離が
+                       指定値未満のボクセルのみ使う
+    Returns:
+        voxelsの順番の選別したボクセル
+    """
+    candidates = [v for v in voxels if voxel_to_value(v) >= voxel_threshold]
+    selected = hit_map.dilate(candidates, pos_threshold)
+    return [v for v in candidates if v in selected]
+
+
 def multi_clustering_voxels(
         multi_voxels: Iterable[tuple[Iterable[tuple[int, int, int]],
                                      Callable[[tuple[int, int, int]], float],
@@ -211,24 +375,9 @@ def multi_clustering_voxels(
             multi_voxels, _distance_func,
             clustering_input.bandwidth, vector3f.add, vector3f.mul)
     else:
-        if isinstance(clustering_input, SingleLinkageInput):
-            cluster_func = (
-                lambda v, v_to_val:
-                clustering.single_linkage_3d(
-                    v_to_val, v, _indexed_distance_func,
-                    clustering_input.threshold,
-                    clustering_input.threshold, 1
-                )
-            )
-        elif isinstance(clustering_input, DbscanInput):
-            cluster_func = (
-                lambda v, _:
-                clustering.dbscan(
-                    v, _distance_func, clustering_input.epsilon,
-                    clustering_input.min_pts
-                )
-            )
-        cluster_itr = (zip(map(lambda c: tuple(c), cluster_func(v, v_to_val)),
+        cluster_itr = (zip(map(lambda c: tuple(c),
+                               clustering_voxels(v, v_to_val,
+                                                 clustering_input)),
                            itertools.repeat(i))
                        for v, v_to_val, i in multi_voxels)
         clusters = multicluster.marge_clusters(
@@ -273,6 +422,7 @@ def detect_frame_union_patches(
         res_to_atoms: Callable[[int], Iterable[int]],
         atom_to_pos_itr: Iterable[Callable[[int], Vector3f]],
         exposed_atoms_itr: Iterable[Iterable[int]],
+        res_order: Iterable[int] | None = None,
 ) -> Iterator[set[int]]:
     """すべてのフレームのパッチの和集合を求める.
 
@@ -282,6 +432,9 @@ def detect_frame_union_patches(
         res_to_atoms: 残基IDから構成原子ID集合を返す関数
         atom_to_pos_itr: フレーム毎の原子IDから原子座標への変換関数
         exposed_atoms_itr: フレーム毎の溶媒接触可能な原子のID集合を返す関数
+        res_order: パッチの残基集合に追加する残基の順番,
+                   溶媒接触可能な原子を含むすべての残基を含む.
+                   Noneの場合はexposed_atoms_itrの走査順
     Returns:
         ホットスポット毎に対応するスポットの残基ID集合
     """
@@ -298,21 +451,82 @@ def detect_frame_union_patches(
                 res_surface_atoms[res_id] = list()
             res_surface_atoms[res_id].extend(
                 map(atom_to_pos, res_to_atoms(res_id)))
-    res_trees: list[tuple[int, vptree.VpTree]] = list()
-    for res_id, res_atoms_pos in res_surface_atoms.items():
-        tree = vptree.VpTree(
-            res_atoms_pos,
-            lambda vl, vr: vector3f.norm(vector3f.sub(vl, vr)))
-        res_trees.append((res_id, tree))
     distance = 5.0
+    res_index = gridindex.LabeledGridIndex[int](
+        ((res_id, pos)
+         for res_id, res_atoms_pos in res_surface_atoms.items()
+         for pos in res_atoms_pos),
+        distance)
+    if res_order is None:
+        res_order = tuple(res_surface_atoms.keys())
+    else:
+        res_order = tuple(res_order)
     for hotspot in hotspots:
-        patch: set[int] = set()
-        for res_id, tree in res_trees:
-            for hotp in hotspot:
-                if tree.exists_neighbor(hotp, distance):
-                    patch.add(res_id)
-                    break
-        yield patch
+        found = res_index.labels_in_radius(hotspot, distance)
+        # 集合の列挙順を残基の走査順に揃える
+        yield set(filter(lambda r: r in found, res_order))
+
+
+def frame_surface_residues(
+        exposed_atoms: Iterable[int],
+        atom_to_res: Callable[[int], int],
+        res_to_atoms: Callable[[int], Iterable[int]],
+        atom_to_pos: Callable[[int], Vector3f],
+) -> Iterator[tuple[int, tuple[Vector3f, ...]]]:
+    """1フレームの溶媒接触可能な原子を含む残基と構成原子の座標を
+    溶媒接触可能な原子の走査順に列挙する.
+
+    Args:
+        exposed_atoms: 溶媒接触可能な原子のID集合
+        atom_to_res: 原子IDから残基IDへの変換関数
+        res_to_atoms: 残基IDから構成原子ID集合を返す関数
+        atom_to_pos: 原子IDから原子座標への変換関数
+    Returns:
+        (残基ID, 構成原子の座標集合)
+    """
+    searched_res: set[int] = set()
+    for atom in exposed_atoms:
+        res_id = atom_to_res(atom)
+        if res_id in searched_res:
+            continue
+        searched_res.add(res_id)
+        yield (res_id, tuple(map(atom_to_pos, res_to_atoms(res_id))))
+
+
+def detect_surface_union_patches(
+        hotspots: Iterable[Iterable[Vector3f]],
+        frame_surface_residues: Iterable[Iterable[tuple[int,
+                                                        Iterable[Vector3f]]]],
+) -> Iterator[set[int]]:
+    """すべてのフレームのパッチの和集合をフレーム毎に順番に求める.
+    detect_frame_union_patchesと同じ結果を返し,
+    保持するのはホットスポットと残基毎の対応のみとする.
+
+    Args:
+        hotspots: ホットスポット毎のボクセル座標集合
+        frame_surface_residues: フレーム毎の溶媒接触可能な原子を含む残基の
+                                (残基ID, 構成原子の座標集合)の集合,
+                                残基は溶媒接触可能な原子の走査順に並べる
+    Returns:
+        ホットスポット毎に対応するスポットの残基ID集合
+    """
+    hotspots = tuple(hotspots)
+    distance = 5.0
+    hotspot_index = gridindex.LabeledGridIndex[int](
+        ((i, pos) for i, hotspot in enumerate(hotspots) for pos in hotspot),
+        distance)
+    found: list[set[int]] = [set() for _ in hotspots]
+    # 残基の走査順
+    surface_res: dict[int, None] = dict()
+    for surface_residues in frame_surface_residues:
+        for res_id, res_atoms_pos in surface_residues:
+            surface_res[res_id] = None
+            for label in hotspot_index.labels_in_radius(res_atoms_pos,
+                                                        distance):
+                found[label].add(res_id)
+    for patch in found:
+        # 集合の列挙順を残基の走査順に揃える
+        yield set(filter(lambda r: r in patch, surface_res.keys()))
 
 
 def _distance_func(idx1: tuple[float, float, float],
@@ -0,0 +1,125 @@
+"""トラジェクトリを一定フレーム数ずつ読み込む省メモリの計算.
+1回目の読み込みでフレーム毎の溶媒露出原子を求めてホットスポットの候補ボクセルを
+選別し, 露出原子とパッチの判定に使う残基の座標を一時ファイルに書き出す.
+2回目の読み込みで一時ファイルの露出原子を使ってフレーム毎のスコアを計算する.
+"""
+from collections.abc import Callable, Iterable, Iterator
+import os
+import pickle
+import tempfile
+from typing import Any, NamedTuple
+from ..neighbors import gridindex
+from ..solidcalc.typehint import Vector3f
+
+
+class StreamInput(NamedTuple):
+    """トラジェクトリを一定フレーム数ずつ読み込む計算の設定
+
+    Attributes:
+        chunk_size: 一度に読み込むフレーム数
+        spill_dir: フレーム毎の情報を書き出す一時ファイルのディレクトリ,
+                   Noneの場合はシステムの既定のディレクトリ
+    """
+    chunk_size: int = 100
+    spill_dir: str | os.PathLike | None = None
+
+
+class FrameSpill:
+    """フレーム毎の情報を順番に書き出して先頭から読み直す一時ファイル.
+    ファイルは名前を持たず, 閉じるかプロセスが終了すると削除される.
+    """
+
+    def __init__(self, spill_dir: str | os.PathLike | None = None):
+        """
+
+        Args:
+            spill_dir: 一時ファイルのディレクトリ,
+                       Noneの場合はシステムの既定のディレクトリ
+        """
+        self._file = tempfile.TemporaryFile(dir=spill_dir)
+        self._n_frames = 0
+
+    def __len__(self) -> int:
+        return self._n_frames
+
+    def write(self, record: Any) -> None:
+        """1フレーム分の情報を末尾に追加する.
+
+        Args:
+            record: pickleで保存できる情報
+        """
+        pickle.dump(record, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._n_frames += 1
+
+    def __iter__(self) -> Iterator[Any]:
+        """先頭のフレームから順番に情報を読み込む.
+        同時に複数の読み込みはできない.
+        """
+        self._file.flush()
+        self._file.seek(0)
+        for _ in range(self._n_frames):
+            yield pickle.load(self._file)
+
+    def close(self) -> None:
+        """一時ファイルを削除する."""
+        self._file.close()
+
+
+class HotspotVoxelFilter:
+    """ホットスポットの検出に使うボクセルを選別する.
+    値がしきい値以上で, いずれかのフレームの溶媒露出原子から
+    指定距離未満のボクセルを, 露出原子の座標をフレーム毎に受け取って求める.
+    spot.create_voxel_filterと同じボクセルを選び,
+    保持するのは候補のボクセルのみとする.
+    """
+
+    def __init__(self,
+                 voxels: Iterable[tuple[int, int, int]],
+                 voxel_to_value: Callable[[tuple[int, int, int]], float],
+                 voxel_threshold: float,
+                 voxel_to_pos: Callable[[tuple[int, int, int]], Vector3f],
+                 pos_threshold: float):
+        """
+
+        Args:
+            voxels: ボクセルのインデックス集合
+            voxel_to_value: インデックスに対応する値を返す関数
+            voxel_threshold: インデックスの値が指定値以上の場合のみ使用する
+            voxel_to_pos: ボクセルのインデックスに対応する座標を返す関数
+            pos_threshold: 溶媒露出原子からの距離が指定値未満のボクセルのみ使う
+        """
+        self._voxel_to_pos = voxel_to_pos
+        self._pos_threshold = pos_threshold
+        self._candidates = [v for v in voxels
+                            if voxel_to_value(v) >= voxel_threshold]
+        self._selected: set[tuple[int, int, int]] = set()
+        self._index = self._create_index()
+
+    def _create_index(self) -> gridindex.LabeledGridIndex:
+        return gridindex.LabeledGridIndex[tuple[int, int, int]](
+            ((v, self._voxel_to_pos(v)) for v in self._candidates),
+            self._pos_threshold)
+
+    def add_frame(self, exposed_atoms_pos: Iterable[Vector3f]) -> None:
+        """1フレーム分の溶媒露出原子の座標を追加する.
+
+        Args:
+            exposed_atoms_pos: 溶媒露出原子の座標集合
+        """
+        found = self._index.labels_in_radius(exposed_atoms_pos,
+                                             self._pos_threshold)
+        if len(found) == 0:
+            return
+        self._selected.update(found)
+        # 選別済みのボクセルを以降の検索から除く
+        self._candidates = [v for v in self._candidates
+                            if v not in self._selected]
+        self._index = self._create_index()
+
+    def get_result(self) -> list[tuple[int, int, int]]:
+        """選別したボクセルを返す.
+
+        Returns:
+            インデックス順のボクセル
+        """
+        return sorted(self._selected)
@@ -0,0 +1,235 @@
+"""クラスタリングパラメータのスイープ.
+パラメータの組み合わせ毎のホットスポットを, 組み合わせによらない
+ボクセルの選別とプローブ毎のクラスタリング結果を共有して求める.
+"""
+from collections.abc import Callable, Hashable, Iterable, Mapping, Sequence
+import itertools
+import math
+from typing import NamedTuple, TypeVar
+from . import multicluster
+from . import spot
+
+
+_ID = TypeVar('_ID', bound=Hashable)
+
+# 値の範囲の終端の判定に使う許容誤差(刻み幅に対する比)
+RANGE_TOLERANCE = 1e-9
+
+
+class SweepPoint(NamedTuple):
+    """スイープするパラメータの1つの組み合わせ
+
+    occupancy: ボクセルの存在確率のしきい値
+    clustering_input: クラスタリングアルゴリズムへの入力パラメータ
+    spot_marge_rate: [0.0, 1.0]で表されこの率以上重複している
+                     異なるプローブのスポットを結合する
+    """
+    occupancy: float
+    clustering_input: (spot.SingleLinkageInput | spot.DbscanInput
+                       | spot.MeanShiftInput)
+    spot_marge_rate: float
+
+
+def expand_sweep_values(value: float | Sequence[float] | Mapping
+                        ) -> tuple[float, ...]:
+    """設定ファイルの1つのパラメータの値を値の集合に展開する.
+
+    Args:
+        value: 値, 値の配列または{start, stop, step}で表される
+               終端を含む範囲
+    Returns:
+        重複を除いた指定順の値の集合
+    """
+    if isinstance(value, Mapping):
+        start = value['start']
+        stop = value['stop']
+        step = value['step']
+        if step <= 0:
+            raise ValueError('sweep step must be positive')
+        n = math.floor((stop - start) / step + RANGE_TOLERANCE) + 1
+        if all(isinstance(v, int) for v in (start, stop, step)):
+            values = [start + i * step for i in range(n)]
+        else:
+            # 刻み幅の加算で生じる端数を設定ファイルの表記に揃える
+            values = [round(start + i * step, 10) for i in range(n)]
+    elif isinstance(value, Sequence) and not isinstance(value, str):
+        values = list(value)
+    else:
+        values = [value]
+    if len(values) == 0:
+        raise ValueError('sweep values must not be empty')
+    return tuple(dict.fromkeys(values))
+
+
+def create_sweep_points(
+        occupancy: float,
+        clustering_input: (spot.SingleLinkageInput | spot.DbscanInput
+                           | spot.MeanShiftInput),
+        spot_marge_rate: float,
+        sweep_setting: Mapping,
+) -> list[SweepPoint]:
+    """設定ファイルの[sweep]からパラメータの組み合わせを作成する.
+    指定のないパラメータは[clustering]の値を使う.
+
+    Args:
+        occupancy: [clustering]のボクセルの存在確率のしきい値
+        clustering_input: [clustering]のアルゴリズムへの入力パラメータ
+        spot_marge_rate: [clustering]のスポットを結合する重複率
+        sweep_setting: 設定ファイルの[sweep],
+                       occupancy, spot_marge_rate, アルゴリズムの
+                       パラメータ名をキーとする
+    Returns:
+        occupancy, アルゴリズムのパラメータ, spot_marge_rateの順に
+        変化させたすべての組み合わせ
+    """
+    param_names = clustering_input._fields
+    unknown = (set(sweep_setting.keys())
+               - {'occupancy', 'spot_marge_rate', *param_names})
+    if len(unknown) > 0:
+        raise ValueError('Unknown sweep parameter {}'.format(
+            ', '.join(sorted(unknown))))
+    occupancies = expand_sweep_values(
+        sweep_setting.get('occupancy', occupancy))
+    inputs = tuple(
+        type(clustering_input)(*values)
+        for values in itertools.product(*(
+            expand_sweep_values(sweep_setting.get(name, default))
+            for name, default in zip(param_names, clustering_input))))
+    marge_rates = expand_sweep_values(
+        sweep_setting.get('spot_marge_rate', spot_marge_rate))
+    return [SweepPoint(*p)
+            for p in itertools.product(occupancies, inputs, marge_rates)]
+
+
+class HotspotSweep:
+    """パラメータの組み合わせ毎にホットスポットを検出する.
+    ボクセルの選別は最も小さいoccupancyで1回だけ行い,
+    プローブ毎のクラスタリング結果と拡大したホットスポットは
+    同じ入力の組み合わせ間で再利用する.
+    """
+
+    def __init__(
+            self,
+            multi_voxels: Iterable[tuple[Iterable[tuple[int, int, int]],
+                                         Callable[[tuple[int, int, int]],
+                                                  float],
+                                         int, _ID]],
+            expand: float,
+            idxs_box: tuple[tuple[int, int, int], tuple[int, int, int]],
+            voxel_width: float,
+    ):
+        """
+
+        Args:
+            multi_voxels: プローブ毎に
+                          (すべての組み合わせの最も小さいoccupancyで
+                           選別済みのボクセルのインデックス集合,
+                           ボクセルインデックスから値を返す関数,
+                           プローブの水素以外の原子数, 識別子)
+            expand: ホットスポットを指定距離分拡大する
+            idxs_box: ホットスポット拡大時のインデックスの許容範囲
+                      (開始点, 大きさ)で表され境界を含む
+            voxel_width: ボクセル1つあたりの幅
+        """
+        self._systems = tuple((tuple(voxels), to_v, n_heavy, i)
+                              for voxels, to_v, n_heavy, i in multi_voxels)
+        self._expand = expand
+        self._idxs_box = idxs_box
+        self._voxel_width = voxel_width
+        self._voxels: dict[tuple[int, float],
+                           tuple[tuple[int, int, int], ...]] = dict()
+        self._clusters: dict[tuple[int, float, Hashable],
+                             tuple[tuple[tuple[int, int, int], ...],
+                                   ...]] = dict()
+        self._hotspots: dict[frozenset[tuple[int, int, int]],
+                             tuple[tuple[int, int, int], ...]] = dict()
+
+    def detect(self, point: SweepPoint
+               ) -> list[tuple[tuple[tuple[int, int, int], ...], set[_ID]]]:
+        """1つの組み合わせのホットスポットを検出する.
+        calcmain.calc_mainで同じパラメータを指定した場合と同じ結果を返す.
+
+        Args:
+            point: パラメータの組み合わせ
+        Returns:
+            (ホットスポット毎のボクセルインデックス集合, 元クラスタのID集合)
+        """
+        index_input = spot.input_to_index_unit(point.clustering_input,
+                                               self._voxel_width)
+        if isinstance(index_input, spot.MeanShiftInput):
+            clusters = spot.multi_clustering_voxels(
+                ((self._select(k, point.occupancy), to_v, i)
+                 for k, (_, to_v, _, i) in enumerate(self._systems)),
+                index_input, point.spot_marge_rate)
+        else:
+            clusters = multicluster.marge_clusters(
+                tuple(
+                    (cl, i)
+                    for k, (_, _, _, i) in enumerate(self._systems)
+                    for cl in self._cluster(k, point.occupancy, index_input)),
+                point.spot_marge_rate)
+        return [(self._expand_hotspot(cl), ids) for cl, ids in clusters]
+
+    def _select(self, system_idx: int, occupancy: float
+                ) -> tuple[tuple[int, int, int], ...]:
+        key = (system_idx, occupancy)
+        ret = self._voxels.get(key)
+        if ret is None:
+            voxels, to_v, n_heavy, _ = self._systems[system_idx]
+            # calc_mainのしきい値と同じ計算で比較する
+            threshold = occupancy * n_heavy
+            ret = tuple(v for v in voxels if to_v(v) >= threshold)
+            self._voxels[key] = ret
+        return ret
+
+    def _cluster(self, system_idx: int, occupancy: float,
+                 index_input: spot.SingleLinkageInput | spot.DbscanInput
+                 ) -> tuple[tuple[tuple[int, int, int], ...], ...]:
+        key = (system_idx, occupancy, index_input)
+        ret = self._clusters.get(key)
+        if ret is None:
+            to_v = self._systems[system_idx][1]
+            ret = tuple(tuple(cl) for cl in spot.clustering_voxels(
+                self._select(system_idx, occupancy), to_v,
+                index_input))
+            self._clusters[key] = ret
+        return ret
+
+    def _expand_hotspot(self, cluster: Iterable[tuple[int, int, int]]
+                        ) -> tuple[tuple[int, int, int], ...]:
+        cluster = tuple(cluster)
+        key = frozenset(cluster)
+        ret = self._hotspots.get(key)
+        if ret is None:
+            ret = tuple(spot.expand_hotspot(
+                cluster, self._expand, self._idxs_box, self._voxel_width))
+            self._hotspots[key] = ret
+        return ret
+
+
+def unique_hotspots(
+        multi_hotspots: Iterable[Iterable[Sequence[tuple[int, int, int]]]]
+) -> tuple[list[Sequence[tuple[int, int, int]]], list[list[int]]]:
+    """組み合わせ毎のホットスポットから重複を除く.
+
+    Args:
+        multi_hotspots: 組み合わせ毎のホットスポットのボクセル集合
+    Returns:
+        (最初に現れた順の重複のないホットスポット,
+         組み合わせ毎の重複のないホットスポットの番号)
+    """
+    hotspot_to_idx: dict[tuple[tuple[int, int, int], ...], int] = dict()
+    hotspots: list[Sequence[tuple[int, int, int]]] = []
+    point_idxs: list[list[int]] = []
+    for point_hotspots in multi_hotspots:
+        idxs = []
+        for hotspot in point_hotspots:
+            key = tuple(hotspot)
+            i = hotspot_to_idx.get(key)
+            if i is None:
+                i = len(hotspots)
+                hotspot_to_idx[key] = i
+                hotspots.append(hotspot)
+            idxs.append(i)
+        point_idxs.append(idxs)
+    return hotspots, point_idxs
@@ -0,0 +1,418 @@
+"""共有ファイルシステム上のディレクトリをキューとする分散計算.
+coordinatorがホットスポットとパッチを求めてフレームの区間毎のタスクを作成し,
+任意のノードのworkerがタスクを取得してフレーム毎のスコアを計算し,
+reduceが計算結果を結合して出力する.
+タスクの取得はファイルの移動(rename)で行うため, 同時に1つのworkerのみ取得できる.
+workerは計算中のタスクファイルの更新時刻を一定間隔で更新し,
+requeueは更新が途絶えたタスクのみ未取得に戻す.
+状態と計算結果はcheckpoint.Checkpointで出力ディレクトリに保存する.
+"""
+import argparse
+from collections.abc import Callable, Iterable, Sequence
+import os
+import pathlib
+import pickle
+import socket
+import sys
+import threading
+import time
+from typing import NamedTuple
+from .. import arguments
+from .. import common
+from .main import create_calc_main_args
+
+
+# 計算途中の状態の保存間隔(フレーム数), キューでは使わないため任意の値でよい
+QUEUE_CHECKPOINT_INTERVAL = 100
+# workerが計算中のタスクファイルの更新時刻を更新する間隔(秒)
+HEARTBEAT_INTERVAL = 60.0
+# requeueで戻すタスクの更新時刻の経過秒数の既定値, 更新間隔の10回分
+REQUEUE_OLDER_THAN = 10 * HEARTBEAT_INTERVAL
+
+
+class QueueTask(NamedTuple):
+    """1プローブのフレームの区間のスコア計算
+
+    Attributes:
+        system_idx: プローブの番号
+        start: 最初のフレーム(コンフォマー)の番号
+        stop: このフレーム番号より前のフレームを計算する
+    """
+    system_idx: int
+    start: int
+    stop: int
+
+    @property
+    def name(self) -> str:
+        """タスクファイルと計算結果の名前"""
+        return 'system{}_chunk{}-{}'.format(
+            self.system_idx, self.start, self.stop)
+
+
+def queue_main(root_dir: str | bytes | os.PathLike) -> None:
+    """分散計算のエントリーポイント
+
+    Args:
+        root_dir: このプロジェクトのルートディレクトリのパス
+    """
+    args = arguments.create_queue_parser().parse_args()
+    if args.command == 'coordinator':
+        tasks = coordinate(args, root_dir, args.chunk_size)
+        print('{} tasks'.format(len(tasks)))
+    elif args.command == 'worker':
+        n_tasks = work(args.out_dir, args.max_tasks)
+        print('{} tasks done'.format(n_tasks))
+    elif args.command == 'reduce':
+        missing = reduce(args.out_dir)
+        if len(missing) > 0:
+            print('{} tasks are not done: {}'.format(
+                len(missing), ', '.join(t.name for t in missing)),
+                file=sys.stderr)
+            sys.exit(1)
+    elif args.command == 'requeue':
+        n_tasks = requeue(args.out_dir, args.older_than)
+        print('{} tasks requeued'.format(n_tasks))
+
+
+def coordinate(args: argparse.Namespace,
+               root_dir: str | bytes | os.PathLike,
+               chunk_size: int) -> list[QueueTask]:
+    """露出原子, ホットスポット, パッチを求めて保存し, タスクを作成する.
+    再実行した場合は保存済みの状態を使い, 終了済みと取得済みのタスクは
+    作成しない.
+
+    Args:
+        args: 計算に使うコマンドライン引数
+        root_dir: このプロジェクトのルートディレクトリのパス
+        chunk_size: 1タスクで計算するフレーム数
+    Returns:
+        すべてのタスク
+    """
+    from . import calcmain
+    if chunk_size < 1:
+        raise ValueError('chunk_size must be positive')
+    # 他のノードのworkerが作業ディレクトリによらず読み込めるように絶対パスにする
+    args.out_dir = args.out_dir.resolve()
+    args.src_dir = args.src_dir.resolve()
+    if args.setting is not None:
+        args.setting = args.setting.resolve()
+    root_dir = os.path.abspath(root_dir)
+    args.resume = True
+    args.checkpoint_interval = QUEUE_CHECKPOINT_INTERVAL
+    calc_args = create_calc_main_args(args, root_dir)
+    if calc_args['convergence_input'] is not None:
+        raise ValueError('convergence is not supported in the work queue')
+    if calc_args['output_frame_scores']:
+        raise ValueError(
+            '--output_frame_scores is not supported in the work queue')
+    if calc_args['sweep_points'] is not None:
+        raise ValueError('sweep is not supported in the work queue')
+    if calc_args['pmap_input'] is not None:
+        raise ValueError('pmap is not supported in the work queue')
+    calcmain.calc_main(**calc_args, prepare_only=True)
+    queue_dir = _queue_dir(args.out_dir)
+    for sub_dir in ('todo', 'running', 'done'):
+        os.makedirs(queue_dir / sub_dir, exist_ok=True)
+    _atomic_write(queue_dir / 'job.pkl', pickle.dumps((args, root_dir)))
+    store = calc_args['checkpoint_store']
+    tasks: list[QueueTask] = []
+    for i in range(len(calc_args['src_system_infos'])):
+        n_frames = len(store.load('system{}_exposed'.format(i))[0])
+        for start in range(0, n_frames, chunk_size):
+            tasks.append(QueueTask(i, start, min(start + chunk_size,
+                                                 n_frames)))
+    for task in tasks:
+        if any((queue_dir / d / task.name).exists()
+               for d in ('todo', 'running', 'done')):
+            continue
+        _atomic_write(queue_dir / 'todo' / task.name,
+                      '{} {} {}\n'.format(*task).encode('ascii'))
+    # タスク一覧はすべてのタスクを作成した後に書き込む
+    _atomic_write(queue_dir / 'tasks.txt', ''.join(
+        '{} {} {}\n'.format(*task) for task in tasks).encode('ascii'))
+    return tasks
+
+
+def work(out_dir: str | bytes | os.PathLike,
+         max_tasks: int | None = None) -> int:
+    """未取得のタスクがなくなるまでタスクを取得して計算する.
+
+    Args:
+        out_dir: coordinatorの出力ディレクトリ
+        max_tasks: 計算するタスク数の上限, Noneの場合は制限しない
+    Returns:
+        計算したタスク数
+    """
+    queue_dir = _queue_dir(out_dir)
+    calc_args = _load_calc_args(queue_dir)
+    store = calc_args['checkpoint_store']
+    system_cache: dict[int, tuple] = dict()
+    n_done = 0
+    while (max_tasks is None) or (n_done < max_tasks):
+        task = claim_task(queue_dir)
+        if task is None:
+            break
+        if task.system_idx not in system_cache:
+            system_cache.clear()
+            system_cache[task.system_idx] = (
+                store.load('system{}_exposed'.format(task.system_idx))[0],
+                store.load('system{}_patches'.format(task.system_idx)))
+        exposed_atoms, patch_list = system_cache[task.system_idx]
+        with TaskHeartbeat(queue_dir / 'running' / task.name):
+            state = calc_task(calc_args, task, exposed_atoms, patch_list)
+        store.save(task.name, state)
+        if not finish_task(queue_dir, task):
+            print('task {} was finished by another worker'.format(task.name),
+                  file=sys.stderr)
+        n_done += 1
+    return n_done
+
+
+class TaskHeartbeat:
+    """計算中のタスクファイルの更新時刻を別スレッドで一定間隔で更新する.
+    requeueで戻されてファイルがなくなった場合は更新をやめる.
+    """
+
+    def __init__(self, path: pathlib.Path,
+                 interval: float = HEARTBEAT_INTERVAL):
+        """
+
+        Args:
+            path: queue/running内のタスクファイルのパス
+            interval: 更新間隔(秒)
+        """
+        self._path = path
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self) -> 'TaskHeartbeat':
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self._interval):
+            try:
+                os.utime(self._path)
+            except FileNotFoundError:
+                return
+
+
+def finish_task(queue_dir: pathlib.Path, task: QueueTask) -> bool:
+    """計算を終えたタスクのファイルをdoneに移動する.
+    requeueでtodoに戻されていた場合はtodoから移動する.
+    他のworkerが取得し直していた場合はそのファイルを移動し,
+    他のworkerが既に移動していた場合は何もしない.
+    計算結果は同じタスクであれば同じため, どのworkerの結果を使ってもよい.
+
+    Args:
+        queue_dir: キューのディレクトリ
+        task: 計算を終えたタスク
+    Returns:
+        移動した場合はTrue, 既にdoneにあった場合はFalse
+    """
+    for sub_dir in ('running', 'todo'):
+        try:
+            os.replace(queue_dir / sub_dir / task.name,
+                       queue_dir / 'done' / task.name)
+        except FileNotFoundError:
+            continue
+        return True
+    return False
+
+
+def claim_task(queue_dir: pathlib.Path) -> QueueTask | None:
+    """未取得のタスクを1つ取得する.
+    タスクファイルをtodoからrunningに移動できた場合に取得したとみなす.
+
+    Args:
+        queue_dir: キューのディレクトリ
+    Returns:
+        取得したタスク, 未取得のタスクがない場合はNone
+    """
+    while True:
+        names = sorted(os.listdir(queue_dir / 'todo'))
+        if len(names) == 0:
+            return None
+        for name in names:
+            running_path = queue_dir / 'running' / name
+            try:
+                os.rename(queue_dir / 'todo' / name, running_path)
+            except FileNotFoundError:
+                # 他のworkerが取得した
+                continue
+            with open(running_path, 'r+') as f:
+                task = QueueTask(*map(int, f.readline().split()))
+                f.seek(0, os.SEEK_END)
+                f.write('{} {}\n'.format(socket.gethostname(), os.getpid()))
+            return task
+
+
+def calc_task(calc_args: dict,
+              task: QueueTask,
+              exposed_atoms: Sequence[Iterable[int]],
+              patch_list: Sequence[set[int]]) -> tuple:
+    """1タスクのフレーム毎のスコアを計算する.
+    トラジェクトリはタスクのフレームのみ読み込む.
+
+    Args:
+        calc_args: calcmain.calc_mainの引数
+        task: タスク
+        exposed_atoms: プローブの全フレームの露出原子
+        patch_list: プローブのパッチ
+    Returns:
+        フレーム毎のスコアの計算途中の状態
+    """
+    from .. import chem
+    from . import calcmain
+    from . import input
+    info = calc_args['src_system_infos'][task.system_idx]
+    pdb_str, _ = input.trajectory_pdb_files_filter(
+        info.pdbs,
+        create_chunk_frame_filter(
+            calcmain.create_system_frame_filter(
+                info, calc_args['frame_selection']),
+            task.start, task.stop))
+    mol = chem.create_mol_from_pdb_str(pdb_str)
+    protein_idxs = tuple(mol.get_atom_idxs())
+    res_to_atoms = calcmain.create_res_to_atoms(
+        mol.divide_to_residue(protein_idxs))
+    scores = calcmain.calc_frame_scores(
+        mol, protein_idxs, res_to_atoms, patch_list,
+        exposed_atoms[task.start:task.stop],
+        calc_args['solvent_radius'], calc_args['output_detail'],
+        (calc_args['surface_input'] if calc_args['surface_input'] is not None
+         else calc_args['resolution']),
+        calc_args['charge_path'], False,
+        None, calc_args['detail_input'], None, None,
+        calcmain.select_active_scores(
+            calc_args['score_weight'], calc_args['output_scores']))
+    return tuple(score.get_state() for score in scores)
+
+
+def create_chunk_frame_filter(frame_filter: Callable[[int], bool] | None,
+                              start: int, stop: int
+                              ) -> Callable[[int], bool]:
+    """frame_filterで選択したフレームのうちstart番目からstop番目より前の
+    フレームを選択する関数を作成する.
+    作成した関数はフレーム番号の昇順に1度ずつ呼び出す必要がある.
+
+    Args:
+        frame_filter: フレームの選択, Noneの場合はすべてのフレーム
+        start: 選択したフレームの中の最初の番号
+        stop: 選択したフレームの中でこの番号より前を選択する
+    Returns:
+        フレーム番号を選択する場合はTrueを返す関数
+    """
+    n_selected = 0
+
+    def _is_selected(frame_idx: int) -> bool:
+        nonlocal n_selected
+        if (frame_filter is not None) and (not frame_filter(frame_idx)):
+            return False
+        n_selected += 1
+        return start < n_selected <= stop
+    return _is_selected
+
+
+def reduce(out_dir: str | bytes | os.PathLike) -> list[QueueTask]:
+    """すべてのタスクの計算結果をプローブ毎に結合して結果を出力する.
+    トラジェクトリは出力に使う各プローブの最後のフレームのみ読み込む.
+
+    Args:
+        out_dir: coordinatorの出力ディレクトリ
+    Returns:
+        終了していないタスク, ある場合は出力しない
+    """
+    from . import calcmain
+    queue_dir = _queue_dir(out_dir)
+    calc_args = _load_calc_args(queue_dir)
+    with open(queue_dir / 'tasks.txt') as f:
+        tasks = [QueueTask(*map(int, line.split())) for line in f]
+    missing = [t for t in tasks if not (queue_dir / 'done' / t.name).exists()]
+    if len(missing) > 0:
+        return missing
+    store = calc_args['checkpoint_store']
+    for system_idx in sorted(set(t.system_idx for t in tasks)):
+        system_tasks = sorted((t for t in tasks if t.system_idx == system_idx),
+                              key=(lambda t: t.start))
+        state = merge_frame_score_states(
+            [store.load(t.name) for t in system_tasks])
+        # calc_mainのフレーム毎のスコアの計算を終了済みの状態にする
+        store.save('system{}_frame_scores'.format(system_idx),
+                   (system_tasks[-1].stop, True, state, None))
+    calcmain.calc_main(**calc_args, reduce_only=True)
+    return []
+
+
+def merge_frame_score_states(states: Sequence[tuple]) -> tuple:
+    """フレームの区間毎のスコアの計算途中の状態を結合する.
+
+    Args:
+        states: フレームの順番に並べた計算途中の状態
+    Returns:
+        結合した状態
+    """
+    from . import scoretype
+    from ..scorecalc import rmsf
+    merged = states[0]
+    for state in states[1:]:
+        # RMSF以外はscoretypeのスコア, 最後はrmsf.AllPatchRmsfCalcの状態
+        merged = (*(scoretype.merge_score_states(merged_scores, scores)
+                    for merged_scores, scores
+                    in zip(merged[:-1], state[:-1])),
+                  rmsf.merge_states(merged[-1], state[-1]))
+    return merged
+
+
+def requeue(out_dir: str | bytes | os.PathLike,
+            older_than: float = REQUEUE_OLDER_THAN) -> int:
+    """取得済みで終了していないタスクのうち,
+    workerによる更新が途絶えたタスクを未取得に戻す.
+    異常終了したworkerのタスクを再計算する場合に使う.
+
+    Args:
+        out_dir: coordinatorの出力ディレクトリ
+        older_than: タスクファイルの更新時刻から指定秒数以上経過した
+                    タスクのみ戻す, 計算中のタスクを戻さないように
+                    HEARTBEAT_INTERVALより十分大きくする
+    Returns:
+        戻したタスク数
+    """
+    if older_than <= HEARTBEAT_INTERVAL:
+        raise ValueError('older_than must be greater than the heartbeat '
+                         'interval of {} seconds'.format(HEARTBEAT_INTERVAL))
+    queue_dir = _queue_dir(out_dir)
+    now = time.time()
+    n_tasks = 0
+    for name in sorted(os.listdir(queue_dir / 'running')):
+        path = queue_dir / 'running' / name
+        try:
+            if now - path.stat().st_mtime < older_than:
+                continue
+            os.rename(path, queue_dir / 'todo' / name)
+        except FileNotFoundError:
+            continue
+        n_tasks += 1
+    return n_tasks
+
+
+def _queue_dir(out_dir: str | bytes | os.PathLike) -> pathlib.Path:
+    return pathlib.Path(out_dir) / 'queue'
+
+
+def _load_calc_args(queue_dir: pathlib.Path) -> dict:
+    """coordinatorが保存したコマンドライン引数からcalc_mainの引数を作成する."""
+    with open(queue_dir / 'job.pkl', 'rb') as f:
+        args, root_dir = pickle.load(f)
+    return create_calc_main_args(args, root_dir)
+
+
+def _atomic_write(path: pathlib.Path, data: bytes) -> None:
+    """一時ファイルに書き込んでから置き換える."""
+    with common.atomic_open(path) as f:
+        f.write(data)
@@ -0,0 +1,119 @@
+"""ラベル付き点集合に対する一様グリッドによる近傍探索"""
+from collections.abc import Hashable, Iterable, Iterator
+import math
+from typing import Generic, TypeVar
+from ..solidcalc.typehint import Vector3f
+
+
+_L = TypeVar("_L", bound=Hashable)
+
+
+class LabeledGridIndex(Generic[_L]):
+    """ラベル付きの3次元座標集合を一様グリッドで保持し,
+    指定半径内に点を持つラベルの集合を検索する.
+    """
+
+    def __init__(self, labeled_points: Iterable[tuple[_L, Vector3f]],
+                 cell_width: float):
+        """
+
+        Args:
+            labeled_points: (ラベル, 座標)の集合
+            cell_width: グリッド1セルの幅,
+                        検索半径と同程度の値を指定すると効率が良い
+        """
+        self._width = cell_width
+        self._cells: dict[tuple[int, int, int],
+                          list[tuple[Vector3f, _L]]] = dict()
+        self._label_box: dict[_L, tuple[list[float], list[float]]] = dict()
+        for label, pos in labeled_points:
+            cell = self._to_cell(pos)
+            if cell in self._cells:
+                self._cells[cell].append((pos, label))
+            else:
+                self._cells[cell] = [(pos, label), ]
+            if label in self._label_box:
+                b_min, b_max = self._label_box[label]
+                for i in range(3):
+                    if pos[i] < b_min[i]:
+                        b_min[i] = pos[i]
+                    if pos[i] > b_max[i]:
+                        b_max[i] = pos[i]
+            else:
+                self._label_box[label] = (list(pos), list(pos))
+
+    def labels(self) -> Iterator[_L]:
+        """保持しているラベルを列挙する.
+
+        Returns:
+            ラベルのイテレータ
+        """
+        return iter(self._label_box.keys())
+
+    def labels_near_box(self, box_min: Vector3f, box_max: Vector3f,
+                        distance: float) -> set[_L]:
+        """点集合の外接直方体が指定直方体から
+        指定距離以内にあるラベルを返す.
+
+        Args:
+            box_min: 直方体の最小点
+            box_max: 直方体の最大点
+            distance: 直方体を各軸方向に拡大する距離
+        Returns:
+            条件を満たすラベルの集合
+        """
+        ret: set[_L] = set()
+        for label, (b_min, b_max) in self._label_box.items():
+            for i in range(3):
+                if ((b_min[i] > box_max[i] + distance)
+                        or (b_max[i] < box_min[i] - distance)):
+                    break
+            else:
+                ret.add(label)
+        return ret
+
+    def labels_in_radius(self, queries: Iterable[Vector3f],
+                         thresthold: float) -> set[_L]:
+        """いずれかの検索点から指定距離未満の点を持つラベルの集合を返す.
+        距離の判定はvector3f.norm(vector3f.sub(query, pos)) < thresthold
+        と同じ結果になる.
+
+        Args:
+            queries: 検索点の集合
+            thresthold: 指定距離未満の点のみ対象とする
+        Returns:
+            条件を満たすラベルの集合
+        """
+        queries = tuple(queries)
+        found: set[_L] = set()
+        if len(queries) == 0:
+            return found
+        box_min = tuple(min(q[i] for q in queries) for i in range(3))
+        box_max = tuple(max(q[i] for q in queries) for i in range(3))
+        candidates = self.labels_near_box(box_min, box_max, thresthold)
+        n_cell = math.ceil(thresthold / self._width)
+        for query in queries:
+            if len(found) == len(candidates):
+                break
+            c0, c1, c2 = self._to_cell(query)
+            for i0 in range(c0 - n_cell, c0 + n_cell + 1):
+                for i1 in range(c1 - n_cell, c1 + n_cell + 1):
+                    for i2 in range(c2 - n_cell, c2 + n_cell + 1):
+                        points = self._cells.get((i0, i1, i2))
+                        if points is None:
+                            continue
+                        for pos, label in points:
+                            if (label in found) or (label not in candidates):
+                                continue
+                            if math.sqrt((query[0] - pos[0])**2
+                                         + (query[1] - pos[1])**2
+                                         + (query[2] - pos[2])**2
+                                         ) < thresthold:
+                                found.add(label)
+        return found
+
+    def _to_cell(self, pos: Vector3f) -> tuple[int, int, int]:
+        w = self._width
+        return (math.floor(pos[0] / w),
+                math.floor(pos[1] / w),
+                math.floor(pos[2] / w))
@@ -9,7 +9,7 @@ def calc_atoms_charge_density(
         atom_to_as_sphere: Callable[[int], Sphere],
         atom_to_charge: Callable[[int], float],
         collided_atom_getter: Callable[[int], Iterable[Hashable]],
-        resolution: int,
+        resolution: solidcalc.SurfaceResolution,
 ) -> float:
     """原子集合のcharge densityを計算する.
 
@@ -19,16 +19,37 @@ def calc_atoms_charge_density(
         atom_to_charge: 原子の電荷を返す関数
         collided_atom_getter: 入力原子と溶媒露出平面が衝突している
                               他の原子IDの集合を返す関数
-        resolution: 原子表面を多面体で近似するときの頂点数
+        resolution: 原子表面を多面体で近似するときの頂点数,
+                    適応的な頂点数またはLCPO法の設定
     Returns:
         原子集合のcharge density
     """
-    atoms = _SumChargeIterator(exposed_atom_ids, atom_to_charge)
-    as_area = sum(map(
+    exposed_atom_ids = tuple(exposed_atom_ids)
+    return calc_atoms_charge_density_by_area(
+        iter(exposed_atom_ids), atom_to_charge,
         solidcalc.create_one_area_in_multi_spheres_func(
-            atom_to_as_sphere, collided_atom_getter, resolution),
-        atoms
-    ))
+            atom_to_as_sphere, collided_atom_getter, resolution,
+            exposed_atom_ids))
+
+
+def calc_atoms_charge_density_by_area(
+        exposed_atom_ids: Iterable[int],
+        atom_to_charge: Callable[[int], float],
+        atom_to_as_area: Callable[[int], float],
+) -> float:
+    """原子毎の溶媒接触面の表面積を返す関数を使って
+    原子集合のcharge densityを計算する.
+    複数の原子集合で表面積を返す関数を共有する場合に使う.
+
+    Args:
+        exposed_atom_ids: 溶媒露出原子のID集合
+        atom_to_charge: 原子の電荷を返す関数
+        atom_to_as_area: 原子の溶媒接触面の表面積を返す関数
+    Returns:
+        原子集合のcharge density
+    """
+    atoms = _SumChargeIterator(exposed_atom_ids, atom_to_charge)
+    as_area = sum(map(atom_to_as_area, atoms))
     charge = atoms.get_sum_charge()
     if as_area > 0:
         return charge / as_area
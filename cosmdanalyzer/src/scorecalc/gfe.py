@@ -1,46 +1,246 @@
 """GFE"""
-from collections.abc import Callable, Collection, Iterable, Iterator
+from collections.abc import Callable, Collection, Iterable, Sequence
 import math
-import statistics
+from typing import NamedTuple
+import numpy as np
 from .. import solidcalc
 from ..solidcalc.typehint import Vector3f
 
 
-def calc_all_gfe(protein_atom_ids: Collection[int],
-                 atom_to_position: Callable[[int], Vector3f],
+class RayVolumeInput(NamedTuple):
+    """球を錐体の集合で近似して体積を計算する.
+    重なる球はそれぞれの中心側の分割平面で切断する.
+
+    resolution: 球面を多面体で近似するときの頂点数
+    """
+    resolution: int
+
+
+class VoxelVolumeInput(NamedTuple):
+    """球をボクセル化して体積を計算する.
+
+    refine: OpenDXのグリッド幅を何分割したボクセルを使うか
+    check_resolution: 0より大きい場合は指定頂点数の錐体近似による体積と比較する
+    """
+    refine: int
+    check_resolution: int = 0
+
+
+# score.volume.methodに指定できる値
+VOLUME_METHODS = ('ray', 'voxel')
+
+
+def calc_protein_volume(
+        protein_atom_ids: Collection[int],
+        atom_to_position: Callable[[int, int], Vector3f],
+        atom_to_vdw_radius: Callable[[int], float],
+        solvent_radius: float,
+        frame_indices: Iterable[int],
+        volume_input: RayVolumeInput | VoxelVolumeInput,
+        grid_size: float,
+        grid_origin: Vector3f,
+        verbose: bool = False,
+        ) -> float:
+    """タンパク質の溶媒接触球で構成される図形の体積を計算する.
+    複数のフレームを指定した場合はフレーム毎の体積の平均を返す.
+
+    Args:
+        protein_atom_ids: タンパク質の原子ID集合
+        atom_to_position: 原子IDとフレーム番号から原子座標に変換する関数
+        atom_to_vdw_radius: 原子IDから原子半径に変換する関数
+        solvent_radius: 溶媒半径
+        frame_indices: 体積を計算するフレーム番号の集合
+        volume_input: 体積計算アルゴリズムへの入力パラメータ
+        grid_size: OpenDXのグリッド1つの幅
+        grid_origin: OpenDXのグリッドの原点
+        verbose: 標準出力に体積計算の情報を表示する場合はTrue
+    Returns:
+        体積
+    """
+    volume_calc = ProteinVolumeCalc(
+        protein_atom_ids, atom_to_vdw_radius, solvent_radius,
+        volume_input, grid_size, grid_origin)
+    for frame_idx in frame_indices:
+        volume_calc.add_frame(
+            (lambda i, f=frame_idx: atom_to_position(i, f)), frame_idx)
+    return volume_calc.get_result(verbose)
+
+
+class ProteinVolumeCalc:
+    """フレーム毎のタンパク質の溶媒接触球で構成される図形の体積の平均を
+    計算する.
+    """
+
+    def __init__(self,
+                 protein_atom_ids: Collection[int],
                  atom_to_vdw_radius: Callable[[int], float],
-                 hotspot_values_list: Iterable[Iterable[float]],
+                 solvent_radius: float,
+                 volume_input: RayVolumeInput | VoxelVolumeInput,
+                 grid_size: float,
+                 grid_origin: Vector3f):
+        """
+
+        Args:
+            protein_atom_ids: タンパク質の原子ID集合
+            atom_to_vdw_radius: 原子IDから原子半径に変換する関数
+            solvent_radius: 溶媒半径
+            volume_input: 体積計算アルゴリズムへの入力パラメータ
+            grid_size: OpenDXのグリッド1つの幅
+            grid_origin: OpenDXのグリッドの原点
+        """
+        self._protein_atom_ids = protein_atom_ids
+        self._atom_to_vdw_radius = atom_to_vdw_radius
+        self._solvent_radius = solvent_radius
+        self._volume_input = volume_input
+        self._grid_size = grid_size
+        self._grid_origin = grid_origin
+        self._sum_volume = 0.0
+        self._n_frames = 0
+        self._last_frame = None
+
+    def add_frame(self, atom_to_position: Callable[[int], Vector3f],
+                  frame_idx: int) -> None:
+        """1フレーム分の体積を計算する.
+
+        Args:
+            atom_to_position: 原子IDから原子座標に変換する関数
+            frame_idx: 体積の比較結果の表示に使うフレーム番号
+        """
+        def atom_to_as_sphere(i: int):
+            return (atom_to_position(i),
+                    self._atom_to_vdw_radius(i) + self._solvent_radius)
+        if isinstance(self._volume_input, RayVolumeInput):
+            volume = solidcalc.calc_multi_sphere_volume(
+                self._protein_atom_ids, atom_to_as_sphere,
+                self._volume_input.resolution)
+        elif isinstance(self._volume_input, VoxelVolumeInput):
+            volume = solidcalc.calc_multi_sphere_voxel_volume(
+                self._protein_atom_ids, atom_to_as_sphere,
+                self._grid_size / self._volume_input.refine,
+                self._grid_origin)
+        else:
+            raise TypeError
+        self._sum_volume += volume
+        self._n_frames += 1
+        self._last_frame = (frame_idx, atom_to_as_sphere, volume)
+
+    def get_result(self, verbose: bool = False) -> float:
+        """追加したフレームの体積の平均を返す.
+
+        Args:
+            verbose: 標準出力に体積計算の情報を表示する場合はTrue
+        Returns:
+            体積
+        """
+        if (isinstance(self._volume_input, VoxelVolumeInput)
+                and self._volume_input.check_resolution > 0):
+            # 最後に計算したフレームで錐体近似の体積と比較する
+            frame_idx, atom_to_as_sphere, volume = self._last_frame
+            ray_volume = solidcalc.calc_multi_sphere_volume(
+                self._protein_atom_ids, atom_to_as_sphere,
+                self._volume_input.check_resolution)
+            print('voxel volume check (frame {}): voxel = {:.3f}, '
+                  'ray = {:.3f}, relative error = {:.3e}'.format(
+                      frame_idx, volume, ray_volume,
+                      abs(volume - ray_volume) / ray_volume))
+        volume = self._sum_volume / self._n_frames
+        if verbose:
+            print('protein volume = {:.3f} ({} frames)'.format(
+                volume, self._n_frames))
+        return volume
+
+
+def calc_all_gfe(hotspot_voxel_ids: Sequence[int],
+                 hotspot_labels: Sequence[int],
+                 n_hotspots: int,
+                 voxel_to_value: Callable[[int], float],
                  system_volume: float,
+                 protein_volume: float,
                  n_probe_heavy_atoms: int,
                  temperature: float,
-                 solvent_radius: float,
-                 resolution: int,
-                 ) -> Iterator[float]:
+                 all_voxel_values: Sequence[float] | None = None,
+                 ) -> tuple[list[float | None], np.ndarray | None]:
     """すべてのホットスポットのGFEを計算する.
+    ホットスポットのボクセルを1次元インデックスとホットスポット番号の
+    平坦な配列で受け取り, GFEへの変換とホットスポット毎の平均を
+    それぞれnumpyの配列演算で行う.
 
     Args:
-        protein_atom_ids: タンパク質の原子ID集合
-        atom_to_position: 原子IDから原子座標に変換する関数
-        atom_to_vdw_radius: 原子IDから原子半径に変換する関数
-        hotspot_values_list: ホットスポット集合
+        hotspot_voxel_ids: ホットスポットに含まれるボクセルの1次元インデックス
+        hotspot_labels: hotspot_voxel_idsの各要素が属するホットスポット番号
+        n_hotspots: ホットスポット数
+        voxel_to_value: ボクセルの1次元インデックスから共溶媒占有率を返す関数
         system_volume: 系全体の体積
+        protein_volume: タンパク質の溶媒接触球で構成される図形の体積
         n_probe_heavy_atoms: 系のすべてのプローブ分子の重原子数の合計
         temperature: 系の温度(K)
-        solvent_radius: 溶媒半径
-        resolution: 原子表面を多面体で近似するときの頂点数
+        all_voxel_values: 1次元インデックス順のすべてのボクセルの共溶媒占有率,
+                          指定した場合はすべてのボクセルのGFEも計算する.
+    Returns:
+        (各hostpotに対応するGFE, 1次元インデックス順のすべてのボクセルのGFE)
+        all_voxel_valuesを指定しない場合はボクセルのGFEはNone
+    """
+    solvent_volume = system_volume - protein_volume
+    voxel_ids = np.asarray(hotspot_voxel_ids, dtype=np.int64)
+    if all_voxel_values is not None:
+        grid_gfe = calc_voxels_gfe(all_voxel_values, n_probe_heavy_atoms,
+                                   temperature, solvent_volume)
+        hotspot_gfe = grid_gfe[voxel_ids]
+    else:
+        grid_gfe = None
+        hotspot_gfe = calc_voxels_gfe(
+            np.fromiter(map(voxel_to_value, hotspot_voxel_ids),
+                        dtype=np.float64, count=len(voxel_ids)),
+            n_probe_heavy_atoms, temperature, solvent_volume)
+    return (group_mean(hotspot_gfe, hotspot_labels, n_hotspots), grid_gfe)
+
+
+def calc_voxels_gfe(
+        voxel_occupancies: Sequence[float] | np.ndarray,
+        n_probe_heavy_atoms: int,
+        temperature: float,
+        solvent_volume: float) -> np.ndarray:
+    """共溶媒占有率の配列をまとめてGFEに変換する.
+    create_gfe_funcを各要素に適用した場合と丸め誤差の範囲で同じ値を返す.
+
+    Args:
+        voxel_occupancies: 共溶媒占有率の配列
+        n_probe_heavy_atoms: 系のすべてのプローブ分子の重原子数の合計
+        temperature: voxel_occupancies計算時の温度(K)
+        solvent_volume: 溶媒領域の体積
+    Returns:
+        入力と同じ順序のGFEの配列
+    """
+    threshold, log_mean_proba = _gfe_params(
+        n_probe_heavy_atoms, temperature, solvent_volume)
+    occupancies = np.asarray(voxel_occupancies, dtype=np.float64)
+    mask = occupancies > threshold
+    # しきい値以下(0を含む)のボクセルは対数を計算せずに3.0とする
+    log_occupancies = np.log(occupancies, where=mask,
+                             out=np.zeros_like(occupancies))
+    return np.where(mask,
+                    _GFE_CONST * temperature
+                    * (log_occupancies - log_mean_proba),
+                    3.0)
+
+
+def group_mean(values: Sequence[float] | np.ndarray,
+               labels: Sequence[int] | np.ndarray,
+               n_groups: int) -> list[float | None]:
+    """ラベル毎の平均値を計算する.
+
+    Args:
+        values: 値の配列
+        labels: valuesの各要素が属する[0, n_groups)のラベル
+        n_groups: ラベルの種類数
     Returns:
-        各hostpotに対応するGFE
+        ラベル毎の平均値, 要素が無いラベルはNone
     """
-    atom_to_last_as_sphere = (
-        lambda i: (atom_to_position(i),
-                   atom_to_vdw_radius(i) + solvent_radius))
-    volume = solidcalc.calc_multi_sphere_volume(
-            protein_atom_ids, atom_to_last_as_sphere, resolution)
-    solvent_volume = system_volume - volume
-    gfe_func = create_gfe_func(n_probe_heavy_atoms, temperature,
-                               solvent_volume)
-    for hotspot_values in hotspot_values_list:
-        yield statistics.mean(map(gfe_func, hotspot_values))
+    labels = np.asarray(labels, dtype=np.int64)
+    sums = np.bincount(labels, weights=np.asarray(values, dtype=np.float64),
+                       minlength=n_groups)
+    counts = np.bincount(labels, minlength=n_groups)
+    return [float(s / c) if c > 0 else None for s, c in zip(sums, counts)]
 
 
 _R = 8.31446261815324
@@ -61,9 +261,22 @@ def create_gfe_func(
     Returns:
         1つの共溶媒占有率から対応するGFEを返す関数
     """
-    mean_proba = n_probe_heavy_atoms / solvent_volume
-    threshold = mean_proba * (math.e**(3 / (_GFE_CONST * temperature)))
-    log_mean_proba = math.log(n_probe_heavy_atoms / solvent_volume)
+    threshold, log_mean_proba = _gfe_params(
+        n_probe_heavy_atoms, temperature, solvent_volume)
     return (lambda o: (_GFE_CONST * temperature
                        * (math.log(o) - log_mean_proba))
             if o > threshold else 3.0)
+
+
+def _gfe_params(n_probe_heavy_atoms: int,
+                temperature: float,
+                solvent_volume: float) -> tuple[float, float]:
+    """GFE計算に使う定数を返す.
+
+    Returns:
+        (GFEが3.0になる共溶媒占有率のしきい値, 平均占有率の対数)
+    """
+    mean_proba = n_probe_heavy_atoms / solvent_volume
+    threshold = mean_proba * (math.e**(3 / (_GFE_CONST * temperature)))
+    log_mean_proba = math.log(n_probe_heavy_atoms / solvent_volume)
+    return (threshold, log_mean_proba)
@@ -1,6 +1,7 @@
 import math
 import statistics
 from collections.abc import Callable, Collection, Iterable, Iterator
+from typing import NamedTuple
 from ..solidcalc.typehint import Vector3f
 from ..solidcalc import vector3f
 
@@ -41,6 +42,24 @@ class AllPatchRmsfCalc:
         for calc in self._patch_calc:
             yield calc.get_result()
 
+    def get_state(self) -> tuple[tuple['PointRmsfState', ...], ...]:
+        """計算途中の状態を保存するために残基毎の計算状態を返す
+
+        Returns:
+            パッチ毎, 残基毎の残基重心のRMSFの計算状態
+        """
+        return tuple(calc.get_state() for calc in self._patch_calc)
+
+    def set_state(self, state: Iterable[Iterable['PointRmsfState']]
+                  ) -> None:
+        """get_stateで保存した状態に戻す
+
+        Args:
+            state: get_stateで保存した計算状態
+        """
+        for calc, patch_state in zip(self._patch_calc, state):
+            calc.set_state(patch_state)
+
 
 class PatchRmsfCalc:
     """残基集合の平均RMSFを計算する"""
@@ -81,6 +100,23 @@ class PatchRmsfCalc:
         else:
             return 0.0
 
+    def get_state(self) -> tuple['PointRmsfState', ...]:
+        """計算途中の状態を保存するために残基毎の計算状態を返す
+
+        Returns:
+            残基毎の残基重心のRMSFの計算状態
+        """
+        return tuple(calc.get_state() for calc in self._res_calcs)
+
+    def set_state(self, state: Iterable['PointRmsfState']) -> None:
+        """get_stateで保存した状態に戻す
+
+        Args:
+            state: get_stateで保存した計算状態
+        """
+        for calc, res_state in zip(self._res_calcs, state):
+            calc.set_state(res_state)
+
 
 class ResidueRmsfCalc:
     """残基重心のRMSFを計算する"""
@@ -99,6 +135,22 @@ class ResidueRmsfCalc:
     def get_result(self) -> float:
         return self._rmsf_calc.get_result()
 
+    def get_state(self) -> 'PointRmsfState':
+        """計算途中の状態を保存するために残基重心の計算状態を返す
+
+        Returns:
+            残基重心のRMSFの計算状態
+        """
+        return self._rmsf_calc.get_state()
+
+    def set_state(self, state: 'PointRmsfState') -> None:
+        """get_stateで保存した状態に戻す
+
+        Args:
+            state: get_stateで保存した計算状態
+        """
+        self._rmsf_calc.set_state(state)
+
 
 class PointRmsfCalc:
     """1点のRMSFを計算する"""
@@ -120,6 +172,16 @@ class PointRmsfCalc:
         self._sum = vector3f.add(self._sum, pos)
         self._sum2 += vector3f.norm2(pos)
 
+    def merge(self, other: 'PointRmsfCalc') -> None:
+        """他のオブジェクトに追加したフレームをすべて追加する.
+
+        Args:
+            other: 結合するオブジェクト
+        """
+        self._n_frames += other._n_frames
+        self._sum = vector3f.add(self._sum, other._sum)
+        self._sum2 += other._sum2
+
     def get_result(self) -> float:
         """RMSFの計算結果を返す.
 
@@ -131,6 +193,61 @@ class PointRmsfCalc:
             - sum((self._sum[i] / self._n_frames)**2 for i in range(3))
         )
 
+    def get_state(self) -> 'PointRmsfState':
+        """計算途中の状態を保存するために追加したフレームの集計値を返す
+
+        Returns:
+            フレーム数, 座標の和, 座標の2乗ノルムの和
+        """
+        return PointRmsfState(self._n_frames, self._sum, self._sum2)
+
+    def set_state(self, state: 'PointRmsfState') -> None:
+        """get_stateで保存した状態に戻す
+
+        Args:
+            state: get_stateで保存した計算状態
+        """
+        self._n_frames, self._sum, self._sum2 = state
+
+
+class PointRmsfState(NamedTuple):
+    """PointRmsfCalcの計算途中の状態
+
+    Attributes:
+        n_frames: 追加したフレーム数
+        sum: 座標の和
+        sum2: 座標の2乗ノルムの和
+    """
+    n_frames: int
+    sum: Vector3f
+    sum2: float
+
+
+def merge_states(state: Iterable[Iterable[PointRmsfState]],
+                 other: Iterable[Iterable[PointRmsfState]]
+                 ) -> tuple[tuple[PointRmsfState, ...], ...]:
+    """フレームの区間毎に計算したAllPatchRmsfCalc.get_stateの状態を結合する.
+
+    Args:
+        state: 前の区間の状態
+        other: 後の区間の状態
+    Returns:
+        結合した状態
+    """
+    return tuple(tuple(map(_merge_point_state, patch_state, patch_other))
+                 for patch_state, patch_other in zip(state, other))
+
+
+def _merge_point_state(state: PointRmsfState, other: PointRmsfState
+                       ) -> PointRmsfState:
+    """PointRmsfCalc.get_stateの2つの状態を結合する."""
+    calc = PointRmsfCalc()
+    calc.set_state(state)
+    other_calc = PointRmsfCalc()
+    other_calc.set_state(other)
+    calc.merge(other_calc)
+    return calc.get_state()
+
 
 def _mean_position(
         atom_ids: Iterable[int],
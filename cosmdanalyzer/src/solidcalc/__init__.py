@@ -1,6 +1,8 @@
+from .lcpo import *
 from .pointset import *
 from .spherearea import *
 from .spherevolume import *
+from .spherevoxel import *
 from .spherepoint import *
 from .sweepprune import *
 from .typehint import *
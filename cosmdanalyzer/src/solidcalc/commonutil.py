@@ -21,8 +21,9 @@ def calc_sphere_div_plane(sphere0: Sphere, sphere1: Sphere
     vec12 = vector3f.sub(sphere1[0], sphere0[0])
     norm12 = vector3f.norm(vec12)
     normal_vec12 = vector3f.mul(vec12, 1.0 / norm12)
+    # 平面は球0の中心から距離dの位置にある
     d = (norm12 + (sphere0[1]**2 - sphere1[1]**2) / norm12) * 0.5
-    pos = vector3f.add(sphere1[0], vector3f.mul(normal_vec12, d))
+    pos = vector3f.add(sphere0[0], vector3f.mul(normal_vec12, d))
     return (pos, normal_vec12)
 
 
@@ -0,0 +1,298 @@
+"""LCPO法(Weiser, Shenkin, Still 1999)による原子毎の表面積の近似計算.
+原子iの表面積を衝突している原子対の球冠の面積の線形結合で近似する.
+
+    A_i = P1 S_i + P2 Σ_j A_ij + P3 Σ_j Σ_k A_jk + P4 Σ_j A_ij Σ_k A_jk
+
+S_iは球の表面積, A_ijは原子jに覆われる原子iの球冠の面積,
+jはiと衝突している原子, kはiとjの両方と衝突している原子である.
+点の数に依存する誤差がなく, 原子毎に衝突している原子数の2乗に比例する
+時間で計算できる.
+係数は溶媒半径1.4Åの溶媒接触面に合わせて決められている.
+"""
+from collections.abc import Callable, Hashable, Iterable
+import math
+from typing import NamedTuple, TypeVar
+import numpy as np
+from . import sweepprune
+from .typehint import Sphere
+
+
+_ID = TypeVar('_ID', bound=Hashable)
+
+LcpoParameter = tuple[float, float, float, float]
+
+# {(原子番号, 混成軌道, 水素以外の結合原子数): (P1, P2, P3, P4)}
+# 混成軌道は'SP2'と'SP3'のみ区別する. 硫黄とリンは混成軌道によらない
+LCPO_PARAMETERS: dict[tuple[int, str, int], LcpoParameter] = {
+    (6, 'SP3', 1): (0.77887, -0.28063, -0.0012968, 0.00039328),
+    (6, 'SP3', 2): (0.56482, -0.19608, -0.0010219, 0.0002658),
+    (6, 'SP3', 3): (0.23348, -0.072627, -0.00020079, 0.00007967),
+    (6, 'SP3', 4): (0.0, 0.0, 0.0, 0.0),
+    (6, 'SP2', 2): (0.51245, -0.15966, -0.00019781, 0.00016392),
+    (6, 'SP2', 3): (0.070344, -0.019015, -0.000022009, 0.000016875),
+    (7, 'SP3', 1): (0.78602, -0.29198, -0.0006537, 0.00036247),
+    (7, 'SP3', 2): (0.22599, -0.036648, -0.0012297, 0.000080038),
+    (7, 'SP3', 3): (0.051481, -0.012603, -0.00032006, 0.000024774),
+    (7, 'SP2', 1): (0.73511, -0.22116, -0.00089148, 0.0002523),
+    (7, 'SP2', 2): (0.41102, -0.12254, -0.000075448, 0.00011804),
+    (7, 'SP2', 3): (0.062577, -0.017874, -0.00008312, 0.000019849),
+    (8, 'SP3', 1): (0.77914, -0.25262, -0.0016056, 0.00035071),
+    (8, 'SP3', 2): (0.49392, -0.16038, -0.00015512, 0.00016453),
+    (8, 'SP2', 1): (0.68563, -0.1868, -0.00135573, 0.00023743),
+    (15, '', 3): (0.3865, -0.18249, -0.0036598, 0.0004264),
+    (15, '', 4): (0.03873, -0.0089339, 0.0000083582, 0.0000030381),
+    (16, '', 1): (0.7722, -0.26393, 0.0010629, 0.0002179),
+    (16, '', 2): (0.54581, -0.19477, -0.0012873, 0.00029247),
+}
+
+# カルボキシ基の酸素原子の係数
+LCPO_CARBOXYLATE_PARAMETER: LcpoParameter = (
+    0.88857, -0.33421, -0.0018683, 0.00049372)
+
+
+class LcpoArea(NamedTuple):
+    """原子毎の表面積をLCPO法で計算する設定.
+    溶媒露出原子の判定はresolutionの頂点数で行う.
+
+    resolution: 溶媒露出原子の判定と誤差の比較に使う頂点数
+    atom_to_parameter: 原子IDからLCPO法の係数を返す関数,
+                       Noneを返す原子(水素)は表面積を0とし衝突判定にも使わない.
+                       Noneの場合は分子の情報から設定する
+    check: Trueの場合は最初のフレームの表面積を
+           全頂点で計算した結果と比較して誤差と計算時間を表示する
+    """
+    resolution: int
+    atom_to_parameter: (Callable[[Hashable], LcpoParameter | None]
+                        | None) = None
+    check: bool = False
+
+
+def lcpo_parameter(atomic_number: int, hybridization: str,
+                   n_heavy_neighbors: int, is_carboxylate: bool = False
+                   ) -> LcpoParameter | None:
+    """原子の種類に対応するLCPO法の係数を返す.
+    表にない水素以外の原子は同じ結合原子数のsp3炭素の係数で代用する.
+
+    Args:
+        atomic_number: 原子番号
+        hybridization: 混成軌道, 'SP2'以外はsp3として扱う
+        n_heavy_neighbors: 水素以外の結合原子数
+        is_carboxylate: カルボキシ基の酸素原子の場合はTrue
+    Returns:
+        係数(P1, P2, P3, P4), 水素の場合はNone
+    """
+    if atomic_number == 1:
+        return None
+    if is_carboxylate:
+        return LCPO_CARBOXYLATE_PARAMETER
+    hybrid = 'SP2' if hybridization == 'SP2' else 'SP3'
+    for key in ((atomic_number, hybrid, n_heavy_neighbors),
+                (atomic_number, '', n_heavy_neighbors)):
+        if key in LCPO_PARAMETERS:
+            return LCPO_PARAMETERS[key]
+    return LCPO_PARAMETERS[(6, 'SP3', min(max(n_heavy_neighbors, 1), 4))]
+
+
+def calc_lcpo_areas(
+        sphere_ids: Iterable[_ID],
+        sphere_getter: Callable[[_ID], Sphere],
+        atom_to_parameter: Callable[[_ID], LcpoParameter | None],
+) -> dict[_ID, float]:
+    """複数の球のそれぞれの表面積をLCPO法でまとめて計算する.
+
+    Args:
+        sphere_ids: 球の識別子の集合
+        sphere_getter: 識別子から(中心座標,半径)で表される球を返す関数
+        atom_to_parameter: 識別子からLCPO法の係数を返す関数
+    Returns:
+        {球の識別子: 表面積}
+    """
+    sphere_ids = tuple(sphere_ids)
+    col_dict = sweepprune.create_strict_collided_dict(
+            sphere_ids, sphere_getter)
+    return _calc_lcpo_area_dict(
+        sphere_ids, sphere_getter,
+        (lambda a: iter(col_dict.get(a, tuple()))), atom_to_parameter)
+
+
+def create_lcpo_area_func(
+        sphere_getter: Callable[[_ID], Sphere],
+        collided_sphere_getter: Callable[[_ID], Iterable[_ID]],
+        atom_to_parameter: Callable[[_ID], LcpoParameter | None],
+        sphere_ids: Iterable[_ID] | None = None,
+) -> Callable[[_ID], float]:
+    """LCPO法で1つの球の占める表面積を計算する関数を返す.
+    sphere_idsを指定した場合は, その球の表面積を最初に呼ばれた時点で
+    まとめて計算し, 以降は計算済みの値を返す.
+    指定していない球は呼ばれる毎に1つずつ計算する.
+
+    Args:
+        sphere_getter: 識別子から[中心座標,半径]で表される球を返す関数
+        collided_sphere_getter: 指定した識別子の球と
+                                衝突している球の識別子の集合を返す関数
+        atom_to_parameter: 識別子からLCPO法の係数を返す関数
+        sphere_ids: まとめて表面積を計算する球の識別子の集合
+    Returns:
+        球IDから1つの球の占める表面積を返す関数
+    """
+    areas: dict[_ID, float] = dict()
+    pending = sphere_ids
+
+    def _one_area(i: _ID) -> float:
+        nonlocal pending
+        if pending is not None:
+            areas.update(_calc_lcpo_area_dict(
+                pending, sphere_getter, collided_sphere_getter,
+                atom_to_parameter))
+            pending = None
+        ret = areas.get(i)
+        if ret is None:
+            ret = _calc_lcpo_area_dict(
+                (i, ), sphere_getter, collided_sphere_getter,
+                atom_to_parameter)[i]
+            areas[i] = ret
+        return ret
+    return _one_area
+
+
+def _calc_lcpo_area_dict(
+        sphere_ids: Iterable[_ID],
+        sphere_getter: Callable[[_ID], Sphere],
+        collided_sphere_getter: Callable[[_ID], Iterable[_ID]],
+        atom_to_parameter: Callable[[_ID], LcpoParameter | None],
+) -> dict[_ID, float]:
+    """LCPO法で複数の球の表面積を配列演算でまとめて計算する.
+    球iと衝突している球jの組(i, j)と, 同じiに対するjより後のkの組(i, j, k)を
+    すべての球について1つの配列に並べ, 球冠の面積をまとめて計算して
+    iまたは(i, j)毎にnp.bincountで足し合わせる.
+    衝突していない球同士の球冠の面積は0になるため,
+    kはiとjの両方と衝突している球に限られる.
+
+    Args:
+        sphere_ids: 表面積を計算する球の識別子の集合
+        sphere_getter: 識別子から[中心座標,半径]で表される球を返す関数
+        collided_sphere_getter: 指定した識別子の球と
+                                衝突している球の識別子の集合を返す関数
+        atom_to_parameter: 識別子からLCPO法の係数を返す関数
+    Returns:
+        {球の識別子: 表面積}
+    """
+    params: dict[_ID, LcpoParameter | None] = dict()
+
+    def _param(i: _ID) -> LcpoParameter | None:
+        if i not in params:
+            params[i] = atom_to_parameter(i)
+        return params[i]
+
+    ret: dict[_ID, float] = dict()
+    # 球の識別子 -> 座標配列の行
+    rows: dict[_ID, int] = dict()
+    spheres: list[Sphere] = []
+
+    def _row(i: _ID) -> int:
+        row = rows.get(i)
+        if row is None:
+            row = rows[i] = len(spheres)
+            spheres.append(sphere_getter(i))
+        return row
+
+    query_ids: list[_ID] = []
+    query_rows: list[int] = []
+    query_params: list[LcpoParameter] = []
+    # (i, j)の組毎のiの番号とjの行, iの番号毎の組の数
+    pair_query: list[int] = []
+    pair_rows: list[int] = []
+    n_pairs: list[int] = []
+    for i in sphere_ids:
+        if i in ret:
+            continue
+        ret[i] = 0.0
+        param = _param(i)
+        if param is None:
+            continue
+        neighbors = [_row(j) for j in collided_sphere_getter(i)
+                     if j != i and _param(j) is not None]
+        pair_query.extend([len(query_ids)] * len(neighbors))
+        pair_rows.extend(neighbors)
+        n_pairs.append(len(neighbors))
+        query_ids.append(i)
+        query_rows.append(_row(i))
+        query_params.append(param)
+    if len(query_ids) == 0:
+        return ret
+    pos = np.array([p for p, _ in spheres], dtype=np.float64).reshape(-1, 3)
+    radius = np.array([r for _, r in spheres], dtype=np.float64)
+    query_rows_arr = np.array(query_rows, dtype=np.intp)
+    pair_query_arr = np.array(pair_query, dtype=np.intp)
+    pair_rows_arr = np.array(pair_rows, dtype=np.intp)
+    n_query = len(query_ids)
+    # 組(i, j)毎に同じiの組でjより後にあるkを並べて(i, j, k)を作り,
+    # 距離を1度だけ求めてA_jkとA_kjの両方に使う
+    pair_idx = np.arange(len(pair_rows), dtype=np.intp)
+    pair_counts = np.array(n_pairs, dtype=np.intp)
+    pair_ends = np.cumsum(pair_counts)[pair_query_arr]
+    n_later = pair_ends - pair_idx - 1
+    triple_pair = np.repeat(pair_idx, n_later)
+    triple_other = (np.arange(len(triple_pair), dtype=np.intp)
+                    - np.repeat(np.cumsum(n_later) - n_later, n_later)
+                    + triple_pair + 1)
+    row_i = query_rows_arr[pair_query_arr]
+    pair_pos = pos[pair_rows_arr]
+    pair_radius = radius[pair_rows_arr]
+    # a_ij[(i, j)] = A_ij, a_jk[(i, j, k)] = A_jk, a_kj[(i, j, k)] = A_kj
+    a_ij = _calc_cap_areas(pos[row_i], radius[row_i], pair_pos, pair_radius)
+    r_j = pair_radius[triple_pair]
+    r_k = pair_radius[triple_other]
+    d_jk = np.sqrt(((pair_pos[triple_pair] - pair_pos[triple_other])**2)
+                   .sum(axis=-1))
+    sum_k = (np.bincount(triple_pair, minlength=len(pair_rows),
+                         weights=_calc_distance_cap_areas(d_jk, r_j, r_k))
+             + np.bincount(triple_other, minlength=len(pair_rows),
+                           weights=_calc_distance_cap_areas(d_jk, r_k, r_j)))
+    p1, p2, p3, p4 = np.array(query_params, dtype=np.float64).T
+    area = (p1 * 4 * math.pi * radius[query_rows_arr]**2
+            + p2 * np.bincount(pair_query_arr, weights=a_ij,
+                               minlength=n_query)
+            + p3 * np.bincount(pair_query_arr, weights=sum_k,
+                               minlength=n_query)
+            + p4 * np.bincount(pair_query_arr, weights=a_ij * sum_k,
+                               minlength=n_query))
+    for i, a in zip(query_ids, np.maximum(area, 0.0).tolist()):
+        ret[i] = a
+    return ret
+
+
+def _calc_cap_areas(pos_i: np.ndarray, r_i: float | np.ndarray,
+                    pos_j: np.ndarray, r_j: float | np.ndarray
+                    ) -> np.ndarray:
+    """球jの内部にある球iの球冠の面積を球の組毎に返す.
+
+    Args:
+        pos_i: 球iの中心座標, 最後の軸が座標
+        r_i: 球iの半径
+        pos_j: 球jの中心座標, pos_iとブロードキャストできる形
+        r_j: 球jの半径
+    Returns:
+        ブロードキャストした形の球冠の面積
+    """
+    return _calc_distance_cap_areas(
+        np.sqrt(((pos_i - pos_j)**2).sum(axis=-1)), r_i, r_j)
+
+
+def _calc_distance_cap_areas(d: np.ndarray, r_i: float | np.ndarray,
+                             r_j: float | np.ndarray) -> np.ndarray:
+    """中心間の距離から球jの内部にある球iの球冠の面積を球の組毎に返す.
+
+    Args:
+        d: 球の中心間の距離
+        r_i: 球iの半径
+        r_j: 球jの半径
+    Returns:
+        ブロードキャストした形の球冠の面積
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        height = r_i - d / 2 - (r_i**2 - r_j**2) / (2 * d)
+    caps = 2 * math.pi * r_i * np.clip(height, 0.0, 2 * r_i)
+    # 中心が一致する場合は小さいほうの球が覆われる
+    return np.where(d == 0.0,
+                    np.where(r_i <= r_j, 4 * math.pi * r_i**2, 0.0), caps)
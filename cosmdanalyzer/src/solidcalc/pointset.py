@@ -1,5 +1,5 @@
 """点集合に対する計算"""
-from collections.abc import Iterable
+from collections.abc import Callable, Iterable
 from .typehint import Vector3f
 import math
 from sys import float_info
@@ -21,17 +21,34 @@ def calc_point_set_box_overwraped(
         r_set: 点集合
         r_box_size: r_setの点が表すBOXの1辺の長さ
     """
-    r_tree = vptree.VpTree(r_set, _ax_max_distance)
+    is_overwraped = create_point_set_box_overwrap_func(r_set, r_box_size)
     overwrap_count = 0
     all_count = 0
     for l_val in l_set:
         all_count += 1
-        d, v = r_tree.nearest_neighbor(l_val, (r_box_size * 0.5) * _min_growth)
-        if v is not None:
+        if is_overwraped(l_val):
             overwrap_count += 1
     return overwrap_count / all_count
 
 
+def create_point_set_box_overwrap_func(
+        r_set: Iterable[Vector3f],
+        r_box_size: float) -> Callable[[Vector3f], bool]:
+    """点がr_setに重なっているかを返す関数を作成する.
+    重なりの条件はcalc_point_set_box_overwrapedと同じ.
+
+    Args:
+        r_set: 点集合
+        r_box_size: r_setの点が表すBOXの1辺の長さ
+    Returns:
+        点がr_setに重なっている場合にTrueを返す関数
+    """
+    r_tree = vptree.VpTree(r_set, _ax_max_distance)
+    thresthold = (r_box_size * 0.5) * _min_growth
+    return (lambda val:
+            r_tree.nearest_neighbor(val, thresthold)[1] is not None)
+
+
 def _ax_max_distance(lhs: Vector3f, rhs: Vector3f):
     """各軸について差の絶対値をとり,その最大値を距離とする"""
     return max(abs(lhs[i] - rhs[i]) for i in range(3))
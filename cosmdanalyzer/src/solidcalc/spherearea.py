@@ -1,17 +1,55 @@
 """複数の球で構成される図形の表面積を計算する"""
 from collections.abc import Callable, Collection, Hashable, Iterable, Iterator
+import itertools
 import math
-from typing import TypeVar
+from typing import NamedTuple, TypeVar
+from . import lcpo
 from . import spherepoint
 from . import sweepprune
 from .typehint import Vector3f, Sphere
-from . import vector3f
 from .. import common
 
 
 _ID = TypeVar('_ID', bound=Hashable)
 
 
+class AdaptiveResolution(NamedTuple):
+    """球面の頂点のうち粗い点集合を先に判定し,
+    粗い点の判定が一部のみ溶媒露出している球のみ全頂点で計算する.
+    表面の球の判定は全頂点で判定した場合と同じ結果になる.
+    表面積は粗い点がすべて露出している球を球全体の表面積,
+    すべて埋もれている球を0とするため, 全頂点の結果と異なる場合がある.
+
+    resolution: 球面を多面体で近似するときの頂点数
+    coarse: 先に判定する頂点数の目安, resolutionの頂点から等間隔に選ぶ
+    check: Trueの場合は最初のフレームの表面積を
+           全頂点で計算した結果と比較して誤差を表示する
+    """
+    resolution: int
+    coarse: int = 64
+    check: bool = False
+
+
+# 表面積の計算方法: 頂点数, 適応的な頂点数またはLCPO法の設定
+SurfaceResolution = int | AdaptiveResolution | lcpo.LcpoArea
+
+# score.surface.methodに指定できる値
+SURFACE_METHODS = ('adaptive', 'lcpo')
+
+
+def to_fixed_resolution(resolution: SurfaceResolution) -> int:
+    """全頂点で計算する場合の頂点数を返す.
+
+    Args:
+        resolution: 頂点数, 適応的な頂点数またはLCPO法の設定
+    Returns:
+        頂点数
+    """
+    if isinstance(resolution, (AdaptiveResolution, lcpo.LcpoArea)):
+        return resolution.resolution
+    return resolution
+
+
 def calc_multi_sphere_area(
         sphere_ids: Iterable[_ID],
         sphere_getter: Callable[[_ID], Sphere],
@@ -37,7 +75,8 @@ def calc_multi_sphere_area(
 def create_one_area_in_multi_spheres_func(
         sphere_getter: Callable[[_ID], Sphere],
         collided_sphere_getter: Callable[[_ID], Iterable[_ID]],
-        resolution: int,
+        resolution: SurfaceResolution,
+        sphere_ids: Iterable[_ID] | None = None,
 ) -> Callable[[_ID], float]:
     """複数の球からなる立体の中の1つの球の占める表面積を計算する関数を返す
 
@@ -45,10 +84,21 @@ def create_one_area_in_multi_spheres_func(
         sphere_getter: 識別子から[中心座標,半径]で表される球を返す関数
         collided_sphere_getter: 指定した識別子の球と
                                 衝突している球の識別子の集合を返す関数
-        resolution: 球面を多面体で近似するときの頂点数
+        resolution: 球面を多面体で近似するときの頂点数,
+                    適応的な頂点数またはLCPO法の設定.
+                    LCPO法の場合はatom_to_parameterを設定しておく
+        sphere_ids: 表面積を求める球の識別子の集合,
+                    LCPO法の場合はこの球の表面積をまとめて計算する
     Returns:
         球IDから1つの球の占める表面積を返す関数
     """
+    if isinstance(resolution, lcpo.LcpoArea):
+        return lcpo.create_lcpo_area_func(
+            sphere_getter, collided_sphere_getter,
+            resolution.atom_to_parameter, sphere_ids)
+    if isinstance(resolution, AdaptiveResolution):
+        return _create_adaptive_area_func(
+            sphere_getter, collided_sphere_getter, resolution)
     plot_func = create_one_plot_in_multi_spheres_func(
         sphere_getter, collided_sphere_getter, resolution)
 
@@ -58,6 +108,32 @@ def create_one_area_in_multi_spheres_func(
     return _one_area_in_multi_spheres
 
 
+def _create_adaptive_area_func(
+        sphere_getter: Callable[[_ID], Sphere],
+        collided_sphere_getter: Callable[[_ID], Iterable[_ID]],
+        resolution: AdaptiveResolution,
+) -> Callable[[_ID], float]:
+    """AdaptiveResolutionで1つの球の占める表面積を計算する関数を返す"""
+    coarse, rest = spherepoint.split_sphere_point_table(
+        resolution.resolution, resolution.coarse)
+
+    def _one_area(i: _ID):
+        pos, r = sphere_getter(i)
+        spheres = tuple(map(sphere_getter, collided_sphere_getter(i)))
+        n_coarse = common.len_iterator(_remove_in_sphere_points(
+            spherepoint.scale_sphere_points(coarse, pos, r), spheres))
+        if n_coarse == 0:
+            return 0.0
+        if n_coarse == len(coarse):
+            return 4 * math.pi * (r**2)
+        # 一部のみ露出している球は残りの頂点も判定する
+        n_rest = common.len_iterator(_remove_in_sphere_points(
+            spherepoint.scale_sphere_points(rest, pos, r), spheres))
+        return ((n_coarse + n_rest)
+                * 4 * math.pi * (r**2) / resolution.resolution)
+    return _one_area
+
+
 def plot_multi_sphere_surface(
         sphere_ids: Iterable[_ID],
         sphere_getter: Callable[[_ID], Sphere],
@@ -95,13 +171,11 @@ def create_one_plot_in_multi_spheres_func(
     Returns:
         球IDから[表面の点の座標集合, 1点あたりの表面積]を返す関数
     """
-    gen_point = spherepoint.SpherePointGenerator()
-
     def _one_plot_in_multi_spheres(i: _ID):
         pos, r = sphere_getter(i)
         one_area = 4 * math.pi * (r**2) / resolution
         points = _remove_in_sphere_points(
-            gen_point.sphere_points(resolution, pos, r),
+            spherepoint.sphere_points(resolution, pos, r),
             tuple(sphere_getter(i) for i in collided_sphere_getter(i)))
         return (points, one_area)
     return _one_plot_in_multi_spheres
@@ -110,14 +184,15 @@ def create_one_plot_in_multi_spheres_func(
 def search_surface_spheres(
         sphere_ids: Iterable[_ID],
         sphere_getter: Callable[[_ID], Sphere],
-        resolution: int,
+        resolution: SurfaceResolution,
 ) -> Iterator[_ID]:
     """複数の球で構成される図形の表面に存在する球を列挙する.
 
     Args:
         sphere_ids: 球の識別子の集合
         sphere_getter: 識別子から[中心座標,半径]で表される球を返す関数
-        resolution: 球面を多面体で近似するときの頂点数
+        resolution: 球面を多面体で近似するときの頂点数,
+                    適応的な頂点数またはLCPO法の設定
     Returns:
         表面に存在する球の識別子のイテレータ
     """
@@ -132,7 +207,7 @@ def search_surface_spheres(
 def create_is_surface_in_multi_spheres_func(
         sphere_getter: Callable[[_ID], Sphere],
         collided_sphere_getter: Callable[[_ID], Iterable[_ID]],
-        resolution: int,
+        resolution: SurfaceResolution,
 ) -> Callable[[_ID], bool]:
     """指定された球が複数の球からなる立体の表面に存在する場合Trueを返す関数
     を返す
@@ -141,10 +216,27 @@ def create_is_surface_in_multi_spheres_func(
         sphere_getter: 識別子から[中心座標,半径]で表される球を返す関数
         collided_sphere_getter: 指定した識別子の球と
                                 衝突している球の識別子の集合を返す関数
-        resolution: 球面を多面体で近似するときの頂点数
+        resolution: 球面を多面体で近似するときの頂点数,
+                    適応的な頂点数またはLCPO法の設定.
+                    適応的な場合は粗い点, 残りの点の順に判定する.
+                    LCPO法の場合はresolution.resolutionの頂点数で判定する
     Returns:
         球IDから立体の表面に存在する場合Trueを返す関数
     """
+    if isinstance(resolution, lcpo.LcpoArea):
+        resolution = resolution.resolution
+    if isinstance(resolution, AdaptiveResolution):
+        coarse, rest = spherepoint.split_sphere_point_table(
+            resolution.resolution, resolution.coarse)
+
+        def _is_surface_adaptive(i: _ID):
+            pos, r = sphere_getter(i)
+            points = _remove_in_sphere_points(
+                spherepoint.scale_sphere_points(
+                    itertools.chain(coarse, rest), pos, r),
+                tuple(map(sphere_getter, collided_sphere_getter(i))))
+            return next(points, None) is not None
+        return _is_surface_adaptive
     plot_func = create_one_plot_in_multi_spheres_func(
         sphere_getter, collided_sphere_getter, resolution)
 
@@ -169,10 +261,20 @@ def _remove_in_sphere_points(
     Returns:
         級の内部に無い点を返すイテレータ
     """
-    r2_iterable = tuple(r**2 for _, r in spheres)
+    spheres = tuple((c[0], c[1], c[2], r**2) for c, r in spheres)
+    # 隣り合う点は同じ球に含まれることが多いため,
+    # 直前の点を含んでいた球から判定する
+    last = None
     for pos in points:
-        for (center, _), r2 in zip(spheres, r2_iterable):
-            if vector3f.norm2(vector3f.sub(pos, center)) < r2:
+        p0, p1, p2 = pos
+        if last is not None:
+            c0, c1, c2, r2 = last
+            if (p0 - c0)**2 + (p1 - c1)**2 + (p2 - c2)**2 < r2:
+                continue
+        for sp in spheres:
+            c0, c1, c2, r2 = sp
+            if (p0 - c0)**2 + (p1 - c1)**2 + (p2 - c2)**2 < r2:
+                last = sp
                 break
         else:
             yield pos
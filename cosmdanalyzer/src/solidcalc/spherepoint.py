@@ -1,14 +1,112 @@
 """球表面を覆う均一な点"""
 import math
-from collections.abc import Iterator
+from collections.abc import Iterable, Iterator
 from .typehint import Vector3f
 
 
-class SpherePointGenerator:
-    """球の表面に均一に発生させた点の座標を生成する."""
+# 分割数毎の半径1, 中心原点の球の表面を均一に覆う点の座標(プロセス内で共有する)
+_NORMALIZED_POINT_TABLES: dict[int, tuple[Vector3f, ...]] = dict()
+
+
+def normalized_sphere_point_table(plot_num: int) -> tuple[Vector3f, ...]:
+    """半径1, 中心原点の球の表面を均一に覆う点の座標を返す.
+    分割数毎に初回のみ計算し, 以降はプロセス内で共有する.
+
+    Args:
+        plot_num: 球表面の分割数
+    Returns:
+        半径1, 中心原点の球の表面を均一に覆う点の座標
+    """
+    table = _NORMALIZED_POINT_TABLES.get(plot_num)
+    if table is None:
+        table = tuple(iterate_normalized_sphere_points(plot_num))
+        _NORMALIZED_POINT_TABLES[plot_num] = table
+    return table
+
+
+def sphere_points(plot_num: int, pos: Vector3f, r: float
+                  ) -> Iterator[Vector3f]:
+    """半径, 中心座標を指定して球の表面を均一に覆う点の座標を列挙する.
+
+    Args:
+        plot_num: 球表面の分割数
+        pos: 球の中心座標
+        r: 球の半径
+    Returns:
+        球の表面を均一に覆う点の座標を列挙する.
+    """
+    return scale_sphere_points(normalized_sphere_point_table(plot_num),
+                               pos, r)
+
+
+# (分割数, 粗い点の数)毎の粗い点と残りの点の座標(プロセス内で共有する)
+_SPLIT_POINT_TABLES: dict[tuple[int, int],
+                          tuple[tuple[Vector3f, ...],
+                                tuple[Vector3f, ...]]] = dict()
 
-    def __init__(self):
-        self._normalized_cache = dict()
+
+def split_sphere_point_table(plot_num: int, n_coarse: int
+                             ) -> tuple[tuple[Vector3f, ...],
+                                        tuple[Vector3f, ...]]:
+    """normalized_sphere_point_tableの点を,
+    球面全体から等間隔に選んだ粗い点と残りの点に分ける.
+
+    Args:
+        plot_num: 球表面の分割数
+        n_coarse: 粗い点の数の目安
+    Returns:
+        (粗い点の座標, 残りの点の座標), それぞれ元の順番を保つ
+    """
+    key = (plot_num, n_coarse)
+    tables = _SPLIT_POINT_TABLES.get(key)
+    if tables is None:
+        table = normalized_sphere_point_table(plot_num)
+        step = max(1, plot_num // max(1, n_coarse))
+        tables = (table[::step],
+                  tuple(p for i, p in enumerate(table) if i % step != 0))
+        _SPLIT_POINT_TABLES[key] = tables
+    return tables
+
+
+def scale_sphere_points(points: Iterable[Vector3f], pos: Vector3f, r: float
+                        ) -> Iterator[Vector3f]:
+    """半径1, 中心原点の球面上の点を指定した球の表面に移す.
+
+    Args:
+        points: 半径1, 中心原点の球面上の点の座標
+        pos: 球の中心座標
+        r: 球の半径
+    Returns:
+        球の表面の点の座標
+    """
+    p0, p1, p2 = pos
+    for x, y, z in points:
+        yield (x * r + p0, y * r + p1, z * r + p2)
+
+
+def get_sphere_point_tables() -> dict[int, tuple[Vector3f, ...]]:
+    """計算済みの点の座標を他のプロセスに渡せる形式で返す.
+
+    Returns:
+        分割数から点の座標への辞書
+    """
+    return dict(_NORMALIZED_POINT_TABLES)
+
+
+def set_sphere_point_tables(tables: dict[int, tuple[Vector3f, ...]]
+                            ) -> None:
+    """get_sphere_point_tablesで取得した点の座標を計算済みとして登録する.
+
+    Args:
+        tables: 分割数から点の座標への辞書
+    """
+    _NORMALIZED_POINT_TABLES.update(tables)
+
+
+class SpherePointGenerator:
+    """球の表面に均一に発生させた点の座標を生成する.
+    点の座標はインスタンスによらずプロセス内で共有する.
+    """
 
     def normalized_sphere_points(self, plot_num: int) -> Iterator[Vector3f]:
         """半径1, 中心原点の球の表面を均一に覆う点の座標を列挙する.
@@ -18,10 +116,7 @@ class SpherePointGenerator:
         Returns:
             半径1, 中心原点の球の表面を均一に覆う点の座標のイテレータ
         """
-        if not (plot_num in self._normalized_cache):
-            self._normalized_cache[plot_num] = tuple(
-                iterate_normalized_sphere_points(plot_num))
-        return iter(self._normalized_cache[plot_num])
+        return iter(normalized_sphere_point_table(plot_num))
 
     def sphere_points(self, plot_num: int, pos: Vector3f, r: float
                       ) -> Iterator[Vector3f]:
@@ -34,8 +129,7 @@ class SpherePointGenerator:
         Returns:
             球の表面を均一に覆う点の座標を列挙する.
         """
-        for x, y, z in self.normalized_sphere_points(plot_num):
-            yield (x * r + pos[0], y * r + pos[1], z * r + pos[2])
+        return sphere_points(plot_num, pos, r)
 
 
 def iterate_normalized_sphere_points(plot_num: int) -> Iterator[Vector3f]:
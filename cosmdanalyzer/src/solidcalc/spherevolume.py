@@ -5,6 +5,7 @@ from typing import TypeVar
 from . import commonutil
 from . import spherepoint
 from . import sweepprune
+from . import vector3f
 from .typehint import Sphere, Vector3f
 
 
@@ -48,11 +49,10 @@ def create_one_volume_in_multi_spheres_func(
     Returns:
         球の識別子から対応する球の占める体積を返す関数
     """
-    gen_point = spherepoint.SpherePointGenerator()
     return (lambda i: calc_one_sphere_volume(
             sphere_getter(i),
             map(sphere_getter, collided_sphere_getter(i)),
-            resolution, lambda n: gen_point.normalized_sphere_points(n)))
+            resolution, spherepoint.normalized_sphere_point_table))
 
 
 def calc_one_sphere_volume(
@@ -85,6 +85,9 @@ def calc_plane_divided_one_sphere_volume(
 ) -> float:
     """球を複数の平面で切断した立体の体積を計算する.
     球を分割された球面を底とする錐体の集合で近似して体積を求める.
+    各平面の垂直ベクトルと反対側を残す.
+    球の中心が残す側にない場合も, 中心からの半直線毎に残す区間を求めて
+    その区間の錐台の体積を足す.
 
     Args:
         sp: 球
@@ -94,13 +97,25 @@ def calc_plane_divided_one_sphere_volume(
     Returns:
         体積
     """
+    # 平面毎の(中心から平面までの符号付き距離, 垂直ベクトル)
+    plane_ds = tuple((vector3f.dot(vector3f.sub(plane[0], sp[0]), plane[1]),
+                      plane[1])
+                     for plane in planes)
     sum_d3 = 0.0
     for v in sphere_point_generator(resolution):
-        d = sp[1]
-        for plane in planes:
-            plane_d = commonutil.calc_intersection_line_plane(
-                    (sp[0], v), plane)
-            if (plane_d > 0) and (plane_d < d):
-                d = plane_d
-        sum_d3 += d**3
+        lo = 0.0
+        hi = sp[1]
+        for plane_d, normal in plane_ds:
+            dn = vector3f.dot(v, normal)
+            if dn > 0.0:
+                hi = min(hi, plane_d / dn)
+            elif dn < 0.0:
+                lo = max(lo, plane_d / dn)
+            elif plane_d < 0:
+                hi = lo
+            if hi <= lo:
+                break
+        else:
+            sum_d3 += hi**3 - lo**3
     return (4 * math.pi / (resolution * 3)) * sum_d3
+
@@ -0,0 +1,126 @@
+"""球で構成された図形の体積をボクセルの被覆数から計算する."""
+from collections.abc import Callable, Hashable, Iterable
+from typing import TypeVar
+import numpy as np
+from .typehint import Sphere, Vector3f
+
+
+_ID = TypeVar("_ID", bound=Hashable)
+
+
+def calc_multi_sphere_voxel_volume(
+        sphere_ids: Iterable[_ID],
+        sphere_getter: Callable[[_ID], Sphere],
+        cell_width: float,
+        origin: Vector3f = (0.0, 0.0, 0.0),
+) -> float:
+    """複数の球で構成される図形の体積をボクセル化して計算する.
+    ボクセルの中心が球の内部にある場合にそのボクセルを被覆されているとみなし,
+    被覆されたボクセル数にボクセル1つの体積を掛けて体積とする.
+
+    Args:
+        sphere_ids: 球の識別子の集合
+        sphere_getter: 識別子から[中心座標,半径]で表される球を返す関数
+        cell_width: ボクセル1つの幅
+        origin: ボクセルの境界が通る点
+    Returns:
+        体積
+    """
+    return (count_covered_voxels(map(sphere_getter, sphere_ids),
+                                 cell_width, origin)
+            * cell_width**3)
+
+
+def count_covered_voxels(
+        spheres: Iterable[Sphere],
+        cell_width: float,
+        origin: Vector3f = (0.0, 0.0, 0.0),
+) -> int:
+    """球の集合に被覆されるボクセル数を数える.
+    球をボクセルの行(0軸, 1軸のインデックスが等しいボクセル列)毎の
+    2軸方向の区間に変換し, 行毎に区間の和集合の長さを数える.
+    区間への変換と和集合の計算はすべての球についてまとめて配列演算で行う.
+
+    Args:
+        spheres: (中心座標, 半径)で表される球の集合
+        cell_width: ボクセル1つの幅
+        origin: ボクセルの境界が通る点
+    Returns:
+        被覆されているボクセル数
+    """
+    spheres = tuple(spheres)
+    if len(spheres) == 0:
+        return 0
+    w = cell_width
+    # 球の中心をボクセル中心基準のインデックス座標に変換する
+    centers = ((np.array([pos for pos, _ in spheres], dtype=np.float64)
+                - np.asarray(origin, dtype=np.float64)) / w - 0.5)
+    ri = np.array([r for _, r in spheres], dtype=np.float64) / w
+    # 球毎の0軸のインデックス
+    sphere_ids, i0 = _expand_ranges(np.ceil(centers[:, 0] - ri),
+                                    np.floor(centers[:, 0] + ri))
+    r0_2 = ri[sphere_ids]**2 - (i0 - centers[sphere_ids, 0])**2
+    mask = r0_2 > 0.0
+    sphere_ids, i0, r0_2 = sphere_ids[mask], i0[mask], r0_2[mask]
+    # 0軸のインデックス毎の1軸のインデックス
+    c1 = centers[sphere_ids, 1]
+    r0 = np.sqrt(r0_2)
+    row_ids, i1 = _expand_ranges(np.ceil(c1 - r0), np.floor(c1 + r0))
+    r1_2 = r0_2[row_ids] - (i1 - c1[row_ids])**2
+    mask = r1_2 > 0.0
+    row_ids, i1, r1_2 = row_ids[mask], i1[mask], r1_2[mask]
+    c2 = centers[sphere_ids[row_ids], 2]
+    r1 = np.sqrt(r1_2)
+    start = np.ceil(c2 - r1).astype(np.int64)
+    end = np.floor(c2 + r1).astype(np.int64)
+    mask = start <= end
+    if not mask.any():
+        return 0
+    i0 = i0[row_ids[mask]].astype(np.int64)
+    i1 = i1[mask].astype(np.int64)
+    start, end = start[mask], end[mask]
+    return _count_union_intervals(i0, i1, start, end)
+
+
+def _expand_ranges(starts: np.ndarray, ends: np.ndarray
+                   ) -> tuple[np.ndarray, np.ndarray]:
+    """境界を含む区間の列をそれぞれ整数の列に展開する.
+
+    Args:
+        starts: 区間の開始点(整数値)
+        ends: 区間の終了点(整数値)
+    Returns:
+        (展開した値の元の区間の番号, 展開した値)
+    """
+    counts = np.maximum(ends - starts + 1, 0).astype(np.int64)
+    ids = np.repeat(np.arange(len(counts)), counts)
+    offsets = np.arange(len(ids)) - np.repeat(np.cumsum(counts) - counts,
+                                              counts)
+    return ids, starts[ids] + offsets
+
+
+def _count_union_intervals(i0: np.ndarray, i1: np.ndarray,
+                           start: np.ndarray, end: np.ndarray) -> int:
+    """行(i0, i1)毎の境界を含む整数区間の和集合の要素数の合計を数える.
+
+    Args:
+        i0: 区間の行の0軸のインデックス
+        i1: 区間の行の1軸のインデックス
+        start: 区間の開始点
+        end: 区間の終了点
+    Returns:
+        和集合の要素数の合計
+    """
+    # 行毎に重ならない1次元の座標に並べ, 全体を1つの区間の列として扱う
+    span = int(end.max() - start.min()) + 2
+    rows = ((i0 - i0.min()) * (int(i1.max() - i1.min()) + 1)
+            + (i1 - i1.min()))
+    starts = rows * span + (start - start.min())
+    ends = rows * span + (end - start.min())
+    order = np.argsort(starts, kind='stable')
+    starts, ends = starts[order], ends[order]
+    # それより前の区間で被覆されている最大の座標
+    prev_ends = np.empty_like(ends)
+    prev_ends[0] = starts[0] - 1
+    np.maximum.accumulate(ends[:-1], out=prev_ends[1:])
+    return int(np.maximum(ends - np.maximum(starts - 1, prev_ends), 0).sum())
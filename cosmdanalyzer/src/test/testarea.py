@@ -0,0 +1,150 @@
+import math
+import random
+import unittest
+from src import solidcalc
+
+
+def _random_spheres(rng: random.Random, n: int):
+    return [((rng.uniform(0.0, 8.0), rng.uniform(0.0, 8.0),
+              rng.uniform(0.0, 8.0)), rng.uniform(1.0, 2.5))
+            for _ in range(n)]
+
+
+def _cap_area(sphere_i, sphere_j) -> float:
+    """球jの内部にある球iの球冠の面積"""
+    (pos_i, r_i), (pos_j, r_j) = sphere_i, sphere_j
+    d = math.dist(pos_i, pos_j)
+    if d == 0.0:
+        return 4 * math.pi * r_i**2 if r_i <= r_j else 0.0
+    height = r_i - d / 2 - (r_i**2 - r_j**2) / (2 * d)
+    return 2 * math.pi * r_i * min(max(height, 0.0), 2 * r_i)
+
+
+def _lcpo_area(i, spheres, params) -> float:
+    """LCPO法の式の通りに1つの球の表面積を計算する"""
+    if params[i] is None:
+        return 0.0
+    p1, p2, p3, p4 = params[i]
+    neighbors = [j for j in range(len(spheres))
+                 if j != i and params[j] is not None
+                 and math.dist(spheres[i][0], spheres[j][0])
+                 < spheres[i][1] + spheres[j][1]]
+    sum_ij = sum(_cap_area(spheres[i], spheres[j]) for j in neighbors)
+    sum_jk = [sum(_cap_area(spheres[j], spheres[k])
+                  for k in neighbors if k != j) for j in neighbors]
+    sum_ijk = sum(_cap_area(spheres[i], spheres[j]) * s
+                  for j, s in zip(neighbors, sum_jk))
+    area = (p1 * 4 * math.pi * spheres[i][1]**2 + p2 * sum_ij
+            + p3 * sum(sum_jk) + p4 * sum_ijk)
+    return max(area, 0.0)
+
+
+class TestArea(unittest.TestCase):
+
+    def test_split_sphere_point_table(self):
+        table = solidcalc.normalized_sphere_point_table(256)
+        self.assertEqual(len(table), 256)
+        coarse, rest = solidcalc.split_sphere_point_table(256, 32)
+        self.assertEqual(len(coarse), 32)
+        self.assertEqual(sorted(coarse + rest), sorted(table))
+
+    def test_adaptive_surface_spheres(self):
+        rng = random.Random(0)
+        spheres = _random_spheres(rng, 60)
+        ids = range(len(spheres))
+        # 粗い点で露出しない球も残りの点で判定するため結果は変わらない
+        self.assertEqual(
+            list(solidcalc.search_surface_spheres(
+                ids, spheres.__getitem__,
+                solidcalc.AdaptiveResolution(256, 16))),
+            list(solidcalc.search_surface_spheres(
+                ids, spheres.__getitem__, 256)))
+
+    def test_adaptive_area(self):
+        rng = random.Random(1)
+        spheres = _random_spheres(rng, 40)
+        ids = range(len(spheres))
+        fixed = solidcalc.calc_multi_sphere_area(
+            ids, spheres.__getitem__, 256)
+        adaptive = solidcalc.calc_multi_sphere_area(
+            ids, spheres.__getitem__, solidcalc.AdaptiveResolution(256, 64))
+        self.assertLess(abs(adaptive - fixed) / fixed, 0.05)
+        # 衝突する球がない場合は全頂点の結果と同じになる
+        one_sphere = [((0.0, 0.0, 0.0), 1.5)]
+        self.assertAlmostEqual(
+            solidcalc.calc_multi_sphere_area(
+                range(1), one_sphere.__getitem__,
+                solidcalc.AdaptiveResolution(256, 64)),
+            4 * math.pi * 1.5**2)
+        self.assertEqual(solidcalc.to_fixed_resolution(
+            solidcalc.AdaptiveResolution(128)), 128)
+
+    def test_lcpo_area(self):
+        # P1=1, P2=-1の場合は2つの球の表面積が厳密に求まる
+        spheres = [((0.0, 0.0, 0.0), 1.7), ((2.0, 0.5, 0.0), 1.5),
+                   ((1.0, 0.0, 0.5), 1.0)]
+        params = [(1.0, -1.0, 0.0, 0.0), (1.0, -1.0, 0.0, 0.0), None]
+        areas = solidcalc.calc_lcpo_areas(
+            range(len(spheres)), spheres.__getitem__, params.__getitem__)
+        self.assertEqual(areas[2], 0.0)
+        points = solidcalc.calc_multi_sphere_area(
+            range(2), spheres.__getitem__, 4096)
+        self.assertLess(abs(areas[0] + areas[1] - points) / points, 0.01)
+        # 衝突する球がない場合はP1倍の球の表面積になる
+        param = solidcalc.lcpo_parameter(6, 'SP3', 2)
+        self.assertAlmostEqual(
+            solidcalc.calc_multi_sphere_area(
+                range(1), spheres.__getitem__,
+                solidcalc.LcpoArea(256, (lambda _: param))),
+            param[0] * 4 * math.pi * 1.7**2)
+        self.assertIsNone(solidcalc.lcpo_parameter(1, 'S', 1))
+        self.assertEqual(solidcalc.lcpo_parameter(16, 'SP3', 2),
+                         solidcalc.lcpo_parameter(16, 'SP2', 2))
+        self.assertEqual(solidcalc.lcpo_parameter(8, 'SP3', 1, True),
+                         solidcalc.LCPO_CARBOXYLATE_PARAMETER)
+        self.assertEqual(solidcalc.lcpo_parameter(26, 'SP3', 0),
+                         solidcalc.lcpo_parameter(6, 'SP3', 1))
+
+    def test_lcpo_batch(self):
+        rng = random.Random(3)
+        spheres = _random_spheres(rng, 50)
+        # 中心が一致する球
+        spheres.append(spheres[7])
+        params = [None if rng.random() < 0.2 else solidcalc.lcpo_parameter(
+                      rng.choice((6, 7, 8)), 'SP3', rng.randint(1, 3))
+                  for _ in spheres]
+        ids = range(len(spheres))
+        areas = solidcalc.calc_lcpo_areas(
+            ids, spheres.__getitem__, params.__getitem__)
+        for i in ids:
+            self.assertAlmostEqual(areas[i], _lcpo_area(i, spheres, params))
+        # 指定した球をまとめて計算しても1つずつ計算しても同じ値になる
+        col_dict = {i: [j for j in ids if math.dist(
+                        spheres[i][0], spheres[j][0])
+                        < spheres[i][1] + spheres[j][1]] for i in ids}
+        batch = solidcalc.create_one_area_in_multi_spheres_func(
+            spheres.__getitem__, col_dict.__getitem__,
+            solidcalc.LcpoArea(256, params.__getitem__), ids[:30])
+        one = solidcalc.create_one_area_in_multi_spheres_func(
+            spheres.__getitem__, col_dict.__getitem__,
+            solidcalc.LcpoArea(256, params.__getitem__))
+        for i in ids:
+            self.assertAlmostEqual(batch(i), one(i))
+            self.assertAlmostEqual(batch(i), areas[i])
+
+    def test_lcpo_surface_spheres(self):
+        rng = random.Random(2)
+        spheres = _random_spheres(rng, 40)
+        ids = range(len(spheres))
+        # 溶媒露出の判定は頂点で行う
+        self.assertEqual(
+            list(solidcalc.search_surface_spheres(
+                ids, spheres.__getitem__, solidcalc.LcpoArea(256))),
+            list(solidcalc.search_surface_spheres(
+                ids, spheres.__getitem__, 256)))
+        self.assertEqual(solidcalc.to_fixed_resolution(
+            solidcalc.LcpoArea(128)), 128)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import argparse
+import os
+import pathlib
+import tempfile
+import unittest
+from src.main import batch
+
+
+def _run_or_crash(job: batch.BatchJob, args: argparse.Namespace,
+                  root_dir: str) -> batch.BatchResult:
+    """名前が'crash'の対象のみワーカープロセスを異常終了させる."""
+    if job.name == 'crash':
+        os._exit(1)
+    return batch.BatchResult(job.name, True, 0.0, job.out_dir / 'log', '')
+
+
+class TestBatch(unittest.TestCase):
+
+    def test_create_jobs(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = pathlib.Path(tmp)
+            atom = 'ATOM      1  CA  ALA     1       0.000   0.000   0.000\n'
+            for name in ('a/x', 'a/y', 'b/x'):
+                (root / name).mkdir(parents=True)
+                (root / name / 'in.pdb').write_text(
+                    ('MODEL 1\n' + atom * 3 + 'ENDMDL\n') * 2 + 'END\n')
+            (root / 'a/x' / 'in.dx').write_text(
+                'object 1 class gridpositions counts 2 3 4\n')
+            targets = list(batch.expand_targets((str(root / '*' / '*'), )))
+            jobs = batch.create_jobs(targets, root / 'out')
+            self.assertEqual([j.name for j in jobs], ['a_x', 'a_y', 'b_x'])
+            self.assertEqual(jobs[0].out_dir, root / 'out' / 'a_x')
+            # 3原子2フレームのトラジェクトリと24ボクセルのDXファイル
+            self.assertEqual(batch.count_pdb_atoms_frames(
+                root / 'a/x' / 'in.pdb'), (3, 2))
+            self.assertEqual(jobs[0].memory,
+                             batch.BASE_MEMORY
+                             + 9 * batch.MEMORY_PER_ATOM_PAIR
+                             + 6 * batch.MEMORY_PER_ATOM_FRAME
+                             + 24 * batch.MEMORY_PER_VOXEL)
+            self.assertEqual(jobs[1].memory,
+                             jobs[0].memory - 24 * batch.MEMORY_PER_VOXEL)
+            single = batch.create_jobs(targets[:1], root / 'out')
+            self.assertEqual(single[0].name, 'x')
+            with self.assertRaises(ValueError):
+                batch.create_jobs(targets + targets[:1], root / 'out')
+
+    def test_broken_pool(self):
+        # 異常終了した対象のみ失敗とし, 同時に実行していた対象も計算する
+        with tempfile.TemporaryDirectory() as tmp:
+            root = pathlib.Path(tmp)
+            jobs = [batch.BatchJob(name, root, root / name, 0.0)
+                    for name in ('a', 'crash', 'b', 'c')]
+            args = argparse.Namespace(setting=str(root / 'setting.toml'))
+            results = batch.run_batch(
+                jobs, args, pathlib.Path(__file__).parents[2], 2,
+                run_func=_run_or_crash)
+            self.assertEqual([r.name for r in results],
+                             ['a', 'crash', 'b', 'c'])
+            self.assertEqual([r.succeeded for r in results],
+                             [True, False, True, True])
+
+    def test_load_manifest(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = pathlib.Path(tmp)
+            for name in ('t1', 't2', 't3'):
+                (root / name).mkdir()
+            manifest = root / 'manifest.txt'
+            manifest.write_text('# targets\nt1\n\nt[23]\n')
+            targets = list(batch.load_manifest(manifest))
+            self.assertEqual(targets, [root / 't1', root / 't2', root / 't3'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import pickle
+import random
+import tempfile
+import unittest
+import numpy as np
+from src import common
+
+
+class TestBitMatrix(unittest.TestCase):
+
+    def _create_rows(self, n_rows: int, n_cols: int) -> list[set[int]]:
+        rng = random.Random(0)
+        return [set(rng.sample(range(n_cols), rng.randrange(n_cols)))
+                for _ in range(n_rows)]
+
+    def _assert_rows(self, matrix: common.BitMatrix, rows: list[set[int]],
+                     n_cols: int):
+        self.assertEqual(len(matrix), len(rows))
+        for row, expected in zip(matrix, rows):
+            self.assertEqual(list(row), sorted(expected))
+            self.assertEqual(len(row), len(expected))
+            self.assertEqual([c in row for c in range(-1, n_cols + 1)],
+                             [c in expected for c in range(-1, n_cols + 1)])
+
+    def test_rows(self):
+        n_cols = 37
+        rows = self._create_rows(5, n_cols)
+        for mapped in (False, True):
+            with tempfile.TemporaryDirectory() as tmp:
+                matrix = common.BitMatrix(len(rows), n_cols, mapped, tmp)
+                for i, cols in enumerate(rows):
+                    matrix.set_row(i, cols)
+                self._assert_rows(matrix, rows, n_cols)
+                self._assert_rows(matrix[1:4], rows[1:4], n_cols)
+                self._assert_rows(matrix[::2], rows[::2], n_cols)
+                self.assertEqual(list(matrix[-1]), sorted(rows[-1]))
+                self.assertEqual(
+                    common.BitRow(common.pack_bits(rows[1], n_cols),
+                                  n_cols).to_bytes(),
+                    matrix[1].to_bytes())
+                self._assert_rows(pickle.loads(pickle.dumps(matrix)), rows,
+                                  n_cols)
+                del matrix
+        with self.assertRaises(IndexError):
+            common.BitMatrix(2, n_cols)[2]
+
+    def test_counts(self):
+        n_cols = 20
+        rows = self._create_rows(4, n_cols)
+        matrix = common.BitMatrix(len(rows), n_cols)
+        for i, cols in enumerate(rows):
+            matrix.set_row(i, cols)
+        groups = [range(0, 7), range(7, 8), range(8, 20), []]
+        self.assertEqual(
+            matrix.count_groups(groups),
+            [sum(len(cols.intersection(g)) for cols in rows) for g in groups])
+        row = matrix[0]
+        mask = common.create_bit_mask(groups[2])
+        self.assertEqual(row.count(mask), len(rows[0].intersection(groups[2])))
+        self.assertEqual(row.contains_many([3, 25, -1, 11]).tolist(),
+                         [c in rows[0] for c in (3, 25, -1, 11)])
+        self.assertEqual(
+            row.contains_many(np.arange(n_cols)).tolist(),
+            [c in rows[0] for c in range(n_cols)])
+        self.assertEqual(row.contains_many([]).tolist(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import random
+import unittest
+from src.main import calccharge
+
+
+class TestCharge(unittest.TestCase):
+
+    def test_calc_atoms_charge(self):
+        # ALA相当の重原子 N, CA, C, O, CB
+        names = (' N  ', ' CA ', ' C  ', ' O  ', ' CB ')
+        numbers = (7, 6, 6, 8, 6)
+        bonds = ((0, 1), (1, 2), (2, 3), (1, 4))
+        charges = (-0.4, 0.03, 0.6, -0.5, -0.18)
+        template = calccharge.ResidueTemplate(
+            tuple(zip(numbers, charges)),
+            tuple(tuple(j for b in bonds for j in b if i in b and j != i)
+                  for i in range(len(names))))
+        n_res = 6
+        atom_to_template: dict[int, int] = dict()
+        res_atoms: dict[int, list[int]] = dict()
+        ids = list(range(n_res * len(names)))
+        random.shuffle(ids)
+        for r in range(n_res):
+            atoms = ids[r * len(names):(r + 1) * len(names)]
+            for i, a in enumerate(atoms):
+                atom_to_template[a] = i
+            random.shuffle(atoms)
+            res_atoms[r] = atoms
+        atom_to_res = {a: r for r, atoms in res_atoms.items() for a in atoms}
+        neighbors: dict[int, list[int]] = {a: [] for a in atom_to_res}
+        for r, atoms in res_atoms.items():
+            t_to_atom = {atom_to_template[a]: a for a in atoms}
+            for i, j in bonds:
+                neighbors[t_to_atom[i]].append(t_to_atom[j])
+                neighbors[t_to_atom[j]].append(t_to_atom[i])
+        # 残基間の結合
+        for r in range(n_res - 1):
+            c = next(a for a in res_atoms[r] if atom_to_template[a] == 2)
+            n = next(a for a in res_atoms[r + 1] if atom_to_template[a] == 0)
+            neighbors[c].append(n)
+            neighbors[n].append(c)
+        args = (range(n_res), res_atoms.__getitem__,
+                (lambda a: numbers[atom_to_template[a]]),
+                neighbors.__getitem__,
+                (lambda a: 'ALA' if atom_to_res[a] < n_res - 1 else 'GLY'),
+                (lambda s: ((template.atoms, template.neighbors.__getitem__)
+                            if s == 'ALA'
+                            else (tuple(), (lambda _: tuple())))))
+        true_charge = {a: charges[t] for a, t in atom_to_template.items()
+                       if atom_to_res[a] < n_res - 1}
+        self.assertEqual(calccharge.calc_atoms_charge(*args), true_charge)
+        self.assertEqual(
+            calccharge.calc_atoms_charge(
+                *args, (lambda a: names[atom_to_template[a]])),
+            true_charge)
@@ -0,0 +1,145 @@
+import contextlib
+import io
+import os
+import pathlib
+import random
+import tempfile
+import unittest
+from src import chem
+from src import common
+from src import solidcalc
+from src.main import calcmain
+from src.main import checkpoint
+from src.main import scoretype
+
+
+_ROOT_DIR = pathlib.Path(__file__).parents[2]
+_SAMPLE_PDB = (_ROOT_DIR / 'sample_input' / 'multi' / 'A00' / 'output'
+               / 'system0' / '2am9_A00_position_check.pdb')
+_N_RESIDUES = 12
+_N_FRAMES = 5
+
+
+def _create_trajectory_mol() -> chem.Mol:
+    """同梱のPDBの先頭の残基の座標をフレーム毎に少しずらした分子を作成する."""
+    with open(_SAMPLE_PDB) as f:
+        protein = [line for line in f if line.startswith('ATOM')
+                   and int(line[22:26]) <= _N_RESIDUES]
+    rng = random.Random(0)
+    lines = []
+    for frame_idx in range(_N_FRAMES):
+        lines.append('MODEL {:>8d}\n'.format(frame_idx + 1))
+        for line in protein:
+            moved = ''.join(
+                '{:8.3f}'.format(float(line[i:i + 8]) + rng.uniform(-0.2, 0.2))
+                for i in (30, 38, 46))
+            lines.append(line[:30] + moved + line[54:])
+        lines.append('ENDMDL\n')
+    return chem.create_mol_from_pdb_str(''.join(lines))
+
+
+class _Interrupted(Exception):
+    pass
+
+
+class _InterruptingWriter:
+    """指定したフレーム数を書き込んだ後に中断する"""
+
+    def __init__(self, n_frames: int):
+        self._n_frames = n_frames
+
+    def add_frame(self, scores, frame_idx: int) -> None:
+        if self._n_frames == 0:
+            raise _Interrupted()
+        self._n_frames -= 1
+
+    def flush(self) -> None:
+        pass
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def test_save_load(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = checkpoint.Checkpoint(tmp, 'key', 10, False)
+            slot = store.slot('scores')
+            score = scoretype.MeanScore(scoretype.SketchDetail())
+            for v in (1.0, 2.0, 4.0):
+                score.add_score(v)
+            slot.save((3, False, (score, )))
+            self.assertEqual(os.listdir(os.path.join(tmp, 'checkpoint')),
+                             ['scores.pkl', ])
+            # 再開しない場合は読み込まない
+            self.assertIsNone(slot.load())
+            resumed = checkpoint.Checkpoint(tmp, 'key', 10, True)
+            n_done, finished, (loaded, ) = resumed.slot('scores').load()
+            self.assertEqual((n_done, finished), (3, False))
+            loaded.add_score(8.0)
+            score.add_score(8.0)
+            self.assertEqual(loaded.get_result(), score.get_result())
+            self.assertEqual(loaded.get_detail_result(),
+                             score.get_detail_result())
+            self.assertIsNone(resumed.load('other'))
+            with self.assertRaises(ValueError):
+                checkpoint.Checkpoint(tmp, 'other key', 10, True).load(
+                    'scores')
+
+
+    def test_resume_frame_scores(self):
+        """途中で中断して再開した結果が中断しない場合と一致することを確認する."""
+        mol = _create_trajectory_mol()
+        protein_idxs = tuple(mol.get_atom_idxs())
+        res_to_atoms = calcmain.create_res_to_atoms(
+            mol.divide_to_residue(protein_idxs))
+        patch_list = [{1, 2, 3, 4}, {6, 7, 8}]
+        exposed_atoms = [common.BitRow(common.pack_bits(
+                             protein_idxs, len(protein_idxs)),
+                             len(protein_idxs))] * _N_FRAMES
+        resolution = solidcalc.AdaptiveResolution(64, 16, True)
+
+        def calc(frame_score_out=None, checkpoint_slot=None):
+            return calcmain.calc_frame_scores(
+                mol, protein_idxs, res_to_atoms, patch_list, exposed_atoms,
+                1.4, True, resolution, _ROOT_DIR / 'data/aminoacids.rtp',
+                False, frame_score_out, checkpoint_slot=checkpoint_slot)
+        with contextlib.redirect_stdout(io.StringIO()):
+            whole = calc()
+        with tempfile.TemporaryDirectory() as tmp:
+            # 2フレーム毎に保存し, 4フレーム目で中断する
+            with contextlib.redirect_stdout(io.StringIO()):
+                with self.assertRaises(_Interrupted):
+                    calc(_InterruptingWriter(3),
+                         checkpoint.Checkpoint(tmp, 'key', 2, False)
+                         .slot('frame_scores'))
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out):
+                resumed = calc(
+                    _InterruptingWriter(_N_FRAMES),
+                    checkpoint.Checkpoint(tmp, 'key', 2, True)
+                    .slot('frame_scores'))
+        # 最初のフレームで表示した誤差は再開後に表示しない
+        self.assertNotIn('surface check', out.getvalue())
+        for whole_score, resumed_score in zip(whole, resumed):
+            self.assertEqual(list(resumed_score.get_result()),
+                             list(whole_score.get_result()))
+        for whole_score, resumed_score in zip(whole[:-1], resumed[:-1]):
+            self.assertEqual(list(resumed_score.get_detail_result()),
+                             list(whole_score.get_detail_result()))
+
+    def test_atomic_open(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'data.bin')
+            with common.atomic_open(path) as f:
+                f.write(b'first')
+            # 書き込み中に失敗した場合は元のファイルを残す
+            with self.assertRaises(RuntimeError):
+                with common.atomic_open(path) as f:
+                    f.write(b'second')
+                    raise RuntimeError()
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), b'first')
+            self.assertEqual(os.listdir(tmp), ['data.bin', ])
+
+
+if __name__ == '__main__':
+    unittest.main()
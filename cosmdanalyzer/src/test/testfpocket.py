@@ -1,7 +1,12 @@
 """fpocketの出力読み込みのユニットテスト"""
+import random
 import unittest
 from pathlib import Path
+from src import index
+from src import solidcalc
 from src.fpocket import parser
+from src.main import calcmain
+from src.main import fpocketscore
 
 
 class TestFpocket(unittest.TestCase):
@@ -21,3 +26,122 @@ class TestFpocket(unittest.TestCase):
                         self.assertEqual(p[0], tp[0])
                         self.assertEqual(p[1], tp[1])
                         self.assertEqual(p[2], tp[2])
+
+    def test_fpocket_scores(self):
+        """すべてのホットスポットの重なりが変更前の判定と一致するテスト"""
+        shape = (16, 16, 16)
+        origin = (-3.0, 1.5, 0.25)
+        size = 0.5
+        grid = tuple(tuple(o + size * i for o, i in zip(origin, v))
+                     for v in ((x, y, z) for x in range(shape[0])
+                               for y in range(shape[1])
+                               for z in range(shape[2])))
+        hotspots = tuple(tuple(set(random.sample(grid, 512)))
+                         for _ in range(4))
+        # グリッド点とグリッド点から少しずれた点を混ぜる
+        fpockets = tuple(
+            (float(i + 1),
+             tuple(p if random.random() < 0.5
+                   else tuple(v + 1.0e-9 for v in p)
+                   for p in random.sample(grid, 128)))
+            for i in range(8))
+        true_scores = [
+            vptree_score(h, size, fpockets) for h in hotspots]
+        self.assertEqual(
+            fpocketscore.fpocket_scores(hotspots, size, fpockets),
+            true_scores)
+        for h, true_score in zip(hotspots, true_scores):
+            self.assertEqual(
+                fpocketscore.fpocket_score(h, size, fpockets, 0.0),
+                true_score)
+
+
+    def test_fpocket_voxel_scores(self):
+        """ボクセル単位のfpocketとホットスポットの重なりのテスト"""
+        shape = (16, 16, 16)
+        origin = (-3.0, 1.5, 0.25)
+        size = 1.0
+        hotspots = tuple(
+            set(tuple(random.randrange(0, n) for n in shape)
+                for _ in range(64))
+            for _ in range(4))
+        voxel_ids = tuple(index.convert_3d_index_to_1d(v, shape)
+                          for h in hotspots for v in h)
+        labels = tuple(i for i, h in enumerate(hotspots) for _ in h)
+        fpockets = tuple(
+            (str(i + 1),
+             tuple(tuple(o + size * random.randrange(-2, n + 2)
+                         + random.uniform(0.05, 0.95) * size
+                         for o, n in zip(origin, shape))
+                   for _ in range(128)))
+            for i in range(8))
+        for threshold in (0.0, 0.02):
+            true_scores = []
+            for h in hotspots:
+                corners = tuple(tuple(o + size * i for o, i in zip(origin, v))
+                                for v in h)
+                max_rate = 0.0
+                max_score = 0.0
+                for score, pos in fpockets:
+                    rate = sum(
+                        any(all(c[i] <= p[i] < c[i] + size
+                                for i in range(3)) for c in corners)
+                        for p in pos) / len(pos)
+                    if (max_rate < rate) and (rate >= threshold):
+                        max_rate = rate
+                        max_score = float(score)
+                true_scores.append(max_score)
+            self.assertEqual(
+                fpocketscore.fpocket_voxel_scores(
+                    voxel_ids, labels, len(hotspots),
+                    fpocketscore.create_grid_voxel_id_func(
+                        origin, size, shape),
+                    fpockets, threshold),
+                true_scores)
+
+    def test_fpocket_voxel_total_score(self):
+        """ボクセル単位の重なりのスコアを重み付きの和に使うテスト"""
+        with open(Path(__file__).parent / 'test_fpocket.pdb') as pdb, \
+             open(Path(__file__).parent / 'test_fpocket_info.txt') as info:
+            fpockets = tuple(parser.parse_fpocket(pdb, info))
+        origin = (-30.0, -30.0, -30.0)
+        size = 1.0
+        shape = (60, 60, 60)
+        to_id = fpocketscore.create_grid_voxel_id_func(origin, size, shape)
+        # 1番目のポケットの点を含むボクセルをホットスポット0とする
+        hotspot = sorted(set(to_id(p) for p in fpockets[0][1]))
+        scores = fpocketscore.fpocket_voxel_scores(
+            hotspot, (0, ) * len(hotspot), 2, to_id, fpockets, 0.5)
+        self.assertEqual(scores, [0.413, 0.0])
+        # 座標が一致する点のみの判定では重ならない
+        self.assertEqual(
+            fpocketscore.fpocket_scores(
+                (tuple((origin[0] + v // 3600 * size,
+                        origin[1] + v // 60 % 60 * size,
+                        origin[2] + v % 60 * size) for v in hotspot),
+                 tuple()),
+                size, fpockets),
+            [0.0, 0.0])
+        n_scores = len(calcmain.SCORE_NAMES)
+        fpocket_idx = calcmain.SCORE_NAMES.index('fpocket')
+        results = tuple(tuple(scores) if i == fpocket_idx else (1.0, 2.0)
+                        for i in range(n_scores))
+        weight = (0.5, ) * n_scores
+        mean_scores = [[0.0, 0.0] for _ in range(n_scores + 1)]
+        sum_score = calcmain.add_system_mean_scores(
+            mean_scores, results, weight, 2)
+        self.assertAlmostEqual(sum_score[0],
+                               0.5 * (n_scores - 1) + 0.5 * 0.413)
+        self.assertAlmostEqual(sum_score[1], 1.0 * (n_scores - 1))
+        self.assertAlmostEqual(mean_scores[fpocket_idx + 1][0], 0.826)
+
+def vptree_score(hotspot, size, fpockets):
+    """変更前のVpTreeによる重なりの判定で最大のスコアを求める"""
+    max_rate = 0
+    max_score = 0.0
+    for score, pos in fpockets:
+        rate = solidcalc.calc_point_set_box_overwraped(pos, hotspot, size)
+        if (max_rate < rate) and rate:
+            max_rate = rate
+            max_score = score
+    return max_score
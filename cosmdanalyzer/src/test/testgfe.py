@@ -0,0 +1,41 @@
+import random
+import statistics
+import unittest
+from src.scorecalc import gfe
+
+
+class TestGfe(unittest.TestCase):
+
+    def test_calc_all_gfe(self):
+        n_hotspots = 8
+        values = tuple(random.choice((0.0, random.uniform(0.0, 0.02)))
+                       for _ in range(1000))
+        hotspots = tuple(
+            tuple(random.sample(range(len(values)), random.randrange(1, 64)))
+            for _ in range(n_hotspots))
+        voxel_ids = tuple(v for h in hotspots for v in h)
+        labels = tuple(i for i, h in enumerate(hotspots) for _ in h)
+        gfe_func = gfe.create_gfe_func(40, 300.0, 4.0e5)
+        hotspot_gfe, grid_gfe = gfe.calc_all_gfe(
+            voxel_ids, labels, n_hotspots, values.__getitem__,
+            5.0e5, 1.0e5, 40, 300.0)
+        self.assertIsNone(grid_gfe)
+        for h, g in zip(hotspots, hotspot_gfe):
+            self.assertAlmostEqual(
+                g, statistics.mean(gfe_func(values[v]) for v in h))
+        hotspot_gfe2, grid_gfe = gfe.calc_all_gfe(
+            voxel_ids, labels, n_hotspots, values.__getitem__,
+            5.0e5, 1.0e5, 40, 300.0, values)
+        self.assertEqual(hotspot_gfe, hotspot_gfe2)
+        for g, v in zip(grid_gfe, values):
+            self.assertAlmostEqual(g, gfe_func(v))
+
+    def test_group_mean(self):
+        self.assertEqual(
+            gfe.group_mean((1.0, 2.0, 4.0, 3.0), (0, 2, 2, 0), 4),
+            [2.0, None, 3.0, None])
+        self.assertEqual(gfe.group_mean((), (), 2), [None, None])
+        values = gfe.calc_voxels_gfe((0.0, 1.0e-8, 0.01), 40, 300.0, 4.0e5)
+        self.assertEqual(values[0], 3.0)
+        self.assertEqual(values[1], 3.0)
+        self.assertLess(values[2], 0.0)
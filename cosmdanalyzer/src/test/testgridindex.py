@@ -0,0 +1,37 @@
+import random
+import unittest
+from src.neighbors import gridindex, vptree
+from src.solidcalc import vector3f
+from src.solidcalc.typehint import Vector3f
+
+
+class TestGridIndex(unittest.TestCase):
+
+    def test_labels_in_radius(self):
+        n_label = 32
+        n_points = 16
+        size = 64.0
+        labeled = tuple(
+            (label, tuple(random.uniform(-size, size) for _ in range(3)))
+            for label in range(n_label) for _ in range(n_points))
+        radius = 5.0
+        index = gridindex.LabeledGridIndex(iter(labeled), radius)
+        trees = dict()
+        for label in range(n_label):
+            trees[label] = vptree.VpTree(
+                (pos for lb, pos in labeled if lb == label), distance_func)
+        for _ in range(32):
+            center = tuple(random.uniform(-size, size) for _ in range(3))
+            queries = tuple(
+                tuple(c + random.uniform(-4.0, 4.0) for c in center)
+                for _ in range(16))
+            true_labels = set(
+                label for label, tree in trees.items()
+                if any(tree.exists_neighbor(q, radius) for q in queries))
+            self.assertEqual(index.labels_in_radius(queries, radius),
+                             true_labels)
+        self.assertEqual(index.labels_in_radius(tuple(), radius), set())
+
+
+def distance_func(v0: Vector3f, v1: Vector3f) -> float:
+    return vector3f.norm(vector3f.sub(v0, v1))
@@ -1,4 +1,5 @@
 import math
+import pickle
 import random
 import unittest
 from src import index
@@ -70,3 +71,22 @@ class Index(unittest.TestCase):
                 d2 = idx[0]**2 + idx[1]**2 + idx[2]**2
                 self.assertTrue(r2 < d2)
                 self.assertTrue(d2 <= ex_r2)
+
+    def test_stencil(self):
+        rng = random.Random(0)
+        for _ in range(16):
+            r = rng.choice((rng.uniform(0.0, 6.0), float(rng.randrange(7))))
+            stencil = index.sphere_grid_stencil(r)
+            self.assertIs(index.sphere_grid_stencil(r), stencil)
+            self.assertEqual(list(stencil),
+                             list(index.sphere_grid_index_iterator(r)))
+            self.assertEqual(list(index.half_sphere_grid_stencil(r)),
+                             list(index.half_sphere_grid_index_iterator(r)))
+            box = (tuple(rng.randrange(-8, 3) for _ in range(3)),
+                   tuple(rng.randrange(0, 10) for _ in range(3)))
+            self.assertEqual(
+                index.clip_stencil(stencil, box),
+                list(index.sphere_and_box_grid_index_iterator(r, box)))
+        tables = pickle.loads(pickle.dumps(index.get_stencil_tables()))
+        index.set_stencil_tables(tables)
+        self.assertEqual(index.get_stencil_tables(), tables)
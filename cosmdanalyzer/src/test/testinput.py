@@ -0,0 +1,109 @@
+import unittest
+from src.main import input
+
+
+def _atom_line(record: str, serial: int, name: str, res_name: str,
+               x: float, element: str) -> str:
+    return '{:6s}{:5d} {:4s} {:3s} A{:4d}    {:8.3f}{:8.3f}{:8.3f}' \
+           '{:6.2f}{:6.2f}          {:>2s}\n'.format(
+               record, serial, name, res_name, 1, x, 0.0, 0.0, 1.0, 0.0,
+               element)
+
+
+def _trajectory_lines(n_frames: int) -> list[str]:
+    lines = ['CRYST1\n', ]
+    for i in range(n_frames):
+        lines.append('MODEL     {}\n'.format(i + 1))
+        lines.append(_atom_line('ATOM', 1, 'N', 'GLY', float(i), 'N'))
+        lines.append(_atom_line('ATOM', 2, 'CA', 'GLY', float(i), 'C'))
+        lines.append('TER       3      GLY A   1\n')
+        lines.append(_atom_line('HETATM', 4, 'C1', 'A00', float(i), 'C'))
+        lines.append(_atom_line('HETATM', 5, 'H1', 'A00', float(i), 'H'))
+        lines.append('TER       6      A00 A   2\n')
+        lines.append('ENDMDL\n')
+    return lines
+
+
+class TestInput(unittest.TestCase):
+
+    def test_frame_filter(self):
+        f = input.create_frame_filter(input.FrameSelection(2, 9, 3))
+        self.assertEqual([i for i in range(20) if f(i)], [2, 5, 8])
+        selection = input.FrameSelection(1, None, 2, 4, 7)
+        f0 = input.create_frame_filter(selection, 20)
+        f1 = input.create_frame_filter(selection, 20)
+        selected = [i for i in range(20) if f0(i)]
+        self.assertEqual(selected, [i for i in range(20) if f1(i)])
+        self.assertEqual(len(selected), 4)
+        self.assertTrue(all(i % 2 == 1 for i in selected))
+        f = input.create_frame_filter(input.FrameSelection(subsample=10), 3)
+        self.assertEqual([i for i in range(5) if f(i)], [0, 1, 2])
+        with self.assertRaises(ValueError):
+            input.create_frame_filter(input.FrameSelection(subsample=1))
+
+    def test_trajectory_filter(self):
+        lines = _trajectory_lines(5)
+        pdb_all, n_probe = input.trajectory_pdb_string_filter(iter(lines))
+        self.assertEqual(n_probe, 1)
+        self.assertEqual(pdb_all.count('MODEL'), 5)
+        used: list[int] = []
+        pdb, n_probe = input.trajectory_pdb_string_filter(
+            iter(lines),
+            input.create_frame_filter(input.FrameSelection(1, None, 2)),
+            used)
+        self.assertEqual(n_probe, 1)
+        self.assertEqual(used, [1, 3])
+        self.assertEqual(pdb.count('MODEL'), 2)
+        self.assertEqual(pdb.count('ENDMDL'), 2)
+        self.assertEqual(pdb.count('ATOM'), 4)
+        self.assertNotIn('HETATM', pdb)
+        self.assertNotIn('   0.000   0.000   0.000', pdb)
+        # 先頭フレームを使う場合は従来と同じ
+        pdb0, _ = input.trajectory_pdb_string_filter(
+            iter(lines), input.create_frame_filter(input.FrameSelection()))
+        self.assertEqual(pdb0, pdb_all)
+        with self.assertRaises(ValueError):
+            input.trajectory_pdb_string_filter(
+                iter(lines),
+                input.create_frame_filter(input.FrameSelection(start=5)))
+
+    def test_trajectory_chunks(self):
+        lines = _trajectory_lines(5)
+        pdb_all, _ = input.trajectory_pdb_string_filter(iter(lines))
+        used: list[int] = []
+        chunks = list(input.trajectory_pdb_string_chunks(
+            iter(lines), 2, None, used))
+        self.assertEqual([c.count('MODEL') for c, _ in chunks], [2, 2, 1])
+        self.assertEqual([n for _, n in chunks], [1, 1, 1])
+        self.assertEqual(used, [0, 1, 2, 3, 4])
+        self.assertTrue(all(c.endswith('END') for c, _ in chunks))
+        # 結合すると一括で読み込んだ場合と同じフレームになる
+        self.assertEqual(''.join(c[:-len('END')] for c, _ in chunks),
+                         pdb_all[:-len('END')])
+        chunks = list(input.trajectory_pdb_string_chunks(
+            iter(lines), 1,
+            input.create_frame_filter(input.FrameSelection(1, None, 2))))
+        self.assertEqual([c.count('MODEL') for c, _ in chunks], [1, 1])
+        with self.assertRaises(ValueError):
+            list(input.trajectory_pdb_string_chunks(iter(lines), 0))
+
+    def test_probe_frames(self):
+        lines = _trajectory_lines(5)
+        probe_frames: list[list[tuple[float, float, float]]] = []
+        pdb, _ = input.trajectory_pdb_string_filter(
+            iter(lines), None, None, probe_frames.append)
+        self.assertEqual(pdb, input.trajectory_pdb_string_filter(
+            iter(lines))[0])
+        # 水素を除いたプローブ原子の座標をフレーム毎に渡す
+        self.assertEqual(probe_frames,
+                         [[(float(i), 0.0, 0.0)] for i in range(5)])
+        probe_frames.clear()
+        list(input.trajectory_pdb_string_chunks(
+            iter(lines), 2,
+            input.create_frame_filter(input.FrameSelection(1, None, 2)),
+            None, probe_frames.append))
+        self.assertEqual(probe_frames, [[(1.0, 0.0, 0.0)], [(3.0, 0.0, 0.0)]])
+
+
+if __name__ == '__main__':
+    unittest.main()
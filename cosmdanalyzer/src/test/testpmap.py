@@ -0,0 +1,143 @@
+import os
+import pathlib
+import random
+import tempfile
+import unittest
+from src.main import calcmain
+from src.main import input
+from src.main import pmap
+
+
+_SAMPLE_DIR = pathlib.Path(__file__).parents[2] / 'sample_input' / 'multi'
+
+
+class TestPmap(unittest.TestCase):
+
+    def test_binning(self):
+        geometry = pmap.PmapGeometry((-1.0, 0.0, 0.0), 0.5, (4, 3, 2))
+        grid = pmap.PmapGrid(geometry, normalize='density')
+        grid.add_frame([(-0.9, 0.1, 0.1), (0.6, 1.4, 0.9), (5.0, 0.0, 0.0),
+                        (-1.0, 0.0, 0.5)])
+        grid.add_frame([(-0.9, 0.1, 0.1)])
+        self.assertEqual(grid.n_frames, 2)
+        # ボクセルiは[origin + i * delta, origin + (i + 1) * delta)の原子を数え,
+        # 範囲外の原子は数えない
+        counts = grid.get_counts()
+        self.assertEqual(len(counts), 4 * 3 * 2)
+        self.assertEqual(counts[0], 2.0)
+        self.assertEqual(counts[(3 * 3 + 2) * 2 + 1], 1.0)
+        self.assertEqual(counts[1], 1.0)
+        self.assertEqual(counts.sum(), 4.0)
+        # 1フレームあたりの数密度
+        values = grid.get_values()
+        self.assertAlmostEqual(values[0], 2 / (2 * 0.5**3))
+        self.assertAlmostEqual(values.sum(), 4 / (2 * 0.5**3))
+        access = calcmain.get_pmap_grid_access(grid)
+        self.assertEqual(access.to_value((3, 2, 1)), values[23])
+        self.assertEqual(access.to_pos((1, 2, 1)), (-0.75, 0.75, 0.25))
+        self.assertEqual(access.shape, (4, 3, 2))
+        self.assertEqual(access.size, 0.5)
+        raw = pmap.PmapGrid(geometry)
+        raw.add_frame([(-0.9, 0.1, 0.1)])
+        raw.add_frame([(-0.9, 0.1, 0.1)])
+        self.assertEqual(raw.get_values()[0], 2.0)
+        with self.assertRaises(ValueError):
+            pmap.PmapGrid(geometry, normalize='total')
+
+    def test_gaussian(self):
+        geometry = pmap.PmapGeometry((0.0, 0.0, 0.0), 1.0, (11, 11, 11))
+        grid = pmap.PmapGrid(geometry, 1.0)
+        grid.add_frame([(5.5, 5.5, 5.5)])
+        values = grid.get_values()
+        center = (5 * 11 + 5) * 11 + 5
+        # 範囲内では原子数が保存され, 中心が最大になる
+        self.assertAlmostEqual(values.sum(), 1.0)
+        self.assertEqual(values.max(), values[center])
+        self.assertAlmostEqual(values[center + 1], values[center - 11])
+        # 範囲外に分配する分は数えない
+        grid.add_frame([(0.5, 0.5, 0.5)])
+        self.assertLess(grid.get_counts().sum(), 2.0)
+
+    def test_geometry(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'PMAP_a_nVH.dx')
+            with open(path, 'w') as f:
+                f.write('object 1 class gridpositions counts 4 6 8\n'
+                        'origin 1.0 2.0 3.0\n'
+                        'delta 0.5 0 0\ndelta 0 0.5 0\ndelta 0 0 0.5\n'
+                        'object 2 class gridconnections counts 4 6 8\n'
+                        'object 3 class array type double rank 0 '
+                        'items 192 data follows\n')
+            info = input.SystemInfo((), path, 'a', None, None)
+            self.assertEqual(
+                pmap.create_pmap_geometry(info, pmap.PmapInput()),
+                pmap.PmapGeometry((1.0, 2.0, 3.0), 0.5, (4, 6, 8)))
+            self.assertEqual(
+                pmap.create_pmap_geometry(info, pmap.PmapInput(1.0)),
+                pmap.PmapGeometry((1.0, 2.0, 3.0), 1.0, (2, 3, 4)))
+
+    def test_sample_dx(self):
+        """同梱のDXファイルと同じ配置と単位になることを確認する.
+        同梱のPDBはDXファイルを作成したトラジェクトリの1フレームのみのため,
+        そのフレームの原子を数えたボクセルがDXファイルでも数えられていることと,
+        ボクセルの座標がDXファイルを読み込んだ場合と一致することを確認する.
+        """
+        for dx_path in sorted(_SAMPLE_DIR.glob('*/output/system*/*.dx')):
+            pdb_path = next(dx_path.parent.glob('*_position_check.pdb'))
+            info = input.SystemInfo((pdb_path, ), dx_path, 'a', None, None)
+            grid = pmap.PmapGrid(pmap.create_pmap_geometry(
+                info, pmap.PmapInput()))
+            _, n_probe_atoms = input.trajectory_pdb_files_filter(
+                info.pdbs, None, None, grid.add_frame)
+            dx_grid = calcmain.get_grid_access(calcmain.load_grid(dx_path))
+            counts = grid.get_counts()
+            # グリッド外のプローブ原子は数えない
+            self.assertGreater(counts.sum(), 0.5 * n_probe_atoms)
+            self.assertLessEqual(counts.sum(), n_probe_atoms)
+            self.assertTrue((dx_grid.flat_values[counts > 0] >= 1.0).all())
+            access = calcmain.get_pmap_grid_access(grid)
+            self.assertEqual(access.shape, tuple(dx_grid.shape))
+            self.assertEqual(access.size, dx_grid.size)
+            for idx in ((0, 0, 0), (3, 17, 42), (79, 79, 79)):
+                for p, q in zip(access.to_pos(idx), dx_grid.to_pos(idx)):
+                    self.assertAlmostEqual(p, q)
+
+    def test_dx_selection(self):
+        """既定の単位ではDXファイルと同じしきい値で同じボクセルを選ぶ"""
+        rng = random.Random(0)
+        geometry = pmap.PmapGeometry((-2.0, 1.0, 0.5), 0.5, (12, 10, 8))
+        grid = pmap.PmapGrid(geometry)
+        centers = [tuple(o + rng.uniform(1.0, 3.0) for o in geometry.origin)
+                   for _ in range(3)]
+        for _ in range(20):
+            grid.add_frame([tuple(c + rng.gauss(0.0, 0.3) for c in center)
+                            for center in centers for _ in range(4)])
+        counts = grid.get_counts()
+        with tempfile.TemporaryDirectory() as tmp:
+            # cpptrajと同じ形式で原子数のDXファイルを書き出す
+            dx_path = os.path.join(tmp, 'PMAP_a_nVH.dx')
+            shape = ' '.join(map(str, geometry.shape))
+            with open(dx_path, 'w') as f:
+                f.write('object 1 class gridpositions counts {}\n'
+                        'origin {} {} {}\n'.format(shape, *geometry.origin))
+                for i in range(3):
+                    delta = [0.0, 0.0, 0.0]
+                    delta[i] = geometry.delta
+                    f.write('delta {} {} {}\n'.format(*delta))
+                f.write('object 2 class gridconnections counts {}\n'
+                        'object 3 class array type double rank 0 '
+                        'items {} data follows\n'.format(shape, len(counts)))
+                for i in range(0, len(counts), 3):
+                    f.write(' '.join(map(str, counts[i:i + 3])) + '\n')
+            dx_grid = calcmain.get_grid_access(calcmain.load_grid(dx_path))
+            access = calcmain.get_pmap_grid_access(grid)
+            for threshold in (1.0, 3.0, 6.0):
+                selected = calcmain.select_occupied_voxels(access, threshold)
+                self.assertGreater(len(selected), 0)
+                self.assertEqual(
+                    selected,
+                    calcmain.select_occupied_voxels(dx_grid, threshold))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import io
+import os
+import tempfile
+import unittest
+from src.main import calcmain
+from src.main import output
+from src.main import reweight
+
+
+def _create_systems(n_patches: int):
+    systems = []
+    for k, n_frames in enumerate((3, 5)):
+        scores = tuple(
+            (tuple(float(i * 10 + p + k) for p in range(n_patches))
+             if i != 2 else (None, ) * n_patches)
+            for i in range(len(calcmain.SCORE_NAMES)))
+        systems.append(output.SystemScoreResults(
+            'A{:02}'.format(k), n_frames, scores))
+    return systems
+
+
+class TestReweight(unittest.TestCase):
+
+    def test_score_results(self):
+        systems = _create_systems(3)
+        weight = (1.0, 0.5, 0.0) + (1.0, ) * 6
+        calculated = [i != 2 for i in range(len(weight))]
+        out = io.BytesIO()
+        output.write_score_results(out, weight, calculated, systems)
+        out.seek(0)
+        self.assertEqual(output.read_score_results(out),
+                         (weight, tuple(calculated), systems))
+        with self.assertRaises(ValueError):
+            output.read_score_results(io.BytesIO(b'CMDAGRD1'))
+
+    def test_reweight(self):
+        systems = _create_systems(2)
+        weight = (1.0, 0.5, 0.0) + (1.0, ) * 6
+        calculated = [i != 2 for i in range(len(weight))]
+        new_weight = (1.0, 2.0, 0.0) + (1.0, ) * 6
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(os.path.join(tmp, calcmain.SCORE_RESULTS_FILE),
+                      'wb') as f:
+                output.write_score_results(f, weight, calculated, systems)
+            for system in systems:
+                os.makedirs(os.path.join(tmp, system.basename))
+            reweight.reweight(tmp, [None, 2.0] + [None] * 7)
+            with open(os.path.join(tmp, 'all_info.txt')) as f:
+                lines = f.read().split('\n')
+            n_all = sum(s.n_frames for s in systems)
+            expected = sum(
+                sum(w * v[0] for w, v in zip(new_weight, s.scores)
+                    if w != 0.0) * s.n_frames
+                for s in systems) / n_all
+            self.assertEqual(lines[1], '\tscore : \t{:.3f}'.format(expected))
+            self.assertEqual(lines[4], '\tprotrusion : \tn/a')
+            self.assertTrue(os.path.isfile(os.path.join(
+                tmp, 'A01', 'A01_info.txt')))
+            with open(os.path.join(tmp, calcmain.SCORE_RESULTS_FILE),
+                      'rb') as f:
+                self.assertEqual(output.read_score_results(f)[0],
+                                 new_weight)
+            # 一時ファイルは置き換え後に残らない
+            self.assertEqual(
+                [n for n in os.listdir(tmp) if n.endswith('.tmp')], [])
+            # 計算していないスコアには重みを付けられない
+            with self.assertRaises(ValueError):
+                reweight.reweight(tmp, [None, None, 1.0] + [None] * 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
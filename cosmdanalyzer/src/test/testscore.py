@@ -1,4 +1,5 @@
 import unittest
+from src.main import calcmain
 from src.main import scoretype
 
 
@@ -16,3 +17,33 @@ class TestScore(unittest.TestCase):
                 3.25, scoretype.sorted_percentile(data, 0.25))
         self.assertEqual(
                 6.5, scoretype.sorted_percentile(data, 0.75))
+
+    def test_active_scores(self):
+        weight = [1.0, 0.0, 0.0, 2.0, 0.0, 1.0, 0.0, 0.0, 1.0]
+        active = calcmain.select_active_scores(weight)
+        self.assertEqual(active, {'gfe', 'convexity', 'hydrophobicity',
+                                  'fpocket'})
+        self.assertEqual(calcmain.required_score_data(active),
+                         {'protein_volume', 'vptree', 'exposure',
+                          'hydrophobicity_table', 'fpocket'})
+        self.assertIn('size',
+                      calcmain.select_active_scores(weight, ['size']))
+        self.assertEqual(calcmain.select_active_scores(weight, ['all']),
+                         set(calcmain.SCORE_NAMES))
+        with self.assertRaises(ValueError):
+            calcmain.select_active_scores(weight, ['volume'])
+        # 重みが0のスコアは計算しない場合があるため和に使わない
+        self.assertEqual(calcmain.weighted_sum(
+            [(1.0, 2.0), (0.0, None), (0.5, 4.0)]), 4.0)
+
+    def test_skipped_score(self):
+        score = scoretype.SkippedScore(3)
+        score.add_frame(lambda a: (0.0, 0.0, 0.0), None)
+        self.assertEqual(list(score.get_result()), [None, None, None])
+        self.assertEqual(list(score.get_frame_result()), [None, None, None])
+        self.assertEqual(list(score.get_detail_result()), [None, None, None])
+        score.set_state(score.get_state())
+        mean = [0.0, 1.0]
+        calcmain.add_to_sequence(mean, [None, 2.0])
+        calcmain.mul_scaler_to_sequence(mean, 0.5)
+        self.assertEqual(mean, [None, 1.5])
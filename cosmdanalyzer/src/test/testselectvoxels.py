@@ -0,0 +1,70 @@
+import random
+import unittest
+from src import index
+from src.main import calcmain
+from src.main import spot
+
+
+def create_grid(values, shape):
+    return calcmain.MyGrid(
+        to_value=(lambda v: values[index.convert_3d_index_to_1d(v, shape)]),
+        to_pos=(lambda v: (v[0] * 1.0, v[1] * 1.0, v[2] * 1.0)),
+        shape=shape,
+        size=1.0,
+        flat_values=values)
+
+
+class TestSelectVoxels(unittest.TestCase):
+
+    def test_select(self):
+        rng = random.Random(0)
+        for shape in ((13, 7, 9), (20, 17, 33), (5, 1, 3), (1, 1, 1)):
+            n = shape[0] * shape[1] * shape[2]
+            values = [0.0] * n
+            for _ in range(max(n // 20, 1)):
+                values[rng.randrange(n)] = rng.random()
+            grid = create_grid(values, shape)
+            for threshold in (0.0, 0.3, 0.9, 2.0):
+                # すべてのボクセルを調べた場合と同じ順番で同じボクセルを選ぶ
+                expected = [v for v in index.dence_matrix_3d_indices(*shape)
+                            if values[index.convert_3d_index_to_1d(
+                                v, shape)] >= threshold]
+                self.assertEqual(
+                    calcmain.select_occupied_voxels(grid, threshold),
+                    expected)
+
+    def test_hotspots(self):
+        rng = random.Random(1)
+        shape = (16, 14, 12)
+        values = [0.0] * (shape[0] * shape[1] * shape[2])
+        for _ in range(3):
+            center = tuple(rng.randrange(2, s - 2) for s in shape)
+            for d in index.sphere_grid_stencil(2.0):
+                v = tuple(c + i for c, i in zip(center, d))
+                values[index.convert_3d_index_to_1d(v, shape)] = rng.random()
+
+        def to_v(v):
+            return values[index.convert_3d_index_to_1d(v, shape)]
+
+        def voxel_to_pos(v):
+            return (v[0] * 1.0, v[1] * 1.0, v[2] * 1.0)
+        atoms_pos = [tuple(rng.uniform(0.0, 14.0) for _ in range(3))
+                     for _ in range(20)]
+        box = ((0, 0, 0), tuple(s - 1 for s in shape))
+        grid = create_grid(values, shape)
+        for clustering_input in (spot.DbscanInput(1.5, 4),
+                                 spot.SingleLinkageInput(1.5)):
+            expected = list(spot.detect_multi_hotspots(
+                [(index.dence_matrix_3d_indices(*shape), to_v, 0.2,
+                  atoms_pos, 0)],
+                voxel_to_pos, 5.0, clustering_input, 1.0, box, 1.0, 0.2))
+            self.assertGreater(len(expected), 0)
+            self.assertEqual(list(spot.detect_multi_hotspots(
+                [(calcmain.select_occupied_voxels(grid, 0.2), to_v, 0.2,
+                  atoms_pos, 0)],
+                voxel_to_pos, 5.0, clustering_input, 1.0, box, 1.0, 0.2)),
+                expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,25 @@
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+
+class TestStartup(unittest.TestCase):
+
+    def test_lazy_import(self):
+        """起動時に依存ライブラリと開発用モジュールを読み込まない"""
+        heavy = ('gridData', 'rdkit', 'numpy', 'src.main.calcmain')
+        dev_only = ('plotly', 'src.visualization', 'src.debug')
+        code = (
+            'import sys\n'
+            'from src import main, arguments\n'
+            'arguments.create_parser()\n'
+            'print(",".join(m for m in {} if m in sys.modules))\n'
+            'from src.main import calcmain\n'
+            'print(",".join(m for m in {} if m in sys.modules))\n'
+        ).format(heavy, dev_only)
+        ret = subprocess.run(
+            (sys.executable, '-c', code),
+            cwd=Path(__file__).parents[2], capture_output=True, text=True,
+            check=True)
+        self.assertEqual(ret.stdout.split('\n')[:2], ['', ''])
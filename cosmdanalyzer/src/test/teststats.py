@@ -0,0 +1,155 @@
+import random
+import statistics
+import unittest
+from src import common
+from src.main import scoretype
+
+
+class TestStats(unittest.TestCase):
+
+    def test_running_stats(self):
+        data = tuple(random.uniform(-10.0, 10.0) for _ in range(1000))
+        all_stats = common.RunningStats()
+        part_stats = tuple(common.RunningStats() for _ in range(3))
+        for i, v in enumerate(data):
+            all_stats.add(v)
+            part_stats[i % 3].add(v)
+        merged = common.RunningStats()
+        for s in part_stats:
+            merged.merge(s)
+        for s in (all_stats, merged):
+            self.assertEqual(s.count, len(data))
+            self.assertAlmostEqual(s.mean, statistics.mean(data))
+            self.assertAlmostEqual(s.variance, statistics.variance(data))
+            self.assertEqual(s.min, min(data))
+            self.assertEqual(s.max, max(data))
+
+    def test_quantile_sketch(self):
+        # バッファ内の場合はソート済み配列の線形補間と一致する
+        data = tuple(random.gauss(0.0, 1.0) for _ in range(101))
+        sketch = common.QuantileSketch(100)
+        for v in data:
+            sketch.add(v)
+        sorted_data = sorted(data)
+        for q in (0.0, 0.25, 0.5, 0.75, 1.0):
+            self.assertEqual(sketch.quantile(q),
+                             scoretype.sorted_percentile(sorted_data, q))
+        # 要約後は順位の誤差が小さい
+        n_data = 20000
+        data = tuple(random.gauss(0.0, 1.0) for _ in range(n_data))
+        sketches = tuple(common.QuantileSketch(200) for _ in range(4))
+        for i, v in enumerate(data):
+            sketches[i % 4].add(v)
+        for s in sketches[1:]:
+            sketches[0].merge(s)
+        sorted_data = sorted(data)
+        for q in (0.25, 0.5, 0.75):
+            v = sketches[0].quantile(q)
+            rank = sum(1 for d in sorted_data if d < v) / n_data
+            self.assertAlmostEqual(rank, q, delta=0.02)
+
+    def test_mean_score_detail(self):
+        data = tuple(random.uniform(0.0, 1.0) for _ in range(50))
+        exact = scoretype.MeanScore(scoretype.ExactDetail())
+        sketch = scoretype.MeanScore(scoretype.SketchDetail())
+        for v in data:
+            exact.add_score(v)
+            sketch.add_score(v)
+        for e, s in zip(exact.get_detail_result(),
+                        sketch.get_detail_result()):
+            self.assertAlmostEqual(e, s)
+
+    def test_block_mean_stats(self):
+        data = tuple(random.gauss(0.0, 1.0) for _ in range(103))
+        stats = common.BlockMeanStats(10)
+        for v in data:
+            stats.add(v)
+        self.assertEqual(stats.count, 103)
+        self.assertEqual(stats.n_blocks, 10)
+        self.assertAlmostEqual(stats.mean, statistics.mean(data))
+        block_means = tuple(statistics.mean(data[i:i + 10])
+                            for i in range(0, 100, 10))
+        self.assertAlmostEqual(
+            stats.standard_error,
+            (statistics.variance(block_means) / 10)**0.5)
+        # 追加順によらずキーの順番でブロックを作る
+        order = list(range(103))
+        random.shuffle(order)
+        keyed = common.BlockMeanStats(10)
+        for i in order:
+            keyed.add(data[i], i)
+        self.assertEqual(keyed.n_blocks, 10)
+        self.assertAlmostEqual(keyed.mean, stats.mean)
+        self.assertAlmostEqual(keyed.standard_error, stats.standard_error)
+        # キーが揃っていないブロックは標準誤差に使わない
+        partial = common.BlockMeanStats(10)
+        for i in order[:50]:
+            partial.add(data[i], i)
+        complete = [i // 10 for i in range(0, 100, 10)
+                    if all(j in order[:50] for j in range(i, i + 10))]
+        self.assertEqual(partial.n_blocks, len(complete))
+        # 値がないキーもブロックが揃ったことの判定に数える
+        sparse = common.BlockMeanStats(10)
+        for i in range(30):
+            sparse.add(data[i] if i % 3 else None, i)
+        self.assertEqual(sparse.count, 20)
+        self.assertEqual(sparse.n_blocks, 3)
+        self.assertAlmostEqual(sparse.mean, statistics.mean(
+            data[i] for i in range(30) if i % 3))
+        sparse_means = tuple(
+            statistics.mean(data[j] for j in range(i, i + 10) if j % 3)
+            for i in range(0, 30, 10))
+        self.assertAlmostEqual(
+            sparse.standard_error,
+            (statistics.variance(sparse_means) / 3)**0.5)
+
+    def test_convergence_monitor(self):
+        n_frames = 1000
+        convergence_input = scoretype.ConvergenceInput(0.05, 'random', 1)
+        # 重み0のスコアは判定に使わない
+        monitor = scoretype.ConvergenceMonitor(
+            convergence_input, (1.0, 0.0), 2, n_frames)
+        order = monitor.frame_order()
+        self.assertEqual(sorted(order), list(range(n_frames)))
+        self.assertEqual(order, scoretype.ConvergenceMonitor(
+            convergence_input, (1.0, 0.0), 2, n_frames).frame_order())
+        values = tuple(random.gauss(10.0, 1.0) for _ in range(n_frames))
+        for i, frame_idx in enumerate(order):
+            converged = monitor.add_frame(
+                ((values[frame_idx], None),
+                 (random.gauss(0.0, 100.0), 0.0)), frame_idx)
+            if i + 1 < (convergence_input.min_blocks
+                        * convergence_input.block_size):
+                self.assertFalse(converged)
+            if converged:
+                break
+        self.assertTrue(monitor.converged)
+        self.assertLess(monitor.n_used_frames, n_frames)
+        self.assertLessEqual(monitor.get_error(), 0.05)
+        # 標準誤差は計算した順番によらずフレーム番号順のブロックで求める
+        shuffled = scoretype.ConvergenceMonitor(
+            convergence_input, (1.0, ), 1, n_frames)
+        in_order = scoretype.ConvergenceMonitor(
+            convergence_input, (1.0, ), 1, n_frames)
+        for frame_idx in order[:50]:
+            shuffled.add_frame(((float(frame_idx), ), ), frame_idx)
+        for frame_idx in sorted(order[:50]):
+            in_order.add_frame(((float(frame_idx), ), ), frame_idx)
+        self.assertAlmostEqual(shuffled.get_error(), in_order.get_error())
+        strided = scoretype.ConvergenceMonitor(
+            convergence_input._replace(order='strided', block_size=1),
+            (1.0, ), 1, 10).frame_order()
+        self.assertEqual(strided, [0, 3, 6, 9, 1, 4, 7, 2, 5, 8])
+        # ブロック内のフレームは続けて計算する
+        blocked = scoretype.ConvergenceMonitor(
+            convergence_input._replace(order='strided', block_size=3),
+            (1.0, ), 1, 10).frame_order()
+        self.assertEqual(blocked, [0, 1, 2, 6, 7, 8, 3, 4, 5, 9])
+        blocked = scoretype.ConvergenceMonitor(
+            convergence_input._replace(block_size=3),
+            (1.0, ), 1, 10).frame_order()
+        self.assertEqual(sorted(blocked), list(range(10)))
+        for i in range(0, 10, 3):
+            start = blocked.index(i - i % 3)
+            self.assertEqual(blocked[start:start + min(3, 10 - i)],
+                             list(range(i, min(i + 3, 10))))
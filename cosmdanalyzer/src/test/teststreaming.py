@@ -0,0 +1,102 @@
+import random
+import unittest
+from src import index
+from src.main import spot
+from src.main import streaming
+
+
+def _random_pos(rng: random.Random, size: float):
+    return tuple(rng.uniform(0.0, size) for _ in range(3))
+
+
+class TestStreaming(unittest.TestCase):
+
+    def test_frame_spill(self):
+        spill = streaming.FrameSpill()
+        records = [(i, tuple(range(i))) for i in range(5)]
+        for r in records:
+            spill.write(r)
+        self.assertEqual(len(spill), 5)
+        self.assertEqual(list(spill), records)
+        # 読み直しても同じ内容になる
+        self.assertEqual(list(spill), records)
+        spill.close()
+
+    def test_hotspot_voxel_filter(self):
+        rng = random.Random(0)
+        shape = (8, 7, 6)
+        values = {v: rng.random() for v in index.dence_matrix_3d_indices(
+            *shape)}
+
+        def voxel_to_pos(v):
+            return (v[0] * 1.5, v[1] * 1.5, v[2] * 1.5)
+        frames = [[_random_pos(rng, 10.0) for _ in range(3)]
+                  for _ in range(4)]
+        voxel_filter = streaming.HotspotVoxelFilter(
+            index.dence_matrix_3d_indices(*shape), values.__getitem__, 0.5,
+            voxel_to_pos, 2.0)
+        for positions in frames:
+            voxel_filter.add_frame(positions)
+        expected = list(filter(
+            spot.create_voxel_filter(
+                values.__getitem__, 0.5, voxel_to_pos,
+                iter([p for positions in frames for p in positions]), 2.0),
+            index.dence_matrix_3d_indices(*shape)))
+        self.assertGreater(len(expected), 0)
+        self.assertEqual(voxel_filter.get_result(), expected)
+
+    def test_exposed_hit_map(self):
+        rng = random.Random(2)
+        shape = (8, 7, 6)
+        origin = (0.5, -1.0, 2.0)
+        width = 1.5
+        values = {v: rng.random() for v in index.dence_matrix_3d_indices(
+            *shape)}
+
+        def voxel_to_pos(v):
+            return tuple(o + i * width for o, i in zip(origin, v))
+        hit_map = spot.ExposedHitMap(origin, width, 2)
+        # セルの中心の座標は丸めても変わらない
+        frames = [[tuple(o + rng.randrange(-4, 20) * width / 2
+                         for o in origin) for _ in range(3)]
+                  for _ in range(4)]
+        for positions in frames + frames:
+            hit_map.add_positions(positions)
+        self.assertEqual(len(hit_map),
+                         len(set(p for ps in frames for p in ps)))
+        expected = list(filter(
+            spot.create_voxel_filter(
+                values.__getitem__, 0.5, voxel_to_pos,
+                iter([p for positions in frames for p in positions]), 2.0),
+            index.dence_matrix_3d_indices(*shape)))
+        self.assertGreater(len(expected), 0)
+        self.assertEqual(spot.select_hit_map_voxels(
+            index.dence_matrix_3d_indices(*shape), values.__getitem__, 0.5,
+            hit_map, 2.0), expected)
+
+    def test_surface_union_patches(self):
+        rng = random.Random(1)
+        n_res = 6
+        res_atoms = {r: [r * 3 + i for i in range(3)] for r in range(n_res)}
+        atom_to_res = (lambda a: a // 3)
+        res_to_atoms = (lambda r: iter(res_atoms[r]))
+        frame_pos = [[_random_pos(rng, 20.0) for _ in range(n_res * 3)]
+                     for _ in range(3)]
+        exposed = [set(rng.sample(range(n_res * 3), 6)) for _ in frame_pos]
+        hotspots = [[_random_pos(rng, 20.0) for _ in range(4)]
+                    for _ in range(3)] + [[]]
+        expected = list(spot.detect_frame_union_patches(
+            hotspots, atom_to_res, res_to_atoms,
+            (pos.__getitem__ for pos in frame_pos), exposed))
+        actual = list(spot.detect_surface_union_patches(
+            hotspots,
+            (spot.frame_surface_residues(
+                e, atom_to_res, res_to_atoms, pos.__getitem__)
+             for pos, e in zip(frame_pos, exposed))))
+        self.assertEqual(actual, expected)
+        self.assertEqual([list(p) for p in actual],
+                         [list(p) for p in expected])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import random
+import unittest
+from src import index
+from src.main import spot
+from src.main import sweep
+
+
+def _random_pos(rng: random.Random, size: float):
+    return tuple(rng.uniform(0.0, size) for _ in range(3))
+
+
+class TestSweep(unittest.TestCase):
+
+    def test_sweep_values(self):
+        self.assertEqual(sweep.expand_sweep_values(0.5), (0.5,))
+        self.assertEqual(sweep.expand_sweep_values([3, 5, 3]), (3, 5))
+        self.assertEqual(sweep.expand_sweep_values(
+            {'start': 5, 'stop': 9, 'step': 2}), (5, 7, 9))
+        self.assertEqual(sweep.expand_sweep_values(
+            {'start': 0.1, 'stop': 0.3, 'step': 0.1}), (0.1, 0.2, 0.3))
+        with self.assertRaises(ValueError):
+            sweep.expand_sweep_values([])
+        points = sweep.create_sweep_points(
+            0.1, spot.DbscanInput(3.0, 7), 0.2,
+            {'occupancy': [0.1, 0.2], 'min_pts': [5, 7]})
+        self.assertEqual(points, [
+            sweep.SweepPoint(o, spot.DbscanInput(3.0, m), 0.2)
+            for o in (0.1, 0.2) for m in (5, 7)])
+        with self.assertRaises(ValueError):
+            sweep.create_sweep_points(0.1, spot.DbscanInput(3.0, 7), 0.2,
+                                      {'threshold': [2.0]})
+
+    def test_hotspot_sweep(self):
+        rng = random.Random(0)
+        shape = (12, 10, 9)
+        width = 1.5
+        box = ((0, 0, 0), tuple(s - 1 for s in shape))
+
+        def voxel_to_pos(v):
+            return (v[0] * width, v[1] * width, v[2] * width)
+        systems = []
+        for i, n_heavy in enumerate((2, 3)):
+            values = {v: rng.random() * n_heavy
+                      for v in index.dence_matrix_3d_indices(*shape)}
+            atoms_pos = [_random_pos(rng, 15.0) for _ in range(6)]
+            systems.append((values.__getitem__, n_heavy, atoms_pos, i))
+        points = sweep.create_sweep_points(
+            0.6, spot.DbscanInput(2.0, 4), 0.3,
+            {'occupancy': [0.5, 0.7], 'epsilon': [1.5, 2.0],
+             'spot_marge_rate': [0.3, 0.8]})
+        points += sweep.create_sweep_points(
+            0.6, spot.SingleLinkageInput(2.0), 0.3,
+            {'occupancy': [0.5, 0.7]})
+        points += [sweep.SweepPoint(0.7, spot.MeanShiftInput(3.0), 0.3)]
+        hotspot_sweep = sweep.HotspotSweep(
+            ((spot.select_exposed_voxels(
+                index.dence_matrix_3d_indices(*shape), to_v, 0.5 * n_heavy,
+                atoms_pos, voxel_to_pos, 3.0), to_v, n_heavy, i)
+             for to_v, n_heavy, atoms_pos, i in systems),
+            1.0, box, width)
+        multi_hotspots = []
+        for point in points:
+            expected = [
+                (tuple(v), ids) for v, ids in spot.detect_multi_hotspots(
+                    ((index.dence_matrix_3d_indices(*shape), to_v,
+                      point.occupancy * n_heavy, atoms_pos, i)
+                     for to_v, n_heavy, atoms_pos, i in systems),
+                    voxel_to_pos, 3.0, point.clustering_input, 1.0, box,
+                    width, point.spot_marge_rate)]
+            self.assertGreater(len(expected), 0)
+            actual = hotspot_sweep.detect(point)
+            self.assertEqual(actual, expected)
+            multi_hotspots.append([v for v, _ in actual])
+        hotspots, point_idxs = sweep.unique_hotspots(multi_hotspots)
+        self.assertEqual(len(set(map(tuple, hotspots))), len(hotspots))
+        self.assertEqual([[hotspots[i] for i in idxs] for idxs in point_idxs],
+                         multi_hotspots)
+
+
+if __name__ == '__main__':
+    unittest.main()
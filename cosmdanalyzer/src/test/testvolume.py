@@ -0,0 +1,46 @@
+import math
+import random
+import unittest
+from src import solidcalc
+
+
+class TestVolume(unittest.TestCase):
+
+    def test_voxel_volume_one_sphere(self):
+        for _ in range(4):
+            r = random.uniform(2.0, 4.0)
+            sp = (tuple(random.uniform(-8.0, 8.0) for _ in range(3)), r)
+            true_volume = 4.0 / 3.0 * math.pi * r**3
+            volume = solidcalc.calc_multi_sphere_voxel_volume(
+                (0, ), (lambda _: sp), 0.1)
+            self.assertAlmostEqual(volume / true_volume, 1.0, delta=0.01)
+
+    def test_voxel_volume_two_spheres(self):
+        r = 2.0
+        d = 2.5
+        spheres = (((0.0, 0.0, 0.0), r), ((d, 0.0, 0.0), r))
+        lens = math.pi * (4 * r + d) * (2 * r - d)**2 / 12
+        true_volume = 2 * (4.0 / 3.0 * math.pi * r**3) - lens
+        volume = solidcalc.calc_multi_sphere_voxel_volume(
+            range(2), (lambda i: spheres[i]), 0.1, (0.05, 0.0, 0.0))
+        self.assertAlmostEqual(volume / true_volume, 1.0, delta=0.01)
+
+    def test_ray_volume_two_spheres(self):
+        r = 2.0
+        d = 2.5
+        spheres = (((0.0, 0.0, 0.0), r), ((d, 0.0, 0.0), r))
+        lens = math.pi * (4 * r + d) * (2 * r - d)**2 / 12
+        true_volume = 2 * (4.0 / 3.0 * math.pi * r**3) - lens
+        volume = solidcalc.calc_multi_sphere_volume(
+            range(2), (lambda i: spheres[i]), 4096)
+        self.assertAlmostEqual(volume / true_volume, 1.0, delta=0.01)
+
+    def test_ray_volume_center_outside(self):
+        # 小さい球の中心が大きい球との分割平面の外側にある
+        spheres = (((0.0, 0.0, 0.0), 3.0), ((1.0, 0.0, 0.0), 1.2),
+                   ((2.5, 0.0, 0.0), 1.5))
+        volume = solidcalc.calc_multi_sphere_volume(
+            range(3), (lambda i: spheres[i]), 4096)
+        voxel_volume = solidcalc.calc_multi_sphere_voxel_volume(
+            range(3), (lambda i: spheres[i]), 0.05)
+        self.assertAlmostEqual(volume / voxel_volume, 1.0, delta=0.01)
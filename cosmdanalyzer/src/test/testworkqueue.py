@@ -0,0 +1,249 @@
+import os
+import pathlib
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from src.main import scoretype
+from src.main import workqueue
+from src.scorecalc import rmsf
+
+
+_ROOT_DIR = pathlib.Path(__file__).parents[2]
+_SAMPLE_PDB = (_ROOT_DIR / 'sample_input' / 'multi' / 'A00' / 'output'
+               / 'system0' / '2am9_A00_position_check.pdb')
+_N_RESIDUES = 12
+_N_PROBES = 3
+_N_FRAMES = 3
+_SETTING = """
+[clustering]
+algorithm = "single_linkage"
+occupancy = 0.1
+extend    = 0.0
+spot_marge_rate = 0.2
+
+[clustering.single_linkage]
+threshold = 1.5
+
+[clustering.dbscan]
+epsilon = 3.0
+min_pts = 7
+
+[clustering.mean_shift]
+bandwidth = 3.0
+
+[score]
+temperature = 300.0
+solvent_radius = 1.4
+resolution = 16
+fpocket_threshold = 0.0
+
+[score.weight]
+gfe            = 1.0
+size           = 1.0
+protrusion     = 1.0
+convexity      = 1.0
+compactness    = 1.0
+hydrophobicity = 1.0
+charge_density = 1.0
+flexibility    = 1.0
+fpocket        = 0.0
+"""
+
+
+def _write_queue_input(src_dir: pathlib.Path) -> None:
+    """同梱のPDBの先頭の残基とプローブから, 2つのトラジェクトリをもつ
+    1プローブの小さな入力を作成する.
+    座標はフレーム毎に少しずらし, DXファイルは3つの原子の周囲のみ値をもつ.
+    """
+    protein = []
+    probes = []
+    with open(_SAMPLE_PDB) as f:
+        for line in f:
+            if not line.startswith('ATOM'):
+                continue
+            res_id = int(line[22:26])
+            if res_id <= _N_RESIDUES:
+                protein.append(line)
+            elif line[17:20] == 'A00' and res_id < 253 + _N_PROBES:
+                probes.append(line)
+    rng = random.Random(0)
+    positions = [(float(line[30:38]), float(line[38:46]),
+                  float(line[46:54])) for line in protein]
+    origin = tuple(min(p[i] for p in positions) - 4.0 for i in range(3))
+    shape = tuple(int(max(p[i] for p in positions) - origin[i]) + 5
+                  for i in range(3))
+    n_voxels = shape[0] * shape[1] * shape[2]
+    os.makedirs(src_dir)
+    with open(src_dir / 'PMAP_test_nVH.dx', 'w') as f:
+        f.write('object 1 class gridpositions counts {} {} {}\n'
+                .format(*shape))
+        f.write('origin {:.3f} {:.3f} {:.3f}\n'.format(*origin))
+        f.write('delta 1 0 0\ndelta 0 1 0\ndelta 0 0 1\n')
+        f.write('object 2 class gridconnections counts {} {} {}\n'
+                .format(*shape))
+        f.write('object 3 class array type double rank 0 items {} '
+                'data follows\n'.format(n_voxels))
+        # 3つの原子を中心とする球の内側のみ占有率を高くする
+        centers = rng.sample(positions, 3)
+        for i in range(shape[0]):
+            for j in range(shape[1]):
+                for k in range(shape[2]):
+                    pos = (origin[0] + i, origin[1] + j, origin[2] + k)
+                    near = any(sum((p - c)**2 for p, c in zip(pos, center))
+                               < 2.5**2 for center in centers)
+                    f.write('{:.4f}\n'.format(
+                        rng.uniform(1.0, 2.0) if near else 0.0))
+    for system_idx in range(2):
+        sys_dir = src_dir / 'system{}'.format(system_idx)
+        os.makedirs(sys_dir)
+        with open(sys_dir / 'test_position_check2.pdb', 'w') as f:
+            for frame_idx in range(_N_FRAMES):
+                f.write('MODEL {:>8d}\n'.format(frame_idx + 1))
+                for i, line in enumerate(protein):
+                    f.write(_move_pdb_line(line, i + 1, rng))
+                f.write('TER   {:5d}\n'.format(len(protein) + 1))
+                for i, line in enumerate(probes):
+                    f.write(_move_pdb_line(line, len(protein) + i + 2, rng))
+                f.write('ENDMDL\n')
+
+
+def _move_pdb_line(line: str, serial: int, rng: random.Random) -> str:
+    """PDBのATOM行の原子番号を付け直し, 座標を乱数でずらす."""
+    pos = (float(line[30:38]), float(line[38:46]), float(line[46:54]))
+    moved = ''.join('{:8.3f}'.format(p + rng.uniform(-0.03, 0.03))
+                    for p in pos)
+    return '{}{:5d}{}{}{}'.format(line[:6], serial, line[11:30], moved,
+                                  line[54:])
+
+
+class TestWorkQueue(unittest.TestCase):
+
+    def test_chunk_frame_filter(self):
+        # 偶数番目のフレームのうち1番目から3番目より前
+        chunk_filter = workqueue.create_chunk_frame_filter(
+            lambda i: i % 2 == 0, 1, 3)
+        self.assertEqual([i for i in range(10) if chunk_filter(i)], [2, 4])
+        chunk_filter = workqueue.create_chunk_frame_filter(None, 0, 2)
+        self.assertEqual([i for i in range(5) if chunk_filter(i)], [0, 1])
+
+    def test_claim_task(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            queue_dir = pathlib.Path(tmp) / 'queue'
+            for sub_dir in ('todo', 'running', 'done'):
+                os.makedirs(queue_dir / sub_dir)
+            task = workqueue.QueueTask(1, 0, 5)
+            with open(queue_dir / 'todo' / task.name, 'w') as f:
+                f.write('1 0 5\n')
+            self.assertEqual(workqueue.claim_task(queue_dir), task)
+            self.assertEqual(os.listdir(queue_dir / 'running'), [task.name, ])
+            self.assertIsNone(workqueue.claim_task(queue_dir))
+            # 計算中のタスクを戻さないように更新間隔以下は指定できない
+            with self.assertRaises(ValueError):
+                workqueue.requeue(tmp, 0.0)
+            # 更新から指定秒数経過していないタスクは戻さない
+            self.assertEqual(workqueue.requeue(tmp), 0)
+            running_path = queue_dir / 'running' / task.name
+            stale = time.time() - 2 * workqueue.REQUEUE_OLDER_THAN
+            os.utime(running_path, (stale, stale))
+            self.assertEqual(workqueue.requeue(tmp), 1)
+            # 戻されたタスクを計算し終えたworkerはtodoから移動する
+            self.assertTrue(workqueue.finish_task(queue_dir, task))
+            self.assertEqual(os.listdir(queue_dir / 'done'), [task.name, ])
+            self.assertFalse(workqueue.finish_task(queue_dir, task))
+            self.assertIsNone(workqueue.claim_task(queue_dir))
+
+    def test_heartbeat(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = pathlib.Path(tmp) / 'task'
+            path.touch()
+            stale = time.time() - 3600.0
+            os.utime(path, (stale, stale))
+            with workqueue.TaskHeartbeat(path, 0.01):
+                time.sleep(0.2)
+            self.assertGreater(path.stat().st_mtime, stale + 3000.0)
+            # ファイルがなくなった場合は更新をやめる
+            with workqueue.TaskHeartbeat(path, 0.01):
+                os.remove(path)
+                time.sleep(0.1)
+            self.assertFalse(path.exists())
+
+    def test_workers(self):
+        """2つのworkerプロセスで計算した結果が1回の実行と一致することを確認する."""
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = pathlib.Path(tmp)
+            src_dir = tmp / 'src'
+            _write_queue_input(src_dir)
+            setting = tmp / 'setting.toml'
+            setting.write_text(_SETTING)
+            subprocess.run(
+                [sys.executable, str(_ROOT_DIR / 'cosmdanalyzer.py'),
+                 '-s', str(setting), str(tmp / 'single'), str(src_dir)],
+                check=True, stdout=subprocess.DEVNULL)
+            out_dir = tmp / 'queue'
+            subprocess.run(
+                [sys.executable, str(_ROOT_DIR / 'cosmdanalyzer_queue.py'),
+                 'coordinator', '-s', str(setting), '--chunk_size', '1',
+                 str(out_dir), str(src_dir)],
+                check=True, stdout=subprocess.DEVNULL)
+            workers = [subprocess.Popen(
+                [sys.executable, str(_ROOT_DIR / 'cosmdanalyzer_queue.py'),
+                 'worker', str(out_dir)], stdout=subprocess.DEVNULL)
+                for _ in range(2)]
+            for worker in workers:
+                self.assertEqual(worker.wait(), 0)
+            queue_dir = out_dir / 'queue'
+            self.assertEqual(len(os.listdir(queue_dir / 'done')),
+                             2 * _N_FRAMES)
+            self.assertEqual(os.listdir(queue_dir / 'running'), [])
+            self.assertEqual(workqueue.reduce(out_dir), [])
+            self.assertIn('Patch 1', (out_dir / 'all_info.txt').read_text())
+            # 出力に使う最後のフレームの座標も1回の実行と一致する
+            single_dir = tmp / 'single'
+            for path in single_dir.rglob('*'):
+                if path.is_file():
+                    self.assertEqual(
+                        (out_dir / path.relative_to(single_dir)).read_bytes(),
+                        path.read_bytes())
+
+    def test_merge_frame_score_states(self):
+        values = (1.0, 2.0, 4.0, 8.0)
+        points = ((0.0, 0.0, 0.0), (1.0, 0.0, 0.0),
+                  (0.0, 2.0, 0.0), (1.0, 1.0, 1.0))
+        whole_score = scoretype.MeanScore(True)
+        whole_rmsf = rmsf.PointRmsfCalc()
+        whole_surface = scoretype.MeanScore(True)
+        states = []
+        for start in (0, 2):
+            score = scoretype.MeanScore(True)
+            surface = scoretype.MeanScore(True)
+            calc = rmsf.PointRmsfCalc()
+            for v, p in zip(values[start:start + 2], points[start:start + 2]):
+                score.add_score(v)
+                surface.add_score(-v)
+                calc.add_frame(p)
+                whole_score.add_score(v)
+                whole_surface.add_score(-v)
+                whole_rmsf.add_frame(p)
+            # 誤差の表示は最初の区間のみ行う
+            states.append((
+                (score, ),
+                scoretype.SurfaceScoreState((surface, ), start > 0),
+                ((calc.get_state(), ), )))
+        merged = workqueue.merge_frame_score_states(states)
+        self.assertEqual(merged[0][0].get_result(), whole_score.get_result())
+        self.assertEqual(merged[0][0].get_detail_result(),
+                         whole_score.get_detail_result())
+        self.assertEqual(merged[1].scores[0].get_result(),
+                         whole_surface.get_result())
+        self.assertFalse(merged[1].surface_check)
+        merged_rmsf = rmsf.PointRmsfCalc()
+        merged_rmsf.set_state(merged[2][0][0])
+        self.assertAlmostEqual(merged_rmsf.get_result(),
+                               whole_rmsf.get_result())
+
+
+if __name__ == '__main__':
+    unittest.main()